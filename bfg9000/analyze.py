@@ -0,0 +1,316 @@
+import errno
+import json
+import os
+from collections import OrderedDict
+from six import iteritems, string_types
+
+from .file_types import Node
+from .iterutils import listify
+from .path import Path, Root
+from .timelog import timing_file
+
+graph_file = '.bfg_graph'
+
+
+class BuildGraph(object):
+    """The steps in a build directory's build files, along with the
+    `build.bfg` line that created each of them, so that a build's log can be
+    mapped back to the targets that took the most time."""
+
+    version = 1
+
+    def __init__(self, backend, steps=None, locations=None, srcdir=None,
+                 roots=None):
+        self.backend = backend
+        self.steps = list(steps or [])
+        self.locations = list(locations or [])
+        self._srcdir = srcdir
+        self._roots = roots
+        self._location_index = {}
+
+    @classmethod
+    def from_env(cls, env):
+        roots = dict(env.base_dirs)
+        roots[Root.builddir] = None
+        return cls(env.backend, srcdir=env.srcdir.string(), roots=roots)
+
+    def _name(self, item):
+        if isinstance(item, string_types):
+            return item
+        if isinstance(item, Node):
+            item = item.path
+        if isinstance(item, Path):
+            try:
+                return item.string(self._roots)
+            except KeyError:
+                # Installation paths aren't part of the build itself.
+                return None
+        return None
+
+    def _location(self, edge):
+        loc = edge and edge.location
+        if loc is None:
+            return None
+
+        filename = loc.filename
+        if self._srcdir:
+            rel = os.path.relpath(filename, self._srcdir)
+            if not rel.startswith(os.pardir + os.sep):
+                filename = rel
+
+        key = (filename, loc.line, loc.function)
+        # The last edge created by a call (e.g. the link step of an
+        # `executable()`) names the target for all of them.
+        outputs = listify(edge.public_output) or edge.output
+        name = self._name(outputs[0]) if outputs else None
+        if key in self._location_index:
+            index = self._location_index[key]
+            if name:
+                self.locations[index][3] = name
+            return index
+
+        self._location_index[key] = index = len(self.locations)
+        self.locations.append([filename, loc.line, loc.function, name])
+        return index
+
+    def add(self, steps, edge=None):
+        location = None
+        for outputs, inputs in steps:
+            outputs = [i for i in (self._name(j) for j in outputs) if i]
+            if not outputs:
+                continue
+            if location is None:
+                location = self._location(edge)
+            self.steps.append([outputs,
+                               [i for i in (self._name(j) for j in inputs)
+                                if i],
+                               location])
+
+    def save(self, path):
+        with open(os.path.join(path, graph_file), 'w') as out:
+            json.dump({
+                'version': self.version,
+                'data': {
+                    'backend': self.backend,
+                    'steps': self.steps,
+                    'locations': self.locations,
+                }
+            }, out)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(os.path.join(path, graph_file)) as inp:
+                state = json.load(inp)
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+
+        if state.get('version') != cls.version:
+            return None
+        data = state['data']
+        return cls(data['backend'], data['steps'], data['locations'])
+
+
+def read_ninja_log(stream):
+    # Each line of a v5 log is `START END MTIME OUTPUT HASH`, with the times in
+    # milliseconds since the start of that build. Later lines supersede
+    # earlier ones for the same output.
+    timings = {}
+    for line in stream:
+        if line.startswith('#'):
+            continue
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) < 4:
+            continue
+        timings[fields[3]] = (int(fields[0]), int(fields[1]))
+    return timings
+
+
+def read_timing_log(stream):
+    # Each line is `START END MAKE_PID TARGET`, with the times in milliseconds
+    # since the epoch. There's one line per recipe line, so add up the lines
+    # from the same Make process; lines from a later process supersede
+    # earlier ones for the same target.
+    timings = {}
+    for line in stream:
+        if line.startswith('#'):
+            continue
+        fields = line.rstrip('\n').split('\t', 3)
+        if len(fields) < 4:
+            continue
+        start, end, pid, target = (int(fields[0]), int(fields[1]), fields[2],
+                                   fields[3])
+        old = timings.get(target)
+        if old and old[2] == pid:
+            start, end = old[0], old[1] + end - start
+        timings[target] = (start, end, pid)
+    return {k: v[:2] for k, v in iteritems(timings)}
+
+
+def load_timings(builddir, backend):
+    logs = {
+        'make': (timing_file, read_timing_log),
+        'ninja': ('.ninja_log', read_ninja_log),
+    }
+    if backend not in logs:
+        raise ValueError('unable to analyze builds using {}'.format(backend))
+
+    log_file, reader = logs[backend]
+    try:
+        with open(os.path.join(builddir, log_file)) as inp:
+            return reader(inp)
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return {}
+
+
+class Analysis(object):
+    def __init__(self, graph, timings):
+        self.graph = graph
+        self.durations = [self._duration(outputs, timings)
+                          for outputs, inputs, location in graph.steps]
+        self.critical_path = self._critical_path()
+
+    @staticmethod
+    def _duration(outputs, timings):
+        return max([(timings[i][1] - timings[i][0]) / 1000.0
+                    for i in outputs if i in timings] or [0])
+
+    def _critical_path(self):
+        producers = {}
+        for index, (outputs, inputs, location) in enumerate(self.graph.steps):
+            for i in outputs:
+                producers.setdefault(i, index)
+
+        # Find the longest path ending at each step, walking the graph
+        # iteratively, since the dependency chains can be quite long.
+        costs = {}
+        preds = {}
+        visiting = set()
+        for root in range(len(self.graph.steps)):
+            stack = [(root, False)]
+            while stack:
+                index, ready = stack.pop()
+                if index in costs:
+                    continue
+                deps = [producers[i] for i in self.graph.steps[index][1]
+                        if i in producers]
+                if not ready:
+                    # Ignore any cycles rather than looping forever.
+                    visiting.add(index)
+                    stack.append((index, True))
+                    stack.extend((i, False) for i in deps
+                                 if i not in costs and i not in visiting)
+                    continue
+
+                deps = [i for i in deps if i in costs]
+                best = max(deps, key=lambda i: costs[i]) if deps else None
+                preds[index] = best
+                costs[index] = self.durations[index] + (
+                    costs[best] if best is not None else 0
+                )
+
+        if not costs:
+            return []
+        index = max(costs, key=lambda i: costs[i])
+        path = []
+        while index is not None:
+            if self.durations[index]:
+                path.append(index)
+            index = preds[index]
+        return path[::-1]
+
+    @property
+    def critical_duration(self):
+        return sum(self.durations[i] for i in self.critical_path)
+
+    def _describe(self, location):
+        if location is None:
+            return OrderedDict([
+                ('target', None), ('function', None), ('location', None),
+            ])
+        filename, line, function, name = self.graph.locations[location]
+        return OrderedDict([
+            ('target', name), ('function', function),
+            ('location', '{}:{}'.format(filename, line)),
+        ])
+
+    def targets(self):
+        critical = set(self.critical_path)
+        totals = OrderedDict()
+        for index, (outputs, inputs, location) in enumerate(self.graph.steps):
+            if not self.durations[index]:
+                continue
+            t = totals.setdefault(location, [0, 0, 0])
+            t[0] += self.durations[index]
+            t[1] += self.durations[index] if index in critical else 0
+            t[2] += 1
+
+        result = []
+        for location, (total, crit, count) in iteritems(totals):
+            info = self._describe(location)
+            info.update([('total', total), ('critical', crit),
+                         ('steps', count)])
+            result.append(info)
+        result.sort(key=lambda i: (-i['total'], -i['critical']))
+        return result
+
+    def to_json(self):
+        path = []
+        for index in self.critical_path:
+            info = OrderedDict([
+                ('outputs', self.graph.steps[index][0]),
+                ('duration', self.durations[index]),
+            ])
+            info.update(self._describe(self.graph.steps[index][2]))
+            path.append(info)
+
+        return OrderedDict([
+            ('critical_path', OrderedDict([
+                ('duration', self.critical_duration),
+                ('steps', path),
+            ])),
+            ('targets', self.targets()),
+        ])
+
+    def format(self):
+        def target(info):
+            if info['target'] is None:
+                return '(internal)'
+            if info['function']:
+                return '{} ({})'.format(info['target'], info['function'])
+            return info['target']
+
+        def table(header, rows, numeric):
+            # Right-align the first `numeric` columns.
+            widths = [max(len(r[i]) for r in [header] + rows)
+                      for i in range(len(header))]
+            return ['  '.join(v.rjust(w) if i < numeric else v.ljust(w)
+                              for i, (v, w) in enumerate(zip(row, widths)))
+                    .rstrip() for row in [header] + rows]
+
+        lines = ['critical path: {:.2f}s over {} step(s)'.format(
+            self.critical_duration, len(self.critical_path)
+        )]
+        rows = []
+        for index in self.critical_path:
+            info = self._describe(self.graph.steps[index][2])
+            rows.append(['{:.2f}s'.format(self.durations[index]),
+                         ' '.join(self.graph.steps[index][0]),
+                         '{} at {}'.format(target(info), info['location'])
+                         if info['location'] else target(info)])
+        if rows:
+            lines.extend('  ' + i for i in
+                         table(['TIME', 'OUTPUT', 'CREATED BY'], rows, 1))
+
+        rows = [['{:.2f}s'.format(i['total']), '{:.2f}s'.format(i['critical']),
+                 str(i['steps']), target(i), i['location'] or '']
+                for i in self.targets()]
+        if rows:
+            lines.append('')
+            lines.extend(table(['TOTAL', 'CRITICAL', 'STEPS', 'TARGET',
+                                'LOCATION'], rows, 3))
+        return '\n'.join(lines)
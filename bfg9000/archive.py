@@ -0,0 +1,269 @@
+import bz2
+import os
+import stat
+import struct
+import tarfile
+import time
+import zipfile
+import zlib
+from multiprocessing.pool import ThreadPool
+
+from .arguments import parser as argparse
+from .app_version import version
+
+try:
+    import lzma
+except ImportError:  # pragma: no cover
+    lzma = None
+
+# zip files can't represent times before 1980, so use that as the default
+# timestamp for archive members.
+_default_mtime = 315532800
+
+_gzip_block_size = 128 * 1024
+_stream_block_size = 8 * 1024 * 1024
+
+
+def _cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):  # pragma: no cover
+        return 1
+
+
+def source_mtime():
+    epoch = os.getenv('SOURCE_DATE_EPOCH')
+    return int(epoch) if epoch else _default_mtime
+
+
+class GzipCompressor(object):
+    block_size = _gzip_block_size
+
+    def __init__(self, level=9):
+        self.level = level
+        self.crc = zlib.crc32(b'')
+        self.size = 0
+
+    def header(self):
+        # Leave out the filename and timestamp so that the output only depends
+        # on the input.
+        return b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+    def update(self, block):
+        self.crc = zlib.crc32(block, self.crc)
+        self.size += len(block)
+
+    def compress(self, block, last):
+        # Like pigz, compress each block as an independent raw deflate stream,
+        # ending all but the last with a sync flush so that the concatenated
+        # blocks form a single valid deflate stream.
+        c = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        return c.compress(block) + c.flush(zlib.Z_FINISH if last else
+                                           zlib.Z_SYNC_FLUSH)
+
+    def trailer(self):
+        return struct.pack('<II', self.crc & 0xffffffff,
+                           self.size & 0xffffffff)
+
+
+class StreamCompressor(object):
+    block_size = _stream_block_size
+
+    def __init__(self, compress):
+        self._compress = compress
+
+    def header(self):
+        return b''
+
+    def update(self, block):
+        pass
+
+    def compress(self, block, last):
+        # bzip2 and xz both support concatenated streams, so we can compress
+        # each block into its own stream.
+        return self._compress(block) if block or last else b''
+
+    def trailer(self):
+        return b''
+
+
+def compressor(format):
+    if format == 'gzip':
+        return GzipCompressor()
+    elif format == 'bzip2':
+        return StreamCompressor(lambda data: bz2.compress(data, 9))
+    elif format == 'xz':
+        if lzma is None:
+            raise ValueError('xz compression is not available')
+        return StreamCompressor(lambda data: lzma.compress(data))
+    raise ValueError("unknown format '{}'".format(format))
+
+
+class ParallelWriter(object):
+    def __init__(self, out, compressor, jobs=1):
+        self.out = out
+        self.compressor = compressor
+        self.jobs = max(jobs, 1)
+        self._pool = ThreadPool(self.jobs) if self.jobs > 1 else None
+        self._buffer = []
+        self._buffered = 0
+        self._blocks = []
+        self.out.write(self.compressor.header())
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.compressor.block_size:
+            data = b''.join(self._buffer)
+            size = self.compressor.block_size
+            while len(data) >= size:
+                self._add_block(data[:size])
+                data = data[size:]
+            self._buffer = [data]
+            self._buffered = len(data)
+
+    def _add_block(self, block):
+        self.compressor.update(block)
+        self._blocks.append(block)
+        # Keep one block back so that we know which block is the last one.
+        if len(self._blocks) > self.jobs * 4:
+            self._flush(self._blocks[:-1], False)
+            self._blocks = self._blocks[-1:]
+
+    def _flush(self, blocks, last):
+        n = len(blocks)
+
+        def compress(i):
+            return self.compressor.compress(blocks[i], last and i == n - 1)
+
+        if self._pool:
+            data = self._pool.map(compress, range(n))
+        else:
+            data = [compress(i) for i in range(n)]
+        for i in data:
+            self.out.write(i)
+
+    def close(self):
+        if self._buffered:
+            self._add_block(b''.join(self._buffer))
+        self._buffer = []
+        if not self._blocks:
+            self._blocks.append(b'')
+        self._flush(self._blocks, True)
+        self._blocks = []
+        self.out.write(self.compressor.trailer())
+        if self._pool:
+            self._pool.close()
+            self._pool.join()
+
+
+def _normalized_mode(st):
+    if stat.S_ISDIR(st.st_mode) or st.st_mode & stat.S_IXUSR:
+        return 0o755
+    return 0o644
+
+
+def _members(sources, directory, dest_prefix):
+    # Sort the members so that the order of the sources doesn't affect the
+    # output.
+    for src in sorted(sources):
+        path = os.path.join(directory, src)
+        name = src.replace(os.sep, '/')
+        if dest_prefix:
+            name = dest_prefix + '/' + name
+        yield path, name, os.lstat(path)
+
+
+def write_tar(out, sources, directory='.', dest_prefix=None, mtime=None):
+    mtime = source_mtime() if mtime is None else mtime
+    with tarfile.open(fileobj=out, mode='w|',
+                      format=tarfile.GNU_FORMAT) as tar:
+        for path, name, st in _members(sources, directory, dest_prefix):
+            info = tarfile.TarInfo(name)
+            info.mtime = mtime
+            info.mode = _normalized_mode(st)
+            info.uid = info.gid = 0
+            info.uname = info.gname = ''
+
+            if stat.S_ISLNK(st.st_mode):
+                info.type = tarfile.SYMTYPE
+                info.linkname = os.readlink(path)
+                info.mode = 0o777
+                tar.addfile(info)
+            elif stat.S_ISDIR(st.st_mode):
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+            else:
+                info.size = st.st_size
+                with open(path, 'rb') as f:
+                    tar.addfile(info, f)
+
+
+def write_zip(out, sources, directory='.', dest_prefix=None, mtime=None):
+    mtime = source_mtime() if mtime is None else mtime
+    date_time = time.gmtime(max(mtime, _default_mtime))[:6]
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as z:
+        for path, name, st in _members(sources, directory, dest_prefix):
+            # zip files can't (portably) hold symlinks, so store their targets.
+            if stat.S_ISLNK(st.st_mode):
+                st = os.stat(path)
+            is_dir = stat.S_ISDIR(st.st_mode)
+            info = zipfile.ZipInfo(name + '/' if is_dir else name, date_time)
+            info.create_system = 3  # Unix
+            info.external_attr = ((stat.S_IFDIR if is_dir else stat.S_IFREG) |
+                                  _normalized_mode(st)) << 16
+            if is_dir:
+                info.external_attr |= 0x10  # MS-DOS directory flag
+                z.writestr(info, b'')
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with open(path, 'rb') as f:
+                    z.writestr(info, f.read())
+
+
+def write_archive(filename, format, sources, directory='.', dest_prefix=None,
+                  jobs=1, mtime=None):
+    with open(filename, 'wb') as out:
+        if format == 'zip':
+            write_zip(out, sources, directory, dest_prefix, mtime)
+        else:
+            writer = ParallelWriter(out, compressor(format), jobs)
+            write_tar(writer, sources, directory, dest_prefix, mtime)
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='bfg9000-archive',
+        description=('Create a reproducible source archive, compressing it ' +
+                     'in parallel.')
+    )
+    parser.add_argument('--version', action='version',
+                        version='%(prog)s ' + version)
+    parser.add_argument('-f', '--format', metavar='FMT', required=True,
+                        choices=['gzip', 'bzip2', 'xz', 'zip'],
+                        help='format of output file (one of: %(choices)s)')
+    parser.add_argument('-C', '--directory', metavar='DIR', default='.',
+                        help='directory the sources are relative to')
+    parser.add_argument('-P', '--dest-prefix', metavar='DIR',
+                        help='a prefix to add to destination files')
+    parser.add_argument('-j', '--jobs', type=int, metavar='N',
+                        default=_cpu_count(),
+                        help='the number of threads to compress with')
+    parser.add_argument('output', metavar='OUTPUT',
+                        help='the archive to create')
+    parser.add_argument('sources', metavar='SOURCE', nargs='*',
+                        help='the files to archive')
+    args = parser.parse_args()
+
+    try:
+        write_archive(args.output, args.format, args.sources, args.directory,
+                      args.dest_prefix, args.jobs)
+    except (IOError, OSError, ValueError) as e:
+        try:
+            os.remove(args.output)
+        except OSError:
+            pass
+        parser.exit(1, '{}: error: {}\n'.format(parser.prog, e))
+    return 0
@@ -15,11 +15,11 @@ from ...tools.common import Command
 from ...shell import posix as pshell
 
 __all__ = ['Call', 'Entity', 'Function', 'Makefile', 'NamedEntity', 'Pattern',
-           'Section', 'Syntax', 'Writer', 'Variable', 'var', 'qvar', 'Silent',
-           'path_vars']
+           'Recursive', 'Section', 'Syntax', 'Writer', 'Variable', 'var',
+           'qvar', 'Silent', 'path_vars']
 
 Rule = namedtuple('Rule', ['targets', 'deps', 'order_only', 'recipe',
-                           'variables', 'phony'])
+                           'variables', 'phony', 'grouped'])
 Include = namedtuple('Include', ['name', 'optional'])
 
 Syntax = Enum('Syntax', ['target', 'dependency', 'function', 'shell', 'clean'])
@@ -107,6 +107,9 @@ class Writer(object):
         if isinstance(thing, Silent):
             self.write_literal('@')
             thing = thing.data
+        elif isinstance(thing, Recursive):
+            self.write_literal('+')
+            thing = thing.data
 
         self.write_each(iterutils.iterate(thing), syntax)
 
@@ -216,6 +219,13 @@ class Silent(object):
         self.data = data
 
 
+class Recursive(object):
+    # A recipe line that Make should treat like a recursive `$(MAKE)`, letting
+    # it share the jobserver with the command being run.
+    def __init__(self, data):
+        self.data = data
+
+
 path_vars = {
     path.Root.srcdir:   Variable('srcdir'),
     path.Root.builddir: None,
@@ -241,6 +251,8 @@ class Makefile(object):
         self._rules = []
         self._targets = set()
         self._includes = []
+        self._included = set()
+        self._shell_wrapper = None
 
     def variable(self, name, value, section=Section.other, exist_ok=False):
         name, exists = self._unique_var(name, exist_ok)
@@ -279,11 +291,19 @@ class Makefile(object):
         self._var_table.add(name)
         return name, exists
 
+    def shell_wrapper(self, condition, command):
+        # When the variable `condition` is defined, run every recipe line via
+        # `command TARGET -c LINE` instead of via the shell directly.
+        self._shell_wrapper = (var(condition), command)
+
     def include(self, name, optional=False):
-        self._includes.append(Include(name, optional))
+        include = Include(name, optional)
+        if include not in self._included:
+            self._included.add(include)
+            self._includes.append(include)
 
     def rule(self, target, deps=None, order_only=None, recipe=None,
-             variables=None, phony=False):
+             variables=None, phony=False, grouped=False):
         targets = iterutils.listify(target)
         if len(targets) == 0:
             raise ValueError('must have at least one target')
@@ -299,20 +319,29 @@ class Makefile(object):
 
         self._rules.append(Rule(
             targets, iterutils.listify(deps), iterutils.listify(order_only),
-            recipe, variables, phony
+            recipe, variables, phony, grouped
         ))
 
     def has_rule(self, name):
         return name in self._targets
 
+    def step_count(self):
+        return len(self._rules)
+
+    def steps(self, start=0):
+        # Each rule as a pair of its targets and everything that must be built
+        # before it.
+        for i in self._rules[start:]:
+            yield i.targets, i.deps + i.order_only
+
     def _convert_args(self, args):
         def convert(args):
             if iterutils.isiterable(args):
                 return Command.convert_args(args, self.cmd_var)
             return args
 
-        if isinstance(args, Silent):
-            return Silent(convert(args.data))
+        if isinstance(args, (Silent, Recursive)):
+            return type(args)(convert(args.data))
         return convert(args)
 
     def _write_variable(self, out, name, value, syntax=Syntax.shell,
@@ -343,7 +372,7 @@ class Makefile(object):
             out.write_literal('\n')
 
         out.write_each(rule.targets, Syntax.target)
-        out.write_literal(':')
+        out.write_literal(' &:' if rule.grouped else ':')
 
         lit = safe_str.literal
         out.write_each(rule.deps, Syntax.dependency, prefix=lit(' '))
@@ -362,8 +391,10 @@ class Makefile(object):
         out = Writer(out)
         out.write_literal(_comment_tmpl.format(self._bfgfile) + '\n\n')
 
-        # Don't let make use built-in suffix rules.
+        # Don't let make use built-in suffix or implicit rules. This also saves
+        # make from searching for them for every file in the build.
         out.write_literal('.SUFFIXES:\n')
+        out.write_literal('MAKEFLAGS += -r\n')
 
         # Necessary for escaping commas in function calls.
         self._write_variable(out, Variable(','), ',')
@@ -378,6 +409,12 @@ class Makefile(object):
             if self._global_variables[section]:
                 out.write_literal('\n')
 
+        if self._shell_wrapper:
+            condition, command = self._shell_wrapper
+            out.write_literal('ifdef ' + condition.name + '\n')
+            self._write_variable(out, Variable('SHELL'), command)
+            out.write_literal('.SHELLFLAGS = $@ -c\nendif\n\n')
+
         target = Pattern('%')
         for name, value in self._target_variables:
             self._write_variable(out, name, value, target=target)
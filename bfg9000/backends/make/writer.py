@@ -1,17 +1,25 @@
 import os
 import re
 import subprocess
+from six import iteritems
 
 from ... import path
 from ... import shell
 from .syntax import *
+from ...analyze import BuildGraph
+from ...configurations import target_name
 from ...iterutils import listify
-from ...versioning import Version
+from ...safe_str import shell_literal
+from ...versioning import SpecifierSet, Version
+
+
+def command(env=os.environ):
+    return shell.which(env.get('MAKE', ['make', 'gmake']), env)
 
 
 def version(env=os.environ):
     try:
-        make = shell.which(env.get('MAKE', ['make', 'gmake']), env)
+        make = command(env)
         output = shell.execute(make + ['--version'], stdout=shell.Mode.pipe,
                                stderr=shell.Mode.devnull)
         m = re.match(r'GNU Make ([\d\.]+)', output)
@@ -54,12 +62,41 @@ def write(env, build_inputs):
     buildfile = Makefile(build_inputs.bfgpath.string(env.base_dirs))
     buildfile.variable(path_vars[path.Root.srcdir], env.srcdir, Section.path)
 
+    graph = BuildGraph.from_env(env)
+
     for i in _pre_rules:
         i(build_inputs, buildfile, env)
+    graph.add(buildfile.steps())
     for e in build_inputs.edges():
+        start = buildfile.step_count()
         _rule_handlers[type(e)](e, build_inputs, buildfile, env)
+        graph.add(buildfile.steps(start), e)
+    start = buildfile.step_count()
     for i in _post_rules:
         i(build_inputs, buildfile, env)
+    graph.add(buildfile.steps(start))
+
+    with open(filepath.string(env.base_dirs), 'w') as out:
+        buildfile.write(out)
+    graph.save(env.builddir.string())
+
+
+def write_configurations(env, bfgpath, configurations, deps=[]):
+    # Each configuration is a complete build directory of its own, so just run
+    # Make in it; the sub-makes share our jobserver.
+    buildfile = Makefile(bfgpath)
+    buildfile.variable(path_vars[path.Root.srcdir], env.srcdir, Section.path)
+
+    for target, names in iteritems(configurations.targets()):
+        buildfile.rule(target=target, deps=[target_name(i, target)
+                                            for i in names], phony=True)
+    for name, targets in iteritems(configurations.configurations):
+        for target in targets:
+            buildfile.rule(target=target_name(name, target),
+                           recipe=[[var('MAKE'), '-C', name, target]],
+                           phony=True)
+    buildfile.rule(target=filepath, deps=deps,
+                   recipe=[env.tool('bfg9000')(path.Path('.'))])
 
     with open(filepath.string(env.base_dirs), 'w') as out:
         buildfile.write(out)
@@ -72,10 +109,20 @@ def flags_vars(name, value, buildfile):
     return gflags, flags
 
 
-def multitarget_rule(buildfile, targets, deps=None, order_only=None,
+def _has_version(env, specifier):
+    return bool(env.backend_version and
+                env.backend_version in SpecifierSet(specifier))
+
+
+def multitarget_rule(buildfile, env, targets, deps=None, order_only=None,
                      recipe=None, variables=None, phony=None):
     targets = listify(targets)
-    if len(targets) > 1:
+    if len(targets) > 1 and _has_version(env, '>=4.3'):
+        # GNU Make 4.3 supports grouped targets, so we don't need a stamp file.
+        buildfile.rule(targets, deps, order_only, recipe, variables, phony,
+                       grouped=True)
+        return
+    elif len(targets) > 1:
         first = targets[0]
         first_path = first if isinstance(first, path.Path) else first.path
         primary = first_path.addext('.stamp')
@@ -87,16 +134,41 @@ def multitarget_rule(buildfile, targets, deps=None, order_only=None,
     buildfile.rule(primary, deps, order_only, recipe, variables, phony)
 
 
+@post_rule
+def timing_rule(build_inputs, buildfile, env):
+    # Running `make BFG9000_TIMING=1` records how long each target took to
+    # build so that `bfg9000 analyze` can report on it. This relies on
+    # `.SHELLFLAGS`, which was added in GNU Make 3.82.
+    if _has_version(env, '>=3.82'):
+        timelog = env.tool('timelog')
+        buildfile.shell_wrapper('BFG9000_TIMING', buildfile.cmd_var(timelog))
+
+
 @post_rule
 def directory_rule(build_inputs, buildfile, env):
     mkdir_p = env.tool('mkdir_p')
     pattern = Pattern(os.path.join('%', dir_sentinel))
     path = Function('patsubst', pattern, Pattern('%'), var('@'), quoted=True)
 
-    buildfile.rule(
-        target=pattern,
-        recipe=[
+    if _has_version(env, '>=4.3'):
+        # Create the directory via $(shell) and the sentinel via $(file) so
+        # that we only need a single process (instead of one each for `mkdir`
+        # and `touch`). These are expanded in order, so the directory exists
+        # by the time we write the sentinel.
+        mkdir = Function('shell', mkdir_p(
+            path, cmd=buildfile.cmd_var(mkdir_p)
+        ))
+        check = Function(
+            'if', Function('filter-out', '0', var('.SHELLSTATUS')),
+            Function('error', shell_literal('unable to create ') + path.use())
+        )
+        recipe = [Silent(mkdir + check + Function(
+            'file', shell_literal('>') + var('@').use()
+        ))]
+    else:
+        recipe = [
             Silent(mkdir_p(path)),
             Silent(['touch', qvar('@')])
         ]
-    )
+
+    buildfile.rule(target=pattern, recipe=recipe)
@@ -21,7 +21,7 @@ __all__ = ['NinjaFile', 'Section', 'Syntax', 'Writer', 'Variable', 'var',
 Rule = namedtuple('Rule', ['command', 'depfile', 'deps', 'generator', 'pool',
                            'restat'])
 Build = namedtuple('Build', ['outputs', 'rule', 'inputs', 'implicit',
-                             'order_only', 'variables'])
+                             'order_only', 'variables', 'dyndep'])
 
 Syntax = Enum('Syntax', ['output', 'input', 'shell', 'clean'])
 Section = Enum('Section', ['path', 'command', 'flags', 'other'])
@@ -161,6 +161,7 @@ class NinjaFile(object):
         self._var_table = set()
         self._variables = {i: [] for i in Section}
 
+        self._pools = OrderedDict()
         self._rules = OrderedDict()
 
         self._builds = []
@@ -190,15 +191,34 @@ class NinjaFile(object):
     def has_variable(self, name):
         return var(name) in self._var_table
 
+    def pool(self, name, depth):
+        if name == 'console':
+            raise ValueError("'console' is a reserved pool name")
+        if re.search(r'\W', name):
+            raise ValueError('pool name contains invalid characters')
+
+        if self.has_pool(name):
+            if self._pools[name] != depth:
+                raise ValueError("pool '{}' already exists".format(name))
+        else:
+            self.min_version('1.1')
+            self._pools[name] = depth
+
+    def has_pool(self, name):
+        return name in self._pools
+
+    def _check_pool(self, pool):
+        if pool == 'console':
+            self.min_version('1.5')
+        elif not self.has_pool(pool):
+            raise ValueError("unknown pool '{}'".format(pool))
+
     def rule(self, name, command, depfile=None, deps=None, generator=False,
              pool=None, restat=False):
         command = self._convert_args(command)
 
         if pool is not None:
-            if pool == 'console':
-                self.min_version('1.5')
-            else:
-                raise ValueError("unknown pool '{}'".format(pool))
+            self._check_pool(pool)
 
         if re.search('\W', name):
             raise ValueError('rule name contains invalid characters')
@@ -213,12 +233,22 @@ class NinjaFile(object):
         return name in self._rules
 
     def build(self, output, rule, inputs=None, implicit=None, order_only=None,
-              variables=None):
+              variables=None, pool=None, dyndep=None):
         if rule != 'phony' and not self.has_rule(rule):
             raise ValueError("unknown rule '{}'".format(rule))
 
         variables = {var(k): self._convert_args(v) for k, v in
                      iteritems(variables or {})}
+        if pool is not None:
+            self._check_pool(pool)
+            variables[var('pool')] = pool
+
+        order_only = iterutils.listify(order_only)
+        if dyndep is not None:
+            # Ninja requires the dyndep file to be an input of the build.
+            self.min_version('1.10')
+            if dyndep not in order_only:
+                order_only = order_only + [dyndep]
 
         outputs = iterutils.listify(output)
         for i in outputs:
@@ -227,13 +257,21 @@ class NinjaFile(object):
             self._build_outputs.add(i)
         self._builds.append(Build(
             outputs, rule, iterutils.listify(inputs),
-            iterutils.listify(implicit), iterutils.listify(order_only),
-            variables
+            iterutils.listify(implicit), order_only, variables, dyndep
         ))
 
     def has_build(self, name):
         return name in self._build_outputs
 
+    def step_count(self):
+        return len(self._builds)
+
+    def steps(self, start=0):
+        # Each build statement as a pair of its outputs and everything that
+        # must be built before it.
+        for i in self._builds[start:]:
+            yield i.outputs, i.inputs + i.implicit + i.order_only
+
     def default(self, paths):
         self._defaults.extend(paths)
 
@@ -275,6 +313,10 @@ class NinjaFile(object):
         out.write_each(build.order_only, Syntax.input, prefix=lit(' || '))
         out.write_literal('\n')
 
+        if build.dyndep:
+            out.write_literal('  dyndep = ')
+            out.write(build.dyndep, Syntax.input)
+            out.write_literal('\n')
         if build.variables:
             for k, v in iteritems(build.variables):
                 self._write_variable(out, k, v, indent=1)
@@ -298,6 +340,11 @@ class NinjaFile(object):
             if self._variables[section]:
                 out.write_literal('\n')
 
+        for name, depth in iteritems(self._pools):
+            out.write_literal('pool ' + name + '\n')
+            self._write_variable(out, var('depth'), str(depth), indent=1)
+            out.write_literal('\n')
+
         for name, rule in iteritems(self._rules):
             self._write_rule(out, name, rule)
             out.write_literal('\n')
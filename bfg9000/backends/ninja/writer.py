@@ -1,16 +1,23 @@
 import os
 import subprocess
+from six import iteritems
 
 from ... import iterutils
 from ... import path
 from ... import shell
 from .syntax import *
+from ...analyze import BuildGraph
+from ...configurations import target_name
 from ...versioning import SpecifierSet, Version
 
 
+def command(env=os.environ):
+    return shell.which(env.get('NINJA', ['ninja', 'ninja-build']), env)
+
+
 def version(env=os.environ):
     try:
-        ninja = shell.which(env.get('NINJA', ['ninja', 'ninja-build']), env)
+        ninja = command(env)
         output = shell.execute(ninja + ['--version'], stdout=shell.Mode.pipe,
                                stderr=shell.Mode.devnull)
         return Version(output.strip())
@@ -49,12 +56,46 @@ def write(env, build_inputs):
     buildfile = NinjaFile(build_inputs.bfgpath.string(env.base_dirs))
     buildfile.variable(path_vars[path.Root.srcdir], env.srcdir, Section.path)
 
+    graph = BuildGraph.from_env(env)
+
     for i in _pre_rules:
         i(build_inputs, buildfile, env)
+    graph.add(buildfile.steps())
     for e in build_inputs.edges():
+        start = buildfile.step_count()
         _rule_handlers[type(e)](e, build_inputs, buildfile, env)
+        graph.add(buildfile.steps(start), e)
+    start = buildfile.step_count()
     for i in _post_rules:
         i(build_inputs, buildfile, env)
+    graph.add(buildfile.steps(start))
+
+    with open(filepath.string(env.base_dirs), 'w') as out:
+        buildfile.write(out)
+    graph.save(env.builddir.string())
+
+
+def write_configurations(env, bfgpath, configurations, deps=[]):
+    # Each configuration is a complete build directory of its own, so just run
+    # Ninja in it. These use the console pool so that only one runs at a time,
+    # letting each one use all the jobs it wants.
+    buildfile = NinjaFile(bfgpath)
+    buildfile.variable(path_vars[path.Root.srcdir], env.srcdir, Section.path)
+    ninja = command(env.variables)
+
+    for name, targets in iteritems(configurations.configurations):
+        for target in targets:
+            command_build(buildfile, env, output=target_name(name, target),
+                          command=ninja + ['-C', name, target])
+    for target, names in iteritems(configurations.targets()):
+        buildfile.build(output=target, rule='phony',
+                        inputs=[target_name(i, target) for i in names])
+    buildfile.default(['all'])
+
+    buildfile.rule(name='regenerate', command=env.tool('bfg9000')(
+        path.Path('.')
+    ), generator=True)
+    buildfile.build(output=filepath, rule='regenerate', implicit=deps)
 
     with open(filepath.string(env.base_dirs), 'w') as out:
         buildfile.write(out)
@@ -67,7 +108,7 @@ def flags_vars(name, value, buildfile):
 
 
 def command_build(buildfile, env, output, inputs=None, implicit=None,
-                  order_only=None, command=[], console=True):
+                  order_only=None, command=[], console=True, pool=None):
     if console:
         rule_name = 'console_command'
         extra_implicit = ['PHONY']
@@ -97,5 +138,6 @@ def command_build(buildfile, env, output, inputs=None, implicit=None,
         inputs=inputs,
         implicit=iterutils.listify(implicit) + extra_implicit,
         order_only=order_only,
-        variables={'cmd': command}
+        variables={'cmd': command},
+        pool=pool
     )
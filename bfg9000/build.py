@@ -48,7 +48,8 @@ def load_toolchain(filename):
     return toolchain
 
 
-def _fill_parser(env, parent=None, filename=optsfile, usage='parse'):
+def _fill_parser(env, parent=None, filename=optsfile, usage='parse',
+                 configurations=None):
     builtin_init()
 
     optspath = Path(filename, Root.srcdir)
@@ -63,9 +64,14 @@ def _fill_parser(env, parent=None, filename=optsfile, usage='parse'):
                                               description=user_description)
             group.usage = usage
 
-            builtin_dict = builtin.options.bind(env=env, parser=group)
+            if configurations is None:
+                configurations = []
+            builtin_dict = builtin.options.bind(
+                env=env, parser=group, configurations=configurations
+            )
             _execute_file(f, filename, builtin_dict)
-            builtin.options.run_post(builtin_dict, env=env, parser=group)
+            builtin.options.run_post(builtin_dict, env=env, parser=group,
+                                     configurations=configurations)
     except IOError as e:
         if e.errno != errno.ENOENT:
             raise
@@ -83,6 +89,12 @@ def parse_user_args(env, filename=optsfile):
     return parser.parse_args(env.extra_args)
 
 
+def user_configurations(env, filename=optsfile):
+    configurations = []
+    _fill_parser(env, None, filename, configurations=configurations)
+    return configurations
+
+
 def execute_script(env, argv, filename=bfgfile):
     builtin_init()
 
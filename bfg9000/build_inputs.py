@@ -1,13 +1,17 @@
-from collections import OrderedDict
+import sys
+from collections import namedtuple, OrderedDict
 from six import iteritems, itervalues
 
 from .path import Path, Root
 from .file_types import File, Node
 from .iterutils import iterate, listify, unlistify
+from .log import _is_bfg_src
 from .objutils import objectify
 
 _build_inputs = {}
 
+Location = namedtuple('Location', ['filename', 'line', 'function'])
+
 
 def build_input(name):
     def wrapper(fn):
@@ -33,9 +37,24 @@ class Edge(object):
             return build.add_source(File(Path(name, Root.srcdir)))
         self.extra_deps = [objectify(i, Node, make)
                            for i in iterate(extra_deps)]
+        self.location = _caller_location()
         build.add_edge(self)
 
 
+def _caller_location():
+    # Find the first frame outside of bfg9000 (usually a line in a build.bfg
+    # file), along with the builtin it called to create this edge.
+    function = None
+    frame = sys._getframe(1)
+    while frame and _is_bfg_src(frame.f_code.co_filename):
+        if frame.f_code.co_name != 'wrapper':
+            function = frame.f_code.co_name
+        frame = frame.f_back
+    if frame is None:
+        return None
+    return Location(frame.f_code.co_filename, frame.f_lineno, function)
+
+
 class BuildInputs(object):
     def __init__(self, env, bfgpath):
         self.bfgpath = bfgpath
@@ -54,6 +73,9 @@ class BuildInputs(object):
         self._edges.append(edge)
         return edge
 
+    def remove_edge(self, edge):
+        self._edges.remove(edge)
+
     def sources(self):
         return itervalues(self._sources)
 
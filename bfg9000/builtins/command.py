@@ -1,15 +1,17 @@
+import hashlib
 from itertools import chain, repeat
 from six.moves import cStringIO as StringIO
 
 from . import builtin
 from .file_types import source_file
+from .pool import make_pool_command, ninja_pool
 from .. import safe_str
 from .. import shell
 from ..backends.make import writer as make
 from ..backends.ninja import writer as ninja
 from ..build_inputs import Edge
 from ..file_types import File, Node, Phony
-from ..iterutils import isiterable, iterate, listify
+from ..iterutils import isiterable, iterate, listify, uniques
 from ..path import Path, Root
 from ..shell import posix as pshell
 from ..tools import common as tools
@@ -17,7 +19,7 @@ from ..tools import common as tools
 
 class BaseCommand(Edge):
     def __init__(self, build, env, name, outputs, cmd=None, cmds=None,
-                 environment=None, extra_deps=None):
+                 environment=None, pool=None, extra_deps=None):
         if (cmd is None) == (cmds is None):
             raise ValueError('exactly one of "cmd" or "cmds" must be ' +
                              'specified')
@@ -32,6 +34,7 @@ class BaseCommand(Edge):
         self.cmds = cmds
         self.inputs = inputs
         self.env = environment or {}
+        self.pool = build['pools'].get(pool)
         Edge.__init__(self, build, outputs, extra_deps=extra_deps)
 
 
@@ -83,25 +86,67 @@ def build_step(build, env, name, **kwargs):
     return BuildStep(build, env, name, **kwargs).public_output
 
 
+def _cached_line(rule, env, line):
+    # Only build steps produce files we can cache, and since we can't see
+    # inside the commands, only files passed to them are part of the key.
+    if not isinstance(rule, BuildStep) or not env.getvar('BFG9000_CACHE_DIR'):
+        return line
+
+    inputs = [i for cmd in rule.cmds for i in iterate(cmd)
+              if isinstance(i, File)]
+    inputs = [i.path for i in inputs + rule.inputs + rule.extra_deps
+              if isinstance(i, File)]
+    salt = hashlib.sha1(repr(
+        (rule.cmds, sorted(rule.env.items()))
+    ).encode('utf-8')).hexdigest()
+    return env.tool('cache').wrap_shell(
+        line, [i.path for i in rule.output], uniques(inputs), salt
+    )
+
+
+def _pooled(env, pool, cmd):
+    # Each command holds a slot in the pool on its own, so raw shell strings
+    # need their own shell to run in.
+    if pool is None:
+        return cmd
+    if not isiterable(cmd):
+        cmd = ['sh', '-c', cmd]
+    return make_pool_command(env, pool, listify(cmd))
+
+
 @make.rule_handler(Command, BuildStep)
 def make_command(rule, build_inputs, buildfile, env):
     # Join all the commands onto one line so that users can use 'cd' and such.
     buildfile.rule(
         target=rule.output,
         deps=rule.inputs + rule.extra_deps,
-        recipe=[pshell.global_env(rule.env, rule.cmds)],
+        recipe=[_cached_line(rule, env, pshell.global_env(
+            rule.env, [_pooled(env, rule.pool, i) for i in rule.cmds]
+        ))],
         phony=isinstance(rule, Command)
     )
 
 
 @ninja.rule_handler(Command, BuildStep)
 def ninja_command(rule, build_inputs, buildfile, env):
+    console = isinstance(rule, Command)
+    if console:
+        # A build's pool overrides its rule's, so commands have to stay in the
+        # console pool to keep the terminal; limit them the same way as Make
+        # does instead.
+        cmds = [_pooled(env, rule.pool, i) for i in rule.cmds]
+        pool = None
+    else:
+        cmds = rule.cmds
+        pool = ninja_pool(buildfile, rule.pool)
+
     ninja.command_build(
         buildfile, env,
         output=rule.output,
         inputs=rule.inputs + rule.extra_deps,
-        command=shell.global_env(rule.env, rule.cmds),
-        console=isinstance(rule, Command)
+        command=_cached_line(rule, env, shell.global_env(rule.env, cmds)),
+        console=console,
+        pool=pool
     )
 
 
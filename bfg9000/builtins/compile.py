@@ -1,24 +1,471 @@
-from collections import defaultdict
-from six import string_types
+import hashlib
+import itertools
+import os
+import re
+from collections import defaultdict, OrderedDict
+from six import iteritems, string_types
 
 from . import builtin
 from .. import options as opts
+from .. import shell
 from .file_types import local_file
+from .pgo import pgo_stamp
 from ..backends.make import writer as make
 from ..backends.ninja import writer as ninja
 from ..build_inputs import build_input, Edge
+from ..depreport import load_deps
 from ..file_types import *
 from ..iterutils import first, flatten, iterate, listify, uniques
-from ..path import Path, Root
+from ..languages import known_langs
+from ..path import Path, Root, makedirs
 from ..shell import posix as pshell
+from ..tools.internal import cached_command
+from ..versioning import SpecifierSet
 
 build_input('compile_flags')(lambda build_inputs, env: defaultdict(list))
+build_input('object_files_ids')(lambda build_inputs, env: itertools.count(1))
+
+
+_unity_langs = ('c', 'c++', 'objc', 'objc++')
+_unity_units = {'': 1, 'k': 1024, 'm': 1024 ** 2}
+
+_auto_pch_langs = ('c', 'c++')
+_auto_pch_budget = 1024 ** 2
+_auto_pch_include = re.compile(r'^#include "(.*)"$')
+
+_depdb_shard = 'DEPDB_SHARD'
+
+_fortran_langs = ('f77', 'f95')
+_fortran_make_deps = Path('.bfg_fortran.mk')
+_fortran_dyndep = Path('.bfg_fortran.dd')
+
+_cxx_module_make_deps = Path('.bfg_cxxmodules.mk')
+_cxx_module_dyndep = Path('.bfg_cxxmodules.dd')
+_cxx_module_bmi_dir = Path('.bfg_modules')
+
+
+@build_input('cxx_modules')
+class CxxModules(object):
+    def __init__(self, build_inputs, env):
+        self.enabled = False
+
+
+@build_input('auto_pch')
+class AutoPch(object):
+    def __init__(self, build_inputs, env):
+        self._deps = None
+
+    def deps(self, env):
+        # Load the dependencies recorded by the last build (if any), mapping
+        # each translation unit to the files it included.
+        if self._deps is None:
+            builddir = env.builddir.string()
+            try:
+                deps = load_deps(builddir, env.backend, env.variables)
+            except (IOError, OSError, ValueError, shell.CalledProcessError):
+                deps = {}
+
+            self._deps = {}
+            for target_deps in deps.values():
+                if target_deps:
+                    paths = [os.path.normpath(os.path.join(builddir, i))
+                             for i in target_deps]
+                    self._deps[paths[0]] = paths[1:]
+        return self._deps
+
+
+class _PchEntry(object):
+    def __init__(self, key, name, pch, args):
+        self.key = key
+        self.name = name
+        self.pch = pch
+        self.args = args
+        self.extra_options = opts.option_list()
+        self.users = []
+
+
+@build_input('pch_cache')
+class PchCache(object):
+    """The precompiled headers created for compile steps that pass a header as
+    their `pch`. These are keyed on everything that affects how the PCH is
+    built, so that compile steps with identical requests share one PCH, while
+    those with different options get their own."""
+
+    def __init__(self, build_inputs, env):
+        self._build = build_inputs
+        self._env = env
+        self._entries = {}
+        self._users = {}
+        self._names = defaultdict(set)
+
+    def __key(self, builtins, header, args, extra_options):
+        includes, packages, options, lang = args
+        try:
+            compiler = self._env.builder(header.lang).pch_compiler
+        except (AttributeError, ValueError):
+            return (header.path, header.lang, None, repr(args),
+                    repr(list(extra_options)))
+
+        # Key on the flags the PCH would actually be built with; the reprs of
+        # header directories and packages don't capture everything that
+        # affects them (e.g. whether a header directory is a system dir).
+        flags = compiler.flags(opts.option_list(
+            (i.compile_options(compiler, None) for i in packages),
+            (opts.include_dir(builtins['header_directory'](i))
+             for i in iterate(includes)),
+            options, extra_options
+        ))
+        return (header.path, header.lang, repr(compiler.command),
+                repr(flags))
+
+    def __create(self, builtins, header, key, args, extra_options):
+        # The first PCH for a header gets the usual name; any variants with
+        # different options are put in their own directories.
+        names = self._names[header.path]
+        name = header.path.suffix
+        index = 1
+        while name in names:
+            index += 1
+            name = 'pch-{}/{}'.format(index, header.path.suffix)
+        names.add(name)
+
+        includes, packages, options, lang = args
+        pch = builtins['precompiled_header'](
+            name, file=header, includes=includes, packages=packages,
+            options=options, lang=lang
+        )
+        entry = self._entries[key] = _PchEntry(key, name, pch, args)
+        if extra_options:
+            entry.extra_options = extra_options
+            pch.creator.add_extra_options(extra_options)
+        return entry
+
+    def __remove_user(self, entry, user):
+        entry.users.remove(user)
+        if not entry.users:
+            del self._entries[entry.key]
+            self._names[entry.pch.creator.file.path].discard(entry.name)
+            self._build.remove_edge(entry.pch.creator)
+
+    def request(self, builtins, user, file, includes, packages, options,
+                lang):
+        if isinstance(file, PrecompiledHeader):
+            return file
+
+        header = builtins['header_file'](file, lang=lang)
+        args = (includes, packages, options, lang)
+        key = self.__key(builtins, header, args, opts.option_list())
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self.__create(builtins, header, key, args,
+                                  opts.option_list())
+        entry.users.append(user)
+        self._users[user] = entry
+        return entry.pch
+
+    def add_extra_options(self, builtins, user, pch, options):
+        entry = self._users.get(user)
+        if entry is None:
+            if hasattr(pch.creator, 'add_extra_options'):
+                pch.creator.add_extra_options(options)
+            return pch
+
+        extra_options = entry.extra_options.copy()
+        extra_options.extend(options)
+        header = entry.pch.creator.file
+        key = self.__key(builtins, header, entry.args, extra_options)
+        if key == entry.key:
+            return entry.pch
+
+        # If nothing else uses this PCH, we can just update it; otherwise,
+        # switch this compile step over to a PCH with the new options.
+        if len(entry.users) == 1 and key not in self._entries:
+            del self._entries[entry.key]
+            entry.key = key
+            entry.extra_options = extra_options
+            self._entries[key] = entry
+            entry.pch.creator.add_extra_options(options)
+            return entry.pch
+
+        self.__remove_user(entry, user)
+        new_entry = self._entries.get(key)
+        if new_entry is None:
+            new_entry = self.__create(builtins, header, key, entry.args,
+                                      extra_options)
+        new_entry.users.append(user)
+        self._users[user] = new_entry
+        return new_entry.pch
+
+
+def _select_pch_headers(tus, previous=(), budget=_auto_pch_budget):
+    # Pick the headers included by at least half of the translation units, in
+    # the order they were first included. To keep the choice from flip-flopping
+    # as the code changes, the headers we picked last time stay until fewer
+    # than a quarter of the translation units include them.
+    if len(tus) < 2:
+        return []
+
+    counts = defaultdict(int)
+    order = []
+    for headers in tus:
+        for i in uniques(headers):
+            if i not in counts:
+                order.append(i)
+            counts[i] += 1
+
+    kept = [i for i in previous if counts[i] * 4 >= len(tus)]
+    added = [i for i in order if i not in kept and counts[i] * 2 >= len(tus)]
+
+    result, size = [], 0
+    for i in kept + added:
+        try:
+            cost = os.path.getsize(i)
+        except OSError:
+            continue
+        if size + cost <= budget:
+            result.append(i)
+            size += cost
+    return result
+
+
+def _read_pch_prefix(filename):
+    base = os.path.dirname(filename)
+    try:
+        with open(filename) as f:
+            return [os.path.normpath(os.path.join(base, m.group(1)))
+                    for m in (_auto_pch_include.match(i.rstrip('\n'))
+                              for i in f) if m]
+    except IOError:
+        return []
+
+
+def _unity_budget(unity):
+    # An integer is the maximum number of files per batch; a string like
+    # '256k' is the maximum total size of the files in a batch.
+    if isinstance(unity, bool):
+        raise TypeError('unity must be an integer or a size string')
+    if isinstance(unity, int):
+        if unity < 1:
+            raise ValueError('unity batch size must be positive')
+        return 'files', unity
+
+    m = re.match(r'^(\d+)([km]?)$', str(unity).strip().lower())
+    if not m:
+        raise ValueError('invalid unity size {!r}'.format(unity))
+    return 'bytes', int(m.group(1)) * _unity_units[m.group(2)]
+
+
+def _unity_batch_id(batch):
+    return hashlib.sha1(''.join(
+        i.path.suffix + '\n' for i in batch
+    ).encode('utf-8')).hexdigest()[:8]
+
+
+def _write_if_changed(filename, data):
+    # Only touch the file if its contents would change so that rewriting a
+    # batch doesn't force us to recompile every other batch too.
+    try:
+        with open(filename) as f:
+            if f.read() == data:
+                return
+    except IOError:
+        pass
+
+    makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'w') as f:
+        f.write(data)
 
 
 class ObjectFiles(list):
-    def __init__(self, builtins, build, env, files, **kwargs):
-        list.__init__(self, (builtins['_make_object_file'](i, **kwargs)
-                             for i in iterate(files)))
+    def __init__(self, builtins, build, env, files, unity=None,
+                 unity_exclude=None, unity_name=None, pch_name=None,
+                 **kwargs):
+        self._unity_members = {}
+
+        # Unity batches and automatic PCHs from direct calls to `object_files`
+        # are named after the order of the calls, so that their names (and
+        # thus what we've already built) stay put when the files change.
+        if ( (unity is not None or kwargs.get('pch') == 'auto') and
+             (unity_name is None or pch_name is None) ):
+            default_name = 'object_files-{}'.format(
+                next(build['object_files_ids'])
+            )
+            unity_name = unity_name or default_name
+            pch_name = pch_name or default_name
+
+        pchs = None
+        if kwargs.get('pch') == 'auto':
+            pchs = self.__auto_pch(builtins, build, env, files, pch_name,
+                                   kwargs)
+
+        def make_object(file, lang, **extra_kwargs):
+            obj_kwargs = dict(kwargs, **extra_kwargs)
+            if pchs is not None:
+                obj_kwargs['pch'] = pchs.get(lang)
+            return builtins['_make_object_file'](file, **obj_kwargs)
+
+        def lang_of(file):
+            if isinstance(file, string_types + (SourceFile,)):
+                return builtins['source_file'](file,
+                                               lang=kwargs.get('lang')).lang
+            return None
+
+        if unity is None:
+            list.__init__(self, (make_object(i, lang_of(i))
+                                 for i in iterate(files)))
+            return
+
+        kind, budget = _unity_budget(unity)
+        exclude = set(
+            i.path if isinstance(i, File) else Path(i, Root.srcdir)
+            for i in iterate(unity_exclude)
+        )
+
+        # Figure out which files can be combined, grouping them by language.
+        # Anything else (pre-built objects, excluded sources, etc) is compiled
+        # on its own.
+        items = []
+        groups = OrderedDict()
+        for i in iterate(files):
+            if isinstance(i, string_types + (SourceFile,)):
+                src = builtins['source_file'](i, lang=kwargs.get('lang'))
+                # Module interface units have to be compiled on their own.
+                if ( src.lang in _unity_langs and src.path not in exclude and
+                     not _is_module_interface(src) ):
+                    if src.lang not in groups:
+                        groups[src.lang] = []
+                        items.append(groups[src.lang])
+                    groups[src.lang].append(src)
+                    continue
+            items.append(i)
+
+        def make_batch(batch):
+            lang = batch[0].lang
+            if len(batch) == 1:
+                return make_object(batch[0], lang)
+
+            # Name each batch after its members so that changing one batch
+            # doesn't rename (and thus rebuild) any of the others.
+            src = SourceFile(Path('{}.unity/unity_{}{}'.format(
+                unity_name, _unity_batch_id(batch),
+                known_langs[lang].exts('source')[0]
+            ), Root.builddir), lang)
+
+            filename = src.path.string(env.base_dirs)
+            base = os.path.dirname(filename)
+            _write_if_changed(filename, ''.join(
+                '#include "{}"\n'.format(self.__relpath(i, env, base))
+                for i in batch
+            ))
+
+            obj = make_object(src, lang, extra_deps=(
+                listify(kwargs.get('extra_deps')) + batch
+            ))
+            for i in batch:
+                self._unity_members[i.path] = obj
+            return obj
+
+        result = []
+        for i in items:
+            if isinstance(i, list):
+                for batch in self.__batches(i, env, kind, budget):
+                    result.append(make_batch(batch))
+            else:
+                result.append(make_object(i, lang_of(i)))
+        list.__init__(self, result)
+
+    def __auto_pch(self, builtins, build, env, files, name, kwargs):
+        # Choose the headers to precompile for each language from the
+        # dependencies recorded by the last build. A translation unit is ours
+        # if it's one of our sources or includes one (i.e. a unity batch).
+        sources = {}
+        for i in iterate(files):
+            if isinstance(i, string_types + (SourceFile,)):
+                src = builtins['source_file'](i, lang=kwargs.get('lang'))
+                if src.lang in _auto_pch_langs:
+                    sources[os.path.normpath(
+                        src.path.string(env.base_dirs)
+                    )] = src.lang
+
+        prefix_dir = Path(name + '.autopch', Root.builddir)
+        prefix_base = prefix_dir.string(env.base_dirs)
+
+        def prefix_file(lang):
+            return HeaderFile(prefix_dir.append(
+                lang + known_langs[lang].exts('header')[0]
+            ), lang)
+
+        # When the last build used a prefix header, the compiler only reports
+        # some of its headers for each translation unit, so count the units as
+        # including all of them.
+        all_deps = build['auto_pch'].deps(env)
+        previous, forced = {}, {}
+        for lang in set(sources.values()):
+            filename = prefix_file(lang).path.string(env.base_dirs)
+            previous[lang] = _read_pch_prefix(filename)
+            forced[lang] = previous[lang] if filename in all_deps else []
+
+        tus = defaultdict(list)
+        for tu, deps in iteritems(all_deps):
+            lang = sources.get(tu) or first(
+                (sources[i] for i in deps if i in sources), None
+            )
+            if lang:
+                tus[lang].append([
+                    i for i in deps if i not in sources and
+                    os.path.dirname(i) != prefix_base
+                ] + forced[lang])
+
+        pchs = {}
+        for lang, headers in iteritems(tus):
+            prefix = prefix_file(lang)
+            filename = prefix.path.string(env.base_dirs)
+            selected = _select_pch_headers(headers, previous[lang])
+            if not selected:
+                continue
+
+            _write_if_changed(filename, ''.join(
+                '#include "{}"\n'.format(
+                    os.path.relpath(i, prefix_base).replace('\\', '/')
+                ) for i in selected
+            ))
+            pchs[lang] = builtins['precompiled_header'](
+                None, file=prefix, includes=kwargs.get('includes'),
+                packages=kwargs.get('packages'),
+                options=kwargs.get('options'), lang=lang
+            )
+        return pchs
+
+    @staticmethod
+    def __relpath(file, env, base):
+        filename = file.path.string(env.base_dirs)
+        try:
+            filename = os.path.relpath(filename, base)
+        except ValueError:  # pragma: no cover
+            # On Windows, we can't make a relative path across drives.
+            pass
+        return filename.replace('\\', '/')
+
+    @staticmethod
+    def __batches(files, env, kind, budget):
+        batch, size = [], 0
+        for i in files:
+            if kind == 'files':
+                cost = 1
+            else:
+                try:
+                    cost = os.path.getsize(i.path.string(env.base_dirs))
+                except OSError:
+                    cost = 0
+
+            if batch and size + cost > budget:
+                yield batch
+                batch, size = [], 0
+            batch.append(i)
+            size += cost
+
+        if batch:
+            yield batch
 
     def __getitem__(self, key):
         if isinstance(key, string_types):
@@ -27,6 +474,8 @@ class ObjectFiles(list):
             key = key.path
 
         if isinstance(key, Path):
+            if key in self._unity_members:
+                return self._unity_members[key]
             for i in self:
                 if i.creator and i.creator.file.path == key:
                     return i
@@ -58,9 +507,11 @@ class Compile(Edge):
 
         if pch and not self.compiler.accepts_pch:
             raise TypeError('pch not supported for this compiler')
-        self.pch = builtins['precompiled_header'](
-            pch, file=pch, includes=includes, packages=self.packages,
-            options=self.user_options, lang=lang
+        self._builtins = builtins
+        self._pch_cache = build['pch_cache']
+        self.pch = self._pch_cache.request(
+            builtins, self, pch, includes, self.packages, self.user_options,
+            lang
         ) if pch else None
 
         extra_options = self.compiler.pre_build(build, name, self)
@@ -82,14 +533,35 @@ class Compile(Edge):
         primary.post_install = self.compiler.post_install(options, output,
                                                           self)
 
+        # The optimized half of a PGO build needs to be rebuilt whenever the
+        # profile changes.
+        if env.pgo and env.pgo.mode == 'use' and self.compiler.flavor == 'cc':
+            extra_deps = listify(extra_deps) + [pgo_stamp()]
+
         Edge.__init__(self, build, output, public_output, extra_deps)
 
     def add_extra_options(self, options):
         self._internal_options.extend(options)
         # PCH files should always be built with the same options as files using
-        # them, so forward the extra options onto the PCH if it exists.
-        if self.pch and hasattr(self.pch.creator, 'add_extra_options'):
-            self.pch.creator.add_extra_options(options)
+        # them, so forward the extra options onto the PCH if it exists. If the
+        # PCH is shared, this may switch us over to a different one.
+        if self.pch:
+            pch = self._pch_cache.add_extra_options(self._builtins, self,
+                                                    self.pch, options)
+            if pch is not self.pch:
+                self.__replace_pch(pch)
+
+    def __replace_pch(self, pch):
+        for i in self._internal_options:
+            if isinstance(i, opts.pch) and i.header is self.pch:
+                i.header = pch
+        for i in self.output:
+            extra = getattr(i, 'extra_objects', None)
+            if extra and getattr(self.pch, 'object_file', None) in extra:
+                i.extra_objects = [getattr(pch, 'object_file', None)
+                                   if j is self.pch.object_file else j
+                                   for j in extra]
+        self.pch = pch
 
     @property
     def options(self):
@@ -110,6 +582,13 @@ class CompileSource(Compile):
             raise ValueError("unable to determine language for file {!r}"
                              .format(self.file.path))
         self.compiler = env.builder(self.file.lang).compiler
+
+        # Once a build has any module interface units, every C++ source needs
+        # to be scanned for the modules it imports.
+        if _is_module_interface(self.file):
+            if not getattr(self.compiler, 'module_flavor', None):
+                raise ValueError('C++ modules require GCC 11+ or Clang 16+')
+            build['cxx_modules'].enabled = True
         Compile.__init__(self, builtins, build, env, name, **kwargs)
 
 
@@ -174,6 +653,25 @@ def global_options(build, options, lang):
         build['compile_flags'][i].extend(pshell.listify(options))
 
 
+def _is_module_interface(file):
+    return known_langs.fromext(file.path.ext(), 'module') == file.lang
+
+
+def _is_module_unit(rule, build_inputs):
+    return (build_inputs['cxx_modules'].enabled and
+            isinstance(rule, CompileSource) and
+            getattr(rule.compiler, 'module_flavor', None) is not None)
+
+
+def _module_units(build_inputs):
+    return [e for e in build_inputs.edges()
+            if _is_module_unit(e, build_inputs)]
+
+
+def _module_scan(rule):
+    return rule.output[0].path.addext('.ddi')
+
+
 def _get_flags(backend, rule, build_inputs, buildfile):
     variables = {}
     cmd_kwargs = {}
@@ -197,6 +695,10 @@ def _get_flags(backend, rule, build_inputs, buildfile):
 def make_compile(rule, build_inputs, buildfile, env):
     compiler = rule.compiler
     variables, cmd_kwargs = _get_flags(make, rule, build_inputs, buildfile)
+    modules = _is_module_unit(rule, build_inputs)
+    if modules:
+        make_module_scan(rule, dict(variables), cmd_kwargs.get('flags'),
+                         buildfile, env)
 
     output_params = []
     if len(rule.output) == 1:
@@ -208,21 +710,47 @@ def make_compile(rule, build_inputs, buildfile, env):
             output_vars.append(v)
             output_params.append(rule.output[i])
 
+    depdb = env.tool('depdb')
+    if compiler.deps_flavor == 'gcc':
+        # With a dependency database, each object's dependencies are merged
+        # into a shard shared with other objects, so Make only has to read a
+        # few files at startup instead of one per object.
+        if depdb.shards:
+            shard = depdb.shard(rule.output[0].path)
+            variables[make.var(_depdb_shard)] = shard
+            buildfile.include(shard, optional=True)
+        else:
+            buildfile.include(rule.output[0].path.addext('.d'), optional=True)
+
     recipename = make.var('RULE_{}'.format(compiler.rule_name.upper()))
     if not buildfile.has_variable(recipename):
         recipe_extra = []
 
         # Only GCC-style depfiles are supported by Make.
         if compiler.deps_flavor == 'gcc':
-            depfixer = env.tool('depfixer')
             cmd_kwargs['deps'] = deps = first(output_vars) + '.d'
-            recipe_extra = [make.Silent(depfixer(deps))]
-
-            buildfile.include(rule.output[0].path.addext('.d'), optional=True)
-
-        buildfile.define(recipename, [compiler(
-            make.qvar('<'), output_vars, **cmd_kwargs
-        )] + recipe_extra)
+            if depdb.shards:
+                recipe_extra = [make.Silent(depdb(
+                    make.qvar(_depdb_shard), first(output_vars), deps
+                ))]
+            else:
+                depfixer = env.tool('depfixer')
+                recipe_extra = [make.Silent(depfixer(deps))]
+
+        if modules:
+            cmd_kwargs['modmap'] = first(output_vars) + '.modmap'
+        command = compiler(make.qvar('<'), output_vars, **cmd_kwargs)
+        if modules and compiler.module_flavor == 'gcc':
+            command = env.tool('modscan').wrap_compile(
+                command, first(output_vars), cmd_kwargs['deps']
+            )
+        # We can only cache the results of compilers that tell us all the
+        # files they read (and write).
+        if ( 'deps' in cmd_kwargs and compiler.lang not in _fortran_langs and
+             not modules ):
+            command = cached_command(env, command, output_vars,
+                                     cmd_kwargs['deps'])
+        buildfile.define(recipename, [command] + recipe_extra)
 
     deps = []
     if isinstance(rule, CompileHeader) and rule.pch_source:
@@ -236,7 +764,7 @@ def make_compile(rule, build_inputs, buildfile, env):
 
     dirs = uniques(i.path.parent() for i in rule.output)
     make.multitarget_rule(
-        buildfile,
+        buildfile, env,
         targets=rule.output,
         deps=deps + rule.extra_deps,
         order_only=[i.append(make.dir_sentinel) for i in dirs if i],
@@ -245,6 +773,31 @@ def make_compile(rule, build_inputs, buildfile, env):
     )
 
 
+def make_module_scan(rule, variables, flags, buildfile, env):
+    compiler = rule.compiler
+    scan = _module_scan(rule)
+    variables[make.var('SCAN_TARGET')] = rule.output[0]
+    buildfile.include(scan.addext('.d'), optional=True)
+
+    recipename = make.var('RULE_{}_SCAN'.format(compiler.rule_name.upper()))
+    if not buildfile.has_variable(recipename):
+        deps = make.qvar('@') + '.d'
+        buildfile.define(recipename, [
+            compiler.scan(make.qvar('<'), make.qvar('@'),
+                          make.qvar('SCAN_TARGET'), deps, flags=flags),
+            make.Silent(env.tool('depfixer')(deps))
+        ])
+
+    directory = scan.parent()
+    buildfile.rule(
+        target=scan,
+        deps=[rule.file] + rule.header_files + rule.extra_deps,
+        order_only=[directory.append(make.dir_sentinel)] if directory else [],
+        recipe=make.Call(recipename),
+        variables=variables
+    )
+
+
 @ninja.rule_handler(CompileSource, CompileHeader)
 def ninja_compile(rule, build_inputs, buildfile, env):
     compiler = rule.compiler
@@ -262,6 +815,12 @@ def ninja_compile(rule, build_inputs, buildfile, env):
             output_vars.append(v)
             variables[v] = rule.output[i]
 
+    fortran = _is_fortran(rule) and _ninja_dyndep(env)
+    modules = _is_module_unit(rule, build_inputs)
+    if modules:
+        ninja_module_scan(rule, dict(variables), cmd_kwargs.get('flags'),
+                          buildfile, env)
+
     if not buildfile.has_rule(compiler.rule_name):
         depfile = None
         deps = None
@@ -273,9 +832,22 @@ def ninja_compile(rule, build_inputs, buildfile, env):
             deps = 'msvc'
             cmd_kwargs['deps'] = True
 
-        buildfile.rule(name=compiler.rule_name, command=compiler(
-            ninja.var('in'), output_vars, **cmd_kwargs
-        ), depfile=depfile, deps=deps)
+        if modules:
+            cmd_kwargs['modmap'] = ninja.var('out') + '.modmap'
+        command = compiler(ninja.var('in'), output_vars, **cmd_kwargs)
+        if modules and compiler.module_flavor == 'gcc':
+            command = env.tool('modscan').wrap_compile(
+                command, ninja.var('out'), depfile
+            )
+        # We can only cache the results of compilers that tell us all the
+        # files they read (and write).
+        if depfile and compiler.lang not in _fortran_langs and not modules:
+            command = cached_command(env, command, output_vars, depfile)
+        # Fortran compilers leave module files alone if they haven't changed,
+        # so let Ninja skip rebuilding the objects that use them.
+        buildfile.rule(name=compiler.rule_name, command=command,
+                       depfile=depfile, deps=deps,
+                       restat=fortran)
 
     inputs = [rule.file]
     implicit_deps = []
@@ -287,6 +859,8 @@ def ninja_compile(rule, build_inputs, buildfile, env):
     implicit_deps.extend(rule.header_files)
     if compiler.needs_libs:
         implicit_deps.extend(rule.libs)
+    if modules:
+        implicit_deps.append(rule.output[0].path.addext('.modmap'))
 
     # Ninja doesn't support multiple outputs and deps-parsing at the same time,
     # so just use the first output and set up an alias if necessary. Aliases
@@ -307,10 +881,135 @@ def ninja_compile(rule, build_inputs, buildfile, env):
         rule=compiler.rule_name,
         inputs=inputs,
         implicit=implicit_deps + rule.extra_deps,
+        variables=variables,
+        dyndep=(_fortran_dyndep if fortran else
+                _cxx_module_dyndep if modules else None)
+    )
+
+
+def ninja_module_scan(rule, variables, flags, buildfile, env):
+    compiler = rule.compiler
+    target = ninja.var('scan_target')
+    variables[target] = rule.output[0]
+
+    rule_name = compiler.rule_name + '_scan'
+    if not buildfile.has_rule(rule_name):
+        depfile = ninja.var('out') + '.d'
+        buildfile.rule(name=rule_name, command=compiler.scan(
+            ninja.var('in'), ninja.var('out'), target, depfile, flags=flags
+        ), depfile=depfile, deps='gcc')
+
+    buildfile.build(
+        output=_module_scan(rule),
+        rule=rule_name,
+        inputs=[rule.file],
+        implicit=rule.header_files + rule.extra_deps,
         variables=variables
     )
 
 
+def _is_fortran(rule):
+    return (isinstance(rule, CompileSource) and
+            rule.compiler.lang in _fortran_langs)
+
+
+def _fortran_sources(build_inputs):
+    return [(e.output[0], e.file) for e in build_inputs.edges()
+            if _is_fortran(e)]
+
+
+def _ninja_dyndep(env):
+    # Ninja learned to load dependencies discovered during the build (i.e.
+    # which objects provide and require which Fortran modules) in 1.10.
+    return bool(env.backend_version and
+                env.backend_version in SpecifierSet('>=1.10'))
+
+
+@make.post_rule
+def make_fortran_modules(build_inputs, buildfile, env):
+    sources = _fortran_sources(build_inputs)
+    if not sources:
+        return
+
+    # Make can't discover dependencies during the build, so scan the sources
+    # up front. Make will regenerate this file (and restart) before building
+    # anything else whenever one of the sources changes.
+    fortscan = env.tool('fortscan')
+    buildfile.rule(
+        target=_fortran_make_deps,
+        deps=[src for obj, src in sources],
+        recipe=[make.Silent(fortscan('make', make.qvar('@'),
+                                     flatten(sources)))]
+    )
+    buildfile.include(_fortran_make_deps)
+
+
+@ninja.post_rule
+def ninja_fortran_modules(build_inputs, buildfile, env):
+    sources = _fortran_sources(build_inputs)
+    if not sources or not _ninja_dyndep(env):
+        return
+
+    fortscan = env.tool('fortscan')
+    buildfile.rule(
+        name='fortscan',
+        command=fortscan('ninja', ninja.var('out'), flatten(sources)),
+        restat=True
+    )
+    buildfile.build(
+        output=_fortran_dyndep,
+        rule='fortscan',
+        inputs=[src for obj, src in sources]
+    )
+
+
+@make.post_rule
+def make_cxx_modules(build_inputs, buildfile, env):
+    units = _module_units(build_inputs)
+    if not units:
+        return
+
+    # Like Fortran modules above, Make scans every source before building
+    # anything else, and orders each object after the objects providing the
+    # modules it imports.
+    modscan = env.tool('modscan')
+    scans = [_module_scan(i) for i in units]
+    buildfile.rule(
+        target=_cxx_module_make_deps,
+        deps=scans,
+        recipe=[make.Silent(modscan.collate(
+            'make', units[0].compiler.module_flavor, make.qvar('@'),
+            _cxx_module_bmi_dir, scans
+        ))]
+    )
+    buildfile.include(_cxx_module_make_deps)
+
+
+@ninja.post_rule
+def ninja_cxx_modules(build_inputs, buildfile, env):
+    units = _module_units(build_inputs)
+    if not units:
+        return
+
+    # Collating the scans also writes the module map for each object, telling
+    # the compiler where to find (or put) the BMIs it needs.
+    modscan = env.tool('modscan')
+    buildfile.rule(
+        name='cxx_modules',
+        command=modscan.collate(
+            'ninja', units[0].compiler.module_flavor, _cxx_module_dyndep,
+            _cxx_module_bmi_dir, ninja.var('in')
+        ),
+        restat=True
+    )
+    buildfile.build(
+        output=([_cxx_module_dyndep] +
+                [i.output[0].path.addext('.modmap') for i in units]),
+        rule='cxx_modules',
+        inputs=[_module_scan(i) for i in units]
+    )
+
+
 try:
     from ..backends.msbuild import writer as msbuild
 
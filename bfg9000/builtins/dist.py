@@ -9,6 +9,7 @@ from ..path import Path, Root
 _exts = OrderedDict(
     gzip='.tar.gz',
     bzip2='.tar.bz2',
+    xz='.tar.xz',
     zip='.zip',
 )
 
@@ -23,17 +24,16 @@ def extra_dist(builtins, files=None, dirs=None):
 
 def _dist_command(format, build_inputs, buildfile, env):
     srcdir = Path('.', Root.srcdir)
-    doppel = env.tool('doppel')
+    archive = env.tool('archive')
 
     project = build_inputs['project']
     dstname = project.name
     if project.version:
         dstname += '-' + str(project.version)
 
-    return doppel(
-        'archive', [i.path.relpath(srcdir) for i in build_inputs.sources()],
-        Path(dstname + _exts[format]), directory=srcdir, format=format,
-        dest_prefix=dstname
+    return archive(
+        format, [i.path.relpath(srcdir) for i in build_inputs.sources()],
+        Path(dstname + _exts[format]), directory=srcdir, dest_prefix=dstname
     )
 
 
@@ -95,9 +95,17 @@ def _filter_from_glob(match_type, matches, extra, exclude):
     return fn
 
 
-def _find_files(paths, filter, flat, as_object):
+def _find_files(paths, filter, flat, as_object, walk_cache=None):
     # "Does the walker choose the path, or the path the walker?" - Garth Nix
     walker = _walk_flat if flat else _walk_recursive
+    if walk_cache is not None:
+        # Several configurations of the same project will all walk the same
+        # directories, so only do it once.
+        def walker(top, walker=walker):
+            key = ('walk', flat, os.getcwd(), top)
+            if key not in walk_cache:
+                walk_cache[key] = list(walker(top))
+            return walk_cache[key]
 
     results, dist_results, seen_dirs = [], [], []
     filetype = File if isinstance(as_object, bool) else as_object
@@ -154,7 +162,8 @@ def find_files(builtins, build_inputs, env, path='.', name='*', type='*',
 
     paths = [i.path.string(env.base_dirs) if isinstance(i, File) else i
              for i in iterate(path)]
-    found, dist, seen_dirs = _find_files(paths, final_filter, flat, as_object)
+    found, dist, seen_dirs = _find_files(paths, final_filter, flat, as_object,
+                                         env.probe_cache)
 
     if cache:
         build_inputs['find_dirs'].update(seen_dirs)
@@ -1,6 +1,7 @@
 import warnings
+from collections import OrderedDict
 from itertools import chain
-from six import itervalues
+from six import iteritems, itervalues
 
 from . import builtin
 from .. import path
@@ -9,7 +10,7 @@ from ..backends.make import writer as make
 from ..backends.ninja import writer as ninja
 from ..build_inputs import build_input
 from ..file_types import Directory, File, file_install_path
-from ..iterutils import flatten, iterate
+from ..iterutils import iterate
 
 
 @build_input('install')
@@ -67,8 +68,21 @@ def install(builtins, build, env, *args):
         builtins['default'](i)
 
 
+# The most files to pass to a single install or uninstall command. This keeps
+# us well below the command-line length limits of the shell.
+_batch_size = 256
+
+
+def _batches(groups):
+    for key, files in iteritems(groups):
+        for i in range(0, len(files), _batch_size):
+            yield key, files[i:i + _batch_size]
+
+
 def _doppel_cmd(env, buildfile):
     doppel = env.tool('doppel')
+    installer = env.tool('installer')
+    installer_cmd = buildfile.cmd_var(installer)
 
     def wrapper(kind):
         cmd = buildfile.cmd_var(doppel)
@@ -82,7 +96,17 @@ def _doppel_cmd(env, buildfile):
 
         name = '{name}_{kind}'.format(name=basename, kind=kind)
         cmd = buildfile.variable(name, cmd, buildfile.Section.command, True)
-        return lambda *args, **kwargs: doppel(*args, cmd=cmd, **kwargs)
+
+        def call(mode, src, dst, directory=None):
+            if mode == 'onto':
+                return doppel(mode, src, dst, cmd=cmd)
+            # Install a batch of files into a directory at once, skipping any
+            # that are already up to date.
+            full_name = directory is not None
+            return installer(src, dst, [cmd] + doppel.into_args(full_name),
+                             directory=directory, full_name=full_name,
+                             cmd=installer_cmd)
+        return call
     return wrapper
 
 
@@ -92,37 +116,66 @@ def _rm_cmd(env, buildfile):
     return lambda *args, **kwargs: rm(*args, cmd=cmd, **kwargs)
 
 
-def _install_commands(install_outputs, doppel):
-    def install_line(output):
-        cmd = doppel(output.install_kind)
+def _post_install_cmd(env, buildfile):
+    installer = env.tool('installer')
+    cmd = buildfile.cmd_var(installer)
+
+    def call(output):
+        return installer.wrap_post_install(
+            output.post_install, output.path, file_install_path(output),
+            cmd=cmd
+        )
+    return call
+
+
+def _install_commands(install_outputs, doppel, post_install):
+    # Group files by their kind and destination so that we can install each
+    # group with a few commands instead of one per file. Each batch is
+    # independent, so the backend can run them in parallel.
+    groups = OrderedDict()
+    singles = []
+    for output in install_outputs:
+        kind = 'program' if output.install_kind == 'program' else 'data'
+        dst = file_install_path(output)
         if isinstance(output, Directory):
             if output.files is not None:
                 src = [i.path.relpath(output.path) for i in output.files]
-                dst = file_install_path(output)
-                return cmd('into', src, dst, directory=output.path)
+                groups.setdefault((kind, dst, output.path), []).extend(src)
+                continue
 
             warnings.warn(
                 ('installed directory {!r} has no matching files; did you ' +
                  'forget to set `include`?').format(output.path)
             )
+        elif output.path.basename() == dst.basename():
+            groups.setdefault((kind, dst.parent(), None), []).append(
+                output.path
+            )
+            continue
 
-        src = output.path
-        dst = file_install_path(output)
-        return cmd('onto', src, dst)
+        singles.append(doppel(kind)('onto', output.path, dst))
 
-    return ([install_line(i) for i in install_outputs] +
-            [i.post_install for i in install_outputs if i.post_install])
+    batches = singles + [
+        doppel(kind)('into', files, dst, directory=directory)
+        for (kind, dst, directory), files in _batches(groups)
+    ]
+    return batches, [post_install(i) for i in install_outputs
+                     if i.post_install]
 
 
-def _uninstall_command(install_outputs, rm):
-    def uninstall_line(output):
+def _uninstall_commands(install_outputs, rm):
+    groups = OrderedDict()
+    for output in install_outputs:
+        dst = file_install_path(output)
         if isinstance(output, Directory):
-            dst = file_install_path(output)
-            return [dst.append(i.path.relpath(output.path)) for i in
-                    iterate(output.files)]
-        return [file_install_path(output)]
+            files = [dst.append(i.path.relpath(output.path)) for i in
+                     iterate(output.files)]
+        else:
+            files = [dst]
+        for i in files:
+            groups.setdefault(i.parent(), []).append(i)
 
-    return rm(flatten(uninstall_line(i) for i in install_outputs))
+    return [rm(files) for key, files in _batches(groups)]
 
 
 @make.post_rule
@@ -138,11 +191,24 @@ def make_install_rule(build_inputs, buildfile, env):
         buildfile.variable(make.path_vars[path.DestDir.destdir],
                            env.variables.get('DESTDIR', ''), make.Section.path)
 
-    install = _install_commands(install_outputs, _doppel_cmd(env, buildfile))
-    buildfile.rule(target='install', deps='all', recipe=install, phony=True)
-
-    uninstall = _uninstall_command(install_outputs, _rm_cmd(env, buildfile))
-    buildfile.rule(target='uninstall', recipe=[uninstall], phony=True)
+    install, post_install = _install_commands(
+        install_outputs, _doppel_cmd(env, buildfile),
+        _post_install_cmd(env, buildfile)
+    )
+    batches = []
+    for i, line in enumerate(install, 1):
+        batches.append('install-{}'.format(i))
+        buildfile.rule(target=batches[-1], deps='all', recipe=[line],
+                       phony=True)
+    buildfile.rule(target='install', deps=['all'] + batches,
+                   recipe=post_install, phony=True)
+
+    uninstall = _uninstall_commands(install_outputs, _rm_cmd(env, buildfile))
+    batches = []
+    for i, line in enumerate(uninstall, 1):
+        batches.append('uninstall-{}'.format(i))
+        buildfile.rule(target=batches[-1], recipe=[line], phony=True)
+    buildfile.rule(target='uninstall', deps=batches, phony=True)
 
 
 @ninja.post_rule
@@ -159,9 +225,27 @@ def ninja_install_rule(build_inputs, buildfile, env):
                            env.variables.get('DESTDIR', ''),
                            ninja.Section.path)
 
-    install = _install_commands(install_outputs, _doppel_cmd(env, buildfile))
-    ninja.command_build(buildfile, env, output='install', inputs=['all'],
-                        command=shell.join_lines(install))
-
-    uninstall = _uninstall_command(install_outputs, _rm_cmd(env, buildfile))
-    ninja.command_build(buildfile, env, output='uninstall', command=uninstall)
+    install, post_install = _install_commands(
+        install_outputs, _doppel_cmd(env, buildfile),
+        _post_install_cmd(env, buildfile)
+    )
+    batches = []
+    for i, line in enumerate(install, 1):
+        batches.append('install-{}'.format(i))
+        ninja.command_build(buildfile, env, output=batches[-1], inputs=['all'],
+                            command=line, console=False)
+    if post_install:
+        ninja.command_build(buildfile, env, output='install',
+                            inputs=['all'] + batches,
+                            command=shell.join_lines(post_install))
+    else:
+        buildfile.build(output='install', rule='phony',
+                        inputs=['all'] + batches)
+
+    uninstall = _uninstall_commands(install_outputs, _rm_cmd(env, buildfile))
+    batches = []
+    for i, line in enumerate(uninstall, 1):
+        batches.append('uninstall-{}'.format(i))
+        ninja.command_build(buildfile, env, output=batches[-1], command=line,
+                            console=False)
+    buildfile.build(output='uninstall', rule='phony', inputs=batches)
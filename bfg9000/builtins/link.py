@@ -7,9 +7,10 @@ from six import string_types
 from six.moves import reduce, filter as ifilter
 
 from . import builtin
-from .. import options as opts
+from .. import options as opts, shell
 from .compile import Compile, ObjectFiles
 from .file_types import local_file
+from .pool import make_pool_command, ninja_pool
 from ..backends.make import writer as make
 from ..backends.ninja import writer as ninja
 from ..build_inputs import build_input, Edge
@@ -18,6 +19,7 @@ from ..iterutils import (first, flatten, iterate, listify, merge_dicts,
                          merge_into_dict, slice_dict, uniques)
 from ..path import Path, Root
 from ..shell import posix as pshell
+from ..tools.internal import cached_command
 
 build_input('link_flags')(lambda build_inputs, env: {
     'dynamic': defaultdict(list), 'static': defaultdict(list)
@@ -30,8 +32,9 @@ class Link(Edge):
     def __init__(self, builtins, build, env, name, files=None, includes=None,
                  pch=None, libs=None, packages=None, compile_options=None,
                  link_options=None, entry_point=None, lang=None,
-                 extra_deps=None):
+                 unity=None, unity_exclude=None, pool=None, extra_deps=None):
         self.name = self.__name(name)
+        self.pool = build['pools'].get(pool)
 
         self.user_libs = [
             builtins['library'](i, kind=self._preferred_lib, lang=lang)
@@ -46,7 +49,9 @@ class Link(Edge):
 
         self.user_files = builtins['object_files'](
             files, includes=includes, pch=pch, libs=self.user_libs,
-            packages=self.user_packages, options=compile_options, lang=lang
+            packages=self.user_packages, options=compile_options, lang=lang,
+            unity=unity, unity_exclude=unity_exclude, unity_name=self.name,
+            pch_name=self.name
         )
         self.files = self.user_files + flatten(
             getattr(i, 'extra_objects', []) for i in self.user_files
@@ -58,6 +63,14 @@ class Link(Edge):
 
         self.user_options = pshell.listify(link_options, type=opts.option_list)
 
+        # LTO has to be enabled both when compiling and when linking, so let
+        # it be specified in either place.
+        self.lto = opts.option_list(
+            i for i in chain(pshell.listify(compile_options),
+                             self.user_options)
+            if isinstance(i, opts.lto)
+        )
+
         if entry_point:
             self.entry_point = entry_point
 
@@ -74,6 +87,8 @@ class Link(Edge):
             raise ValueError('unable to determine language')
 
         self.linker = self.__find_linker(env, formats[0], self.langs)
+        if self.lto and hasattr(self.linker, 'lto_linker'):
+            self.linker = self.linker.lto_linker()
 
         # Forward any necessary options to the compile step.
         if hasattr(self.linker, 'compile_options'):
@@ -81,6 +96,7 @@ class Link(Edge):
         else:
             compile_opts = opts.option_list()
         compile_opts.extend(forward_opts.get('compile_options', []))
+        compile_opts.extend(self.lto)
         for i in self.files:
             if hasattr(i.creator, 'add_extra_options'):
                 i.creator.add_extra_options(compile_opts)
@@ -161,6 +177,7 @@ class DynamicLink(Link):
 
         self._internal_options.extend(extra_options)
         self._internal_options.extend(forward_opts.get('link_options', []))
+        self._internal_options.extend(self.lto)
 
         first(output).runtime_deps.extend(
             i.runtime_file for i in self.libs if i.runtime_file
@@ -217,7 +234,7 @@ class StaticLink(Link):
             'compile_options': opts.option_list(),
             # Don't include libs in link_options, since later link steps will
             # handle adding them to their LDFLAGS.
-            'link_options': self.user_options,
+            'link_options': self.user_options + self.lto,
             'libs': self.libs,
             'packages': self.user_packages,
         }
@@ -384,6 +401,15 @@ def _get_flags(backend, rule, build_inputs, buildfile):
     return variables, cmd_kwargs
 
 
+def _remove_output(env, linker, output_vars):
+    # Some linkers (e.g. `ar`) update an existing output instead of replacing
+    # it, which keeps stale members around and fails outright if the existing
+    # output is in a different format, so remove it first.
+    if getattr(linker, 'updates_output', False):
+        return [env.tool('rm')(output_vars)]
+    return []
+
+
 @make.rule_handler(StaticLink, DynamicLink, SharedLink)
 def make_link(rule, build_inputs, buildfile, env):
     linker = rule.linker
@@ -401,22 +427,32 @@ def make_link(rule, build_inputs, buildfile, env):
 
     recipename = make.var('RULE_{}'.format(linker.rule_name.upper()))
     if not buildfile.has_variable(recipename):
-        buildfile.define(recipename, [linker(
+        buildfile.define(recipename, [cached_command(env, linker(
             make.var('1'), output_vars, **cmd_kwargs
-        )])
+        ), output_vars)])
 
     files = rule.files
     if hasattr(rule.linker, 'transform_input'):
         files = rule.linker.transform_input(files)
 
+    # Only the link itself goes in the pool (the pool helper runs a single
+    # command, not a shell line), so remove any old output separately.
+    recipe = make.Call(recipename, files, *output_params)
+    if rule.pool:
+        recipe = make_pool_command(env, rule.pool, [recipe])
+    recipe = _remove_output(env, linker, make.qvar('@')) + [recipe]
+    if ( hasattr(rule.linker, 'needs_jobserver') and
+         rule.linker.needs_jobserver(rule.options) ):
+        recipe = [make.Recursive(i) for i in listify(recipe)]
+
     manifest = listify(getattr(rule, 'manifest', None))
     dirs = uniques(i.path.parent() for i in rule.output)
     make.multitarget_rule(
-        buildfile,
+        buildfile, env,
         targets=rule.output,
         deps=rule.files + rule.libs + manifest + rule.extra_deps,
         order_only=[i.append(make.dir_sentinel) for i in dirs if i],
-        recipe=make.Call(recipename, files, *output_params),
+        recipe=recipe,
         variables=variables
     )
 
@@ -445,17 +481,28 @@ def ninja_link(rule, build_inputs, buildfile, env):
         input_var = ninja.var('in')
 
     if not buildfile.has_rule(linker.rule_name):
-        buildfile.rule(name=linker.rule_name, command=linker(
-            input_var, output_vars, **cmd_kwargs
+        commands = _remove_output(env, linker, output_vars) + [
+            cached_command(env, linker(input_var, output_vars, **cmd_kwargs),
+                           output_vars)
+        ]
+        buildfile.rule(name=linker.rule_name, command=(
+            shell.join_lines(commands) if len(commands) > 1 else commands[0]
         ))
 
+    # Links can use a lot of memory, so unless told otherwise, put dynamic
+    # links in a pool sized to fit in the available memory.
+    pool = rule.pool
+    if pool is None and isinstance(rule, DynamicLink):
+        pool = build_inputs['pools'].link_pool()
+
     manifest = listify(getattr(rule, 'manifest', None))
     buildfile.build(
         output=rule.output,
         rule=linker.rule_name,
         inputs=rule.files,
         implicit=rule.libs + manifest + rule.extra_deps,
-        variables=variables
+        variables=variables,
+        pool=ninja_pool(buildfile, pool)
     )
 
 
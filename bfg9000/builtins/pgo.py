@@ -0,0 +1,95 @@
+from .. import pgo, shell
+from ..backends.make import writer as make
+from ..backends.ninja import writer as ninja
+from ..file_types import Directory, File
+from ..path import Path, Root
+from ..versioning import SpecifierSet
+
+
+def pgo_stamp():
+    return File(Path(pgo.stamp_file, Root.builddir))
+
+
+def _uses_clang(build_inputs):
+    return any(getattr(getattr(i, 'compiler', None), 'brand', None) == 'clang'
+               for i in build_inputs.edges())
+
+
+def _train_commands(build_inputs, env, subbuild):
+    # First, build the instrumented binaries, and then run the training
+    # command (by default, the instrumented build's tests) to produce a
+    # profile for the optimized build to use.
+    train = env.pgo.train
+    if train:
+        directory = Path(pgo.generate_dir, Root.builddir)
+    elif build_inputs['tests']:
+        directory = None
+        train = subbuild + ['test']
+    else:
+        raise ValueError('profile-guided optimization needs a training ' +
+                         'command; pass --pgo-train or define some tests')
+
+    merge = env.tool('llvm_profdata') if _uses_clang(build_inputs) else None
+    return [subbuild, env.tool('pgo')(
+        Path(pgo.profile_dir, Root.builddir), train, directory=directory,
+        merge=merge, stamp=pgo_stamp().path
+    )]
+
+
+def _train_deps(build_inputs):
+    # The instrumented build is generated from the same sources as this one,
+    # so retrain whenever any of them change; otherwise, the optimized build
+    # would keep using a stale profile.
+    return [i.path for i in build_inputs.sources()
+            if not isinstance(i, Directory)]
+
+
+def _enabled(env):
+    return env.pgo and env.pgo.mode == 'use'
+
+
+@make.post_rule
+def make_pgo_rule(build_inputs, buildfile, env):
+    if not _enabled(env):
+        return
+
+    recipe = _train_commands(build_inputs, env, [
+        make.var('MAKE'), '-C', Path(pgo.generate_dir, Root.builddir)
+    ])
+
+    # Training only touches the profile stamp if the profile changed, so
+    # track when it last ran with a separate stamp to avoid retraining on
+    # every build.
+    trained = Path(pgo.trained_file, Root.builddir)
+    buildfile.rule(target=trained, deps=_train_deps(build_inputs),
+                   recipe=recipe + [make.Silent(['touch', make.var('@')])])
+    buildfile.rule(target=pgo_stamp().path, deps=[trained])
+    buildfile.rule(target='pgo-train', recipe=recipe, phony=True)
+
+
+@ninja.post_rule
+def ninja_pgo_rule(build_inputs, buildfile, env):
+    if not _enabled(env):
+        return
+
+    command = shell.join_lines(_train_commands(
+        build_inputs, env,
+        ninja.command(env.variables) + ['-C', Path(pgo.generate_dir,
+                                                   Root.builddir)]
+    ))
+
+    # Training only touches the profile stamp if the profile changed; `restat`
+    # lets Ninja know not to rebuild the optimized objects (or retrain) when
+    # that happens.
+    if not buildfile.has_rule('pgo_train'):
+        extra_kwargs = {}
+        if ( env.backend_version and env.backend_version in
+             SpecifierSet('>=1.5') ):
+            extra_kwargs['pool'] = 'console'
+        buildfile.rule(name='pgo_train',
+                       command=shell.shell_list([ninja.var('cmd')]),
+                       restat=True, **extra_kwargs)
+    buildfile.build(output=pgo_stamp().path, rule='pgo_train',
+                    implicit=_train_deps(build_inputs),
+                    variables={'cmd': command})
+    ninja.command_build(buildfile, env, output='pgo-train', command=command)
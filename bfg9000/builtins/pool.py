@@ -0,0 +1,113 @@
+import os
+import re
+from collections import OrderedDict
+from six import string_types
+
+from . import builtin
+from ..build_inputs import build_input
+from ..objutils import objectify
+
+# The amount of memory to reserve for each concurrent link in the default link
+# pool. Large C++ links (especially with LTO or debug info) can easily use this
+# much.
+_link_memory = 2 * 1024 ** 3
+
+
+class Pool(object):
+    def __init__(self, name, depth):
+        if not re.match(r'^\w+$', name):
+            raise ValueError('pool name contains invalid characters')
+        if isinstance(depth, bool) or not isinstance(depth, int):
+            raise TypeError('expected an integer depth')
+        if depth < 1:
+            raise ValueError('pool depth must be positive')
+        self.name = name
+        self.depth = depth
+
+    def __eq__(self, rhs):
+        return (type(self) is type(rhs) and self.name == rhs.name and
+                self.depth == rhs.depth)
+
+    def __ne__(self, rhs):
+        return not (self == rhs)
+
+    def __repr__(self):
+        return '<Pool {!r}, depth={}>'.format(self.name, self.depth)
+
+
+def _physical_memory():
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):  # pragma: no cover
+        return None
+
+
+@build_input('pools')
+class Pools(object):
+    def __init__(self, build_inputs, env):
+        self._pools = OrderedDict()
+
+    def add(self, name, depth):
+        if name == 'console':
+            raise ValueError("'console' is a reserved pool name")
+        if name in self._pools:
+            raise ValueError("pool '{}' already exists".format(name))
+        pool = self._pools[name] = Pool(name, depth)
+        return pool
+
+    def get(self, pool):
+        if pool is None:
+            return None
+
+        def lookup(name):
+            try:
+                return self._pools[name]
+            except KeyError:
+                raise ValueError("unknown pool '{}'".format(name))
+        return objectify(pool, Pool, lookup)
+
+    def link_pool(self):
+        # Unless the user has defined their own, size the default link pool
+        # so that concurrent links can't exhaust the available memory.
+        if 'link' not in self._pools:
+            memory, cpus = _physical_memory(), _cpu_count()
+            if not memory:
+                return None
+            depth = max(memory // _link_memory, 1)
+            if cpus:
+                depth = min(depth, cpus)
+            self._pools['link'] = Pool('link', int(depth))
+        return self._pools['link']
+
+    def __iter__(self):
+        return iter(self._pools.values())
+
+
+@builtin.function('build_inputs')
+def pool(build, name, depth):
+    if not isinstance(name, string_types):
+        raise TypeError('expected a string name')
+    return build['pools'].add(name, depth)
+
+
+def make_pool_command(env, pool, command):
+    # Make has no notion of pools, so run the command via a helper that limits
+    # the number of commands in each pool running at once.
+    if pool is None:
+        return command
+    return env.tool('pool')(pool.name, pool.depth, command)
+
+
+def ninja_pool(buildfile, pool):
+    if pool is None:
+        return None
+    buildfile.pool(pool.name, pool.depth)
+    return pool.name
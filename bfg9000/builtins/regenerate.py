@@ -16,7 +16,7 @@ def make_regenerate_rule(build_inputs, buildfile, env):
     bfg9000 = env.tool('bfg9000')
 
     make.multitarget_rule(
-        buildfile,
+        buildfile, env,
         targets=[Path('Makefile')] + build_inputs['regenerate'].outputs,
         deps=[build_inputs.bfgpath],
         recipe=[bfg9000(Path('.'))]
@@ -1,6 +1,5 @@
-import warnings
-from six import string_types
-from six.moves import cStringIO as StringIO
+import hashlib
+import json
 
 from . import builtin
 from .. import safe_str
@@ -8,9 +7,14 @@ from .. import shell
 from ..backends.make import writer as make
 from ..backends.ninja import writer as ninja
 from ..build_inputs import build_input
-from ..file_types import Executable, File, Node
-from ..iterutils import first, isiterable, iterate, listify
-from ..shell import posix as pshell
+from ..file_types import Node
+from ..iterutils import first, isiterable, iterate, listify, uniques
+from ..path import Path, Root
+from ..platforms.basepath import BasePath
+from ..tools.common import Command
+
+manifest_name = '.bfg_tests.json'
+stamp_dir = '.bfg_tests'
 
 
 @build_input('tests')
@@ -18,6 +22,7 @@ class TestInputs(object):
     def __init__(self, build_inputs, env):
         self.tests = []
         self.extra_deps = []
+        self.mode = 'all'
 
     def __nonzero__(self):
         return self.__bool__()
@@ -82,31 +87,142 @@ def test_deps(build, *args):
     build['tests'].extra_deps.extend(args)
 
 
-def _build_commands(tests, writer, shell, local_env, collapse=False):
-    def command(test, args=[]):
-        subcmd = local_env(test.env, test.cmd) + args
+@builtin.function('build_inputs')
+def test_mode(build, mode):
+    if mode not in ('all', 'incremental'):
+        raise ValueError("mode must be one of 'all' or 'incremental'")
+    build['tests'].mode = mode
+
+
+def _realize(thing, variables):
+    thing = safe_str.safe_str(thing)
+    if isinstance(thing, safe_str.literal_types):
+        return thing.string
+    elif isinstance(thing, safe_str.jbos):
+        return ''.join(_realize(i, variables) for i in thing.bits)
+    elif isinstance(thing, BasePath):
+        return thing.string(variables)
+    return thing
+
+
+def _realize_words(env, line, variables):
+    # Turn a command into a list of shell words, since the test runner executes
+    # each test as a shell string. Plain strings are already shell-escaped.
+    if not isiterable(line):
+        return [_realize(line, variables)]
+
+    result = []
+    for i in Command.convert_args(line, lambda cmd: cmd.command):
+        i = safe_str.safe_str(i)
+        if isinstance(i, safe_str.literal_types):
+            result.append(i.string)
+        else:
+            result.append(shell.quote(_realize(i, variables)))
+    return result
+
+
+def _test_words(env, test, variables, collapse=False):
+    words = []
+    if collapse and test.env:
+        env_vars = [shell.quote('{}={}'.format(k, _realize(v, variables)))
+                    for k, v in sorted(test.env.items())]
+        if hasattr(shell, 'local_env'):
+            words.extend(env_vars)
+        else:
+            setenv = env.tool('setenv').command
+            words.extend(_realize_words(env, setenv, variables) + env_vars +
+                         ['--'])
+    words.extend(_realize_words(env, test.cmd, variables))
+
+    if isinstance(test, TestDriver):
+        # Children of a test driver are passed to it as single arguments, just
+        # like they would be on the command line.
+        for i in test.tests:
+            child = _test_words(env, i, variables, True)
+            words.append(child[0] if len(child) == 1 else
+                         shell.quote(' '.join(child)))
+    return words
+
+
+def _test_line(env, test, variables):
+    return ' '.join(_test_words(env, test, variables))
 
-        if collapse:
-            out = writer(StringIO())
-            out.write_shell(subcmd)
-            s = out.stream.getvalue()
-            if len(subcmd) > 1:
-                s = shell.quote(s)
-            return safe_str.literal(s)
-        return subcmd
 
-    cmd, deps = [], []
+def _test_deps(tests):
+    deps = []
     for i in tests:
         deps.extend(i.inputs)
         if isinstance(i, TestDriver):
-            args, more_deps = _build_commands(
-                i.tests, writer, shell, local_env, True
-            )
-            cmd.append(command(i, args))
-            deps.extend(more_deps)
-        else:
-            cmd.append(command(i))
-    return cmd, deps
+            deps.extend(_test_deps(i.tests))
+    return deps
+
+
+def _test_files(tests):
+    # Unlike _test_deps, this includes files in the source directory (e.g.
+    # scripts or data files), since changing them should re-run the test.
+    files = []
+    for i in tests:
+        files.extend(j for j in iterate(i.cmd) if isinstance(j, Node))
+        if isinstance(i, TestDriver):
+            files.extend(_test_files(i.tests))
+    return uniques(files)
+
+
+def _write_manifest(build_inputs, env):
+    # Use absolute paths for running the tests, but show paths relative to
+    # the build directory in the test names, since that's where we run from.
+    variables = env.base_dirs
+    name_vars = dict(variables)
+    name_vars[Root.builddir] = None
+
+    tests = []
+    names = set()
+    for i in build_inputs['tests'].tests:
+        name = base = _test_line(env, i, name_vars)
+        n = 1
+        while name in names:
+            n += 1
+            name = '{} #{}'.format(base, n)
+        names.add(name)
+
+        entry = {
+            'name': name,
+            'cmd': _test_line(env, i, variables),
+            'env': {k: _realize(v, variables)
+                    for k, v in (i.env or {}).items()},
+        }
+        # Identify each test by what it runs so that its stamp (see below)
+        # changes along with it.
+        entry['id'] = hashlib.sha1(json.dumps(
+            [entry['cmd'], entry['env']], sort_keys=True
+        ).encode('utf-8')).hexdigest()[:16]
+        tests.append(entry)
+
+    manifest = Path(manifest_name, Root.builddir)
+    data = json.dumps({'tests': tests}, indent=2, sort_keys=True)
+    filename = manifest.string(variables)
+    try:
+        with open(filename) as f:
+            changed = f.read() != data
+    except IOError:
+        changed = True
+    if changed:
+        with open(filename, 'w') as f:
+            f.write(data)
+    return manifest, [i['id'] for i in tests]
+
+
+def _stamp_steps(build_inputs, env, manifest, ids):
+    # In incremental mode, each test gets its own build step which writes a
+    # stamp file (and a log) when the test passes, so that only tests whose
+    # inputs have changed are re-run.
+    tests = build_inputs['tests']
+    runner = env.tool('test_runner')
+    for test, test_id in zip(tests.tests, ids):
+        stamp = Path('{}/{}.pass'.format(stamp_dir, test_id), Root.builddir)
+        log = Path('{}/{}.log'.format(stamp_dir, test_id), Root.builddir)
+        yield (stamp, _test_files([test]) + tests.extra_deps,
+               runner(manifest, test_id, stamp, log))
 
 
 @make.post_rule
@@ -115,22 +231,28 @@ def make_test_rule(build_inputs, buildfile, env):
     if not tests:
         return
 
-    recipe, deps = _build_commands(
-        tests.tests, make.Writer, pshell, pshell.local_env
-    )
-
+    manifest, ids = _write_manifest(build_inputs, env)
     buildfile.rule(
         target='tests',
-        deps=deps + tests.extra_deps,
-        phony=True
-    )
-    buildfile.rule(
-        target='test',
-        deps='tests',
-        recipe=recipe,
+        deps=_test_deps(tests.tests) + tests.extra_deps,
         phony=True
     )
 
+    if tests.mode == 'incremental':
+        stamps = []
+        for stamp, deps, command in _stamp_steps(build_inputs, env, manifest,
+                                                 ids):
+            buildfile.rule(target=stamp, deps=deps, recipe=[command])
+            stamps.append(stamp)
+        buildfile.rule(target='test', deps=stamps, phony=True)
+    else:
+        buildfile.rule(
+            target='test',
+            deps='tests',
+            recipe=[env.tool('test_runner')(manifest)],
+            phony=True
+        )
+
 
 @ninja.post_rule
 def ninja_test_rule(build_inputs, buildfile, env):
@@ -138,23 +260,25 @@ def ninja_test_rule(build_inputs, buildfile, env):
     if not tests:
         return
 
-    try:
-        local_env = shell.local_env
-    except AttributeError:
-        local_env = env.tool('setenv')
-
-    commands, deps = _build_commands(
-        tests.tests, ninja.Writer, shell, local_env
-    )
-
+    manifest, ids = _write_manifest(build_inputs, env)
     buildfile.build(
         output='tests',
         rule='phony',
-        inputs=deps + tests.extra_deps
-    )
-    ninja.command_build(
-        buildfile, env,
-        output='test',
-        inputs='tests',
-        command=shell.join_lines(commands),
+        inputs=_test_deps(tests.tests) + tests.extra_deps
     )
+
+    if tests.mode == 'incremental':
+        stamps = []
+        for stamp, deps, command in _stamp_steps(build_inputs, env, manifest,
+                                                 ids):
+            ninja.command_build(buildfile, env, output=stamp, inputs=deps,
+                                command=command, console=False)
+            stamps.append(stamp)
+        buildfile.build(output='test', rule='phony', inputs=stamps)
+    else:
+        ninja.command_build(
+            buildfile, env,
+            output='test',
+            inputs='tests',
+            command=env.tool('test_runner')(manifest),
+        )
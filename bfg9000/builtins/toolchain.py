@@ -45,6 +45,12 @@ def compiler(names, lang, strict=False):
     os.environ[var] = which(names, strict=strict, kind='compiler')
 
 
+@builtin.function(context='toolchain')
+def compiler_launcher(names, lang, strict=False):
+    var = known_langs[lang].var('launcher')
+    os.environ[var] = which(names, strict=strict, kind='compiler launcher')
+
+
 @builtin.function(context='toolchain')
 def compile_options(options, lang):
     # This only supports strings (and lists of strings) for options, *not*
@@ -1,5 +1,7 @@
 from . import builtin
+from .. import shell
 from ..arguments.parser import add_user_argument
+from ..configurations import Configuration
 
 
 @builtin.getter('argv')
@@ -11,3 +13,9 @@ def argv(_argv):
 def argument(parser, *args, **kwargs):
     names = ['--' + i for i in args]
     add_user_argument(parser, *names, **kwargs)
+
+
+@builtin.function('configurations', context='options')
+def configuration(configurations, name, variables=None, args=None):
+    configurations.append(Configuration(name, variables,
+                                        shell.listify(args or [])))
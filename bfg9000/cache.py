@@ -0,0 +1,464 @@
+import errno
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+from six.moves import cStringIO as StringIO
+
+from . import depfixer
+from .arguments import parser as argparse
+from .app_version import version
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+# Bump this whenever the layout of the store or the way we compute keys
+# changes, so that old entries are never mistaken for new ones.
+_format_version = '1'
+
+# The maximum number of sets of discovered deps to remember for each command.
+# Each set corresponds to a different combination of header contents we've
+# seen for the same command line.
+_max_manifest_entries = 16
+
+_size_units = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+_lib_exts = ['.so', '.a', '.dylib', '.dll.a', '.lib']
+
+
+def parse_size(value):
+    m = re.match(r'^(\d+)([kmg]?)b?$', value.strip().lower())
+    if not m:
+        raise ValueError('invalid size {!r}'.format(value))
+    return int(m.group(1)) * _size_units[m.group(2)]
+
+
+def format_size(size):
+    for unit in ['', 'k', 'M']:
+        if size < 1024:
+            return '{:.1f}{}B'.format(size, unit) if unit else \
+                   '{}B'.format(size)
+        size /= 1024.0
+    return '{:.1f}GB'.format(size)
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def _replace(src, dst):
+    try:
+        os.rename(src, dst)
+    except OSError:  # pragma: no cover
+        # Windows can't rename onto an existing file.
+        os.remove(dst)
+        os.rename(src, dst)
+
+
+def _update(h, *args):
+    for i in args:
+        h.update(str(i).encode('utf-8') + b'\0')
+
+
+def _which(program):
+    if os.path.dirname(program):
+        return program if os.path.isfile(program) else None
+    for i in os.getenv('PATH', '').split(os.pathsep):
+        path = os.path.join(i, program)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def read_deps(filename):
+    # Use depfixer's parser to list the deps from a Makefile-style depfile.
+    out = StringIO()
+    with open(filename) as f:
+        depfixer.emit_deps(f, out)
+    return [re.sub(r'\\(.)', r'\1', i[:-1])
+            for i in out.getvalue().splitlines()]
+
+
+class Store(object):
+    def __init__(self, path, max_size=None):
+        self.path = path
+        self.max_size = max_size
+        self._file_hashes = {}
+
+    def _entry(self, kind, key, ext=''):
+        return os.path.join(self.path, kind, key[:2], key + ext)
+
+    def hash_file(self, filename):
+        if filename not in self._file_hashes:
+            h = hashlib.sha256()
+            try:
+                with open(filename, 'rb') as f:
+                    for chunk in iter(lambda: f.read(65536), b''):
+                        h.update(chunk)
+                self._file_hashes[filename] = h.hexdigest()
+            except (IOError, OSError):
+                self._file_hashes[filename] = None
+        return self._file_hashes[filename]
+
+    def command_inputs(self, args, exclude):
+        # Guess which arguments of a command refer to input files. This covers
+        # plain filenames, response files (`@file`), and libraries found via
+        # `-L`/`-l`; anything else needs to be specified explicitly or
+        # discovered via a depfile.
+        inputs, lib_dirs, libs = [], [], []
+        it = iter(args)
+        for i in it:
+            if i == '-L':
+                lib_dirs.append(next(it, ''))
+            elif i.startswith('-L'):
+                lib_dirs.append(i[2:])
+            elif i.startswith('-l') and len(i) > 2:
+                libs.append(i[2:])
+            elif i.startswith('@') and os.path.isfile(i[1:]):
+                inputs.append(i[1:])
+                with open(i[1:]) as f:
+                    inputs.extend(j for j in f.read().split()
+                                  if os.path.isfile(j))
+            elif not i.startswith('-') and os.path.isfile(i):
+                inputs.append(i)
+
+        for lib in libs:
+            for d in lib_dirs:
+                found = [os.path.join(d, 'lib' + lib + ext) for ext in
+                         _lib_exts]
+                found = [j for j in found if os.path.isfile(j)]
+                if found:
+                    inputs.extend(found)
+                    break
+
+        exclude = set(os.path.normpath(i) for i in exclude)
+        return [i for i in inputs if os.path.normpath(i) not in exclude]
+
+    def command_key(self, args, outputs, inputs, salt='', depfile=None):
+        h = hashlib.sha256()
+        _update(h, 'bfg9000-cache', _format_version, salt)
+        for i in args:
+            _update(h, 'arg', i)
+        for i in outputs:
+            _update(h, 'output', i)
+
+        # Include the identity of the program itself, in case it's been
+        # upgraded since we last ran it.
+        program = args and _which(args[0])
+        if program:
+            st = os.stat(program)
+            _update(h, 'program', program, st.st_size, int(st.st_mtime))
+
+        exclude = list(outputs) + ([depfile] if depfile else [])
+        for i in inputs + self.command_inputs(args, exclude):
+            _update(h, 'input', i, self.hash_file(i))
+        return h.hexdigest()
+
+    def _result_key(self, key, deps):
+        h = hashlib.sha256()
+        _update(h, key)
+        for name, digest in deps:
+            _update(h, name, digest)
+        return h.hexdigest()
+
+    def _read_json(self, filename):
+        try:
+            with open(filename) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write_json(self, filename, data):
+        _makedirs(os.path.dirname(filename))
+        tmp = '{}.{}.tmp'.format(filename, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        _replace(tmp, filename)
+
+    def lookup(self, key):
+        manifest = self._read_json(self._entry('manifests', key, '.json'))
+        for entry in manifest or []:
+            if all(self.hash_file(name) == digest
+                   for name, digest in entry['deps']):
+                filename = self._entry('results', entry['result'], '.json')
+                result = self._read_json(filename)
+                if result and all(
+                    os.path.exists(self._entry('objects', i['digest']))
+                    for i in result['outputs']
+                ):
+                    os.utime(filename, None)
+                    return result
+        return None
+
+    def restore(self, result):
+        for i in result['outputs']:
+            blob = self._entry('objects', i['digest'])
+            _makedirs(os.path.dirname(i['name']) or '.')
+            tmp = '{}.{}.tmp'.format(i['name'], os.getpid())
+            shutil.copyfile(blob, tmp)
+            os.chmod(tmp, i['mode'])
+            _replace(tmp, i['name'])
+            os.utime(blob, None)
+
+    def _add_blob(self, filename):
+        digest = self.hash_file(filename)
+        blob = self._entry('objects', digest)
+        if os.path.exists(blob):
+            os.utime(blob, None)
+            return digest, 0
+
+        _makedirs(os.path.dirname(blob))
+        tmp = '{}.{}.tmp'.format(blob, os.getpid())
+        shutil.copyfile(filename, tmp)
+        _replace(tmp, blob)
+        return digest, os.path.getsize(blob)
+
+    def store(self, key, outputs, deps=(), stdout=b'', stderr=b''):
+        # Forget any hashes we computed before running the command, since the
+        # outputs have just been (re)written.
+        self._file_hashes = {}
+        deps = [(i, self.hash_file(i)) for i in deps]
+        added = 0
+
+        result = {'outputs': [], 'stdout': stdout.decode('latin-1'),
+                  'stderr': stderr.decode('latin-1')}
+        for i in outputs:
+            if not os.path.isfile(i):
+                return False
+            digest, size = self._add_blob(i)
+            added += size
+            result['outputs'].append({
+                'name': i, 'digest': digest,
+                'mode': os.stat(i).st_mode & 0o777,
+            })
+
+        result_key = self._result_key(key, deps)
+        self._write_json(self._entry('results', result_key, '.json'), result)
+
+        manifest_file = self._entry('manifests', key, '.json')
+        manifest = [i for i in self._read_json(manifest_file) or []
+                    if i['result'] != result_key]
+        manifest.insert(0, {'deps': deps, 'result': result_key})
+        self._write_json(manifest_file, manifest[:_max_manifest_entries])
+
+        stats = self.update_stats(stores=1, size=added)
+        if self.max_size and stats['size'] > self.max_size:
+            self.trim()
+        return True
+
+    def _lock(self):
+        _makedirs(self.path)
+        f = open(os.path.join(self.path, 'lock'), 'a')
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        return f
+
+    def stats(self):
+        stats = self._read_json(os.path.join(self.path, 'stats.json')) or {}
+        for i in ('hits', 'misses', 'stores', 'evictions', 'size'):
+            stats.setdefault(i, 0)
+        return stats
+
+    def update_stats(self, **kwargs):
+        with self._lock():
+            stats = self.stats()
+            for k, v in kwargs.items():
+                stats[k] += v
+            self._write_json(os.path.join(self.path, 'stats.json'), stats)
+            return stats
+
+    def trim(self, max_size=None):
+        max_size = self.max_size if max_size is None else max_size
+        with self._lock():
+            entries = []
+            for kind in ('objects', 'results', 'manifests'):
+                for base, dirs, files in os.walk(os.path.join(self.path,
+                                                              kind)):
+                    for i in files:
+                        name = os.path.join(base, i)
+                        st = os.stat(name)
+                        entries.append((st.st_mtime, st.st_size, name))
+
+            size = sum(i[1] for i in entries)
+            evicted = 0
+            if max_size is not None and size > max_size:
+                # Evict the least-recently-used entries until we're comfortably
+                # below the limit so that we don't have to trim again soon.
+                target = max_size * 0.9
+                for mtime, entry_size, name in sorted(entries):
+                    if size <= target:
+                        break
+                    os.remove(name)
+                    size -= entry_size
+                    evicted += 1
+
+            stats = self.stats()
+            stats['size'] = size
+            stats['evictions'] += evicted
+            self._write_json(os.path.join(self.path, 'stats.json'), stats)
+            return evicted
+
+
+def _write_output(stream, data):
+    stream = getattr(stream, 'buffer', stream)
+    stream.write(data)
+    stream.flush()
+
+
+def _run(store, args):
+    command = args.command
+    if command and command[0] == '--':
+        command = command[1:]
+    if not command:
+        return 'command required'
+
+    key = store.command_key(command, args.outputs, args.inputs, args.salt,
+                            args.depfile)
+    result = store.lookup(key)
+    if result:
+        store.restore(result)
+        store.update_stats(hits=1)
+        _write_output(sys.stdout, result['stdout'].encode('latin-1'))
+        _write_output(sys.stderr, result['stderr'].encode('latin-1'))
+        return 0
+
+    store.update_stats(misses=1)
+    try:
+        p = subprocess.Popen(command, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return 'command not found: {}'.format(command[0])
+        raise  # pragma: no cover
+
+    stdout, stderr = p.communicate()
+    _write_output(sys.stdout, stdout)
+    _write_output(sys.stderr, stderr)
+
+    if p.returncode == 0:
+        try:
+            deps = read_deps(args.depfile) if args.depfile else []
+            store.store(key, args.outputs + ([args.depfile] if args.depfile
+                                             else []),
+                        deps, stdout, stderr)
+        except (EnvironmentError, ValueError):
+            # Failing to cache a result shouldn't fail the build.
+            pass
+    return p.returncode
+
+
+def _lookup(store, args):
+    key = store.command_key([], args.outputs, args.inputs, args.salt)
+    result = store.lookup(key)
+    if result:
+        store.restore(result)
+        store.update_stats(hits=1)
+        return 0
+    store.update_stats(misses=1)
+    return 1
+
+
+def _store(store, args):
+    key = store.command_key([], args.outputs, args.inputs, args.salt)
+    try:
+        store.store(key, args.outputs)
+    except (EnvironmentError, ValueError):
+        pass
+    return 0
+
+
+def _stats(store, args):
+    stats = store.stats()
+    total = stats['hits'] + stats['misses']
+    rate = (100.0 * stats['hits'] / total) if total else 0
+    print('cache directory: {}'.format(store.path))
+    print('hits:            {}'.format(stats['hits']))
+    print('misses:          {}'.format(stats['misses']))
+    print('hit rate:        {:.1f}%'.format(rate))
+    print('stored results:  {}'.format(stats['stores']))
+    print('evictions:       {}'.format(stats['evictions']))
+    print('size:            {}'.format(format_size(stats['size'])))
+    if store.max_size:
+        print('max size:        {}'.format(format_size(store.max_size)))
+    return 0
+
+
+def _trim(store, args):
+    evicted = store.trim()
+    print('evicted {} entries'.format(evicted))
+    return 0
+
+
+def _add_key_args(parser):
+    parser.add_argument('-o', '--output', action='append', default=[],
+                        dest='outputs', metavar='FILE',
+                        help='an output file of the command')
+    parser.add_argument('-i', '--input', action='append', default=[],
+                        dest='inputs', metavar='FILE',
+                        help='an extra input file of the command')
+    parser.add_argument('--salt', default='',
+                        help='an extra string to include in the cache key')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='bfg9000-cache',
+        description='Cache the outputs of build commands in a local store.'
+    )
+    parser.add_argument('--version', action='version',
+                        version='%(prog)s ' + version)
+    parser.add_argument('-d', '--cache-dir', metavar='DIR',
+                        default=os.getenv('BFG9000_CACHE_DIR'),
+                        help='the directory of the cache store')
+    parser.add_argument('--max-size', type=parse_size, metavar='SIZE',
+                        default=os.getenv('BFG9000_CACHE_SIZE', '5G'),
+                        help='the maximum size of the cache store')
+    subparsers = parser.add_subparsers()
+
+    run_p = subparsers.add_parser(
+        'run', help='run a command, restoring its outputs from the cache ' +
+        'if possible'
+    )
+    run_p.set_defaults(func=_run)
+    _add_key_args(run_p)
+    run_p.add_argument('--depfile', metavar='FILE',
+                       help='the depfile generated by the command')
+    run_p.add_argument('command', nargs=argparse.REMAINDER,
+                       metavar='COMMAND', help='the command to execute')
+
+    lookup_p = subparsers.add_parser(
+        'lookup', help='restore outputs from the cache, failing if not found'
+    )
+    lookup_p.set_defaults(func=_lookup)
+    _add_key_args(lookup_p)
+
+    store_p = subparsers.add_parser('store', help='add outputs to the cache')
+    store_p.set_defaults(func=_store)
+    _add_key_args(store_p)
+
+    stats_p = subparsers.add_parser('stats', help='show cache statistics')
+    stats_p.set_defaults(func=_stats)
+
+    trim_p = subparsers.add_parser('trim', help='evict old cache entries')
+    trim_p.set_defaults(func=_trim)
+
+    args = parser.parse_args()
+    if not hasattr(args, 'func'):
+        parser.error('command required')
+    if not args.cache_dir:
+        parser.error('no cache directory specified')
+
+    store = Store(args.cache_dir, args.max_size)
+    result = args.func(store, args)
+    if isinstance(result, str):
+        parser.exit(66 if result.startswith('command not found') else 2,
+                    '{}: error: {}\n'.format(parser.prog, result))
+    return result
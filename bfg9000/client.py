@@ -0,0 +1,131 @@
+import json
+import os
+import re
+import socket
+import stat
+import sys
+import tempfile
+
+from .app_version import version
+
+# This module is the entry point for `bfg9000`, so it should import as little
+# as possible: when a `bfg9000 serve` process is running, `bfg9000 refresh` is
+# handed off to it without loading the rest of bfg9000.
+
+
+def socket_dir():
+    # Keep the socket in a directory only we can use so that no one else can
+    # pretend to be our server.
+    runtime_dir = os.getenv('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'bfg9000')
+    return os.path.join(tempfile.gettempdir(),
+                        'bfg9000-{}'.format(os.getuid()))
+
+
+def socket_path():
+    return os.path.join(socket_dir(), 'server.sock')
+
+
+def is_private(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return (stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and
+            not st.st_mode & 0o077)
+
+
+def send(path, message):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+        s.sendall((json.dumps(message) + '\n').encode('utf-8'))
+        s.shutdown(socket.SHUT_WR)
+
+        data = b''
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        s.close()
+    return json.loads(data.decode('utf-8'))
+
+
+def request(message, path=None):
+    """Send a request to the server, returning its response or None if
+    there's no (usable) server running."""
+    if not hasattr(socket, 'AF_UNIX') or not hasattr(os, 'getuid'):
+        return None
+
+    path = path or socket_path()
+    if not os.path.exists(path) or not is_private(os.path.dirname(path)):
+        return None
+
+    message = dict(message, version=version)
+    try:
+        response = send(path, message)
+    except (socket.error, ValueError):
+        # The server went away (or was never really there); we'll just do the
+        # work ourselves.
+        return None
+    if response.get('refused'):
+        return None
+    return response
+
+
+def _strip_color(text):
+    return re.sub(r'\033\[[\d;]*m', '', text)
+
+
+def _parse_refresh(argv):
+    # Only handle the simplest forms of `refresh`; anything else (including
+    # errors) goes to the real driver.
+    if not argv or argv[0] != 'refresh':
+        return None
+
+    force = False
+    builddir = None
+    for i in argv[1:]:
+        if i in ('-f', '--force'):
+            force = True
+        elif i.startswith('-') or builddir is not None:
+            return None
+        else:
+            builddir = i
+
+    # Multi-configuration build directories are refreshed all at once, which
+    # the server doesn't know how to do.
+    builddir = os.path.abspath(builddir or '.')
+    if ( not os.path.isdir(builddir) or
+         os.path.exists(os.path.join(builddir, 'build.bfg')) or
+         os.path.exists(os.path.join(builddir, '.bfg_configs')) ):
+        return None
+    return {'command': 'refresh', 'builddir': builddir, 'force': force}
+
+
+def delegate(argv, path=None):
+    message = _parse_refresh(argv)
+    if message is None:
+        return None
+
+    response = request(message, path)
+    if response is None:
+        return None
+
+    output = response.get('output', '')
+    if not sys.stderr.isatty():
+        output = _strip_color(output)
+    sys.stderr.write(output)
+    return response['returncode']
+
+
+def main():
+    result = delegate(sys.argv[1:])
+    if result is not None:
+        return result
+
+    from .driver import main
+    return main()
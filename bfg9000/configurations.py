@@ -0,0 +1,144 @@
+import errno
+import json
+import os
+import re
+from collections import OrderedDict
+from six import string_types
+
+from . import shell
+
+configs_file = '.bfg_configs'
+
+_var_ex = re.compile(r'^([A-Za-z_][A-Za-z0-9_]*)=(.*)$', re.DOTALL)
+_name_ex = re.compile(r'^[\w][\w.+-]*$')
+
+# The targets that can be built for all of the configurations at once from
+# the top-level build directory.
+aggregate_targets = ('all', 'test', 'install', 'uninstall')
+
+
+class Configuration(object):
+    """A named set of variables (e.g. `CXXFLAGS`) and arguments (installation
+    directories and project-defined options) for one of the configurations
+    in a multi-configuration build directory."""
+
+    def __init__(self, name, variables=None, args=None):
+        if not isinstance(name, string_types) or not _name_ex.match(name):
+            raise ValueError('invalid configuration name {!r}'.format(name))
+        if name in aggregate_targets:
+            raise ValueError('configuration name {!r} is reserved'
+                             .format(name))
+
+        self.name = name
+        self.variables = dict(variables or {})
+        self.args = list(args or [])
+
+    @classmethod
+    def parse(cls, spec):
+        # A configuration is written as `NAME[:SETTINGS]`, where SETTINGS is a
+        # shell-quoted list of `VAR=VALUE` assignments followed by arguments,
+        # e.g. `asan: CXXFLAGS='-g -fsanitize=address' --prefix=/opt/asan`.
+        name, _, settings = spec.partition(':')
+        variables, args = {}, []
+        for i in shell.split(settings):
+            m = _var_ex.match(i)
+            if m and not args:
+                variables[m.group(1)] = m.group(2)
+            else:
+                args.append(i)
+        return cls(name.strip(), variables, args)
+
+    def __eq__(self, rhs):
+        return (type(self) == type(rhs) and self.name == rhs.name and
+                self.variables == rhs.variables and self.args == rhs.args)
+
+    def __ne__(self, rhs):
+        return not (self == rhs)
+
+    def __repr__(self):
+        return '<Configuration({!r})>'.format(self.name)
+
+
+def check_unique(configurations):
+    seen = set()
+    for i in configurations:
+        if i.name in seen:
+            raise ValueError('duplicate configuration {!r}'.format(i.name))
+        seen.add(i.name)
+
+
+def targets(build_inputs):
+    # `all` always exists, but the other aggregate targets only exist if
+    # there's something for them to do.
+    result = ['all']
+    if build_inputs['tests']:
+        result.append('test')
+    if build_inputs['install']:
+        result.extend(['install', 'uninstall'])
+    return result
+
+
+def target_name(name, target):
+    # In the top-level build directory, `NAME` builds the default targets of
+    # the configuration `NAME`, and `NAME/TARGET` builds one of its other
+    # aggregate targets.
+    return name if target == 'all' else '{}/{}'.format(name, target)
+
+
+class ConfigurationSet(object):
+    """The configurations (and the targets each of them has) in a
+    multi-configuration build directory."""
+
+    version = 1
+
+    def __init__(self, configurations=None):
+        self.configurations = OrderedDict(configurations or [])
+
+    def add(self, name, targets):
+        self.configurations[name] = list(targets)
+
+    def targets(self):
+        # Map each aggregate target to the configurations that can build it.
+        result = OrderedDict()
+        for target in aggregate_targets:
+            names = [name for name, targets in self.configurations.items()
+                     if target in targets]
+            if names:
+                result[target] = names
+        return result
+
+    def save(self, path):
+        with open(os.path.join(path, configs_file), 'w') as out:
+            json.dump({
+                'version': self.version,
+                'data': {
+                    'configurations': list(self.configurations.items()),
+                }
+            }, out)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(os.path.join(path, configs_file)) as inp:
+                state = json.load(inp)
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+
+        if state.get('version') != cls.version:
+            return None
+        data = state['data']
+        return cls(data['configurations'])
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, configs_file))
+
+    @staticmethod
+    def clear(path):
+        try:
+            os.remove(os.path.join(path, configs_file))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
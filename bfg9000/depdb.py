@@ -0,0 +1,115 @@
+import errno
+import os
+from six.moves import cStringIO as StringIO
+
+from .arguments import parser as argparse
+from .app_version import version
+from .depfixer import emit_deps
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+# Each shard is a Makefile made up of one block per object file, each starting
+# with a marker line so that we can replace it when the object is rebuilt.
+marker = '# depdb: '
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def _lock(shard):
+    if fcntl is None:  # pragma: no cover
+        return None
+    f = open(shard + '.lock', 'a')
+    fcntl.flock(f, fcntl.LOCK_EX)
+    return f
+
+
+def read_shard(stream):
+    blocks = {}
+    key = None
+    for line in stream:
+        if line.startswith(marker):
+            key = line[len(marker):].rstrip('\n')
+            blocks[key] = []
+        elif key is not None:
+            blocks[key].append(line)
+    return blocks
+
+
+def write_shard(stream, blocks):
+    # Write the blocks in sorted order so that the shard's contents don't
+    # depend on the order the objects were built in.
+    for key in sorted(blocks):
+        stream.write(marker + key + '\n')
+        for line in blocks[key]:
+            stream.write(line)
+
+
+def fix_deps(depfile):
+    # Like `bfg9000-depfixer`, add every dependency as a target so that Make
+    # doesn't complain if one is removed.
+    with open(depfile) as f:
+        data = f.read()
+    if data and not data.endswith('\n'):
+        data += '\n'
+
+    extra = StringIO()
+    emit_deps(StringIO(data), extra)
+    return data + extra.getvalue()
+
+
+def update(shard, target, deps):
+    _makedirs(os.path.dirname(shard) or '.')
+    lock = _lock(shard)
+    try:
+        try:
+            with open(shard) as f:
+                blocks = read_shard(f)
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            blocks = {}
+
+        blocks[target] = deps.splitlines(True)
+
+        # Write to a temporary file first so that an interrupted update can't
+        # leave a half-written shard for Make to read. We hold the lock, so no
+        # one else is using this temporary file.
+        tmp = shard + '.tmp'
+        with open(tmp, 'w') as f:
+            write_shard(f, blocks)
+        os.rename(tmp, shard)
+    finally:
+        if lock:
+            lock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='bfg9000-depdb',
+        description=('Merge the dependencies for TARGET from DEPFILE into ' +
+                     'SHARD, a Makefile holding the dependencies of many ' +
+                     'targets.')
+    )
+    parser.add_argument('--version', action='version',
+                        version='%(prog)s ' + version)
+    parser.add_argument('shard', metavar='SHARD',
+                        help='the dependency file to update')
+    parser.add_argument('target', metavar='TARGET',
+                        help='the target the dependencies belong to')
+    parser.add_argument('depfile', metavar='DEPFILE',
+                        help='the depfile generated by the compiler')
+    args = parser.parse_args()
+
+    try:
+        update(args.shard, args.target, fix_deps(args.depfile))
+    except Exception as e:
+        parser.error(e)
@@ -102,6 +102,44 @@ def emit_deps(instream, outstream):
         raise ParseError('unexpected end of file')
 
 
+def parse_deps(instream):
+    # Read the rules in a depfile as a list of (targets, deps) pairs.
+    rules = []
+    targets, deps = [], None
+    word = []
+
+    def flush():
+        if word:
+            name = ''.join(word).replace('\\ ', ' ')
+            (targets if deps is None else deps).append(name)
+            del word[:]
+
+    for tok, value in tokenize(instream.read()):
+        if tok == Token.char:
+            word.append(value)
+        elif tok == Token.space:
+            flush()
+        elif tok == Token.colon:
+            flush()
+            if deps is not None or not targets:
+                raise UnexpectedTokenError(tok)
+            deps = []
+        else:  # tok == Token.newline
+            flush()
+            if deps is not None:
+                rules.append((targets, deps))
+            elif targets:
+                raise UnexpectedTokenError(tok)
+            targets, deps = [], None
+
+    flush()
+    if deps is not None:
+        rules.append((targets, deps))
+    elif targets:
+        raise ParseError('unexpected end of file')
+    return rules
+
+
 def main():
     parser = argparse.ArgumentParser(
         prog='bfg9000-depfixer',
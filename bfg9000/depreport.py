@@ -0,0 +1,156 @@
+import os
+from collections import OrderedDict
+from six import iteritems
+from six.moves import cStringIO as StringIO
+
+from . import shell
+from .analyze import load_timings
+from .depfixer import parse_deps, ParseError
+
+
+def read_ninja_deps(stream):
+    # Read the output of `ninja -t deps`, which lists each target followed by
+    # its (indented) dependencies, with a blank line after each target.
+    deps = {}
+    target = None
+    for line in stream:
+        if line[:1] in (' ', '\t'):
+            if target is not None and line.strip():
+                deps[target].append(line.strip())
+            continue
+
+        name, sep, _ = line.partition(': #deps')
+        target = name if sep else None
+        if target is not None:
+            deps[target] = []
+    return deps
+
+
+def ninja_deps(builddir, ninja):
+    output = shell.execute(ninja + ['-C', builddir, '-t', 'deps'],
+                           stdout=shell.Mode.pipe, stderr=shell.Mode.devnull)
+    return read_ninja_deps(StringIO(output))
+
+
+def make_deps(builddir):
+    # The Make backend keeps the dependencies for each object in a depfile next
+    # to it, or in the shared depfiles in `.bfg_deps/` when using
+    # `MAKE_DEPDB_SHARDS`.
+    deps = {}
+    for base, dirs, files in os.walk(builddir):
+        in_depdb = os.path.basename(base) == '.bfg_deps'
+        for f in files:
+            if not (f.endswith('.d') or (in_depdb and f.endswith('.mk'))):
+                continue
+            with open(os.path.join(base, f)) as inp:
+                data = ''.join(i for i in inp if not i.startswith('#'))
+            try:
+                rules = parse_deps(StringIO(data))
+            except ParseError:
+                continue
+
+            for targets, target_deps in rules:
+                # Skip the empty rules that `bfg9000-depfixer` adds for each
+                # dependency.
+                if target_deps:
+                    for t in targets:
+                        deps[t] = target_deps
+    return deps
+
+
+def load_deps(builddir, backend, env_vars):
+    if backend == 'ninja':
+        from .backends.ninja.writer import command
+        return ninja_deps(builddir, command(env_vars))
+    elif backend == 'make':
+        return make_deps(builddir)
+    raise ValueError('unable to read dependencies for {}'.format(backend))
+
+
+class DepsReport(object):
+    """The objects that depend on each header (and so would be rebuilt if it
+    changed), along with how long they take to compile."""
+
+    def __init__(self, deps, timings, builddir, srcdir, threshold=25,
+                 system=False):
+        self.objects = len(deps)
+        self.threshold = threshold
+
+        def normalize(path):
+            return os.path.normpath(os.path.join(builddir, path))
+
+        def project_path(path):
+            for i in (srcdir, builddir):
+                rel = os.path.relpath(path, i)
+                if not rel.startswith(os.pardir + os.sep):
+                    return rel
+            return None
+
+        headers = {}
+        for target, target_deps in iteritems(deps):
+            # The first dependency is the source file being compiled.
+            for i in set(normalize(j) for j in target_deps[1:]):
+                headers.setdefault(i, []).append(target)
+
+        self.headers = []
+        for header, objects in iteritems(headers):
+            name = project_path(header)
+            if name is None:
+                if not system:
+                    continue
+                name = header
+
+            cost = sum((timings[i][1] - timings[i][0]) / 1000.0
+                       for i in objects if i in timings)
+            percent = 100.0 * len(objects) / self.objects
+            self.headers.append(OrderedDict([
+                ('header', name),
+                ('objects', len(objects)),
+                ('percent', percent),
+                ('cost', cost),
+                ('flagged', percent > threshold),
+            ]))
+        self.headers.sort(key=lambda i: (-i['cost'], -i['objects'],
+                                         i['header']))
+
+    @property
+    def flagged(self):
+        return [i for i in self.headers if i['flagged']]
+
+    def to_json(self):
+        return OrderedDict([
+            ('objects', self.objects),
+            ('threshold', self.threshold),
+            ('headers', self.headers),
+        ])
+
+    def format(self):
+        header = ['OBJECTS', 'PERCENT', 'COST', 'HEADER']
+        rows = [[str(i['objects']), '{:.1f}%'.format(i['percent']),
+                 '{:.2f}s'.format(i['cost']),
+                 ('* ' if i['flagged'] else '  ') + i['header']]
+                for i in self.headers]
+        widths = [max(len(r[i]) for r in [header] + rows)
+                  for i in range(len(header) - 1)]
+
+        lines = ['{} object(s), {} header(s)'.format(self.objects,
+                                                     len(self.headers))]
+        if rows:
+            lines.extend('  '.join([v.rjust(w) for v, w in zip(r, widths)] +
+                                   [('  ' if r is header else '') + r[-1]])
+                         for r in [header] + rows)
+
+        flagged = len(self.flagged)
+        if flagged:
+            lines.append('')
+            lines.append('* {} header(s) rebuild more than {:g}% of the '
+                         'objects when changed'.format(flagged,
+                                                      self.threshold))
+        return '\n'.join(lines)
+
+
+def report(builddir, env, threshold=25, system=False):
+    deps = load_deps(builddir, env.backend, env.variables)
+    timings = load_timings(builddir, env.backend)
+    return DepsReport(deps, timings, os.path.abspath(builddir),
+                      env.srcdir.string(), threshold, system)
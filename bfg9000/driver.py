@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 from six import iteritems
@@ -5,10 +6,20 @@ from six import iteritems
 from . import build
 from . import log
 from . import path
+from . import pgo
+from . import shell
+from .analyze import Analysis, BuildGraph, load_timings
 from .arguments import parser as argparse
+from .depreport import report as deps_report
 from .backends import list_backends
-from .environment import Environment, EnvVersionError
+from .environment import Environment, EnvVersionError, PgoSettings
 from .platforms.target import platform_info
+from .client import request as server_request
+from .configurations import check_unique, Configuration, ConfigurationSet
+from .configurations import targets as configuration_targets
+from .server import RequestStream, Server
+from .snapshot import Snapshot
+from .watch import make_watcher, Watch
 from .app_version import version
 
 logger = log.getLogger(__name__)
@@ -35,7 +46,37 @@ file in SRCDIR, and place them in BUILDDIR.
 refresh_desc = """
 Regenerate an existing set of build files needed to perform actual builds. This
 is run automatically if bfg9000 determines that the build files are out of
-date.
+date. If nothing that went into generating the build files has changed since
+they were last generated, they're left as-is.
+"""
+
+watch_desc = """
+Watch the source directory for changes and rebuild TARGETs (or the default
+targets) in an existing build directory whenever something changes. The build
+files are regenerated in-process, reusing the probed tools, when the build
+scripts or the directories searched by `find_files()` change.
+"""
+
+serve_desc = """
+Run a server in the background that keeps bfg9000 loaded, along with the tools
+and packages it found for each build directory, so that `bfg9000 refresh` (and
+so automatic regeneration of the build files) can be handed off to it instead
+of starting from scratch. If the server isn't running, `refresh` simply does
+the work itself.
+"""
+
+analyze_desc = """
+Analyze the last build in BUILDDIR (as recorded by `.ninja_log` for Ninja, or
+by running `make BFG9000_TIMING=1` for Make) to find its critical path and how
+much time was spent building each target, along with the line in the build
+script that defined it.
+"""
+
+depsreport_desc = """
+Report, for each header included by the objects in BUILDDIR, how many objects
+depend on it (and so would be rebuilt if it changed) and how long those
+objects took to compile in the last build, using the dependencies that the
+compiler recorded during the build.
 """
 
 env_desc = """
@@ -73,6 +114,146 @@ def environment_from_args(args, toolchain=None, extra_args=None):
     return env, backend
 
 
+def generate(env, backend):
+    # Remove any old snapshot first so that a failure below can't leave a
+    # snapshot claiming that the (old) build files are up to date.
+    builddir = env.builddir.string()
+    Snapshot.clear(builddir)
+
+    argv = build.parse_user_args(env)
+    build_inputs = build.execute_script(env, argv)
+    backend.write(env, build_inputs)
+
+    filepath = getattr(backend, 'filepath', None)
+    if filepath:
+        outputs = ([filepath] +
+                   [i.path for i in build_inputs['regenerate'].outputs])
+        optspath = path.Path(build.optsfile, path.Root.srcdir)
+        Snapshot.take(env, build_inputs, outputs, optspath).save(builddir)
+    return build_inputs
+
+
+def generate_configurations(env, backend, configurations, force=True):
+    # Generate each configuration in its own subdirectory, sharing everything
+    # we learn about the system between them, and then write the top-level
+    # build file to build them all.
+    builddir = env.builddir.string()
+    Snapshot.clear(builddir)
+    old = ConfigurationSet.load(builddir) or ConfigurationSet()
+    result = ConfigurationSet()
+
+    for name, config_env in configurations:
+        config_env.share_probes(env)
+        config_dir = config_env.builddir.string()
+        if not force and name in old.configurations:
+            snapshot = Snapshot.load(config_dir)
+            if snapshot and snapshot.current(config_env):
+                logger.debug('build files for {!r} are up to date'
+                             .format(name))
+                result.add(name, old.configurations[name])
+                continue
+
+        logger.info('generating configuration {!r}'.format(name))
+        build_inputs = generate(config_env, backend)
+        result.add(name, configuration_targets(build_inputs))
+
+    write_configurations(env, backend, result)
+
+
+def write_configurations(env, backend, configurations):
+    # The top-level build file regenerates itself (and any out-of-date
+    # configurations) when the build scripts change, just like a regular
+    # build directory.
+    bfgpath = path.Path(build.bfgfile, path.Root.srcdir)
+    optspath = path.Path(build.optsfile, path.Root.srcdir)
+    deps = [bfgpath] + ([optspath] if path.exists(optspath, env.base_dirs)
+                        else [])
+    backend.write_configurations(env, bfgpath.string(env.base_dirs),
+                                 configurations, deps)
+    configurations.save(env.builddir.string())
+
+
+def update_parent_configuration(env, backend, build_inputs):
+    # If this build directory is one configuration of a multi-configuration
+    # build, make sure the top-level build file knows about its targets.
+    builddir = env.builddir.string()
+    parent_dir, name = os.path.split(os.path.normpath(builddir))
+    configurations = ConfigurationSet.load(parent_dir)
+    if not configurations or name not in configurations.configurations:
+        return
+
+    targets = configuration_targets(build_inputs)
+    if configurations.configurations[name] == targets:
+        return
+    logger.info('updating top-level build files for {!r}'.format(name))
+    configurations.add(name, targets)
+    write_configurations(Environment.load(parent_dir), backend,
+                         configurations)
+
+
+def regenerate(env, backend, force=False):
+    # Regenerate an existing build directory: either all the (out-of-date)
+    # configurations of a multi-configuration build, or a single build
+    # directory, updating the top-level build files of any multi-configuration
+    # build it's part of.
+    configurations = ConfigurationSet.load(env.builddir.string())
+    if configurations:
+        generate_configurations(env, backend, (
+            (i, Environment.load(os.path.join(env.builddir.string(), i)))
+            for i in configurations.configurations
+        ), force=force)
+        return
+
+    build_inputs = generate(env, backend)
+    update_parent_configuration(env, backend, build_inputs)
+
+
+def configuration_arg(string):
+    try:
+        return Configuration.parse(string)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def configuration_environments(args, toolchain, extra, configurations):
+    # Each configuration can set its own installation directories; any other
+    # arguments are passed along to options.bfg.
+    parser = argparse.ArgumentParser(add_help=False)
+    add_install_args(parser)
+
+    for i in configurations:
+        config_args, config_extra = parser.parse_known_args(
+            i.args, argparse.Namespace(**vars(args))
+        )
+        config_args.builddir = args.builddir.append(i.name)
+        if not path.exists(config_args.builddir):
+            os.mkdir(config_args.builddir.string())
+
+        env = environment_from_args(config_args, toolchain,
+                                    extra + config_extra)[0]
+        env.variables.update(i.variables)
+        env.save(config_args.builddir.string())
+        yield i.name, env
+
+
+def pgo_environment(args, toolchain, extra, env):
+    # A PGO build directory holds the optimized build, with the instrumented
+    # build in a subdirectory; both share the directory holding the profile.
+    profile_dir = env.builddir.append(pgo.profile_dir)
+    train = shell.split(args.pgo_train) if args.pgo_train else None
+    env.pgo = PgoSettings('use', profile_dir, train)
+
+    pgo_args = argparse.Namespace(**vars(args))
+    pgo_args.builddir = args.builddir.append(pgo.generate_dir)
+    if not path.exists(pgo_args.builddir):
+        os.mkdir(pgo_args.builddir.string())
+
+    pgo_env = environment_from_args(pgo_args, toolchain, extra)[0]
+    pgo_env.pgo = PgoSettings('generate', profile_dir, train)
+    pgo_env.save(pgo_args.builddir.string())
+    return pgo_env
+
+
 def directory_pair(srcname, buildname):
     class DirectoryPair(argparse.Action):
         def __call__(self, parser, namespace, values, option_string=None):
@@ -148,6 +329,25 @@ def add_configure_args(parser):
     build.add_argument('--static', action='enable', default=False,
                        help='build static libraries (default: disabled)')
 
+    build.add_argument('--pgo', action='enable', default=False,
+                       help=('build with profile-guided optimization ' +
+                             '(default: disabled)'))
+    build.add_argument('--pgo-train', metavar='COMMAND',
+                       help=('the command to run in the instrumented build ' +
+                             'to train it for profile-guided optimization ' +
+                             '(default: run the tests)'))
+
+    build.add_argument('--config', metavar='NAME[:SETTINGS]',
+                       type=configuration_arg, action='append', default=[],
+                       help=('generate a configuration named NAME in a ' +
+                             'subdirectory of the build directory; may be ' +
+                             'specified multiple times'))
+
+    install = parser.add_argument_group('installation arguments')
+    add_install_args(install)
+
+
+def add_install_args(parser):
     install_dirs = platform_info().install_dirs
     common_path_help = 'installation path for {} (default: %(default)r)'
     path_help = {
@@ -159,12 +359,11 @@ def add_configure_args(parser):
         'includedir': common_path_help.format('headers'),
     }
 
-    install = parser.add_argument_group('installation arguments')
     for root in path.InstallRoot:
         name = '--' + root.name.replace('_', '-')
-        install.add_argument(name, type=argparse.Directory(), metavar='PATH',
-                             default=install_dirs[root],
-                             help=path_help[root.name])
+        parser.add_argument(name, type=argparse.Directory(), metavar='PATH',
+                            default=install_dirs[root],
+                            help=path_help[root.name])
 
 
 def configure(parser, subparser, args, extra):
@@ -186,11 +385,32 @@ def configure(parser, subparser, args, extra):
         os.mkdir(args.builddir.string())
 
     env, backend = environment_from_args(args, toolchain, extra)
+    pgo_env = None
+    if args.pgo:
+        if args.config:
+            subparser.error("--enable-pgo can't be used with --config")
+        pgo_env = pgo_environment(args, toolchain, extra, env)
     env.save(args.builddir.string())
     try:
-        argv = build.parse_user_args(env)
-        build_inputs = build.execute_script(env, argv)
-        backend.write(env, build_inputs)
+        configurations = args.config or build.user_configurations(env)
+        if not configurations:
+            ConfigurationSet.clear(args.builddir.string())
+            if pgo_env:
+                pgo_env.share_probes(env)
+                generate(pgo_env, backend)
+            generate(env, backend)
+            return
+        elif pgo_env:
+            raise ValueError("profile-guided optimization can't be used " +
+                             'with multiple configurations')
+
+        if not hasattr(backend, 'write_configurations'):
+            subparser.error("the {} backend doesn't support multiple "
+                            'configurations'.format(args.backend))
+        check_unique(configurations)
+        generate_configurations(env, backend, configuration_environments(
+            args, toolchain, extra, configurations
+        ))
     except Exception as e:
         logger.exception(e)
         return 1
@@ -206,15 +426,127 @@ def refresh(parser, subparser, args, extra):
 
     try:
         env = Environment.load(args.builddir.string())
-
         backend = list_backends()[env.backend]
-        argv = build.parse_user_args(env)
-        build_inputs = build.execute_script(env, argv)
-        backend.write(env, build_inputs)
+
+        configurations = ConfigurationSet.load(args.builddir.string())
+        if not configurations and not args.force:
+            snapshot = Snapshot.load(args.builddir.string())
+            if snapshot and snapshot.current(env):
+                logger.debug('build files are up to date')
+                snapshot.touch()
+                return
+
+        regenerate(env, backend, force=args.force)
     except Exception as e:
         return handle_reload_exception(e, suggest_rerun=True)
 
 
+def watch(parser, subparser, args, extra):
+    if extra:
+        subparser.error('unrecognized arguments: {}'.format(' '.join(extra)))
+
+    if build.is_srcdir(args.builddir):
+        subparser.error('build directory must not contain a {} file'
+                        .format(build.bfgfile))
+
+    try:
+        env = Environment.load(args.builddir.string())
+        backend = list_backends()[env.backend]
+    except Exception as e:
+        return handle_reload_exception(e)
+
+    if not hasattr(backend, 'command'):
+        subparser.error("the {} backend doesn't support watching"
+                        .format(env.backend))
+    try:
+        session = Watch(env, backend, args.targets, regenerate)
+    except IOError as e:
+        logger.error(str(e))
+        return 1
+
+    watcher = make_watcher(env.srcdir.string(), [env.builddir.string()],
+                           poll=args.poll)
+    try:
+        session.run(watcher, args.delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+def serve(parser, subparser, args, extra):
+    if extra:
+        subparser.error('unrecognized arguments: {}'.format(' '.join(extra)))
+
+    if args.stop:
+        if server_request({'command': 'stop'}) is None:
+            logger.error('no server running')
+            return 1
+        return
+
+    try:
+        Server(regenerate, args.log_stream).serve(
+            idle_timeout=args.idle_timeout
+        )
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.exception(e)
+        return 1
+
+
+def analyze(parser, subparser, args, extra):
+    if extra:
+        subparser.error('unrecognized arguments: {}'.format(' '.join(extra)))
+
+    builddir = args.builddir.string()
+    try:
+        graph = BuildGraph.load(builddir)
+        if graph is None:
+            logger.error('no build graph found; try refreshing the build ' +
+                         'directory first')
+            return 1
+
+        timings = load_timings(builddir, graph.backend)
+        if not timings:
+            logger.error('no build log found; try building first')
+            return 1
+
+        analysis = Analysis(graph, timings)
+        if args.json:
+            print(json.dumps(analysis.to_json(), indent=2))
+        else:
+            print(analysis.format())
+    except Exception as e:
+        logger.exception(e)
+        return 1
+
+
+def depsreport(parser, subparser, args, extra):
+    if extra:
+        subparser.error('unrecognized arguments: {}'.format(' '.join(extra)))
+
+    builddir = args.builddir.string()
+    try:
+        env = Environment.load(builddir)
+    except Exception as e:
+        return handle_reload_exception(e)
+
+    try:
+        result = deps_report(builddir, env, args.threshold, args.system)
+        if not result.objects:
+            logger.error('no dependencies found; try building first')
+            return 1
+
+        if args.json:
+            print(json.dumps(result.to_json(), indent=2))
+        else:
+            print(result.format())
+    except Exception as e:
+        logger.exception(e)
+        return 1
+
+
 def env(parser, subparser, args, extra):
     if extra:
         subparser.error('unrecognized arguments: {}'.format(' '.join(extra)))
@@ -270,11 +602,77 @@ def main():
         'refresh', description=refresh_desc, help='regenerate build files'
     )
     refresh_p.set_defaults(func=refresh, parser=refresh_p)
+    refresh_p.add_argument('-f', '--force', action='store_true',
+                           help='regenerate the build files even if nothing ' +
+                           'has changed')
     refresh_p.add_argument('builddir',
                            type=argparse.Directory(must_exist=True),
                            metavar='BUILDDIR', nargs='?', default='.',
                            help='build directory')
 
+    watch_p = subparsers.add_parser(
+        'watch', description=watch_desc,
+        help='rebuild whenever the source directory changes'
+    )
+    watch_p.set_defaults(func=watch, parser=watch_p)
+    watch_p.add_argument('--delay', metavar='SECONDS', type=float,
+                         default=0.1,
+                         help=('how long to wait for changes to settle ' +
+                               'before building (default: %(default)s)'))
+    watch_p.add_argument('--poll', action='store_true',
+                         help='poll for changes instead of using inotify')
+    watch_p.add_argument('builddir',
+                         type=argparse.Directory(must_exist=True),
+                         metavar='BUILDDIR', nargs='?', default='.',
+                         help='build directory')
+    watch_p.add_argument('targets', metavar='TARGET', nargs='*',
+                         help='targets to build')
+
+    serve_p = subparsers.add_parser(
+        'serve', description=serve_desc,
+        help='keep bfg9000 running to make refreshing faster'
+    )
+    serve_p.set_defaults(func=serve, parser=serve_p,
+                         log_stream=RequestStream())
+    serve_p.add_argument('--idle-timeout', metavar='SECONDS', type=float,
+                         default=3600,
+                         help=('exit after being idle this long ' +
+                               '(default: %(default)s)'))
+    serve_p.add_argument('--stop', action='store_true',
+                         help='stop the running server')
+
+    analyze_p = subparsers.add_parser(
+        'analyze', description=analyze_desc,
+        help='find the targets that slow the build down'
+    )
+    analyze_p.set_defaults(func=analyze, parser=analyze_p)
+    analyze_p.add_argument('--json', action='store_true',
+                           help='print the results as JSON')
+    analyze_p.add_argument('builddir',
+                           type=argparse.Directory(must_exist=True),
+                           metavar='BUILDDIR', nargs='?', default='.',
+                           help='build directory')
+
+    depsreport_p = subparsers.add_parser(
+        'deps-report', description=depsreport_desc,
+        help='find the headers that cause the most rebuilding'
+    )
+    depsreport_p.set_defaults(func=depsreport, parser=depsreport_p)
+    depsreport_p.add_argument('--threshold', metavar='PERCENT', type=float,
+                              default=25,
+                              help=('flag headers that rebuild more than ' +
+                                    'this percent of the objects (default: ' +
+                                    '%(default)s)'))
+    depsreport_p.add_argument('--system', action='store_true',
+                              help=('include headers outside of the source ' +
+                                    'and build directories'))
+    depsreport_p.add_argument('--json', action='store_true',
+                              help='print the results as JSON')
+    depsreport_p.add_argument('builddir',
+                              type=argparse.Directory(must_exist=True),
+                              metavar='BUILDDIR', nargs='?', default='.',
+                              help='build directory')
+
     env_p = subparsers.add_parser(
         'env', description=env_desc, help='print environment'
     )
@@ -292,7 +690,8 @@ def main():
     help_p.set_defaults(func=help, parser=help_p)
 
     args, extra = parser.parse_known_args()
-    log.init(args.color, debug=args.debug, warn_once=args.warn_once)
+    log.init(args.color, debug=args.debug, warn_once=args.warn_once,
+             stream=getattr(args, 'log_stream', None))
 
     return args.func(parser, args.parser, args, extra)
 
@@ -3,7 +3,7 @@ import os
 import sys
 import warnings
 from collections import namedtuple
-from six import iteritems
+from six import iteritems, string_types
 
 from . import platforms
 from . import tools
@@ -11,20 +11,32 @@ from . import shell
 from .backends import list_backends
 from .file_types import Executable, Node
 from .iterutils import first, isiterable, listify
+from .languages import known_langs
 from .log import UserDeprecationWarning
 from .path import InstallRoot, Path, Root
 from .tools.common import Command
 from .versioning import Version
 
 LibraryMode = namedtuple('LibraryMode', ['shared', 'static'])
+PgoSettings = namedtuple('PgoSettings', ['mode', 'profile_dir', 'train'])
 
 
 class EnvVersionError(RuntimeError):
     pass
 
 
+def _flags_vars():
+    result = {'CPPFLAGS', 'LDFLAGS', 'LDLIBS'}
+    for lang in known_langs:
+        try:
+            result.add(lang.var('cflags'))
+        except ValueError:
+            pass
+    return result
+
+
 class Environment(object):
-    version = 12
+    version = 13
     envfile = '.bfg_environ'
 
     Mode = shell.Mode
@@ -34,10 +46,13 @@ class Environment(object):
         tools.init()
         env.__builders = {}
         env.__tools = {}
+        env.__probes = []
+        env.__probe_cache = None
         return env
 
     def __init__(self, bfgdir, backend, backend_version, srcdir, builddir,
-                 install_dirs, library_mode, extra_args, target_platform=None):
+                 install_dirs, library_mode, extra_args, target_platform=None,
+                 pgo=None):
         self.bfgdir = bfgdir
         self.backend = backend
         self.backend_version = backend_version
@@ -49,6 +64,7 @@ class Environment(object):
         self.builddir = builddir
         self.install_dirs = install_dirs
         self.library_mode = LibraryMode(*library_mode)
+        self.pgo = PgoSettings(*pgo) if pgo else None
 
         self.extra_args = extra_args
 
@@ -83,6 +99,41 @@ class Environment(object):
             self.__tools[name] = tools.get_tool(self, name)
         return self.__tools[name]
 
+    @property
+    def probes(self):
+        return self.__probes
+
+    def add_probe(self, path):
+        # Record a file or directory outside the project that the
+        # configuration depends on (e.g. a compiler we ran or a directory we
+        # searched for a library) so that refreshing the build can tell if it
+        # changed.
+        if path not in self.__probes:
+            self.__probes.append(path)
+
+    @property
+    def probe_cache(self):
+        return self.__probe_cache
+
+    def share_probes(self, other):
+        # Let this environment reuse the results of looking at the system
+        # (running tools and scanning the source directory) from `other`, e.g.
+        # when generating several configurations of the same project at once.
+        if other.__probe_cache is None:
+            other.__probe_cache = {}
+        self.__probe_cache = other.__probe_cache
+
+    def _probe_key(self, args, env_vars, kwargs):
+        # Flags variables only matter to bfg9000 itself, and any flags passed
+        # to a tool are already part of its arguments.
+        flags = _flags_vars()
+        if not isinstance(args, string_types):
+            args = [i.string(self.base_dirs) if isinstance(i, Path) else i
+                    for i in args]
+        return repr((args, sorted((k, v) for k, v in iteritems(env_vars)
+                                  if k not in flags),
+                     sorted(iteritems(kwargs))))
+
     def _runner(self, lang):
         try:
             return self.builder(lang).runner
@@ -125,9 +176,31 @@ class Environment(object):
 
         if not kwargs.get('shell', False):
             args = Command.convert_args(args, lambda x: x.command)
-
-        return shell.execute(args, env=env_vars, base_dirs=self.base_dirs,
-                             **kwargs)
+            if args and isinstance(args[0], Path):
+                self.add_probe(args[0].string(self.base_dirs))
+            elif args and isinstance(args[0], string_types):
+                self.add_probe(args[0])
+
+        # Only cache commands whose output we're looking at; anything else is
+        # being run for its side effects.
+        cache = self.__probe_cache
+        if cache is None or not any(kwargs.get(i) == shell.Mode.pipe
+                                    for i in ('stdout', 'stderr')):
+            return shell.execute(args, env=env_vars, base_dirs=self.base_dirs,
+                                 **kwargs)
+
+        key = self._probe_key(args, env_vars, kwargs)
+        if key not in cache:
+            try:
+                cache[key] = (True, shell.execute(
+                    args, env=env_vars, base_dirs=self.base_dirs, **kwargs
+                ))
+            except (OSError, shell.CalledProcessError) as e:
+                cache[key] = (False, e)
+        ok, result = cache[key]
+        if not ok:
+            raise result
+        return result
 
     def run(self, args, lang=None, *posargs, **kwargs):
         return self.execute(self.run_arguments(args, lang), *posargs, **kwargs)
@@ -149,6 +222,8 @@ class Environment(object):
                         for k, v in iteritems(self.install_dirs)
                     },
                     'library_mode': self.library_mode,
+                    'pgo': [self.pgo.mode, self.pgo.profile_dir.to_json(),
+                            self.pgo.train] if self.pgo else None,
                     'extra_args': self.extra_args,
                     'variables': self.variables,
                 }
@@ -209,6 +284,10 @@ class Environment(object):
             platform = data.pop('platform')
             data['host_platform'] = data['target_platform'] = platform
 
+        # v13 adds profile-guided optimization.
+        if version < 13:
+            data['pgo'] = None
+
         # Now that we've upgraded, initialize the Environment object.
         env = Environment.__new__(Environment)
 
@@ -235,6 +314,10 @@ class Environment(object):
             for k, v in iteritems(data['install_dirs'])
         }
         env.library_mode = LibraryMode(*data['library_mode'])
+        env.pgo = None
+        if data['pgo']:
+            mode, profile_dir, train = data['pgo']
+            env.pgo = PgoSettings(mode, Path.from_json(profile_dir), train)
 
         if save_on_upgrade and version < cls.version:
             env.save(path)
@@ -123,6 +123,12 @@ class ObjectFile(Binary):
     pass
 
 
+# The debug info split out of an object file, e.g. a `.dwo` file from
+# `-gsplit-dwarf`.
+class DebugInfoFile(File):
+    private = True
+
+
 # This is used by JVM languages to hold a list of all the object files
 # generated by a particular source file's compilation.
 class ObjectFileList(ObjectFile):
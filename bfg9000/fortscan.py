@@ -0,0 +1,207 @@
+import os
+import re
+from collections import OrderedDict
+from six.moves import cStringIO as StringIO
+
+from .arguments import parser as argparse
+from .app_version import version
+
+# These patterns work for both free- and fixed-form source, since fixed-form
+# comment lines start with a character other than a space in the first column.
+_module_ex = re.compile(
+    r'^\s*module\s+(?!(?:procedure|function|subroutine|pure|impure|elemental|'
+    r'recursive)\b)(\w+)\s*(?:!.*)?$', re.IGNORECASE
+)
+_submodule_ex = re.compile(
+    r'^\s*submodule\s*\(\s*(\w+)\s*(?::\s*(\w+)\s*)?\)\s*(\w+)', re.IGNORECASE
+)
+_use_ex = re.compile(
+    r'^\s*use\b\s*(?:,\s*(\w+)\s*)?(?:::)?\s*(\w+)', re.IGNORECASE
+)
+_include_ex = re.compile(r'''^\s*include\s*(['"])(.+?)\1''', re.IGNORECASE)
+
+
+class Scan(object):
+    def __init__(self, provides=None, requires=None):
+        self.provides = provides or []
+        self.requires = requires or []
+
+    def __eq__(self, rhs):
+        return (self.provides == rhs.provides and
+                self.requires == rhs.requires)
+
+    def __ne__(self, rhs):
+        return not (self == rhs)
+
+    def __repr__(self):
+        return '<Scan(provides={!r}, requires={!r})>'.format(
+            self.provides, self.requires
+        )
+
+
+def _add(items, name):
+    if name not in items:
+        items.append(name)
+
+
+def scan(stream, result=None, directory=None, seen=None):
+    # Module names are case-insensitive; Fortran compilers name the module
+    # files after the lower-cased name. Submodules are named `parent@child`,
+    # matching the `.smod` files gfortran generates for them.
+    result = Scan() if result is None else result
+    seen = set() if seen is None else seen
+    for line in stream:
+        m = _module_ex.match(line)
+        if m:
+            _add(result.provides, m.group(1).lower())
+            continue
+
+        m = _submodule_ex.match(line)
+        if m:
+            parent = m.group(1).lower()
+            _add(result.requires, parent)
+            if m.group(2):
+                _add(result.requires, parent + '@' + m.group(2).lower())
+            _add(result.provides, parent + '@' + m.group(3).lower())
+            continue
+
+        m = _use_ex.match(line)
+        if m:
+            if (m.group(1) or '').lower() != 'intrinsic':
+                _add(result.requires, m.group(2).lower())
+            continue
+
+        m = _include_ex.match(line)
+        if m and directory is not None:
+            path = os.path.join(directory, m.group(2))
+            if path not in seen and os.path.exists(path):
+                seen.add(path)
+                with open(path) as f:
+                    scan(f, result, os.path.dirname(path), seen)
+
+    # A file that defines a module and uses it (e.g. from a submodule) doesn't
+    # need to wait for itself.
+    result.requires = [i for i in result.requires if i not in result.provides]
+    return result
+
+
+def scan_file(filename):
+    with open(filename) as f:
+        return scan(f, directory=os.path.dirname(filename))
+
+
+def module_file(name, module_dir=None):
+    filename = name + ('.smod' if '@' in name else '.mod')
+    return os.path.join(module_dir, filename) if module_dir else filename
+
+
+def resolve(scans):
+    # Map each module to the object that provides it; modules that no object
+    # provides (e.g. intrinsic or external modules) are left out, since the
+    # build can't do anything about them anyway.
+    providers = {}
+    for obj, result in scans.items():
+        for i in result.provides:
+            providers.setdefault(i, obj)
+
+    resolved = OrderedDict()
+    for obj, result in scans.items():
+        provides = [i for i in result.provides if providers[i] == obj]
+        requires = [i for i in result.requires
+                    if i in providers and providers[i] != obj]
+        resolved[obj] = (provides, [(i, providers[i]) for i in requires])
+    return resolved
+
+
+def ninja_escape(path):
+    return re.sub(r'([$ :\n])', r'$\1', path)
+
+
+def make_escape(path):
+    return re.sub(r'([\\ #:])', r'\\\1', path.replace('$', '$$'))
+
+
+def emit_ninja(out, resolved, module_dir=None):
+    out.write('ninja_dyndep_version = 1\n')
+    for obj, (provides, requires) in resolved.items():
+        # Ninja requires every build statement using this file to be listed.
+        out.write('build ' + ninja_escape(obj))
+        if provides:
+            out.write(' |' + ''.join(
+                ' ' + ninja_escape(module_file(i, module_dir))
+                for i in provides
+            ))
+        out.write(': dyndep')
+        if requires:
+            out.write(' |' + ''.join(
+                ' ' + ninja_escape(module_file(i, module_dir))
+                for i, _ in requires
+            ))
+        out.write('\n')
+
+
+def emit_make(out, resolved, module_dir=None):
+    # Make can't see the module files, so just order each object after the
+    # objects that provide the modules it uses.
+    for obj, (provides, requires) in resolved.items():
+        for i in sorted(set(provider for _, provider in requires)):
+            out.write('{}: {}\n'.format(make_escape(obj), make_escape(i)))
+
+
+def write_if_changed(filename, data, touch=False):
+    try:
+        with open(filename) as f:
+            if f.read() == data:
+                if touch:
+                    os.utime(filename, None)
+                return False
+    except IOError:
+        pass
+
+    with open(filename, 'w') as f:
+        f.write(data)
+    return True
+
+
+_formats = {'ninja': emit_ninja, 'make': emit_make}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='bfg9000-fortscan',
+        description=('Scan Fortran sources for the modules they provide ' +
+                     'and use, and write the dependencies between their ' +
+                     'object files to OUTPUT.')
+    )
+    parser.add_argument('--version', action='version',
+                        version='%(prog)s ' + version)
+    parser.add_argument('-f', '--format', metavar='FMT', required=True,
+                        choices=sorted(_formats),
+                        help='format of output file (one of: %(choices)s)')
+    parser.add_argument('-o', '--output', metavar='FILE', required=True,
+                        help='the file to write the dependencies to')
+    parser.add_argument('-J', '--module-dir', metavar='DIR',
+                        help='the directory module files are written to')
+    parser.add_argument('files', metavar='OBJECT SOURCE', nargs='*',
+                        help='pairs of object files and their sources')
+    args = parser.parse_args()
+
+    if len(args.files) % 2:
+        parser.error('each object must be followed by its source')
+
+    try:
+        scans = OrderedDict(
+            (args.files[i], scan_file(args.files[i + 1]))
+            for i in range(0, len(args.files), 2)
+        )
+        out = StringIO()
+        _formats[args.format](out, resolve(scans), args.module_dir)
+
+        # Only touch the output if it changed so that Ninja can skip
+        # reloading it (and rebuilding everything after it). Make, on the
+        # other hand, needs the file to be newer than the sources.
+        write_if_changed(args.output, out.getvalue(),
+                         touch=args.format == 'make')
+    except (IOError, OSError) as e:
+        parser.exit(1, '{}: error: {}\n'.format(parser.prog, e))
+    return 0
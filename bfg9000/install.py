@@ -0,0 +1,193 @@
+import errno
+import hashlib
+import json
+import os
+import stat
+import subprocess
+import sys
+
+from .arguments import parser as argparse
+from .app_version import version
+
+_chunk_size = 1024 * 1024
+
+
+def _hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _lstat(path):
+    try:
+        return os.lstat(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return None
+
+
+def _sync_mtime(src_stat, dst):
+    dst_stat = os.stat(dst)
+    os.utime(dst, (dst_stat.st_atime, src_stat.st_mtime))
+
+
+def _stamp_file(state_dir, dst):
+    name = hashlib.sha1(os.path.abspath(dst).encode('utf-8')).hexdigest()
+    return os.path.join(state_dir, name)
+
+
+def _fingerprint(st):
+    return [st.st_size, st.st_mtime]
+
+
+def _read_stamp(state_dir, dst):
+    try:
+        with open(_stamp_file(state_dir, dst)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def stamp(src, dst, state_dir):
+    """Record that `dst` is the installed (and possibly since modified, e.g. by
+    patching its rpath) version of `src`."""
+    src_stat, dst_stat = os.stat(src), os.stat(dst)
+    if not os.path.exists(state_dir):
+        os.makedirs(state_dir)
+    with open(_stamp_file(state_dir, dst), 'w') as f:
+        json.dump({'src': _fingerprint(src_stat) + [_hash(src)],
+                   'dst': _fingerprint(dst_stat)}, f)
+
+
+def stamped(src, dst, state_dir):
+    """Check if `dst` is still what we recorded after installing `src`."""
+    data = _read_stamp(state_dir, dst)
+    src_stat, dst_stat = _lstat(src), _lstat(dst)
+    if data is None or src_stat is None or dst_stat is None:
+        return False
+    if data['dst'] != _fingerprint(dst_stat):
+        return False
+
+    src_size, src_mtime, src_hash = data['src']
+    if src_size != src_stat.st_size:
+        return False
+    return (src_mtime == src_stat.st_mtime or
+            _hash(src) == src_hash)
+
+
+def up_to_date(src, dst, state_dir=None):
+    # Files changed after being installed (e.g. by patching their rpaths) will
+    # never match their sources, so check if we've recorded installing them
+    # first.
+    if state_dir and stamped(src, dst, state_dir):
+        return True
+
+    src_stat, dst_stat = _lstat(src), _lstat(dst)
+    if src_stat is None or dst_stat is None:
+        return False
+
+    if stat.S_ISLNK(src_stat.st_mode):
+        return (stat.S_ISLNK(dst_stat.st_mode) and
+                os.readlink(src) == os.readlink(dst))
+    if not (stat.S_ISREG(src_stat.st_mode) and
+            stat.S_ISREG(dst_stat.st_mode)):
+        return False
+
+    # Check the cheap things first: files of different sizes can't be the
+    # same, and files we installed ourselves have the same mtime as their
+    # source. Otherwise, fall back to comparing the contents.
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+    if src_stat.st_mtime == dst_stat.st_mtime:
+        return True
+    if _hash(src) != _hash(dst):
+        return False
+
+    _sync_mtime(src_stat, dst)
+    return True
+
+
+def install(command, sources, dest, directory=None, full_name=False,
+            force=False, state_dir=None):
+    def paths(src):
+        return (os.path.join(directory or '.', src),
+                os.path.join(dest, src if full_name else
+                             os.path.basename(src)))
+
+    if not force:
+        sources = [i for i in sources
+                   if not up_to_date(*paths(i), state_dir=state_dir)]
+    if not sources:
+        return 0
+
+    args = list(command)
+    if directory:
+        args.extend(['-C', directory])
+    result = subprocess.call(args + sources + [dest])
+    if result == 0:
+        for src, dst in (paths(i) for i in sources):
+            src_stat = _lstat(src)
+            if src_stat and stat.S_ISREG(src_stat.st_mode):
+                _sync_mtime(src_stat, dst)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='bfg9000-install',
+        description=('Install SOURCEs into DEST by running COMMAND ' +
+                     '(typically `doppel -ip`) as ' +
+                     '`COMMAND [-C DIR] SOURCE... DEST`, skipping any ' +
+                     'sources that are already installed.')
+    )
+    parser.add_argument('--version', action='version',
+                        version='%(prog)s ' + version)
+    parser.add_argument('-C', '--directory', metavar='DIR',
+                        help='directory the sources are relative to')
+    parser.add_argument('-N', '--full-name', action='store_true',
+                        help='install sources using their full names')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='install sources even if they are unchanged')
+    parser.add_argument('-d', '--state-dir', default='.bfg_install',
+                        help=('directory to record installed files in ' +
+                              '(default: %(default)s)'))
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--check', nargs=2, metavar=('SOURCE', 'FILE'),
+                      help=('exit successfully if FILE was recorded as ' +
+                            'installed from SOURCE and is unchanged since'))
+    mode.add_argument('--stamp', nargs=2, metavar=('SOURCE', 'FILE'),
+                      help='record that FILE was installed from SOURCE')
+    parser.add_argument('dest', metavar='DEST', nargs='?',
+                        help='the directory to install into')
+    parser.add_argument('sources', metavar='SOURCE', nargs='*',
+                        help='the files to install')
+
+    argv = sys.argv[1:]
+    try:
+        split = argv.index('--')
+    except ValueError:
+        split = len(argv)
+    args = parser.parse_args(argv[:split])
+    command = argv[split + 1:]
+    force = (args.force or
+             os.getenv('BFG9000_INSTALL_FORCE') in ('1', 'true'))
+
+    try:
+        if args.check:
+            return int(force or not stamped(*args.check,
+                                            state_dir=args.state_dir))
+        elif args.stamp:
+            stamp(*args.stamp, state_dir=args.state_dir)
+            return 0
+
+        if not command:
+            parser.error('command required')
+        if args.dest is None:
+            parser.error('destination required')
+        return install(command, args.sources, args.dest, args.directory,
+                       args.full_name, force, args.state_dir)
+    except (IOError, OSError) as e:
+        parser.exit(1, '{}: error: {}\n'.format(parser.prog, e))
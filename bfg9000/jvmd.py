@@ -0,0 +1,413 @@
+import errno
+import hashlib
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from io import StringIO
+
+from .arguments import parser as argparse
+from .app_version import version
+from .jvmoutput import filter_output
+from .shell import which
+
+# The compile server itself. It's kept as a source string so that we can build
+# it on demand with the user's own javac; this way, we only need a JDK to use
+# the daemon. The protocol is line-based over a loopback socket:
+#
+#   client: <token> "\n" ("compile" | "stop") "\n"
+#           <cwd> "\n" <argc> "\n" <arg> "\n" ...
+#   server: <exit status> "\n" <compiler output>...
+#
+# An exit status of "refused" means the client should run the compiler itself
+# (e.g. because the request came from a different build directory).
+_server_src = r"""
+import java.io.*;
+import java.net.*;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.util.concurrent.atomic.AtomicInteger;
+import javax.tools.*;
+
+public class BfgJvmd {
+    static final AtomicInteger active = new AtomicInteger();
+    static volatile long lastUsed = System.currentTimeMillis();
+    static volatile boolean running = true;
+
+    public static void main(String[] args) throws Exception {
+        final File stateDir = new File(args[0]);
+        final String token = args[1];
+        final long idle = Long.parseLong(args[2]) * 1000;
+        final String compilerId = args[3];
+        final String cwd = new File(".").getCanonicalPath();
+        final JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+        if (compiler == null)
+            System.exit(1);
+
+        ServerSocket server = new ServerSocket(
+            0, 50, InetAddress.getByName("127.0.0.1")
+        );
+        server.setSoTimeout(1000);
+
+        File portFile = new File(stateDir, "port");
+        File tmpFile = new File(stateDir, "port.tmp");
+        String state = server.getLocalPort() + "\n" + token + "\n" +
+                       compilerId + "\n";
+        try (Writer w = new OutputStreamWriter(new FileOutputStream(tmpFile),
+                                               StandardCharsets.UTF_8)) {
+            w.write(state);
+        }
+        if (!tmpFile.renameTo(portFile))
+            System.exit(1);
+
+        while (running) {
+            final Socket client;
+            try {
+                client = server.accept();
+            } catch (SocketTimeoutException e) {
+                if (active.get() == 0 &&
+                    System.currentTimeMillis() - lastUsed > idle)
+                    break;
+                continue;
+            }
+
+            active.incrementAndGet();
+            new Thread(() -> {
+                try {
+                    handle(client, compiler, cwd, token);
+                } catch (IOException e) {
+                    // Nothing to do; the client will fall back.
+                } finally {
+                    lastUsed = System.currentTimeMillis();
+                    active.decrementAndGet();
+                }
+            }).start();
+        }
+
+        // If we were replaced by a daemon for a different compiler, the port
+        // file is its now, so leave it alone.
+        try {
+            if (new String(Files.readAllBytes(portFile.toPath()),
+                           StandardCharsets.UTF_8).equals(state))
+                portFile.delete();
+        } catch (IOException e) {
+            // Already gone.
+        }
+        System.exit(0);
+    }
+
+    static void handle(Socket client, JavaCompiler compiler, String cwd,
+                       String token) throws IOException {
+        try (Socket s = client) {
+            BufferedReader in = new BufferedReader(new InputStreamReader(
+                s.getInputStream(), StandardCharsets.UTF_8
+            ));
+            Writer out = new OutputStreamWriter(s.getOutputStream(),
+                                                StandardCharsets.UTF_8);
+            if (!token.equals(in.readLine()))
+                return;
+
+            String command = in.readLine();
+            if ("stop".equals(command)) {
+                running = false;
+                out.write("0\n");
+                out.flush();
+                return;
+            }
+
+            String reqCwd = in.readLine();
+            int argc = Integer.parseInt(in.readLine());
+            String[] args = new String[argc];
+            for (int i = 0; i < argc; i++)
+                args[i] = in.readLine();
+
+            if (!"compile".equals(command) || reqCwd == null ||
+                !new File(reqCwd).getCanonicalPath().equals(cwd)) {
+                out.write("refused\n");
+                out.flush();
+                return;
+            }
+
+            ByteArrayOutputStream buf = new ByteArrayOutputStream();
+            int status = compiler.run(null, buf, buf, args);
+            out.write(status + "\n");
+            out.write(buf.toString());
+            out.flush();
+        }
+    }
+}
+"""
+
+_server_class = 'BfgJvmd'
+_compilers = ('javac', 'javac.exe')
+
+
+class DaemonError(Exception):
+    pass
+
+
+_State = namedtuple('_State', ['port', 'token', 'compiler'])
+
+
+def _compiler_id(javac):
+    # Identify the compiler by the file it resolves to and when it last
+    # changed, so that switching to (or upgrading) a different JDK gets a new
+    # daemon instead of the old JDK's compiler.
+    try:
+        path = os.path.realpath(which(javac, resolve=True)[0])
+        st = os.stat(path)
+        key = '{}\n{}\n{}'.format(path, st.st_size, st.st_mtime)
+    except (IOError, OSError):
+        key = javac
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+
+def _read_state(state_dir):
+    try:
+        with open(os.path.join(state_dir, 'port')) as f:
+            port, token, compiler = f.read().split()
+            return _State(int(port), token, compiler)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _request(state, lines, timeout=None):
+    s = socket.create_connection(('127.0.0.1', state.port), timeout=timeout)
+    try:
+        s.settimeout(None)
+        s.sendall(''.join(
+            i + '\n' for i in [state.token] + lines
+        ).encode('utf-8'))
+        f = s.makefile('rb')
+        try:
+            status = f.readline().decode('utf-8').strip()
+            if not status:
+                raise DaemonError('no response from daemon')
+            return status, f.read().decode('utf-8')
+        finally:
+            f.close()
+    finally:
+        s.close()
+
+
+def _java_command(javac):
+    if os.getenv('JAVACMD'):
+        return os.getenv('JAVACMD')
+    # Prefer the `java` next to the compiler we're using so that the daemon
+    # gets the same JDK.
+    base = os.path.dirname(javac)
+    if base:
+        java = os.path.join(base, 'java' + os.path.splitext(javac)[1])
+        if os.path.exists(java):
+            return java
+    return 'java'
+
+
+def _touch(path):
+    with open(path, 'a'):
+        os.utime(path, None)
+
+
+def _recently_failed(state_dir, timeout=60):
+    try:
+        path = os.path.join(state_dir, 'failed')
+        return time.time() - os.path.getmtime(path) < timeout
+    except OSError:
+        return False
+
+
+def _start_daemon(state_dir, javac, compiler, idle_timeout,
+                  start_timeout=10):
+    # Build the server with each compiler separately, since an older JVM can't
+    # load classes from a newer javac.
+    src_hash = hashlib.sha1(
+        (_server_src + compiler).encode('utf-8')
+    ).hexdigest()[:12]
+    class_dir = os.path.join(state_dir, 'classes-' + src_hash)
+    lock = os.path.join(state_dir, 'lock')
+
+    try:
+        os.makedirs(state_dir)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    # Only one client should spawn the daemon; the rest just wait for it to
+    # show up. If the lock is old, the starter probably died, so ignore it.
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        owner = True
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+        try:
+            owner = time.time() - os.path.getmtime(lock) > start_timeout * 3
+            if owner:
+                os.utime(lock, None)
+        except OSError:
+            owner = False
+
+    proc = None
+    try:
+        if owner:
+            try:
+                os.remove(os.path.join(state_dir, 'port'))
+            except OSError:
+                pass
+
+            class_file = os.path.join(class_dir, _server_class + '.class')
+            token = hashlib.sha1(os.urandom(32)).hexdigest()
+            kwargs = {}
+            if hasattr(os, 'setsid'):
+                kwargs['preexec_fn'] = os.setsid
+            else:  # pragma: no cover
+                kwargs['creationflags'] = 0x00000008  # DETACHED_PROCESS
+
+            with open(os.devnull, 'r+') as devnull:
+                if not os.path.exists(class_file):
+                    try:
+                        os.makedirs(class_dir)
+                    except OSError as e:
+                        if e.errno != errno.EEXIST:
+                            raise
+                    src = os.path.join(class_dir, _server_class + '.java')
+                    with open(src, 'w') as f:
+                        f.write(_server_src)
+                    subprocess.check_call([javac, '-d', class_dir, src],
+                                          stdout=devnull, stderr=devnull)
+
+                proc = subprocess.Popen(
+                    [_java_command(javac), '-cp', class_dir, _server_class,
+                     state_dir, token, str(idle_timeout), compiler],
+                    stdin=devnull, stdout=devnull, stderr=devnull,
+                    close_fds=True, **kwargs
+                )
+
+        end = time.time() + start_timeout
+        while time.time() < end:
+            state = _read_state(state_dir)
+            if state and state.compiler == compiler:
+                return state
+            if proc and proc.poll() is not None:
+                break
+            time.sleep(0.05)
+        raise DaemonError('unable to start daemon')
+    except Exception:
+        # Don't make every other compilation wait on a daemon that won't start.
+        if owner:
+            _touch(os.path.join(state_dir, 'failed'))
+        raise
+    finally:
+        if owner:
+            try:
+                os.remove(lock)
+            except OSError:
+                pass
+
+
+def _daemon_compile(args):
+    compiler = _compiler_id(args.command[0])
+    state = _read_state(args.state_dir)
+    lines = ['compile', os.getcwd(), str(len(args.command) - 1)]
+    lines.extend(args.command[1:])
+
+    # If the daemon is running a different compiler (e.g. because `JAVAC`
+    # changed), replace it with one for ours.
+    if state and state.compiler != compiler:
+        _stop_daemon(state)
+        state = None
+
+    if state:
+        try:
+            return _request(state, lines, timeout=5)
+        except (socket.error, DaemonError):
+            # The daemon is probably dead; try starting a new one.
+            pass
+
+    if _recently_failed(args.state_dir):
+        raise DaemonError('daemon failed to start recently')
+    state = _start_daemon(args.state_dir, args.command[0], compiler,
+                          args.idle_timeout)
+    return _request(state, lines, timeout=5)
+
+
+def _can_use_daemon(command):
+    # The daemon can only stand in for javac itself, and `-J` options need to
+    # go to a fresh JVM anyway. Our protocol is line-based, so arguments with
+    # newlines in them can't be sent either.
+    return (os.path.basename(command[0]).lower() in _compilers and
+            not any(i.startswith('-J') or i.startswith('@') or '\n' in i
+                    for i in command[1:]))
+
+
+def _direct_compile(parser, args):
+    try:
+        p = subprocess.Popen(args.command, universal_newlines=True,
+                             stderr=subprocess.PIPE)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            parser.exit(66, 'command not found: {}\n'.format(args.command[0]))
+        raise  # pragma: no cover
+
+    filter_output(p.stderr, args.output)
+    return p.wait()
+
+
+def _stop_daemon(state):
+    try:
+        _request(state, ['stop'], timeout=5)
+    except (socket.error, DaemonError):
+        pass
+
+
+def _stop(args):
+    state = _read_state(args.state_dir)
+    if state:
+        _stop_daemon(state)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='bfg9000-jvmd',
+        description=('Compile JVM sources via a persistent compiler daemon, ' +
+                     'falling back to running the compiler directly if the ' +
+                     'daemon is unavailable, and write the generated .class ' +
+                     'files to a file.')
+    )
+    parser.add_argument('--version', action='version',
+                        version='%(prog)s ' + version)
+    parser.add_argument('-o', type=argparse.FileType('w'), default=sys.stdout,
+                        dest='output', help=('the output file to list the ' +
+                                             'generated .class files'))
+    parser.add_argument('-d', '--state-dir', default='.bfg_jvmd',
+                        metavar='DIR',
+                        help='directory to store daemon state in')
+    parser.add_argument('--idle-timeout', type=int, default=600,
+                        metavar='SECS',
+                        help='seconds of inactivity before the daemon exits')
+    parser.add_argument('--stop', action='store_true',
+                        help='stop the running daemon, if any')
+    parser.add_argument('command', nargs=argparse.REMAINDER, metavar='COMMAND',
+                        help='the command to execute')
+    args = parser.parse_args()
+
+    if args.stop:
+        return _stop(args)
+    if len(args.command) == 0:
+        parser.error('command required')
+
+    if _can_use_daemon(args.command):
+        try:
+            status, output = _daemon_compile(args)
+            if status != 'refused':
+                status = int(status)
+                filter_output(StringIO(output), args.output)
+                return status
+        except (EnvironmentError, socket.error, subprocess.CalledProcessError,
+                DaemonError, ValueError):
+            pass
+
+    return _direct_compile(parser, args)
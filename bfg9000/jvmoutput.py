@@ -18,6 +18,26 @@ _class_re = re.compile(
 )
 
 
+# Write the names of the .class files mentioned in `stream` to `output`,
+# passing along any other (non-verbose) messages to `passthrough`.
+def filter_output(stream, output, passthrough=None):
+    passthrough = passthrough or sys.stderr
+    for line in stream:
+        if line[0] != '[':
+            passthrough.write(line)
+            continue
+
+        m = _class_re.match(line)
+        if m:
+            kind = m.group(1)
+            class_file = m.group(2)
+            # JDK 9-10 emits broken paths; fix them. For more info, see
+            # <https://bugs.openjdk.java.net/browse/JDK-8194893>.
+            if kind == 'DirectoryFileObject[':
+                class_file = class_file.replace(':', os.path.sep)
+            output.write(class_file + '\n')
+
+
 def main():
     parser = argparse.ArgumentParser(
         prog='bfg9000-jvmoutput',
@@ -44,18 +64,5 @@ def main():
             parser.exit(66, 'command not found: {}\n'.format(args.command[0]))
         raise  # pragma: no cover
 
-    for line in p.stderr:
-        if line[0] != '[':
-            sys.stderr.write(line)
-            continue
-
-        m = _class_re.match(line)
-        if m:
-            kind = m.group(1)
-            class_file = m.group(2)
-            # JDK 9-10 emits broken paths; fix them. For more info, see
-            # <https://bugs.openjdk.java.net/browse/JDK-8194893>.
-            if kind == 'DirectoryFileObject[':
-                class_file = class_file.replace(':', os.path.sep)
-            args.output.write(class_file + '\n')
+    filter_output(p.stderr, args.output)
     return p.wait()
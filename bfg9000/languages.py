@@ -1,5 +1,5 @@
 from functools import partial
-from six import iteritems
+from six import iteritems, itervalues
 
 from .iterutils import listify, iterate
 
@@ -57,6 +57,9 @@ class Languages(object):
         except KeyError:
             raise ValueError('unrecognized language {!r}'.format(name))
 
+    def __iter__(self):
+        return itervalues(self._langs)
+
     def _add(self, info):
         self._langs[info.name] = info
         for kind, exts in iteritems(info._exts):
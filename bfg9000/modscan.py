@@ -0,0 +1,377 @@
+import errno
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import OrderedDict
+from six.moves import cStringIO as StringIO
+
+from .arguments import parser as argparse
+from .app_version import version
+from .fortscan import make_escape, ninja_escape, write_if_changed
+
+# Module declarations and imports, as they appear in preprocessed source. We
+# don't try to handle header units (`import <foo>;`), only named modules.
+_module_ex = re.compile(
+    r'^\s*(export\s+)?module\s+([\w.]+)\s*(?::\s*([\w.]+)\s*)?;', re.MULTILINE
+)
+_import_ex = re.compile(
+    r'^\s*(?:export\s+)?import\s+([\w.]+)?\s*(?::\s*([\w.]+)\s*)?;',
+    re.MULTILINE
+)
+
+_bmi_exts = {'gcc': '.gcm', 'clang': '.pcm'}
+
+
+class Unit(object):
+    def __init__(self, output, provides=None, requires=None):
+        self.output = output
+        self.provides = provides or []
+        self.requires = requires or []
+
+    def __eq__(self, rhs):
+        return (self.output == rhs.output and
+                self.provides == rhs.provides and
+                self.requires == rhs.requires)
+
+    def __ne__(self, rhs):
+        return not (self == rhs)
+
+    def __repr__(self):
+        return '<Unit({!r}, provides={!r}, requires={!r})>'.format(
+            self.output, self.provides, self.requires
+        )
+
+
+def _remove_line_markers(source):
+    return re.sub(r'^#.*$', '', source, flags=re.MULTILINE)
+
+
+def parse_preprocessed(source, output):
+    # Compilers without a P1689 scanner can still tell us what the source
+    # looks like after preprocessing, which is enough to find the module
+    # declaration and imports.
+    source = _remove_line_markers(source)
+    unit = Unit(output)
+    module = None
+
+    m = _module_ex.search(source)
+    if m:
+        exported, module, partition = m.groups()
+        if partition:
+            unit.provides.append((module + ':' + partition, bool(exported)))
+        elif exported:
+            unit.provides.append((module, True))
+        else:
+            # Implementation units implicitly import their interface.
+            unit.requires.append(module)
+
+    for name, partition in _import_ex.findall(source):
+        if partition:
+            if not module:
+                continue
+            name = module + ':' + partition
+        if name and name not in unit.requires:
+            unit.requires.append(name)
+    return unit
+
+
+def to_p1689(unit):
+    rule = OrderedDict([('primary-output', unit.output)])
+    if unit.provides:
+        rule['provides'] = [OrderedDict([
+            ('logical-name', name), ('is-interface', interface)
+        ]) for name, interface in unit.provides]
+    if unit.requires:
+        rule['requires'] = [{'logical-name': i} for i in unit.requires]
+    return OrderedDict([('version', 1), ('revision', 0), ('rules', [rule])])
+
+
+def from_p1689(data):
+    return [Unit(
+        rule['primary-output'],
+        [(i['logical-name'], i.get('is-interface', True))
+         for i in rule.get('provides', [])],
+        [i['logical-name'] for i in rule.get('requires', [])]
+    ) for rule in data.get('rules', [])]
+
+
+class Module(object):
+    def __init__(self, name, bmi, interface=True):
+        self.name = name
+        self.bmi = bmi
+        self.interface = interface
+
+    def __eq__(self, rhs):
+        return (self.name == rhs.name and self.bmi == rhs.bmi and
+                self.interface == rhs.interface)
+
+    def __ne__(self, rhs):
+        return not (self == rhs)
+
+    def __repr__(self):
+        return '<Module({!r}, {!r})>'.format(self.name, self.bmi)
+
+
+class Resolved(object):
+    def __init__(self, provides, requires, all_requires, providers):
+        self.provides = provides
+        self.requires = requires
+        self.all_requires = all_requires
+        self.providers = providers
+
+
+def _bmi_name(name, ext):
+    # Partitions are named `module:partition`, but colons are a bad idea in
+    # filenames.
+    return name.replace(':', '-') + ext
+
+
+def resolve(units, bmi_dir, flavor):
+    ext = _bmi_exts[flavor]
+
+    # Each module's BMI is built once, by the first object that provides it,
+    # and shared by everything that imports it. If another object provides the
+    # same module (e.g. the same source built into two libraries), it gets a
+    # BMI of its own so that the two don't clobber each other.
+    providers = {}
+    for unit in units:
+        for name, _ in unit.provides:
+            providers.setdefault(name, unit.output)
+
+    def bmi(name, output):
+        if providers[name] == output:
+            return os.path.join(bmi_dir, _bmi_name(name, ext))
+        return output + '.' + _bmi_name(name, ext)
+
+    # Modules that nothing provides are left out; they're either external or
+    # the compiler will complain about them anyway.
+    direct = OrderedDict(
+        (unit.output, [i for i in unit.requires if i in providers and
+                       providers[i] != unit.output])
+        for unit in units
+    )
+
+    def walk(output, seen):
+        for i in direct.get(output, []):
+            if i not in seen:
+                seen.append(i)
+                walk(providers[i], seen)
+        return seen
+
+    resolved = OrderedDict()
+    for unit in units:
+        resolved[unit.output] = Resolved(
+            [Module(name, bmi(name, unit.output), interface)
+             for name, interface in unit.provides],
+            [Module(i, bmi(i, providers[i])) for i in direct[unit.output]],
+            [Module(i, bmi(i, providers[i]))
+             for i in walk(unit.output, [])],
+            [providers[i] for i in direct[unit.output]]
+        )
+    return resolved
+
+
+def emit_ninja(out, resolved):
+    out.write('ninja_dyndep_version = 1\n')
+    for output, r in resolved.items():
+        out.write('build ' + ninja_escape(output))
+        if r.provides:
+            out.write(' |' + ''.join(' ' + ninja_escape(i.bmi)
+                                     for i in r.provides))
+        out.write(': dyndep')
+        if r.requires:
+            out.write(' |' + ''.join(' ' + ninja_escape(i.bmi)
+                                     for i in r.requires))
+        out.write('\n')
+
+
+def emit_make(out, resolved):
+    # Make can't see the BMIs, so just order each object after the objects
+    # that provide the modules it imports.
+    for output, r in resolved.items():
+        for i in sorted(set(r.providers)):
+            out.write('{}: {}\n'.format(make_escape(output), make_escape(i)))
+
+
+def _quote_response(arg):
+    if re.search(r'[\s"\'\\]', arg):
+        return '"' + re.sub(r'(["\\])', r'\\\1', arg) + '"'
+    return arg
+
+
+def modmap(resolved, flavor):
+    if flavor == 'gcc':
+        # A GCC module mapper file: each line maps a module to its BMI.
+        return ''.join('{} {}\n'.format(i.name, i.bmi)
+                       for i in resolved.provides + resolved.all_requires)
+
+    # A Clang response file.
+    args = []
+    if any(i.interface for i in resolved.provides):
+        args.extend(['-x', 'c++-module'])
+    for i in resolved.provides[:1]:
+        args.append('-fmodule-output=' + i.bmi)
+    for i in resolved.all_requires:
+        args.append('-fmodule-file={}={}'.format(i.name, i.bmi))
+    return ''.join(_quote_response(i) + '\n' for i in args)
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def _read_json(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def collate(output, format, flavor, bmi_dir, scans):
+    units = []
+    for i in scans:
+        units.extend(from_p1689(_read_json(i)))
+    resolved = resolve(units, bmi_dir, flavor)
+
+    _makedirs(bmi_dir)
+    for name, r in resolved.items():
+        write_if_changed(name + '.modmap', modmap(r, flavor))
+
+    out = StringIO()
+    _formats[format](out, resolved)
+    # As with `bfg9000-fortscan`, Ninja wants the output left alone if it
+    # didn't change, but Make needs it to be newer than its inputs.
+    write_if_changed(output, out.getvalue(), touch=format == 'make')
+
+
+def _split_rule(line):
+    # Module partitions have colons in their names, so only treat a colon
+    # followed by whitespace as the separator.
+    m = re.match(r'^((?:[^\\]|\\.)*?):(?:\s+|$)(.*)$', line)
+    if not m:
+        return None
+    return re.split(r'(?<!\\)\s+', m.group(1).strip()), m.group(2).split()
+
+
+def fix_deps(depfile, target):
+    # GCC adds information about modules to depfiles, which neither Ninja nor
+    # our Make rules want. Keep only the dependencies of the object (and its
+    # BMI), minus the pseudo-targets for modules.
+    with open(depfile) as f:
+        data = re.sub(r'\\\n', ' ', f.read())
+
+    deps = []
+    for line in data.splitlines():
+        if re.match(r'^\s*\w+\s*\+?=', line) or line.startswith('.PHONY'):
+            continue
+        rule = _split_rule(line)
+        if rule is None or all(i.endswith('.c++m') for i in rule[0]):
+            continue
+        deps.extend(i for i in rule[1]
+                    if not i.endswith('.c++m') and i not in deps)
+
+    with open(depfile, 'w') as f:
+        f.write(target + ':' + ''.join(' ' + i for i in deps) + '\n')
+
+
+_formats = {'ninja': emit_ninja, 'make': emit_make}
+
+
+def _split_command(argv, parser):
+    try:
+        split = argv.index('--')
+    except ValueError:
+        parser.error('command required')
+    command = argv[split + 1:]
+    if not command:
+        parser.error('command required')
+    return argv[:split], command
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='bfg9000-modscan',
+        description='Find the dependencies between C++ modules.'
+    )
+    parser.add_argument('--version', action='version',
+                        version='%(prog)s ' + version)
+    subparsers = parser.add_subparsers(dest='subcommand')
+
+    scan_p = subparsers.add_parser(
+        'scan', help='scan a source file for the modules it provides and ' +
+        'imports, as `scan [OPTION]... -- COMMAND`'
+    )
+    scan_mode = scan_p.add_mutually_exclusive_group(required=True)
+    scan_mode.add_argument('--stdout', dest='mode', action='store_const',
+                           const='stdout',
+                           help='COMMAND prints P1689 output')
+    scan_mode.add_argument('--preprocessed', dest='mode', action='store_const',
+                           const='preprocessed',
+                           help='COMMAND prints preprocessed source')
+    scan_p.add_argument('-o', '--output', metavar='FILE', required=True,
+                        help='the P1689 file to write')
+    scan_p.add_argument('-t', '--target', metavar='OBJECT', required=True,
+                        help='the object file the source is compiled to')
+
+    collate_p = subparsers.add_parser(
+        'collate', help='collate the results of scanning many sources'
+    )
+    collate_p.add_argument('-f', '--format', metavar='FMT', required=True,
+                           choices=sorted(_formats),
+                           help='format of output file (one of: %(choices)s)')
+    collate_p.add_argument('--flavor', metavar='FLAVOR', required=True,
+                           choices=sorted(_bmi_exts),
+                           help='the compiler flavor (one of: %(choices)s)')
+    collate_p.add_argument('-b', '--bmi-dir', metavar='DIR', required=True,
+                           help='the directory to put shared BMIs in')
+    collate_p.add_argument('-o', '--output', metavar='FILE', required=True,
+                           help='the file to write the dependencies to')
+    collate_p.add_argument('scans', metavar='SCAN', nargs='*',
+                           help='the P1689 files to collate')
+
+    compile_p = subparsers.add_parser(
+        'compile', help='run a compiler and clean up the module information ' +
+        'it adds to its depfile, as `compile [OPTION]... -- COMMAND`'
+    )
+    compile_p.add_argument('-t', '--target', metavar='OBJECT', required=True,
+                           help='the object file being compiled')
+    compile_p.add_argument('--depfile', metavar='FILE', required=True,
+                           help='the depfile the compiler writes')
+
+    argv = sys.argv[1:]
+    command = None
+    if argv and argv[0] in ('scan', 'compile'):
+        argv, command = _split_command(argv, parser)
+    args = parser.parse_args(argv)
+    if not args.subcommand:
+        parser.error('subcommand required')
+
+    try:
+        if args.subcommand == 'collate':
+            collate(args.output, args.format, args.flavor, args.bmi_dir,
+                    args.scans)
+            return 0
+
+        if args.subcommand == 'compile':
+            result = subprocess.call(command)
+            if result == 0:
+                fix_deps(args.depfile, args.target)
+            return result
+
+        p = subprocess.Popen(command, stdout=subprocess.PIPE)
+        stdout = p.communicate()[0].decode('utf-8', 'replace')
+        if p.returncode != 0:
+            return p.returncode
+        if args.mode == 'preprocessed':
+            stdout = json.dumps(to_p1689(parse_preprocessed(
+                stdout, args.target
+            )), indent=2) + '\n'
+        with open(args.output, 'w') as f:
+            f.write(stdout)
+        return 0
+    except (IOError, OSError, ValueError) as e:
+        parser.exit(1, '{}: error: {}\n'.format(parser.prog, e))
@@ -146,3 +146,13 @@ entry_point = option('entry_point', [('value', str)])
 
 # General options
 pthread = option('pthread')
+
+
+class lto(Option):
+    _fields = [ ('mode', str),
+                ('jobs', (int, type(None))) ]
+
+    def __init__(self, mode='full', jobs=None):
+        if mode not in ('full', 'thin'):
+            raise ValueError('invalid LTO mode {!r}'.format(mode))
+        Option._init(self, mode, jobs)
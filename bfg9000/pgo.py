@@ -0,0 +1,94 @@
+import argparse
+import hashlib
+import os
+import shutil
+import subprocess
+
+from .app_version import version
+
+# The names used for the various parts of a profile-guided optimization
+# build, relative to the top-level build directory.
+generate_dir = 'pgo-generate'
+profile_dir = 'pgo-profile'
+stamp_file = 'pgo-profile.stamp'
+
+# Make can't tell that the profile stamp wasn't updated by retraining, so it
+# records when the training last ran separately.
+trained_file = 'pgo-trained.stamp'
+
+# Clang writes raw profiles to a directory of their own, which then need to be
+# merged into a single file for the optimized build to use.
+raw_dir = 'raw'
+profdata_file = 'default.profdata'
+
+
+def _hash_profile(path):
+    digest = hashlib.sha1()
+    for base, dirs, files in os.walk(path):
+        dirs.sort()
+        for f in sorted(files):
+            filename = os.path.join(base, f)
+            digest.update(os.path.relpath(filename, path).encode('utf-8'))
+            with open(filename, 'rb') as inp:
+                digest.update(inp.read())
+    return digest.hexdigest()
+
+
+def train(profile, command, directory=None, merge=None, stamp=None):
+    # Start from a clean slate so that stale profiles from an older build (or
+    # from a previous training run) don't get mixed in with the new ones.
+    if os.path.exists(profile):
+        shutil.rmtree(profile)
+    os.makedirs(profile)
+
+    result = subprocess.call(command, cwd=directory)
+    if result != 0:
+        return result
+
+    if merge:
+        result = subprocess.call(merge + [
+            'merge', '-output=' + os.path.join(profile, profdata_file),
+            os.path.join(profile, raw_dir)
+        ])
+        if result != 0:
+            return result
+
+    # Only update the stamp if the profile actually changed, so that the
+    # optimized build isn't rebuilt needlessly.
+    if stamp:
+        digest = _hash_profile(profile)
+        try:
+            with open(stamp) as inp:
+                changed = inp.read() != digest
+        except IOError:
+            changed = True
+        if changed:
+            with open(stamp, 'w') as out:
+                out.write(digest)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='bfg9000-pgo',
+        description=('Run COMMAND to train an instrumented build, storing ' +
+                     'the resulting profile in PROFILE.')
+    )
+    parser.add_argument('--version', action='version',
+                        version='%(prog)s ' + version)
+    parser.add_argument('-C', '--directory', metavar='DIR',
+                        help='the directory to run COMMAND in')
+    parser.add_argument('--merge', metavar='PROFDATA',
+                        help=('merge the raw profiles with PROFDATA (i.e. ' +
+                              '`llvm-profdata`)'))
+    parser.add_argument('--stamp', metavar='FILE',
+                        help='a file to update when the profile changes')
+    parser.add_argument('profile', metavar='PROFILE',
+                        help='the directory to store the profile in')
+    parser.add_argument('command', metavar='COMMAND', nargs='+',
+                        help='the training command to run')
+    args = parser.parse_args()
+
+    merge = [args.merge] if args.merge else None
+    return train(args.profile, args.command, args.directory, merge,
+                 args.stamp)
@@ -0,0 +1,81 @@
+import errno
+import os
+import subprocess
+import time
+
+from .arguments import parser as argparse
+from .app_version import version
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def acquire(state_dir, name, depth, interval=0.05):
+    # Each pool has `depth` slots, each represented by a lock file. Since the
+    # OS releases the locks when we exit, a crashed command can never leave a
+    # slot held forever.
+    if fcntl is None:  # pragma: no cover
+        return None
+
+    _makedirs(state_dir)
+    slots = [os.path.join(state_dir, '{}.{}.lock'.format(name, i))
+             for i in range(depth)]
+    while True:
+        for i in slots:
+            f = open(i, 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except (IOError, OSError) as e:
+                f.close()
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='bfg9000-pool',
+        description=('Run a command, waiting until fewer than DEPTH other ' +
+                     'commands in the same pool are running.')
+    )
+    parser.add_argument('--version', action='version',
+                        version='%(prog)s ' + version)
+    parser.add_argument('-d', '--state-dir', default='.bfg_pools',
+                        metavar='DIR',
+                        help='directory to store pool state in')
+    parser.add_argument('name', metavar='NAME', help='the name of the pool')
+    parser.add_argument('depth', type=int, metavar='DEPTH',
+                        help='the maximum number of concurrent commands')
+    parser.add_argument('command', nargs=argparse.REMAINDER, metavar='COMMAND',
+                        help='the command to execute')
+    args = parser.parse_args()
+
+    command = args.command
+    if command and command[0] == '--':
+        command = command[1:]
+    if not command:
+        parser.error('command required')
+    if args.depth < 1:
+        parser.error('depth must be positive')
+
+    lock = acquire(args.state_dir, args.name, args.depth)
+    try:
+        return subprocess.call(command)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            parser.exit(66, 'command not found: {}\n'.format(command[0]))
+        raise  # pragma: no cover
+    finally:
+        if lock:
+            lock.close()
@@ -0,0 +1,154 @@
+import errno
+import hashlib
+import json
+import os
+import socket
+import sys
+from six.moves import cStringIO as StringIO
+
+from . import log
+from .app_version import version
+from .backends import list_backends
+from .client import socket_path
+from .environment import Environment
+from .snapshot import Snapshot
+
+logger = log.getLogger(__name__)
+
+
+class RequestStream(object):
+    """A stream that writes to whatever the current request's output is, so
+    that log messages end up with the right client."""
+
+    def __init__(self, target=None):
+        self.target = target or sys.stderr
+
+    def write(self, data):
+        self.target.write(data)
+
+    def flush(self):
+        self.target.flush()
+
+
+def _envfile_hash(builddir):
+    with open(os.path.join(builddir, Environment.envfile), 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _makedirs_private(path):
+    try:
+        os.makedirs(path, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    os.chmod(path, 0o700)
+
+
+class Server(object):
+    def __init__(self, regenerate, stream=None):
+        self.regenerate = regenerate
+        self.stream = stream
+        self._envs = {}
+        self._running = False
+
+    def _environment(self, builddir, snapshot):
+        # Reuse the environment from the last time we regenerated this build
+        # directory, and with it all the tools we probed, unless its settings
+        # or any of those tools changed.
+        key = _envfile_hash(builddir)
+        cached = self._envs.get(builddir)
+        if ( cached and cached[0] == key and snapshot and
+             'which' not in snapshot.changes(cached[1]) ):
+            return cached[1]
+
+        env = Environment.load(builddir)
+        self._envs[builddir] = (key, env)
+        return env
+
+    def refresh(self, builddir, force=False):
+        try:
+            snapshot = Snapshot.load(builddir)
+            env = self._environment(builddir, snapshot)
+            if not force and snapshot and snapshot.current(env):
+                logger.debug('build files are up to date')
+                snapshot.touch()
+                return 0
+
+            self.regenerate(env, list_backends()[env.backend])
+            return 0
+        except Exception as e:
+            # Don't trust anything we know about a build directory that we
+            # failed to regenerate.
+            self._envs.pop(builddir, None)
+            logger.exception(e)
+            return 1
+
+    def handle(self, message):
+        if message.get('version') != version:
+            return {'refused': True}
+        if message.get('command') == 'stop':
+            self._running = False
+            return {'returncode': 0}
+        if message.get('command') != 'refresh':
+            return {'refused': True}
+
+        output = StringIO()
+        old_stdout = sys.stdout
+        if self.stream:
+            self.stream.target = output
+        sys.stdout = output
+        try:
+            returncode = self.refresh(message['builddir'],
+                                      message.get('force', False))
+        finally:
+            sys.stdout = old_stdout
+            if self.stream:
+                self.stream.target = sys.stderr
+        return {'returncode': returncode, 'output': output.getvalue()}
+
+    def _serve_one(self, conn):
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = conn.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+        try:
+            message = json.loads(data.decode('utf-8'))
+        except ValueError:
+            return
+        response = self.handle(message)
+        conn.sendall(json.dumps(response).encode('utf-8'))
+
+    def serve(self, path=None, idle_timeout=None):
+        path = path or socket_path()
+        _makedirs_private(os.path.dirname(path))
+        if os.path.exists(path):
+            os.remove(path)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(path)
+            sock.listen(16)
+            sock.settimeout(idle_timeout)
+            logger.info('listening on {}'.format(path))
+            self._running = True
+            while self._running:
+                try:
+                    conn = sock.accept()[0]
+                except socket.timeout:
+                    logger.info('exiting after being idle')
+                    return
+                try:
+                    conn.settimeout(None)
+                    self._serve_one(conn)
+                except socket.error as e:
+                    logger.debug('lost connection: {}'.format(e))
+                finally:
+                    conn.close()
+        finally:
+            sock.close()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,147 @@
+import errno
+import hashlib
+import json
+import os
+
+from . import shell
+from .app_version import version as bfg_version
+from .environment import Environment
+
+snapshot_file = '.bfg_snapshot'
+
+
+def _hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def _file_state(path, env_vars):
+    try:
+        with open(path, 'rb') as f:
+            return _hash(f.read())
+    except IOError:
+        return None
+
+
+def _dir_state(path, env_vars):
+    # Only the names of the directory's entries matter, not their contents;
+    # `find_files()` would pick up a new or removed file, but not a modified
+    # one.
+    try:
+        names = sorted(os.listdir(path))
+    except OSError:
+        return None
+    return _hash('\n'.join(names).encode('utf-8'))
+
+
+def _stat_state(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime, st.st_size]
+
+
+def _which_state(path, env_vars):
+    # Probes without a directory are commands looked up on the PATH; if one is
+    # installed in another place (or upgraded in place), it might not behave
+    # the same as the one we ran before.
+    if not os.path.dirname(path):
+        try:
+            path = shell.which([[path]], env_vars, resolve=True)[0]
+        except IOError:
+            return None
+    state = _stat_state(path)
+    return [path] + state if state else None
+
+
+_kinds = {
+    'file': _file_state,
+    'dir': _dir_state,
+    'which': _which_state,
+}
+
+
+class Snapshot(object):
+    """A record of everything that went into generating a build directory's
+    files, so that refreshing the build can be skipped when none of it has
+    changed."""
+
+    version = 1
+
+    def __init__(self, backend, outputs, fingerprints):
+        self.backend = backend
+        self.outputs = outputs
+        self.fingerprints = fingerprints
+
+    @classmethod
+    def take(cls, env, build_inputs, outputs, optsfile):
+        def path(p):
+            return os.path.abspath(p.string(env.base_dirs))
+
+        fingerprints = [
+            ['file', os.path.join(env.builddir.string(), Environment.envfile)],
+            ['file', path(build_inputs.bfgpath)],
+            ['file', path(optsfile)],
+        ]
+        fingerprints.extend(['dir', i] for i in
+                            sorted(path(j) for j in build_inputs['find_dirs']))
+        fingerprints.extend(['which', i] for i in env.probes)
+
+        fingerprints = [[kind, p, _kinds[kind](p, env.variables)]
+                        for kind, p in fingerprints]
+        return cls(env.backend, [path(i) for i in outputs], fingerprints)
+
+    def changes(self, env):
+        return set(kind for kind, path, state in self.fingerprints
+                   if _kinds[kind](path, env.variables) != state)
+
+    def current(self, env):
+        if env.backend != self.backend:
+            return False
+        if not all(os.path.exists(i) for i in self.outputs):
+            return False
+        return not self.changes(env)
+
+    def touch(self):
+        # The build system reran us because something looked out of date, so
+        # mark the outputs as up to date to keep it from doing so forever.
+        for i in self.outputs:
+            os.utime(i, None)
+
+    def save(self, path):
+        with open(os.path.join(path, snapshot_file), 'w') as out:
+            json.dump({
+                'version': self.version,
+                'bfg_version': bfg_version,
+                'data': {
+                    'backend': self.backend,
+                    'outputs': self.outputs,
+                    'fingerprints': self.fingerprints,
+                }
+            }, out)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(os.path.join(path, snapshot_file)) as inp:
+                state = json.load(inp)
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+
+        # Snapshots from other versions of bfg9000 might have been generated
+        # differently, so just ignore them.
+        if ( state.get('version') != cls.version or
+             state.get('bfg_version') != bfg_version ):
+            return None
+        data = state['data']
+        return cls(data['backend'], data['outputs'], data['fingerprints'])
+
+    @staticmethod
+    def clear(path):
+        try:
+            os.remove(os.path.join(path, snapshot_file))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
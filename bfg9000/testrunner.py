@@ -0,0 +1,242 @@
+import errno
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from six.moves import queue
+from xml.etree import ElementTree
+
+from .arguments import parser as argparse
+from .app_version import version
+
+
+def _cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):  # pragma: no cover
+        return 1
+
+
+def _read_json(filename, default=None):
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return default
+
+
+class TestResult(object):
+    def __init__(self, test, returncode, output, duration):
+        self.test = test
+        self.returncode = returncode
+        self.output = output
+        self.duration = duration
+
+    @property
+    def name(self):
+        return self.test['name']
+
+    @property
+    def passed(self):
+        return self.returncode == 0
+
+
+def schedule(tests, history):
+    # Run the slowest tests first so that they don't end up straggling at the
+    # end of the run. Tests we haven't seen before might be slow too, so they
+    # go first of all.
+    def key(i):
+        index, test = i
+        duration = history.get(test['name'])
+        return (duration is not None, -(duration or 0), index)
+    return [test for index, test in sorted(enumerate(tests), key=key)]
+
+
+def run_test(test):
+    env = dict(os.environ)
+    env.update(test.get('env', {}))
+
+    start = time.time()
+    try:
+        p = subprocess.Popen(test['cmd'], shell=True, env=env,
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = p.communicate()[0]
+        returncode = p.returncode
+    except OSError as e:  # pragma: no cover
+        output, returncode = str(e).encode('utf-8'), 127
+    return TestResult(test, returncode, output.decode('utf-8', 'replace'),
+                      time.time() - start)
+
+
+def run_tests(tests, jobs, report=None):
+    pending = queue.Queue()
+    for i in tests:
+        pending.put(i)
+
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            try:
+                test = pending.get_nowait()
+            except queue.Empty:
+                return
+            result = run_test(test)
+            with lock:
+                results.append(result)
+                if report:
+                    report(result, len(results), len(tests))
+
+    threads = [threading.Thread(target=worker)
+               for i in range(max(min(jobs, len(tests)), 1))]
+    for i in threads:
+        i.daemon = True
+        i.start()
+    for i in threads:
+        i.join()
+    return results
+
+
+def write_junit(filename, results, duration):
+    failures = sum(1 for i in results if not i.passed)
+    root = ElementTree.Element('testsuites')
+    suite = ElementTree.SubElement(root, 'testsuite', {
+        'name': 'bfg9000', 'tests': str(len(results)),
+        'failures': str(failures), 'errors': '0',
+        'time': '{:.3f}'.format(duration),
+    })
+    for i in results:
+        case = ElementTree.SubElement(suite, 'testcase', {
+            'classname': 'bfg9000', 'name': i.name,
+            'time': '{:.3f}'.format(i.duration),
+        })
+        if not i.passed:
+            failure = ElementTree.SubElement(case, 'failure', {
+                'message': 'exited with status {}'.format(i.returncode)
+            })
+            failure.text = i.output
+        elif i.output:
+            ElementTree.SubElement(case, 'system-out').text = i.output
+
+    ElementTree.ElementTree(root).write(filename, encoding='utf-8',
+                                        xml_declaration=True)
+
+
+def _print_result(out, verbose):
+    def report(result, index=None, total=None):
+        progress = '[{}/{}] '.format(index, total) if index else ''
+        out.write('{}{} {} ({:.2f}s)\n'.format(
+            progress, 'PASS' if result.passed else 'FAIL', result.name,
+            result.duration
+        ))
+        if result.output and (verbose or not result.passed):
+            out.write(result.output)
+            if not result.output.endswith('\n'):
+                out.write('\n')
+        out.flush()
+    return report
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def run_one(test, stamp, log, out=sys.stdout):
+    # Make sure a stale stamp can't outlive a failure.
+    _remove(stamp)
+    result = run_test(test)
+
+    _makedirs(os.path.dirname(log) or '.')
+    with open(log, 'w') as f:
+        f.write(result.output)
+    _print_result(out, False)(result)
+    if result.passed:
+        _makedirs(os.path.dirname(stamp) or '.')
+        with open(stamp, 'w'):
+            pass
+    return result.returncode
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='bfg9000-test',
+        description='Run the tests listed in a test manifest.'
+    )
+    parser.add_argument('--version', action='version',
+                        version='%(prog)s ' + version)
+    parser.add_argument('manifest', metavar='MANIFEST',
+                        help='the test manifest generated by bfg9000')
+    parser.add_argument('-j', '--jobs', type=int, metavar='N',
+                        default=os.getenv('BFG9000_TEST_JOBS') or
+                        _cpu_count(),
+                        help='the number of tests to run at once')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='show the output of passing tests too')
+    parser.add_argument('--history', metavar='FILE',
+                        default='.bfg_test_history.json',
+                        help='file to record test durations in')
+    parser.add_argument('--junit', metavar='FILE', default='test-results.xml',
+                        help='file to write a JUnit-style XML report to')
+
+    single = parser.add_argument_group('single-test arguments')
+    single.add_argument('--id', metavar='ID',
+                        help='only run the test with this ID')
+    single.add_argument('--stamp', metavar='FILE',
+                        help='file to create if the test passes')
+    single.add_argument('--log', metavar='FILE',
+                        help="file to write the test's output to")
+    args = parser.parse_args()
+
+    manifest = _read_json(args.manifest)
+    if manifest is None:
+        parser.error('unable to read manifest {!r}'.format(args.manifest))
+    tests = manifest['tests']
+
+    if args.id:
+        if not args.stamp or not args.log:
+            parser.error('--id requires --stamp and --log')
+        test = [i for i in tests if i['id'] == args.id]
+        if not test:
+            parser.error('unknown test {!r}'.format(args.id))
+        return run_one(test[0], args.stamp, args.log)
+
+    history = _read_json(args.history, {})
+    start = time.time()
+    results = run_tests(schedule(tests, history), args.jobs,
+                        _print_result(sys.stdout, args.verbose))
+    duration = time.time() - start
+
+    # Only remember tests that still exist so the history doesn't grow without
+    # bound.
+    history = {i.name: i.duration for i in results}
+    try:
+        with open(args.history, 'w') as f:
+            json.dump(history, f)
+        if args.junit:
+            write_junit(args.junit, results, duration)
+    except (IOError, OSError) as e:
+        sys.stderr.write('{}: warning: {}\n'.format(parser.prog, e))
+
+    failed = [i for i in results if not i.passed]
+    print('{} passed, {} failed in {:.2f}s'.format(
+        len(results) - len(failed), len(failed), duration
+    ))
+    for i in sorted(failed, key=lambda i: i.name):
+        print('  FAILED: {}'.format(i.name))
+    return 1 if failed else 0
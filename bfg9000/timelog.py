@@ -0,0 +1,57 @@
+import argparse
+import os
+import subprocess
+import time
+
+from .app_version import version
+
+# This is used as Make's `SHELL`, so it runs once for every recipe line; keep
+# its imports to a minimum so that it doesn't slow the build down too much.
+
+timing_file = '.bfg_timing'
+
+
+def now():
+    return int(time.time() * 1000)
+
+
+def record(filename, start, end, target):
+    # Write each line all at once so that lines from parallel jobs don't get
+    # interleaved.
+    line = '{}\t{}\t{}\t{}\n'.format(start, end, os.getppid(), target)
+    fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+    try:
+        os.write(fd, line.encode('utf-8'))
+    finally:
+        os.close(fd)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='bfg9000-timelog',
+        description=('Run a line of a recipe for TARGET via the shell, ' +
+                     'recording how long it took.')
+    )
+    parser.add_argument('--version', action='version',
+                        version='%(prog)s ' + version)
+    parser.add_argument('-f', '--file', default=timing_file, metavar='FILE',
+                        help='the file to record timings in (default: ' +
+                        '%(default)s)')
+    parser.add_argument('--shell', default='/bin/sh', metavar='SHELL',
+                        help='the shell to run LINE with (default: ' +
+                        '%(default)s)')
+    parser.add_argument('target', nargs='*', metavar='TARGET',
+                        help='the target being built')
+    parser.add_argument('-c', dest='line', required=True, metavar='LINE',
+                        help='the line to run')
+    args = parser.parse_args()
+
+    # Make also uses `SHELL` for `$(shell ...)`, in which case there's no
+    # target; just run the line.
+    if not args.target:
+        return subprocess.call([args.shell, '-c', args.line])
+
+    start = now()
+    result = subprocess.call([args.shell, '-c', args.line])
+    record(args.file, start, now(), ' '.join(args.target))
+    return result
@@ -1,23 +1,58 @@
 import os
+import re
 from itertools import chain
 
 from .. import options as opts, safe_str, shell
 from .common import BuildCommand, check_which, library_macro
-from ..file_types import StaticLibrary
-from ..iterutils import iterate
+from ..file_types import StaticLibrary, file_install_path
+from ..iterutils import iterate, uniques
 from ..objutils import memoize
 from ..path import Path
-from ..versioning import detect_version
+from ..versioning import SpecifierSet, detect_version
+
+# The versions of each archiver that support `--thin`. Older versions of GNU
+# ar only support the `T` modifier, which has a different meaning elsewhere,
+# so we just build full archives with them.
+_thin_versions = {
+    'gnu': SpecifierSet('>=2.38'),
+    'llvm': SpecifierSet('>=14'),
+}
+
+
+def _lto_archivers(builder):
+    # Archives of LTO objects need an archiver that can load the compiler's
+    # plugin to index them, e.g. `gcc-ar` for `gcc` or `llvm-ar-15` for
+    # `clang-15`.
+    generic = 'llvm-ar' if builder.brand == 'clang' else 'gcc-ar'
+    m = re.match(r'^(.*?)(?:gcc|g\+\+|c\+\+|cc|clang\+\+|clang)(-[\d.]+)?$',
+                 os.path.basename(builder.compiler.command[0]))
+    if not m:
+        return [generic]
+    return uniques([m.group(1) + generic + (m.group(2) or ''), generic])
 
 
 class ArLinker(BuildCommand):
-    def __init__(self, builder, env):
-        cmd = check_which(env.getvar('AR', 'ar'), env.variables,
-                          kind='static linker')
+    # `ar` adds to an existing archive rather than replacing it.
+    updates_output = True
+
+    def __init__(self, builder, env, lto=False):
+        self.lto = lto
+        if lto:
+            rule_name, command_var = 'ar_lto', 'lto_ar'
+            cmd = check_which(env.getvar('LTO_AR', _lto_archivers(builder)),
+                              env.variables, kind='LTO static linker')
+        else:
+            rule_name, command_var = 'ar', 'ar'
+            cmd = check_which(env.getvar('AR', 'ar'), env.variables,
+                              kind='static linker')
         global_flags = shell.split(env.getvar('ARFLAGS', 'cr'))
-        BuildCommand.__init__(self, builder, env, 'ar', 'ar', cmd,
+        BuildCommand.__init__(self, builder, env, rule_name, command_var, cmd,
                               flags=('arflags', global_flags))
 
+    @memoize
+    def lto_linker(self):
+        return self if self.lto else ArLinker(self.builder, self.env, True)
+
     @memoize
     def _check_version(self):
         try:
@@ -27,6 +62,8 @@ class ArLinker(BuildCommand):
             )
             if 'GNU ar' in output:
                 return 'gnu', detect_version(output)
+            elif 'LLVM' in output:
+                return 'llvm', detect_version(output)
         except (OSError, shell.CalledProcessError):
             pass
         return 'unknown', None
@@ -43,6 +80,15 @@ class ArLinker(BuildCommand):
     def flavor(self):
         return 'ar'
 
+    @property
+    def thin(self):
+        # Thin archives only refer to their objects instead of copying them,
+        # which is all we need for libraries used inside the build tree. We
+        # convert them to full archives when installing them below.
+        brand, version = self._check_version()
+        return (brand in _thin_versions and version is not None and
+                version in _thin_versions[brand])
+
     def can_link(self, format, langs):
         return format == self.builder.object_format
 
@@ -75,9 +121,12 @@ class ArLinker(BuildCommand):
                 raise TypeError('unknown option type {!r}'.format(type(i)))
         return flags
 
-    def _call(self, cmd, input, output, flags=None):
+    def _call(self, cmd, input, output, flags=None, thin=None):
+        if thin is None:
+            thin = self.thin
         return list(chain(
-            cmd, iterate(flags), [output], iterate(input)
+            cmd, iterate(flags), ['--thin'] if thin else [], [output],
+            iterate(input)
         ))
 
     def output_file(self, name, context):
@@ -85,3 +134,16 @@ class ArLinker(BuildCommand):
         path = os.path.join(head, 'lib' + tail + '.a')
         return StaticLibrary(Path(path), self.builder.object_format,
                              context.langs)
+
+    def post_install(self, options, output, context):
+        if not self.thin:
+            return None
+
+        # The installed copy of a thin archive would refer to objects in the
+        # build tree (by relative path, no less), so rebuild it in place as a
+        # full archive.
+        path = file_install_path(output)
+        return shell.join_lines([
+            self.env.tool('rm')(path),
+            self(context.files, path, flags=self.global_flags, thin=False),
+        ])
@@ -6,20 +6,22 @@ from .. import shell
 from ..languages import known_langs
 
 with known_langs.make('c') as x:
-    x.vars(compiler='CC', cflags='CFLAGS')
+    x.vars(compiler='CC', launcher='CC_LAUNCHER', cflags='CFLAGS')
     x.exts(source=['.c'], header=['.h'])
 
 with known_langs.make('c++') as x:
-    x.vars(compiler='CXX', cflags='CXXFLAGS')
-    x.exts(source=['.cpp', '.cc', '.cp', '.cxx', '.CPP', '.c++', '.C'],
-           header=['.hpp', '.hh', '.hp', '.hxx', '.HPP', '.h++', '.H'])
+    x.vars(compiler='CXX', launcher='CXX_LAUNCHER', cflags='CXXFLAGS')
+    x.exts(source=['.cpp', '.cc', '.cp', '.cxx', '.CPP', '.c++', '.C',
+                   '.cppm', '.ccm', '.cxxm', '.c++m', '.ixx', '.mpp'],
+           header=['.hpp', '.hh', '.hp', '.hxx', '.HPP', '.h++', '.H'],
+           module=['.cppm', '.ccm', '.cxxm', '.c++m', '.ixx', '.mpp'])
 
 with known_langs.make('objc') as x:
-    x.vars(compiler='OBJC', cflags='OBJCFLAGS')
+    x.vars(compiler='OBJC', launcher='OBJC_LAUNCHER', cflags='OBJCFLAGS')
     x.exts(source=['.m'])
 
 with known_langs.make('objc++') as x:
-    x.vars(compiler='OBJCXX', cflags='OBJCXXFLAGS')
+    x.vars(compiler='OBJCXX', launcher='OBJCXX_LAUNCHER', cflags='OBJCXXFLAGS')
     x.exts(source=['.mm', '.M'])
 
 _posix_cmds = {
@@ -2,13 +2,15 @@ import os
 import posixpath
 import re
 import subprocess
+import warnings
 from itertools import chain
 from six import string_types
 
 from . import pkg_config
-from .. import options as opts, safe_str, shell
+from .. import options as opts, pgo, safe_str, shell
 from .ar import ArLinker
-from .common import BuildCommand, darwin_install_name, library_macro
+from .common import (BuildCommand, darwin_install_name, find_launcher,
+                     library_macro)
 from .ld import LdLinker
 from ..builtins.symlink import Symlink
 from ..exceptions import PackageResolutionError
@@ -20,6 +22,11 @@ from ..path import InstallRoot, Path, Root
 from ..versioning import detect_version, SpecifierSet
 
 
+# The directory in the build tree that ThinLTO caches its per-module results
+# in, so that incremental links only redo the work for modules that changed.
+_thinlto_cache = '.thinlto_cache'
+
+
 class CcBuilder(object):
     def __init__(self, env, langinfo, command, version_output):
         name = langinfo.var('compiler').lower()
@@ -43,24 +50,46 @@ class CcBuilder(object):
         )
         ldflags = shell.split(env.getvar('LDFLAGS', ''))
         ldlibs = shell.split(env.getvar('LDLIBS', ''))
+        self.launcher = find_launcher(env, langinfo)
 
-        # macOS's ld doesn't support --version, but we can still try it out and
-        # grab the command line.
-        ld_command = None
-        try:
-            stdout, stderr = env.execute(
-                command + ldflags + ['-v', '-Wl,--version'],
-                stdout=shell.Mode.pipe, stderr=shell.Mode.pipe,
-                returncode='any'
-            )
+        if env.pgo:
+            pgo_cflags, pgo_ldflags = self._pgo_flags(env)
+            cflags.extend(pgo_cflags)
+            ldflags.extend(pgo_ldflags)
 
-            for line in stderr.split('\n'):
-                if '--version' in line:
-                    ld_command = shell.split(line)[0:1]
-                    if os.path.basename(ld_command[0]) != 'collect2':
-                        break
-        except (OSError, shell.CalledProcessError):
-            pass
+        # Use the first of the preferred linkers (e.g. `mold lld gold`) that
+        # the compiler can actually run.
+        ld_command = None
+        linkers = shell.split(env.getvar('LINKER', ''))
+        for i in linkers:
+            fuse_ld = '-fuse-ld=' + i
+            try:
+                ld_command, stdout = self._probe_ld(env, command,
+                                                    ldflags + [fuse_ld], 0)
+                ldflags.append(fuse_ld)
+                break
+            except (OSError, shell.CalledProcessError):
+                pass
+        else:
+            if linkers:
+                warnings.warn('unable to use any linker from {!r}; using the '
+                              'default linker'.format(' '.join(linkers)))
+            try:
+                ld_command, stdout = self._probe_ld(env, command, ldflags)
+            except (OSError, shell.CalledProcessError):
+                pass
+        ld = LdLinker(self, env, ld_command, stdout) if ld_command else None
+
+        self.split_dwarf = env.getvar('SPLIT_DWARF') in ('1', 'true')
+        if self.split_dwarf:
+            if self.object_format != 'elf':
+                warnings.warn('split DWARF is only supported for ELF ' +
+                              'objects')
+                self.split_dwarf = False
+            elif ld and ld.brand in ('gold', 'lld', 'mold'):
+                # Let the linker build an index of the debug info up front
+                # so that debuggers don't need to read every `.dwo` file.
+                ldflags.append('-Wl,--gdb-index')
 
         self.compiler = CcCompiler(self, env, name, command, cflags_name,
                                    cflags)
@@ -79,12 +108,51 @@ class CcBuilder(object):
             ),
             'static_library': ArLinker(self, env),
         }
-        if ld_command:
-            self._linkers['raw'] = LdLinker(self, env, ld_command, stdout)
+        if ld:
+            self._linkers['raw'] = ld
 
         self.packages = CcPackageResolver(self, env, command, ldflags)
         self.runner = None
 
+    @staticmethod
+    def _probe_ld(env, command, ldflags, returncode='any'):
+        # macOS's ld doesn't support --version, but we can still try it out
+        # and grab the command line.
+        stdout, stderr = env.execute(
+            command + ldflags + ['-v', '-Wl,--version'],
+            stdout=shell.Mode.pipe, stderr=shell.Mode.pipe,
+            returncode=returncode
+        )
+
+        ld_command = None
+        for line in stderr.split('\n'):
+            if '--version' in line:
+                ld_command = shell.split(line)[0:1]
+                if os.path.basename(ld_command[0]) != 'collect2':
+                    break
+        return ld_command, stdout
+
+    def _pgo_flags(self, env):
+        profile_dir = env.pgo.profile_dir.string()
+        generate = env.pgo.mode == 'generate'
+        if self.brand == 'gcc' and self.version in SpecifierSet('>=11'):
+            # Name the profile for each object relative to the build directory
+            # so that the instrumented and optimized builds agree on it.
+            prefix = '-fprofile-prefix-path=' + env.builddir.string()
+            if generate:
+                flag = '-fprofile-generate=' + profile_dir
+                return [flag, prefix], [flag]
+            return ['-fprofile-use=' + profile_dir, prefix], []
+        elif self.brand == 'clang':
+            if generate:
+                flag = '-fprofile-generate=' + os.path.join(profile_dir,
+                                                            pgo.raw_dir)
+                return [flag], [flag]
+            return ['-fprofile-use=' + os.path.join(profile_dir,
+                                                    pgo.profdata_file)], []
+        raise ValueError('profile-guided optimization requires GCC 11+ or ' +
+                         'Clang')
+
     @staticmethod
     def check_command(env, command):
         return env.execute(command + ['--version'], stdout=shell.Mode.pipe,
@@ -134,7 +202,11 @@ class CcBaseCompiler(BuildCommand):
 
     @property
     def num_outputs(self):
-        return 1
+        return 2 if self.split_dwarf else 1
+
+    @property
+    def split_dwarf(self):
+        return False
 
     @property
     def needs_libs(self):
@@ -144,13 +216,28 @@ class CcBaseCompiler(BuildCommand):
         return [os.path.abspath(i) for i in
                 self.env.getvar('CPATH', '').split(os.pathsep)]
 
-    def _call(self, cmd, input, output, deps=None, flags=None):
+    @property
+    def module_flavor(self):
+        return None
+
+    def _modmap_args(self, modmap):
+        if not modmap:
+            return []
+        if self.module_flavor == 'gcc':
+            return ['-fmodules-ts', '-fmodule-mapper=' + modmap]
+        # Clang reads the module map as a response file.
+        return ['@' + modmap]
+
+    def _call(self, cmd, input, output, deps=None, flags=None, modmap=None):
         result = list(chain(
-            cmd, self._always_flags, iterate(flags), ['-c', input]
+            iterate(self.builder.launcher), cmd, self._always_flags,
+            iterate(flags), self._modmap_args(modmap), ['-c', input]
         ))
         if deps:
             result.extend(['-MMD', '-MF', deps])
-        result.extend(['-o', output])
+        # When splitting out the debug info, the compiler names the `.dwo`
+        # file after the object file on its own.
+        result.extend(['-o', first(output)])
         return result
 
     @property
@@ -165,6 +252,8 @@ class CcBaseCompiler(BuildCommand):
             elif (self.brand == 'gcc' and self.version and
                   self.version in SpecifierSet('>=4.9')):
                 flags += ['-fdiagnostics-color']
+        if self.split_dwarf:
+            flags += ['-g', '-gsplit-dwarf']
         return flags
 
     def _include_dir(self, directory):
@@ -179,6 +268,13 @@ class CcBaseCompiler(BuildCommand):
         else:
             return ['-I' + directory.path]
 
+    def _lto(self, lto):
+        # GCC doesn't have ThinLTO, but its default (partitioned) LTO already
+        # does most of its work in parallel.
+        if self.brand == 'clang' and lto.mode == 'thin':
+            return '-flto=thin'
+        return '-flto'
+
     def flags(self, options, output=None, mode='normal'):
         flags = []
         for i in options:
@@ -197,6 +293,8 @@ class CcBaseCompiler(BuildCommand):
                 flags.append('-fPIC')
             elif isinstance(i, opts.pch):
                 flags.extend(['-include', i.header.path.stripext()])
+            elif isinstance(i, opts.lto):
+                flags.append(self._lto(i))
             elif isinstance(i, safe_str.stringy_types):
                 flags.append(i)
             else:
@@ -223,10 +321,54 @@ class CcCompiler(CcBaseCompiler):
     def accepts_pch(self):
         return True
 
+    @property
+    def split_dwarf(self):
+        return self.builder.split_dwarf and self.lang != 'java'
+
+    @property
+    def module_flavor(self):
+        # Named modules need GCC 11+ or Clang 16+.
+        if self.lang != 'c++' or not self.version:
+            return None
+        if self.brand == 'gcc' and self.version in SpecifierSet('>=11'):
+            return 'gcc'
+        elif self.brand == 'clang' and self.version in SpecifierSet('>=16'):
+            return 'clang'
+        return None
+
+    def scan(self, input, output, target, deps, flags=None, cmd=None):
+        # Scan a source file for the modules it provides and imports, writing
+        # the result to `output` in P1689 format.
+        cmd = list(chain(listify(cmd or self), self._always_flags,
+                         iterate(flags)))
+        depfile = ['-MD', '-MF', deps, '-MT', output]
+
+        if self.brand == 'clang':
+            return self.env.tool('modscan')(
+                'stdout', output, target, self.env.tool('clang_scan_deps')(
+                    cmd + ['-c', input, '-o', target] + depfile
+                )
+            )
+        elif self.version in SpecifierSet('>=14'):
+            return cmd + [
+                '-E', input, '-fmodules-ts', '-fdeps-format=p1689r5',
+                '-fdeps-file=' + output, '-fdeps-target=' + target,
+                '-o', output + '.i'
+            ] + depfile
+        # Older versions of GCC can't scan for modules, so look at the
+        # preprocessed source ourselves.
+        return self.env.tool('modscan')(
+            'preprocessed', output, target, cmd + ['-E', input] + depfile
+        )
+
     def output_file(self, name, context):
         # XXX: MinGW's object format doesn't appear to be COFF...
-        return ObjectFile(Path(name + '.o'), self.builder.object_format,
-                          self.lang)
+        output = ObjectFile(Path(name + '.o'), self.builder.object_format,
+                            self.lang)
+        if self.split_dwarf:
+            output.debug_info = DebugInfoFile(Path(name + '.dwo'))
+            return [output, output.debug_info]
+        return output
 
 
 class CcPchCompiler(CcCompiler):
@@ -249,6 +391,11 @@ class CcPchCompiler(CcCompiler):
         # You can't pass a PCH to a PCH compiler!
         return False
 
+    @property
+    def num_outputs(self):
+        # PCHs keep their debug info inline, even with `-gsplit-dwarf`.
+        return 1
+
     def output_file(self, name, context):
         ext = '.gch' if self.builder.brand == 'gcc' else '.pch'
         return PrecompiledHeader(Path(name + ext), self.lang)
@@ -509,6 +656,52 @@ class CcLinker(BuildCommand):
                 return []
             raise
 
+    def _uses_jobserver(self, lto):
+        return (self.brand == 'gcc' and lto.jobs is None and
+                self.env.backend == 'make')
+
+    def needs_jobserver(self, options):
+        # GCC can run its LTO partitions using Make's job slots, but only if
+        # Make treats the link as a recursive command.
+        return any(isinstance(i, opts.lto) and self._uses_jobserver(i)
+                   for i in options)
+
+    def _thinlto_flags(self, jobs):
+        cache = Path(_thinlto_cache)
+        if self.builder.object_format == 'mach-o':
+            flags = ['-Wl,-cache_path_lto,' + cache]
+            jobs_flag = '-Wl,-mllvm,-threads={}'
+        else:
+            try:
+                brand = self.builder.linker('raw').brand
+            except KeyError:
+                brand = 'unknown'
+            if brand == 'lld':
+                flags = ['-Wl,--thinlto-cache-dir=' + cache]
+                jobs_flag = '-Wl,--thinlto-jobs={}'
+            else:
+                # Other ELF linkers run ThinLTO via the LLVM gold plugin.
+                flags = ['-Wl,-plugin-opt,cache-dir=' + cache]
+                jobs_flag = '-Wl,-plugin-opt,jobs={}'
+
+        if jobs:
+            flags.append(jobs_flag.format(jobs))
+        return flags
+
+    def _lto_flags(self, lto):
+        if self.brand == 'clang':
+            if lto.mode == 'thin':
+                return ['-flto=thin'] + self._thinlto_flags(lto.jobs)
+            return ['-flto']
+        elif self.brand == 'gcc':
+            if lto.jobs:
+                return ['-flto={}'.format(lto.jobs)]
+            elif self._uses_jobserver(lto):
+                return ['-flto=jobserver']
+            elif self.version and self.version in SpecifierSet('>=10'):
+                return ['-flto=auto']
+        return ['-flto']
+
     def flags(self, options, output=None, mode='normal'):
         raw_static = mode != 'pkg-config'
         flags, rpaths, rpath_links, lib_dirs = [], [], [], []
@@ -534,6 +727,8 @@ class CcLinker(BuildCommand):
                 if self.lang != 'java':
                     raise ValueError('entry point only applies to java')
                 flags.append('--main={}'.format(i.value))
+            elif isinstance(i, opts.lto):
+                flags.extend(self._lto_flags(i))
             elif isinstance(i, safe_str.stringy_types):
                 flags.append(i)
             elif isinstance(i, opts.lib_literal):
@@ -705,7 +900,9 @@ class CcPackageResolver(object):
             search_dirs = self.include_dirs
 
         for base in search_dirs:
-            if os.path.exists(os.path.join(base, name)):
+            fullpath = os.path.join(base, name)
+            self.env.add_probe(os.path.dirname(fullpath))
+            if os.path.exists(fullpath):
                 return HeaderDirectory(Path(base, Root.absolute), None,
                                        system=True, external=True)
 
@@ -734,6 +931,7 @@ class CcPackageResolver(object):
             libnames.append((name + '.lib', Library, {}))
 
         for base in search_dirs:
+            self.env.add_probe(base)
             for libname, libkind, extra_kwargs in libnames:
                 fullpath = os.path.join(base, libname)
                 if os.path.exists(fullpath):
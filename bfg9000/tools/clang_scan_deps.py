@@ -0,0 +1,13 @@
+from . import tool
+from .common import SimpleCommand
+
+
+@tool('clang_scan_deps')
+class ClangScanDeps(SimpleCommand):
+    def __init__(self, env):
+        SimpleCommand.__init__(self, env, name='clang_scan_deps',
+                               env_var='CLANG_SCAN_DEPS',
+                               default='clang-scan-deps')
+
+    def _call(self, cmd, subcmd):
+        return cmd + ['-format=p1689', '--'] + subcmd
@@ -110,6 +110,23 @@ def check_which(names, *args, **kwargs):
         return shell.listify(names[0])
 
 
+def find_launcher(env, langinfo):
+    # Launchers (e.g. ccache) are kept separate from the compiler command so
+    # that they're only used when actually compiling files, not when probing
+    # the compiler for its brand, version, search dirs, etc.
+    try:
+        var = langinfo.var('launcher')
+    except ValueError:
+        return None
+
+    launcher = env.getvar(var)
+    if not launcher:
+        return None
+    cmd = check_which(launcher, env.variables,
+                      kind='{} compiler launcher'.format(langinfo.name))
+    return Command(env, var.lower(), var.lower(), cmd)
+
+
 def choose_builder(env, langinfo, default_candidates, builders):
     candidates = listify(env.getvar(langinfo.var('compiler'),
                                     default_candidates))
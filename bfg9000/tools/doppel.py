@@ -14,25 +14,17 @@ class Doppel(SimpleCommand):
     def data_args(self):
         return ['-m', '644']
 
-    def _call(self, cmd, mode, src, dst, directory=None, format=None,
-              dest_prefix=None):
+    def into_args(self, full_name=True):
+        return ['-ipN' if full_name else '-ip']
+
+    def _call(self, cmd, mode, src, dst, directory=None):
         if mode == 'onto':
             return cmd + ['-p', src, dst]
 
         elif mode == 'into':
-            result = cmd + ['-ipN']
-            if directory:
-                result.extend(['-C', directory])
-            result.extend(iterate(src))
-            result.append(dst)
-            return result
-
-        elif mode == 'archive':
-            result = cmd + ['-ipN', '-f', format]
+            result = cmd + self.into_args()
             if directory:
                 result.extend(['-C', directory])
-            if dest_prefix:
-                result.extend(['-P', dest_prefix])
             result.extend(iterate(src))
             result.append(dst)
             return result
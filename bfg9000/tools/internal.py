@@ -1,5 +1,10 @@
+import os
+import zlib
+
 from . import tool
 from .common import SimpleCommand
+from ..iterutils import iterate
+from ..path import Path
 from ..safe_str import shell_literal
 from ..shell import escape_line, shell_list
 
@@ -14,6 +19,156 @@ class Bfg9000(SimpleCommand):
         return cmd + ['refresh', builddir]
 
 
+@tool('archive')
+class Archive(SimpleCommand):
+    def __init__(self, env):
+        SimpleCommand.__init__(self, env, name='bfg9000_archive',
+                               env_var='BFG9000_ARCHIVE',
+                               default=env.bfgdir.append('bfg9000-archive'))
+
+    def _call(self, cmd, format, src, dst, directory=None, dest_prefix=None):
+        args = ['-f', format]
+        if directory:
+            args.extend(['-C', directory])
+        if dest_prefix:
+            args.extend(['-P', dest_prefix])
+        return cmd + args + [dst] + list(iterate(src))
+
+
+@tool('cache')
+class Cache(SimpleCommand):
+    def __init__(self, env):
+        SimpleCommand.__init__(self, env, name='bfg9000_cache',
+                               env_var='BFG9000_CACHE',
+                               default=env.bfgdir.append('bfg9000-cache'))
+        cache_dir = env.getvar('BFG9000_CACHE_DIR')
+        self.cache_dir = os.path.abspath(cache_dir) if cache_dir else None
+        self.max_size = env.getvar('BFG9000_CACHE_SIZE')
+
+    def _store_args(self, outputs, inputs=None, salt=None):
+        result = ['-d', self.cache_dir]
+        if self.max_size:
+            result.extend(['--max-size', self.max_size])
+        return result, ([j for i in iterate(outputs) for j in ['-o', i]] +
+                        [j for i in iterate(inputs) for j in ['-i', i]] +
+                        (['--salt', salt] if salt else []))
+
+    def _call(self, cmd, subcmd, outputs, depfile=None):
+        store_args, key_args = self._store_args(outputs)
+        if depfile:
+            key_args.extend(['--depfile', depfile])
+        return cmd + store_args + ['run'] + key_args + ['--'] + subcmd
+
+    def wrap_shell(self, line, outputs, inputs, salt, cmd=None):
+        # Arbitrary shell commands can't be passed to `run`, so instead we try
+        # to restore the outputs first, and only if that fails do we run the
+        # command and store its outputs. The command itself runs in a subshell
+        # in case it changes the working directory.
+        cmd = [cmd or self]
+        store_args, key_args = self._store_args(outputs, inputs, salt)
+        return (
+            shell_list(cmd + store_args + ['lookup'] + key_args +
+                       [shell_literal('||'), shell_literal('('),
+                        shell_literal('(')]) +
+            escape_line(line, listify=True) +
+            shell_list([shell_literal(')'), shell_literal('&&')] + cmd +
+                       store_args + ['store'] + key_args +
+                       [shell_literal(')')])
+        )
+
+
+def cached_command(env, command, outputs, depfile=None):
+    if not env.getvar('BFG9000_CACHE_DIR'):
+        return command
+    return env.tool('cache')(command, outputs, depfile)
+
+
+@tool('pool')
+class Pool(SimpleCommand):
+    def __init__(self, env):
+        SimpleCommand.__init__(self, env, name='bfg9000_pool',
+                               env_var='BFG9000_POOL',
+                               default=env.bfgdir.append('bfg9000-pool'))
+
+    def _call(self, cmd, name, depth, subcmd):
+        return cmd + [name, str(depth), '--'] + subcmd
+
+
+@tool('timelog')
+class Timelog(SimpleCommand):
+    def __init__(self, env):
+        SimpleCommand.__init__(self, env, name='bfg9000_timelog',
+                               env_var='BFG9000_TIMELOG',
+                               default=env.bfgdir.append('bfg9000-timelog'))
+
+    def _call(self, cmd, target, line):
+        return cmd + [target, '-c', line]
+
+
+@tool('pgo')
+class Pgo(SimpleCommand):
+    def __init__(self, env):
+        SimpleCommand.__init__(self, env, name='bfg9000_pgo',
+                               env_var='BFG9000_PGO',
+                               default=env.bfgdir.append('bfg9000-pgo'))
+
+    def _call(self, cmd, profile, command, directory=None, merge=None,
+              stamp=None):
+        args = []
+        if directory:
+            args.extend(['-C', directory])
+        if merge:
+            args.extend(['--merge', merge])
+        if stamp:
+            args.extend(['--stamp', stamp])
+        return cmd + args + [profile, '--'] + command
+
+
+@tool('installer')
+class Installer(SimpleCommand):
+    def __init__(self, env):
+        SimpleCommand.__init__(self, env, name='bfg9000_install',
+                               env_var='BFG9000_INSTALL',
+                               default=env.bfgdir.append('bfg9000-install'))
+
+    def _call(self, cmd, src, dst, subcmd, directory=None, full_name=False):
+        args = []
+        if directory:
+            args.extend(['-C', directory])
+        if full_name:
+            args.append('-N')
+        return cmd + args + [dst] + list(iterate(src)) + ['--'] + subcmd
+
+    def wrap_post_install(self, line, src, dst, cmd=None):
+        # Post-install steps (e.g. patching rpaths) modify the installed file,
+        # so it'll never match its source again. Instead, record the source
+        # once the step is done, and skip it (and the install itself) if
+        # neither file has changed since.
+        cmd = [cmd or self]
+        return (
+            shell_list(cmd + ['--check', src, dst] +
+                       [shell_literal('||'), shell_literal('('),
+                        shell_literal('(')]) +
+            escape_line(line, listify=True) +
+            shell_list([shell_literal(')'), shell_literal('&&')] + cmd +
+                       ['--stamp', src, dst, shell_literal(')')])
+        )
+
+
+@tool('test_runner')
+class TestRunner(SimpleCommand):
+    def __init__(self, env):
+        SimpleCommand.__init__(self, env, name='bfg9000_test',
+                               env_var='BFG9000_TEST',
+                               default=env.bfgdir.append('bfg9000-test'))
+
+    def _call(self, cmd, manifest, test_id=None, stamp=None, log=None):
+        if test_id is None:
+            return cmd + [manifest]
+        return cmd + ['--id', test_id, '--stamp', stamp, '--log', log,
+                      manifest]
+
+
 @tool('depfixer')
 class Depfixer(SimpleCommand):
     def __init__(self, env):
@@ -25,6 +180,53 @@ class Depfixer(SimpleCommand):
                                  shell_literal('>>'), depfile])
 
 
+@tool('depdb')
+class Depdb(SimpleCommand):
+    def __init__(self, env):
+        SimpleCommand.__init__(self, env, name='depdb', env_var='DEPDB',
+                               default=env.bfgdir.append('bfg9000-depdb'))
+        shards = env.getvar('MAKE_DEPDB_SHARDS')
+        self.shards = max(int(shards), 0) if shards else 0
+
+    def shard(self, output):
+        # Spread the objects across the shards by hashing their paths so
+        # that each shard stays small.
+        key = zlib.crc32(output.suffix.encode('utf-8')) & 0xffffffff
+        return Path('.bfg_deps/{}.mk'.format(key % self.shards))
+
+    def _call(self, cmd, shard, target, depfile):
+        return cmd + [shard, target, depfile]
+
+
+@tool('fortscan')
+class Fortscan(SimpleCommand):
+    def __init__(self, env):
+        SimpleCommand.__init__(self, env, name='fortscan', env_var='FORTSCAN',
+                               default=env.bfgdir.append('bfg9000-fortscan'))
+
+    def _call(self, cmd, format, output, files):
+        return cmd + ['-f', format, '-o', output] + list(files)
+
+
+@tool('modscan')
+class Modscan(SimpleCommand):
+    def __init__(self, env):
+        SimpleCommand.__init__(self, env, name='modscan', env_var='MODSCAN',
+                               default=env.bfgdir.append('bfg9000-modscan'))
+
+    def _call(self, cmd, mode, output, target, subcmd):
+        return cmd + ['scan', '--' + mode, '-o', output, '-t', target,
+                      '--'] + subcmd
+
+    def collate(self, format, flavor, output, bmi_dir, scans, cmd=None):
+        return [cmd or self, 'collate', '-f', format, '--flavor', flavor,
+                '-b', bmi_dir, '-o', output] + list(iterate(scans))
+
+    def wrap_compile(self, subcmd, target, depfile, cmd=None):
+        return [cmd or self, 'compile', '-t', target, '--depfile',
+                depfile, '--'] + subcmd
+
+
 @tool('jvmoutput')
 class JvmOutput(SimpleCommand):
     def __init__(self, env):
@@ -35,3 +237,13 @@ class JvmOutput(SimpleCommand):
 
     def _call(self, cmd, output, subcmd):
         return cmd + ['-o', output] + subcmd
+
+
+@tool('jvmd')
+class Jvmd(SimpleCommand):
+    def __init__(self, env):
+        SimpleCommand.__init__(self, env, name='jvmd', env_var='JVMD',
+                               default=env.bfgdir.append('bfg9000-jvmd'))
+
+    def _call(self, cmd, output, subcmd):
+        return cmd + ['-o', output] + subcmd
@@ -117,7 +117,13 @@ class JvmCompiler(BuildCommand):
         return False
 
     def _call(self, cmd, input, output, flags=None):
-        jvmoutput = self.env.tool('jvmoutput')
+        # Only javac can be hosted by the compiler daemon; other JVM compilers
+        # always use the regular output filter.
+        use_daemon = self.env.getvar('JVM_DAEMON') in ('1', 'true')
+        if self.lang == 'java' and use_daemon:
+            jvmoutput = self.env.tool('jvmd')
+        else:
+            jvmoutput = self.env.tool('jvmoutput')
         result = list(chain(
             cmd, self._always_flags, iterate(flags), [input]
         ))
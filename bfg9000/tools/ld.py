@@ -10,13 +10,20 @@ class LdLinker(object):
         self.env = env
         self.command = command
 
-        if 'GNU ld' in version_output:
+        # mold claims to be "compatible with GNU ld", so check for it first.
+        if version_output.startswith('mold '):
+            self.brand = 'mold'
+            self.version = detect_version(version_output)
+        elif 'GNU ld' in version_output:
             self.brand = 'bfd'
             self.version = detect_version(version_output)
         elif 'GNU gold' in version_output:
             self.brand = 'gold'
             self.version = detect_version(version_output, post='$',
                                           flags=re.MULTILINE)
+        elif 'LLD' in version_output:
+            self.brand = 'lld'
+            self.version = detect_version(version_output)
         else:
             self.brand = 'unknown'
             self.version = None
@@ -0,0 +1,10 @@
+from . import tool
+from .common import SimpleCommand
+
+
+@tool('llvm_profdata')
+class LlvmProfdata(SimpleCommand):
+    def __init__(self, env):
+        SimpleCommand.__init__(self, env, name='llvm_profdata',
+                               env_var='LLVM_PROFDATA',
+                               default='llvm-profdata')
@@ -3,7 +3,8 @@ import re
 from itertools import chain
 
 from . import pkg_config
-from .common import BuildCommand, check_which, library_macro
+from .common import (BuildCommand, check_which, find_launcher,
+                     library_macro)
 from .. import options as opts, safe_str, shell
 from ..arguments.windows import ArgumentParser
 from ..builtins.file_types import generated_file
@@ -31,6 +32,10 @@ class MsvcBuilder(object):
             self.brand = 'unknown'
             self.version = None
 
+        if env.pgo:
+            raise ValueError('profile-guided optimization requires GCC 11+ ' +
+                             'or Clang')
+
         # Look for the last argument that looks like our compiler and use its
         # directory as the base directory to find the linkers.
         origin = ''
@@ -53,6 +58,7 @@ class MsvcBuilder(object):
         )
         ldflags = shell.split(env.getvar('LDFLAGS', ''))
         ldlibs = shell.split(env.getvar('LDLIBS', ''))
+        self.launcher = find_launcher(env, langinfo)
 
         self.compiler = MsvcCompiler(self, env, name, command, cflags_name,
                                      cflags)
@@ -135,7 +141,10 @@ class MsvcBaseCompiler(BuildCommand):
         return cpath + include
 
     def _call(self, cmd, input, output, deps=None, flags=None):
-        result = list(chain( cmd, self._always_flags, iterate(flags) ))
+        result = list(chain(
+            iterate(self.builder.launcher), cmd, self._always_flags,
+            iterate(flags)
+        ))
         if deps:
             result.append('/showIncludes')
         result.extend(['/c', input])
@@ -163,6 +172,8 @@ class MsvcBaseCompiler(BuildCommand):
                 flags.append('/std:' + i.value)
             elif isinstance(i, opts.pch):
                 flags.append('/Yu' + i.header.header_name)
+            elif isinstance(i, opts.lto):
+                flags.append('/GL')
             elif isinstance(i, safe_str.stringy_types):
                 flags.append(i)
             else:
@@ -239,7 +250,7 @@ class MsvcPchCompiler(MsvcBaseCompiler):
 
         if context.pch_source is None:
             ext = known_langs[self.lang].exts('source')[0]
-            context.pch_source = SourceFile(header.path.stripext(ext).reroot(),
+            context.pch_source = SourceFile(Path(name).stripext(ext),
                                             header.lang)
             with generated_file(build, self.env, context.pch_source) as out:
                 out.write('#include "{}"\n'.format(header.path.basename()))
@@ -357,6 +368,11 @@ class MsvcLinker(BuildCommand):
                 lib_dirs.append(i.directory.path)
             elif isinstance(i, opts.lib):
                 lib_dirs.append(i.library.path.parent())
+            elif isinstance(i, opts.lto):
+                # Incremental link-time code generation is MSVC's closest
+                # equivalent to ThinLTO.
+                flags.append('/LTCG:INCREMENTAL' if i.mode == 'thin'
+                             else '/LTCG')
             elif isinstance(i, safe_str.stringy_types):
                 flags.append(i)
             elif isinstance(i, opts.lib_literal):
@@ -1,4 +1,5 @@
 import argparse
+import os
 import subprocess
 
 from . import tool
@@ -34,6 +35,20 @@ class PkgConfig(SimpleCommand):
             result.append('--msvc-syntax')
         return result
 
+    @memoize
+    def search_dirs(self):
+        # The directories pkg-config looks for `.pc` files in, so that we can
+        # tell when a package is installed or removed.
+        dirs = self.env.getvar('PKG_CONFIG_PATH', '').split(os.pathsep)
+        try:
+            dirs.extend(self.env.execute(
+                self.command + ['--variable=pc_path', 'pkg-config'],
+                stdout=shell.Mode.pipe, stderr=shell.Mode.devnull
+            ).strip().split(os.pathsep))
+        except (OSError, subprocess.CalledProcessError):
+            pass
+        return [i for i in dirs if i]
+
 
 class PkgConfigPackage(Package):
     def __init__(self, name, format, specifier, kind, pkg_config):
@@ -94,5 +109,7 @@ class PkgConfigPackage(Package):
 
 
 def resolve(env, name, format, version=None, kind=PackageKind.any):
-    return PkgConfigPackage(name, format, version, kind,
-                            env.tool('pkg_config'))
+    pkg_config = env.tool('pkg_config')
+    for i in pkg_config.search_dirs():
+        env.add_probe(i)
+    return PkgConfigPackage(name, format, version, kind, pkg_config)
@@ -0,0 +1,305 @@
+import errno
+import os
+import select
+import stat
+import struct
+import subprocess
+import sys
+import time
+
+from . import log
+from .build import bfgfile, optsfile
+from .configurations import ConfigurationSet
+from .snapshot import Snapshot
+from .versioning import SpecifierSet
+
+logger = log.getLogger(__name__)
+
+try:
+    import ctypes
+    import ctypes.util
+except ImportError:  # pragma: no cover
+    ctypes = None
+
+# inotify(7) constants.
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_watch_mask = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM |
+               _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF |
+               _IN_MOVE_SELF)
+_event = struct.Struct('iIII')
+
+
+def _walk_dirs(root, ignore):
+    # Hidden directories (e.g. `.git`) and the build directory change all the
+    # time without mattering to the build, so don't watch them.
+    for path, dirs, _ in os.walk(root):
+        dirs[:] = [i for i in dirs if not i.startswith('.') and
+                   os.path.join(path, i) not in ignore]
+        yield path
+
+
+class PollingWatcher(object):
+    def __init__(self, root, ignore=(), interval=0.5):
+        self.root = os.path.abspath(root)
+        self.ignore = set(os.path.abspath(i) for i in ignore)
+        self.interval = interval
+        self._state = self._scan()
+
+    def _scan(self):
+        state = {}
+        for path in _walk_dirs(self.root, self.ignore):
+            for name in os.listdir(path):
+                fullpath = os.path.join(path, name)
+                if fullpath in self.ignore:
+                    continue
+                try:
+                    st = os.stat(fullpath)
+                except OSError:
+                    continue
+                if name.startswith('.') and stat.S_ISDIR(st.st_mode):
+                    continue
+                state[fullpath] = (st.st_mtime, st.st_size)
+        return state
+
+    def wait(self, timeout=None):
+        start = time.time()
+        while True:
+            state = self._scan()
+            changes = set(i for i in set(state) | set(self._state)
+                          if state.get(i) != self._state.get(i))
+            self._state = state
+            if changes:
+                return changes
+
+            remaining = (None if timeout is None else
+                         timeout - (time.time() - start))
+            if remaining is not None and remaining <= 0:
+                return changes
+            time.sleep(self.interval if remaining is None else
+                       min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    def __init__(self, root, ignore=()):
+        self.root = os.path.abspath(root)
+        self.ignore = set(os.path.abspath(i) for i in ignore)
+
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        self._dirs = {}
+        for path in _walk_dirs(self.root, self.ignore):
+            self._add_watch(path)
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, path.encode('utf-8'),
+                                          _watch_mask)
+        # The directory may have been removed before we got to it; that's
+        # fine, since its parent will report that anyway.
+        if wd >= 0:
+            self._dirs[wd] = path
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 65536)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return set()
+            raise
+
+        changes = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _event.unpack_from(data, offset)
+            offset += _event.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8')
+            offset += length
+
+            if mask & _IN_Q_OVERFLOW:
+                # We lost events, so just claim that the whole tree changed.
+                changes.add(self.root)
+                continue
+            if mask & _IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+
+            path = self._dirs.get(wd)
+            if path is None:
+                continue
+            if name:
+                path = os.path.join(path, name)
+            if path in self.ignore:
+                continue
+            changes.add(path)
+
+            # Start watching new directories (and anything created in them
+            # before we noticed).
+            if ( mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO) and
+                 not os.path.basename(path).startswith('.') and
+                 path not in self.ignore ):
+                for i in _walk_dirs(path, self.ignore):
+                    self._add_watch(i)
+                    changes.add(i)
+        return changes
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            remaining = (None if deadline is None else
+                         max(deadline - time.time(), 0))
+            try:
+                ready = select.select([self._fd], [], [], remaining)[0]
+            except select.error as e:  # pragma: no cover
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            if not ready:
+                return set()
+            changes = self._read_events()
+            if changes:
+                return changes
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def _load_libc():
+    if ctypes is None or not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        return libc
+    except (OSError, AttributeError):  # pragma: no cover
+        return None
+
+
+def make_watcher(root, ignore=(), poll=False):
+    if not poll and _load_libc():
+        try:
+            return InotifyWatcher(root, ignore)
+        except OSError as e:
+            # We might be out of inotify instances or watches; polling is
+            # slower, but still works.
+            logger.debug('unable to use inotify: {}'.format(e))
+    return PollingWatcher(root, ignore)
+
+
+def collect(watcher, delay=0.1):
+    # Editors often save files in several steps, and we don't want to start a
+    # build in the middle of that, so wait until things are quiet.
+    changes = watcher.wait()
+    while True:
+        more = watcher.wait(delay)
+        if not more:
+            return changes
+        changes |= more
+
+
+class Watch(object):
+    def __init__(self, env, backend, targets, regenerate):
+        self.env = env
+        self.backend = backend
+        self.targets = targets
+        self.regenerate = regenerate
+        self.command = backend.command(env.variables)
+
+    @property
+    def builddir(self):
+        return self.env.builddir.string()
+
+    def _tracked(self):
+        # The build files only depend on the build scripts and the directories
+        # searched by `find_files()` (i.e. what's in `.bfg_find_deps`); the
+        # snapshot already knows about all of these. For multi-configuration
+        # builds, each configuration has its own snapshot.
+        builddirs = [self.builddir]
+        configurations = ConfigurationSet.load(self.builddir)
+        if configurations:
+            builddirs = [os.path.join(self.builddir, i)
+                         for i in configurations.configurations]
+
+        files = set(os.path.join(self.env.srcdir.string(), i)
+                    for i in (bfgfile, optsfile))
+        dirs = set()
+        for i in builddirs:
+            snapshot = Snapshot.load(i)
+            if snapshot:
+                dirs.update(path for kind, path, _ in snapshot.fingerprints
+                            if kind == 'dir')
+        return files, dirs
+
+    def needs_refresh(self, changes):
+        files, dirs = self._tracked()
+        return any(i in files or i in dirs or os.path.dirname(i) in dirs
+                   for i in changes)
+
+    def _restat(self):
+        # Ninja remembers when it last ran its regenerate rule, so tell it that
+        # the build files are up to date now to keep it from running the rule
+        # again.
+        if ( self.env.backend == 'ninja' and self.env.backend_version and
+             self.env.backend_version in SpecifierSet('>=1.10') ):
+            subprocess.call(self.command + ['-t', 'restat'],
+                            cwd=self.builddir)
+
+    def refresh(self):
+        snapshot = Snapshot.load(self.builddir)
+        if snapshot and snapshot.current(self.env):
+            snapshot.touch()
+        else:
+            logger.info('regenerating build files')
+            try:
+                # Reuse the environment so that we don't have to probe for
+                # tools again.
+                self.regenerate(self.env, self.backend)
+            except Exception as e:
+                logger.exception(e)
+                return False
+
+        self._restat()
+        return True
+
+    def build(self):
+        logger.info('building {}'.format(' '.join(self.targets) or
+                                         'default targets'))
+        result = subprocess.call(self.command + self.targets,
+                                 cwd=self.builddir)
+        if result != 0:
+            logger.error('build failed')
+        return result
+
+    def step(self, changes):
+        if self.needs_refresh(changes) and not self.refresh():
+            return None
+        return self.build()
+
+    def run(self, watcher, delay=0.1):
+        if self.refresh():
+            self.build()
+        while True:
+            self.step(collect(watcher, delay))
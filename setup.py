@@ -168,10 +168,21 @@ setup(
 
     entry_points={
         'console_scripts': [
-            'bfg9000=bfg9000.driver:main',
+            'bfg9000=bfg9000.client:main',
             '9k=bfg9000.driver:simple_main',
             'bfg9000-depfixer=bfg9000.depfixer:main',
+            'bfg9000-depdb=bfg9000.depdb:main',
+            'bfg9000-fortscan=bfg9000.fortscan:main',
+            'bfg9000-modscan=bfg9000.modscan:main',
             'bfg9000-jvmoutput=bfg9000.jvmoutput:main',
+            'bfg9000-jvmd=bfg9000.jvmd:main',
+            'bfg9000-cache=bfg9000.cache:main',
+            'bfg9000-pool=bfg9000.pool:main',
+            'bfg9000-timelog=bfg9000.timelog:main',
+            'bfg9000-pgo=bfg9000.pgo:main',
+            'bfg9000-test=bfg9000.testrunner:main',
+            'bfg9000-install=bfg9000.install:main',
+            'bfg9000-archive=bfg9000.archive:main',
         ],
         'bfg9000.backends': [
             'make=bfg9000.backends.make.writer',
@@ -0,0 +1,10 @@
+#include <stdio.h>
+
+int main(int argc, char *argv[]) {
+#ifdef NDEBUG
+  printf("release\n");
+#else
+  printf("debug\n");
+#endif
+  return 0;
+}
@@ -0,0 +1,10 @@
+module;
+#include <iostream>
+#include <string>
+
+export module greeting;
+export import :strings;
+
+export void greet(const std::string &name) {
+  std::cout << prefix() << name << "!" << std::endl;
+}
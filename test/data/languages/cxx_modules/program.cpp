@@ -0,0 +1,6 @@
+import greeting;
+
+int main() {
+  greet("c++ modules");
+  return 0;
+}
@@ -0,0 +1,5 @@
+export module greeting:strings;
+
+export const char * prefix() {
+  return "hello from ";
+}
@@ -0,0 +1,5 @@
+#include "library.hpp"
+
+std::string hello() {
+  return "hello from lto!";
+}
@@ -0,0 +1,7 @@
+#include <iostream>
+#include "library.hpp"
+
+int main() {
+  std::cout << hello() << std::endl;
+  return 0;
+}
@@ -0,0 +1,5 @@
+#include "header.hpp"
+
+void goodbye() {
+  std::cout << "goodbye from pch!" << std::endl;
+}
@@ -0,0 +1,10 @@
+#ifndef INC_HEADER_HPP
+#define INC_HEADER_HPP
+
+#include <iostream>
+
+inline void hello() {
+  std::cout << "hello from pch!" << std::endl;
+}
+
+#endif
@@ -0,0 +1,6 @@
+#include "header.hpp"
+#include "library.hpp"
+
+void library_hello() {
+  hello();
+}
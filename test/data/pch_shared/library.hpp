@@ -0,0 +1,16 @@
+#ifndef INC_LIBRARY_HPP
+#define INC_LIBRARY_HPP
+
+#ifdef _WIN32
+#  ifdef LIBLIBRARY_EXPORTS
+#    define LIBLIBRARY_PUBLIC __declspec(dllexport)
+#  else
+#    define LIBLIBRARY_PUBLIC __declspec(dllimport)
+#  endif
+#else
+#  define LIBLIBRARY_PUBLIC
+#endif
+
+void LIBLIBRARY_PUBLIC library_hello();
+
+#endif
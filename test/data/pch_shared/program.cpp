@@ -0,0 +1,11 @@
+#include "header.hpp"
+#include "library.hpp"
+
+void goodbye();
+
+int main() {
+  hello();
+  library_hello();
+  goodbye();
+  return 0;
+}
@@ -12,3 +12,31 @@ class TestCxx(IntegrationTest):
     def test_build(self):
         self.build(executable('program'))
         self.assertOutput([executable('program')], 'hello from c++!\n')
+
+
+@skip_if(not getattr(env.builder('c++').compiler, 'module_flavor', None),
+         'compiler has no module support')
+class TestCxxModules(IntegrationTest):
+    def __init__(self, *args, **kwargs):
+        IntegrationTest.__init__(
+            self, os.path.join('languages', 'cxx_modules'), stage_src=True,
+            *args, **kwargs
+        )
+
+    def test_build(self):
+        self.build(executable('program'))
+        self.assertOutput([executable('program')],
+                          'hello from c++ modules!\n')
+
+    def test_rebuild(self):
+        self.build(executable('program'))
+
+        self.wait()
+        with open(os.path.join(self.srcdir, 'strings.cppm')) as f:
+            source = f.read()
+        with open(os.path.join(self.srcdir, 'strings.cppm'), 'w') as f:
+            f.write(source.replace('hello from', 'goodbye from'))
+
+        self.build(executable('program'))
+        self.assertOutput([executable('program')],
+                          'goodbye from c++ modules!\n')
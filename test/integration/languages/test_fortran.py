@@ -25,3 +25,30 @@ class TestF95(IntegrationTest):
     def test_build(self):
         self.build(executable('program'))
         self.assertOutput([executable('program')], ' hello from f95!\n')
+
+
+@skip_if(env.host_platform.name == 'windows', 'no fortran on windows')
+class TestF95Modules(IntegrationTest):
+    def __init__(self, *args, **kwargs):
+        IntegrationTest.__init__(
+            self, os.path.join('languages', 'f95_modules'), stage_src=True,
+            *args, **kwargs
+        )
+
+    def test_build(self):
+        self.build(executable('program'))
+        self.assertOutput([executable('program')],
+                          'hello from f95 modules!\n')
+
+    def test_rebuild(self):
+        self.build(executable('program'))
+
+        self.wait()
+        with open(os.path.join(self.srcdir, 'strings.f95')) as f:
+            source = f.read()
+        with open(os.path.join(self.srcdir, 'strings.f95'), 'w') as f:
+            f.write(source.replace('hello from', 'goodbye from'))
+
+        self.build(executable('program'))
+        self.assertOutput([executable('program')],
+                          'goodbye from f95 modules!\n')
@@ -32,6 +32,24 @@ class TestJava(IntegrationTest):
         )
 
 
+@skip_if_backend('msbuild')
+class TestJavaDaemon(IntegrationTest):
+    def __init__(self, *args, **kwargs):
+        IntegrationTest.__init__(self, os.path.join('languages', 'java'),
+                                 env={'JVM_DAEMON': '1'}, *args, **kwargs)
+
+    def tearDown(self):
+        self.assertPopen(['bfg9000-jvmd', '--stop'])
+
+    def test_build(self):
+        self.build('program.jar')
+        self.assertTrue(os.path.exists(os.path.join('.bfg_jvmd', 'port')))
+        for i in glob.glob("*.class*"):
+            os.remove(i)
+        self.assertOutput(['java', '-jar', 'program.jar'],
+                          'hello from java!\n')
+
+
 @skip_if('gcj' not in extra_tests, 'skipping gcj tests')
 class TestGcj(IntegrationTest):
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,36 @@
+import json
+import os
+
+from . import *
+pjoin = os.path.join
+
+
+@skip_if_backend('msbuild')
+class TestAnalyze(IntegrationTest):
+    def __init__(self, *args, **kwargs):
+        IntegrationTest.__init__(
+            self, pjoin(examples_dir, '02_library'), *args, **kwargs
+        )
+
+    def test_analyze(self):
+        if self.backend == 'make':
+            self.build(extra_args=['BFG9000_TIMING=1'])
+        else:
+            self.build()
+
+        output = json.loads(self.assertPopen(['bfg9000', 'analyze',
+                                              '--json']))
+        targets = {i['target']: i for i in output['targets']}
+        self.assertEqual(targets[executable('program').path]['location'],
+                         'build.bfg:18')
+        self.assertEqual(targets[executable('program').path]['function'],
+                         'executable')
+        self.assertEqual(targets[shared_library('library').path]['function'],
+                         'library')
+        self.assertGreater(output['critical_path']['duration'], 0)
+
+        self.assertIn('critical path:', self.assertPopen(['bfg9000',
+                                                          'analyze']))
+
+    def test_no_log(self):
+        self.assertPopen(['bfg9000', 'analyze'], returncode=1)
@@ -0,0 +1,94 @@
+import os.path
+import shutil
+import sys
+from six import assertRegex
+
+from . import *
+
+cache_dir = os.path.join(test_stage_dir, 'cache-store')
+
+
+class TestCacheCommand(TestCase):
+    def setUp(self):
+        cleandir(cache_dir)
+        os.chdir(cache_dir)
+
+    def cache(self, *args):
+        return ['bfg9000-cache', '-d',
+                os.path.join(cache_dir, 'store')] + list(args)
+
+    def test_no_args(self):
+        self.assertPopen(['bfg9000-cache', '-d', 'store'], returncode=2)
+
+    def test_nonexistent_command(self):
+        self.assertPopen(self.cache('run', '-o', 'out', '--', 'nonexist'),
+                         returncode=66)
+
+    def test_run(self):
+        script = 'open("out", "w").write("hello")'
+        cmd = self.cache('run', '-o', 'out', '--', sys.executable, '-c',
+                         script)
+        self.assertPopen(cmd)
+        os.remove('out')
+
+        self.assertPopen(cmd)
+        with open('out') as f:
+            self.assertEqual(f.read(), 'hello')
+        assertRegex(self, self.assertPopen(self.cache('stats')),
+                    r'hits:\s+1\n')
+
+    def test_lookup_store(self):
+        with open('in', 'w') as f:
+            f.write('input')
+        key = ['-o', 'out', '-i', 'in', '--salt', 'salt']
+
+        self.assertPopen(self.cache('lookup', *key), returncode=1)
+        shutil.copy('in', 'out')
+        self.assertPopen(self.cache('store', *key))
+        os.remove('out')
+
+        self.assertPopen(self.cache('lookup', *key))
+        with open('out') as f:
+            self.assertEqual(f.read(), 'input')
+
+        with open('in', 'w') as f:
+            f.write('changed')
+        self.assertPopen(self.cache('lookup', *key), returncode=1)
+
+    def test_trim(self):
+        with open('out', 'w') as f:
+            f.write('output')
+        self.assertPopen(self.cache('store', '-o', 'out'))
+        self.assertOutput(self.cache('--max-size', '0', 'trim'),
+                          'evicted 3 entries\n')
+
+
+@skip_if_backend('msbuild')
+class TestCacheBuild(IntegrationTest):
+    def __init__(self, *args, **kwargs):
+        IntegrationTest.__init__(self, 'depfile', stage_src=True, env={
+            'BFG9000_CACHE_DIR': os.path.join(test_stage_dir, 'cache-build')
+        }, *args, **kwargs)
+
+    def setUp(self):
+        cleandir(os.path.join(test_stage_dir, 'cache-build'))
+        IntegrationTest.setUp(self)
+
+    def test_rebuild(self):
+        self.build(executable('program'))
+        self.assertOutput([executable('program')], 'hello\n')
+
+        # Rebuilding from scratch should restore everything from the cache.
+        self.configure()
+        self.build(executable('program'))
+        self.assertOutput([executable('program')], 'hello\n')
+        assertRegex(self, self.assertPopen(['bfg9000-cache', 'stats'],
+                                           env=self.env),
+                    r'hits:\s+[1-9]')
+
+        # Changing a header should invalidate the cached results.
+        self.wait()
+        shutil.copy(os.path.join(self.srcdir, 'header_replaced.hpp'),
+                    os.path.join(self.srcdir, 'header.hpp'))
+        self.build(executable('program'))
+        self.assertOutput([executable('program')], 'goodbye\n')
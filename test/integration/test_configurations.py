@@ -0,0 +1,84 @@
+import json
+import os
+
+from . import *
+pjoin = os.path.join
+
+
+@skip_if_backend('msbuild')
+class TestConfigurations(IntegrationTest):
+    def __init__(self, *args, **kwargs):
+        IntegrationTest.__init__(self, 'configurations', *args, **kwargs)
+
+    def test_build(self):
+        self.build()
+        for i in ('debug', 'release'):
+            self.assertOutput([pjoin(i, executable('program').path)],
+                              '{}\n'.format(i))
+
+    def test_build_one(self):
+        self.build('release')
+        self.assertExists(pjoin('release', executable('program').path))
+        self.assertNotExists(pjoin('debug', executable('program').path))
+
+    def test_test(self):
+        self.build('test')
+        self.build('debug/test')
+
+    def test_command_line(self):
+        self.configure(extra_args=['--config', 'fast:CFLAGS=-DNDEBUG'])
+        self.assertFalse(os.path.exists(pjoin(self.builddir, 'debug')))
+
+        self.build()
+        self.assertOutput([pjoin('fast', executable('program').path)],
+                          'release\n')
+
+    def test_refresh(self):
+        self.assertPopen(['bfg9000', 'refresh', '--force'])
+        self.build()
+        self.assertOutput([pjoin('debug', executable('program').path)],
+                          'debug\n')
+
+
+@skip_if_backend('msbuild')
+class TestConfigurationsRegenerate(IntegrationTest):
+    def __init__(self, *args, **kwargs):
+        IntegrationTest.__init__(self, 'configurations', stage_src=True,
+                                 configure=False, *args, **kwargs)
+
+    def _write_build(self, with_test):
+        with open(pjoin(self.srcdir, 'build.bfg'), 'w') as f:
+            f.write("prog = executable('program', files=['program.c'])\n" +
+                    'default(prog)\n' +
+                    ('test(prog)\n' if with_test else ''))
+
+    def _configs(self):
+        with open(pjoin(self.builddir, '.bfg_configs')) as f:
+            return dict(json.load(f)['data']['configurations'])
+
+    def test_top_level(self):
+        self.configure()
+        self._write_build(False)
+        self.configure(orig_srcdir=None)
+        self.assertEqual(self._configs(), {'debug': ['all'],
+                                           'release': ['all']})
+
+        # Adding a test should regenerate everything from the top level.
+        self.wait()
+        self._write_build(True)
+        self.build('test')
+        self.build('debug/test')
+
+    def test_sub_configuration(self):
+        self.configure()
+        self._write_build(False)
+        self.configure(orig_srcdir=None)
+
+        # Regenerating a single configuration should update the top level.
+        self.wait()
+        self._write_build(True)
+        self.assertPopen([os.getenv(self.backend.upper(), self.backend),
+                          '-C', 'debug'])
+        self.assertEqual(self._configs(), {'debug': ['all', 'test'],
+                                           'release': ['all']})
+        self.build('debug/test')
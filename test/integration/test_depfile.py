@@ -21,3 +21,26 @@ class TestDepfile(IntegrationTest):
 
         self.build(executable('program'))
         self.assertOutput([executable('program')], 'goodbye\n')
+
+
+@only_if_backend('make', hide=True)
+class TestDepdb(IntegrationTest):
+    def __init__(self, *args, **kwargs):
+        IntegrationTest.__init__(self, 'depfile', stage_src=True,
+                                 env={'MAKE_DEPDB_SHARDS': '2'},
+                                 *args, **kwargs)
+
+    @skip_if(env.host_platform.name == 'windows', 'xfail on windows + make')
+    def test_build(self):
+        self.build(executable('program'))
+        self.assertOutput([executable('program')], 'hello\n')
+        self.assertTrue(os.path.isdir('.bfg_deps'))
+        with open('Makefile') as f:
+            self.assertNotIn('.o.d\n', f.read())
+
+        self.wait()
+        shutil.copy(os.path.join(self.srcdir, 'header_replaced.hpp'),
+                    os.path.join(self.srcdir, 'header.hpp'))
+
+        self.build(executable('program'))
+        self.assertOutput([executable('program')], 'goodbye\n')
@@ -0,0 +1,28 @@
+import json
+import os
+
+from . import *
+pjoin = os.path.join
+
+
+@skip_if_backend('msbuild')
+class TestDepsReport(IntegrationTest):
+    def __init__(self, *args, **kwargs):
+        IntegrationTest.__init__(
+            self, pjoin(examples_dir, '02_library'), *args, **kwargs
+        )
+
+    def test_report(self):
+        self.build()
+        output = json.loads(self.assertPopen(['bfg9000', 'deps-report',
+                                              '--json']))
+        self.assertEqual(output['objects'], 2)
+        self.assertEqual(output['headers'][0]['header'], 'library.hpp')
+        self.assertEqual(output['headers'][0]['objects'], 2)
+        self.assertTrue(output['headers'][0]['flagged'])
+
+        self.assertIn('library.hpp', self.assertPopen(['bfg9000',
+                                                       'deps-report']))
+
+    def test_not_built(self):
+        self.assertPopen(['bfg9000', 'deps-report'], returncode=1)
@@ -32,3 +32,20 @@ class TestExecutable(IntegrationTest):
                 'simple-1.0/build.bfg',
                 'simple-1.0/simple.cpp',
             })
+
+    @skip_if_backend('msbuild')
+    def test_dist_reproducible(self):
+        dist = output_file('simple-1.0.tar.xz')
+        self.build('dist-xz')
+        with open(self.target_path(dist), 'rb') as f:
+            first = f.read()
+
+        os.utime(os.path.join(self.srcdir, 'simple.cpp'), None)
+        self.build('dist-xz')
+        with open(self.target_path(dist), 'rb') as f:
+            self.assertEqual(f.read(), first)
+        with tarfile.open(self.target_path(dist)) as t:
+            self.assertEqual(set(t.getnames()), {
+                'simple-1.0/build.bfg',
+                'simple-1.0/simple.cpp',
+            })
@@ -35,6 +35,12 @@ class TestInstall(IntegrationTest):
             pjoin(self.libdir, static_library('static_a').path),
         ] + extra)
 
+        # Thin archives should be converted to full archives when installed.
+        if env.builder('c++').flavor == 'cc':
+            static_a = pjoin(self.libdir, static_library('static_a').path)
+            with open(static_a, 'rb') as f:
+                self.assertEqual(f.read(8), b'!<arch>\n')
+
     @skip_if_backend('msbuild')
     def test_install(self):
         self.build('install')
@@ -48,6 +54,31 @@ class TestInstall(IntegrationTest):
             'hello from static a!\nhello from static b!\n'
         )
 
+    @skip_if_backend('msbuild')
+    def test_install_twice(self):
+        self.build('install')
+        self._check_installed()
+
+        # Files modified after installation (e.g. rpath'd binaries) shouldn't
+        # be installed (and modified) again if they haven't changed.
+        installed = [
+            pjoin(self.bindir, executable('program').path),
+            pjoin(self.libdir, shared_library('shared_a').path),
+            pjoin(self.libdir, static_library('static_a').path),
+        ]
+        mtimes = [os.stat(i).st_mtime for i in installed]
+        self.wait()
+        self.build('install')
+        self.assertEqual([os.stat(i).st_mtime for i in installed], mtimes)
+
+        os.chdir(self.srcdir)
+        cleandir(self.builddir)
+        self.assertOutput(
+            [pjoin(self.bindir, executable('program').path)],
+            'hello from shared a!\nhello from shared b!\n' +
+            'hello from static a!\nhello from static b!\n'
+        )
+
     @skip_if_backend('msbuild')
     def test_install_existing_paths(self):
         makedirs(self.includedir, exist_ok=True)
@@ -0,0 +1,40 @@
+import os
+import sys
+
+from . import *
+
+
+def print_stderr_args(message):
+    return [sys.executable, '-c', 'import sys; sys.stderr.write("{}")'.format(
+        message.replace('"', '\\"').replace('\n', '\\n')
+    )]
+
+
+# These exercise the fallback path, since the daemon only hosts javac; the
+# daemon itself is tested via the Java language tests.
+class TestJvmd(TestCase):
+    def test_no_args(self):
+        self.assertPopen(['bfg9000-jvmd'], returncode=2)
+
+    def test_nonexistent_command(self):
+        self.assertPopen(['bfg9000-jvmd', 'nonexist'], returncode=66)
+
+    def test_stop_not_running(self):
+        self.assertPopen(['bfg9000-jvmd', '-d', 'nonexist', '--stop'])
+
+    def test_fallback(self):
+        self.assertOutput(
+            ['bfg9000-jvmd'] + print_stderr_args(
+                '[wrote foo/bar.class]\n' +
+                '[wrote DirectoryFileObject[bad:foo/baz.class]]\n'
+            ),
+            'foo/bar.class\n' + os.path.join('bad', 'foo/baz.class') + '\n'
+        )
+
+    def test_fallback_messages(self):
+        self.assertOutput(
+            ['bfg9000-jvmd'] + print_stderr_args(
+                'warning: something\n[wrote foo/bar.class]\n'
+            ),
+            'warning: something\nfoo/bar.class\n'
+        )
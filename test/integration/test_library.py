@@ -28,6 +28,24 @@ class TestLibrary(IntegrationTest):
         self.assertExists(static_library('library'))
         self.assertNotExists(shared_library('library'))
 
+    @skip_if(is_msvc, hide=True)
+    def test_static_replace_existing(self):
+        self.configure(extra_args=['--disable-shared', '--enable-static'])
+        self.build()
+
+        # Replace the library with an out-of-date full archive to make sure
+        # rebuilding it doesn't try to update it in place.
+        lib = self.target_path(static_library('library'))
+        header = '{:<16}{:<12}{:<6}{:<6}{:<8}{:<10}`\n'.format(
+            'stale.txt/', 0, 0, 0, 644, 6
+        )
+        with open(lib, 'wb') as f:
+            f.write(b'!<arch>\n' + header.encode('ascii') + b'stale\n')
+        os.utime(lib, (0, 0))
+
+        self.build()
+        self.assertOutput([executable('program')], 'hello, library!\n')
+
     # Dual-use libraries collide on MSVC.
     @skip_if(is_msvc, hide=True)
     def test_dual(self):
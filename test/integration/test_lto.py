@@ -0,0 +1,11 @@
+from . import *
+
+
+@skip_if(env.builder('c++').flavor == 'msvc', hide=True)
+class TestLto(IntegrationTest):
+    def __init__(self, *args, **kwargs):
+        IntegrationTest.__init__(self, 'lto', *args, **kwargs)
+
+    def test_build(self):
+        self.build(executable('program'))
+        self.assertOutput([executable('program')], 'hello from lto!\n')
@@ -17,3 +17,14 @@ class TestPchNoSource(IntegrationTest):
     def test_build(self):
         self.build(executable('program'))
         self.assertOutput([executable('program')], 'hello from pch!\n')
+
+
+class TestPchShared(IntegrationTest):
+    def __init__(self, *args, **kwargs):
+        IntegrationTest.__init__(self, 'pch_shared', *args, **kwargs)
+
+    def test_build(self):
+        self.build(executable('program'))
+        self.assertOutput([executable('program')],
+                          'hello from pch!\nhello from pch!\n' +
+                          'goodbye from pch!\n')
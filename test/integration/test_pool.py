@@ -0,0 +1,28 @@
+import sys
+
+from . import *
+
+
+class TestPoolCommand(TestCase):
+    def setUp(self):
+        cleandir(os.path.join(test_stage_dir, 'pool'))
+        os.chdir(os.path.join(test_stage_dir, 'pool'))
+
+    def test_no_args(self):
+        self.assertPopen(['bfg9000-pool', 'link', '1'], returncode=2)
+
+    def test_invalid_depth(self):
+        self.assertPopen(['bfg9000-pool', 'link', '0', '--', 'true'],
+                         returncode=2)
+
+    def test_nonexistent_command(self):
+        self.assertPopen(['bfg9000-pool', 'link', '1', '--', 'nonexist'],
+                         returncode=66)
+
+    def test_run(self):
+        self.assertOutput(['bfg9000-pool', 'link', '2', '--', sys.executable,
+                           '-c', 'print("hello")'], 'hello\n')
+
+    def test_returncode(self):
+        self.assertPopen(['bfg9000-pool', 'link', '2', '--', sys.executable,
+                          '-c', 'import sys; sys.exit(3)'], returncode=3)
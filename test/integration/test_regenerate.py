@@ -1,4 +1,4 @@
-import os.path
+import os
 import shutil
 
 from . import *
@@ -23,6 +23,18 @@ class TestRegenerate(IntegrationTest):
         self.build('bar')
         self.assertExists(pjoin(self.builddir, 'bar'))
 
+    def test_regenerate_unchanged(self):
+        snapshot = pjoin(self.builddir, '.bfg_snapshot')
+        mtime = os.stat(snapshot).st_mtime
+
+        # Touching the build file without changing it should make the
+        # refresh a no-op.
+        self.wait()
+        os.utime(pjoin(self.srcdir, 'build.bfg'), None)
+        self.build('foo')
+        self.assertEqual(os.stat(snapshot).st_mtime, mtime)
+        self.assertExists(pjoin(self.builddir, 'foo'))
+
 
 @skip_if_backend('msbuild')
 class TestRegenerateGlob(IntegrationTest):
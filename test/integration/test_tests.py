@@ -1,4 +1,5 @@
 import os.path
+from six import assertRegex
 
 from . import *
 
@@ -11,4 +12,28 @@ class TestTests(IntegrationTest):
         )
 
     def test_test(self):
-        self.build('test')
+        assertRegex(self, self.build('test'), r'2 passed, 0 failed')
+        self.assertExists('test-results.xml')
+        self.assertExists('.bfg_test_history.json')
+
+
+@skip_if_backend('msbuild')
+class TestIncrementalTests(IntegrationTest):
+    def __init__(self, *args, **kwargs):
+        IntegrationTest.__init__(self, 'incremental_tests', *args, **kwargs)
+
+    def build_tests(self):
+        make = self.backend == 'make'
+        args = [os.getenv(self.backend.upper(), self.backend),
+                '-k' if make else '-k0', 'test']
+        return self.assertPopen(args, returncode=2 if make else 1)
+
+    def test_test(self):
+        output = self.build_tests()
+        assertRegex(self, output, r'PASS .*test_pass\.py')
+        assertRegex(self, output, r'FAIL .*test_fail\.py')
+
+        # Only the failed test should run again.
+        output = self.build_tests()
+        assertNotRegex(self, output, r'test_pass\.py')
+        assertRegex(self, output, r'FAIL .*test_fail\.py')
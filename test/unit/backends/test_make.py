@@ -1,15 +1,23 @@
+import mock
 import ntpath
 import os.path
 import posixpath
 import unittest
 from six.moves import cStringIO as StringIO
 
+from ... import make_env
+
 from bfg9000 import path
 from bfg9000 import safe_str
 from bfg9000.backends.make.syntax import *
+from bfg9000.backends.make.writer import multitarget_rule
+from bfg9000.build_inputs import BuildInputs
+from bfg9000.builtins import builtin
+from bfg9000.builtins.compile import make_compile
 from bfg9000.platforms import platform_name
 from bfg9000.platforms.posix import PosixPath
 from bfg9000.platforms.windows import WindowsPath
+from bfg9000.versioning import Version
 
 esc_colon = ':' if platform_name() == 'windows' else '\\:'
 
@@ -259,3 +267,105 @@ class TestMakefile(unittest.TestCase):
                          'target: name := value\n'
                          'target:\n'
                          '\tcmd\n\n')
+
+    def test_rule_prefixes(self):
+        self.makefile.rule('target', recipe=[Silent(['cmd1']),
+                                             Recursive(['cmd2'])])
+        out = Writer(StringIO())
+        self.makefile._write_rule(out, self.makefile._rules[0])
+        self.assertEqual(out.stream.getvalue(),
+                         'target:\n'
+                         '\t@cmd1\n'
+                         '\t+cmd2\n\n')
+
+    def test_rule_grouped(self):
+        self.makefile.rule(['target1', 'target2'], deps=['dep'],
+                           recipe=['cmd'], grouped=True)
+        out = Writer(StringIO())
+        self.makefile._write_rule(out, self.makefile._rules[0])
+        self.assertEqual(out.stream.getvalue(),
+                         'target1 target2 &: dep\n'
+                         '\tcmd\n\n')
+
+    def test_steps(self):
+        self.makefile.rule('target1', deps=['dep'], order_only=['dir'])
+        self.makefile.rule('target2', deps=['target1'])
+        self.assertEqual(self.makefile.step_count(), 2)
+        self.assertEqual(list(self.makefile.steps()), [
+            (['target1'], ['dep', 'dir']),
+            (['target2'], ['target1']),
+        ])
+        self.assertEqual(list(self.makefile.steps(1)), [
+            (['target2'], ['target1']),
+        ])
+
+    def test_shell_wrapper(self):
+        self.makefile.shell_wrapper('TIMING', Variable('TIMELOG'))
+        out = StringIO()
+        self.makefile.write(out)
+        self.assertIn('ifdef TIMING\n'
+                      'SHELL := $(TIMELOG)\n'
+                      '.SHELLFLAGS = $@ -c\n'
+                      'endif\n', out.getvalue())
+
+
+class TestMultitargetRule(unittest.TestCase):
+    def setUp(self):
+        self.env = make_env()
+        self.makefile = Makefile('build.bfg')
+
+    def _rules(self):
+        out = Writer(StringIO())
+        for i in self.makefile._rules:
+            self.makefile._write_rule(out, i)
+        return out.stream.getvalue()
+
+    def test_single(self):
+        self.env.backend_version = Version('4.3')
+        multitarget_rule(self.makefile, self.env, ['target'], ['dep'],
+                         recipe=['cmd'])
+        self.assertEqual(self._rules(), 'target: dep\n\tcmd\n\n')
+
+    def test_stamp(self):
+        self.env.backend_version = Version('4.2.1')
+        multitarget_rule(self.makefile, self.env, [
+            path.Path('target1'), path.Path('target2')
+        ], ['dep'], recipe=['cmd'])
+        self.assertEqual(self._rules(),
+                         'target1 target2: target1.stamp\n\n'
+                         'target1.stamp: dep\n\tcmd\n\t@touch $@\n\n')
+
+    def test_grouped(self):
+        self.env.backend_version = Version('4.3')
+        multitarget_rule(self.makefile, self.env, [
+            path.Path('target1'), path.Path('target2')
+        ], ['dep'], recipe=['cmd'])
+        self.assertEqual(self._rules(), 'target1 target2 &: dep\n\tcmd\n\n')
+
+
+class TestCompileRule(unittest.TestCase):
+    def setUp(self):
+        self.env = make_env()
+        self.build = BuildInputs(self.env, path.Path('build.bfg',
+                                                     path.Root.srcdir))
+        self.builtin_dict = builtin.build.bind(
+            build_inputs=self.build, env=self.env, argv=None
+        )
+        self.makefile = Makefile('build.bfg')
+
+    def test_depfiles(self):
+        objs = [self.builtin_dict['object_file'](file=i)
+                for i in ('foo.cpp', 'bar.cpp')]
+        if objs[0].creator.compiler.deps_flavor != 'gcc':
+            raise unittest.SkipTest('compiler has no GCC-style depfiles')
+
+        # Every object's depfile should be included, not just the first one
+        # for each compiler.
+        with mock.patch('bfg9000.shell.which', return_value=['command']):
+            for i in objs:
+                make_compile(i.creator, self.build, self.makefile, self.env)
+        out = StringIO()
+        self.makefile.write(out)
+        for i in objs:
+            self.assertIn('-include {}.d\n'.format(i.path.suffix),
+                          out.getvalue())
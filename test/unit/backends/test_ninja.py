@@ -160,3 +160,87 @@ class TestWritePosixPath(TestWritePath):
 class TestWriteWindowsPath(TestWritePath):
     Path = WindowsPath
     ospath = ntpath
+
+
+class TestNinjaFileSteps(unittest.TestCase):
+    def setUp(self):
+        self.ninjafile = NinjaFile('build.bfg')
+        self.ninjafile.rule('cmd', ['cmd'])
+
+    def test_steps(self):
+        self.ninjafile.build('out1', 'cmd', inputs='in', implicit='imp',
+                             order_only='dir')
+        self.ninjafile.build(['out2', 'out3'], 'cmd', inputs='out1')
+        self.assertEqual(self.ninjafile.step_count(), 2)
+        self.assertEqual(list(self.ninjafile.steps()), [
+            (['out1'], ['in', 'imp', 'dir']),
+            (['out2', 'out3'], ['out1']),
+        ])
+        self.assertEqual(list(self.ninjafile.steps(1)), [
+            (['out2', 'out3'], ['out1']),
+        ])
+
+
+class TestNinjaFilePool(unittest.TestCase):
+    def setUp(self):
+        self.ninjafile = NinjaFile('build.bfg')
+
+    def write(self):
+        out = StringIO()
+        self.ninjafile.write(out)
+        return out.getvalue()
+
+    def test_pool(self):
+        self.ninjafile.pool('link', 2)
+        self.ninjafile.pool('link', 2)
+        self.ninjafile.rule('cmd', ['cmd'])
+        self.ninjafile.build('out', 'cmd', pool='link')
+        result = self.write()
+        self.assertIn('ninja_required_version = 1.1\n', result)
+        self.assertIn('pool link\n  depth = 2\n', result)
+        self.assertIn('build out: cmd\n  pool = link\n', result)
+
+    def test_rule_pool(self):
+        self.ninjafile.pool('link', 2)
+        self.ninjafile.rule('cmd', ['cmd'], pool='link')
+        self.assertIn('rule cmd\n  command = cmd\n  pool = link\n',
+                      self.write())
+
+    def test_invalid_pool(self):
+        self.assertRaises(ValueError, self.ninjafile.pool, 'console', 1)
+        self.assertRaises(ValueError, self.ninjafile.pool, 'a b', 1)
+
+        self.ninjafile.pool('link', 2)
+        self.assertRaises(ValueError, self.ninjafile.pool, 'link', 3)
+
+    def test_unknown_pool(self):
+        self.assertRaises(ValueError, self.ninjafile.rule, 'cmd', ['cmd'],
+                          pool='nonexist')
+        self.ninjafile.rule('cmd', ['cmd'])
+        self.assertRaises(ValueError, self.ninjafile.build, 'out', 'cmd',
+                          pool='nonexist')
+
+
+class TestNinjaFileDyndep(unittest.TestCase):
+    def setUp(self):
+        self.ninjafile = NinjaFile('build.bfg')
+
+    def write(self):
+        out = StringIO()
+        self.ninjafile.write(out)
+        return out.getvalue()
+
+    def test_dyndep(self):
+        self.ninjafile.rule('cmd', ['cmd'])
+        self.ninjafile.build('out', 'cmd', inputs='in', dyndep='out.dd')
+        result = self.write()
+        self.assertIn('ninja_required_version = 1.10\n', result)
+        self.assertIn('build out: cmd in || out.dd\n  dyndep = out.dd\n',
+                      result)
+
+    def test_dyndep_order_only(self):
+        self.ninjafile.rule('cmd', ['cmd'])
+        self.ninjafile.build('out', 'cmd', order_only=['out.dd'],
+                             dyndep='out.dd')
+        self.assertIn('build out: cmd || out.dd\n  dyndep = out.dd\n',
+                      self.write())
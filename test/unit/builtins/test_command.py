@@ -0,0 +1,45 @@
+import mock
+from six.moves import cStringIO as StringIO
+
+from .common import BuiltinTest
+from bfg9000.backends.ninja.syntax import NinjaFile
+from bfg9000.builtins import command, pool  # noqa
+from bfg9000.builtins.command import ninja_command
+
+
+def mock_which(*args, **kwargs):
+    return ['command']
+
+
+class TestCommand(BuiltinTest):
+    def ninja(self, output):
+        ninjafile = NinjaFile('build.bfg')
+        with mock.patch('bfg9000.shell.which', mock_which):
+            ninja_command(output.creator, self.build, ninjafile, self.env)
+        out = StringIO()
+        ninjafile.write(out)
+        return out.getvalue()
+
+    def test_ninja(self):
+        result = self.ninja(self.builtin_dict['command']('foo', cmd=['echo']))
+        self.assertIn('build foo: console_command | PHONY\n', result)
+        self.assertNotIn('bfg9000-pool', result)
+
+    def test_ninja_pool(self):
+        self.builtin_dict['pool']('slow', 2)
+        result = self.ninja(self.builtin_dict['command'](
+            'foo', cmd=['echo'], pool='slow'
+        ))
+
+        # Commands keep the console pool, so limit them via `bfg9000-pool`.
+        self.assertIn('build foo: console_command | PHONY\n', result)
+        self.assertNotIn('pool = slow', result)
+        self.assertIn('slow 2 -- echo', result)
+
+    def test_ninja_build_step_pool(self):
+        self.builtin_dict['pool']('slow', 2)
+        result = self.ninja(self.builtin_dict['build_step'](
+            'foo', cmd=['touch', 'foo'], pool='slow'
+        ))
+        self.assertIn('  pool = slow\n', result)
+        self.assertNotIn('slow 2 --', result)
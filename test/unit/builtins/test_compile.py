@@ -1,9 +1,12 @@
+import hashlib
 import mock
+import unittest
 from collections import namedtuple
+from six import assertRegex
 
 from .common import BuiltinTest
 from bfg9000.builtins import compile
-from bfg9000 import file_types
+from bfg9000 import file_types, options as opts
 from bfg9000.iterutils import listify, unlistify
 from bfg9000.path import Path, Root
 
@@ -60,6 +63,18 @@ class TestObjectFile(CompileTest):
     def test_make_no_name_or_file(self):
         self.assertRaises(TypeError, self.builtin_dict['object_file'])
 
+    def test_make_split_dwarf(self):
+        self.env.variables['SPLIT_DWARF'] = '1'
+        compiler = self.env.builder('c++').compiler
+        if not getattr(compiler, 'split_dwarf', False):
+            raise unittest.SkipTest('split DWARF not supported')
+
+        result = self.builtin_dict['object_file'](file='main.cpp')
+        self.assertEqual(result, self.output_file(compiler, 'main', None))
+        self.assertEqual(result.creator.output, [
+            result, file_types.DebugInfoFile(Path('main.dwo'))
+        ])
+
 
 class TestPrecompiledHeader(CompileTest):
     class MockFile(object):
@@ -117,6 +132,103 @@ class TestPrecompiledHeader(CompileTest):
         self.assertRaises(TypeError, self.builtin_dict['precompiled_header'])
 
 
+class TestSharedPrecompiledHeader(CompileTest):
+    def setUp(self):
+        CompileTest.setUp(self)
+        patcher = mock.patch('bfg9000.builtins.file_types.generated_file',
+                             return_value=TestPrecompiledHeader.MockFile())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def object_file(self, name, **kwargs):
+        obj = self.builtin_dict['object_file'](file=name + '.cpp', **kwargs)
+        return obj.creator
+
+    def pch_edges(self):
+        return [i for i in self.build.edges()
+                if isinstance(i, compile.CompileHeader)]
+
+    def test_share(self):
+        foo = self.object_file('foo', pch='main.hpp')
+        bar = self.object_file('bar', pch='main.hpp')
+        self.assertIs(foo.pch, bar.pch)
+        self.assertEqual(self.pch_edges(), [foo.pch.creator])
+
+    def test_different_options(self):
+        foo = self.object_file('foo', pch='main.hpp')
+        bar = self.object_file('bar', pch='main.hpp', options=['-O2'])
+        baz = self.object_file('baz', pch='main.hpp', options=['-O2'])
+        self.assertIsNot(foo.pch, bar.pch)
+        self.assertIs(bar.pch, baz.pch)
+        self.assertEqual(bar.pch.creator.file, foo.pch.creator.file)
+        self.assertNotEqual(bar.pch.path, foo.pch.path)
+        self.assertEqual(len(self.pch_edges()), 2)
+
+    def test_same_includes(self):
+        header_dir = self.builtin_dict['header_directory']
+        foo = self.object_file('foo', pch='main.hpp', includes=['include'])
+        bar = self.object_file('bar', pch='main.hpp',
+                               includes=[header_dir('include')])
+        self.assertIs(foo.pch, bar.pch)
+        self.assertEqual(len(self.pch_edges()), 1)
+
+    def test_different_system_includes(self):
+        header_dir = self.builtin_dict['header_directory']
+        foo = self.object_file('foo', pch='main.hpp',
+                               includes=[header_dir('include')])
+        bar = self.object_file('bar', pch='main.hpp',
+                               includes=[header_dir('include', system=True)])
+        self.assertIsNot(foo.pch, bar.pch)
+        self.assertEqual(len(self.pch_edges()), 2)
+
+    def test_different_headers(self):
+        foo = self.object_file('foo', pch='main.hpp')
+        bar = self.object_file('bar', pch='other.hpp')
+        self.assertIsNot(foo.pch, bar.pch)
+        self.assertEqual(len(self.pch_edges()), 2)
+
+    def test_extra_options_single(self):
+        foo = self.object_file('foo', pch='main.hpp')
+        pch = foo.pch
+        foo.add_extra_options(opts.option_list('-fPIC'))
+        self.assertIs(foo.pch, pch)
+        self.assertIn('-fPIC', list(pch.creator.options))
+
+    def test_extra_options_split(self):
+        foo = self.object_file('foo', pch='main.hpp')
+        bar = self.object_file('bar', pch='main.hpp')
+        baz = self.object_file('baz', pch='main.hpp')
+        pch = foo.pch
+
+        foo.add_extra_options(opts.option_list('-fPIC'))
+        self.assertIsNot(foo.pch, pch)
+        self.assertIs(bar.pch, pch)
+        self.assertNotIn('-fPIC', list(pch.creator.options))
+        self.assertIn('-fPIC', list(foo.pch.creator.options))
+        self.assertIn(foo.pch, [i.header for i in foo.options
+                                if isinstance(i, opts.pch)])
+
+        bar.add_extra_options(opts.option_list('-fPIC'))
+        self.assertIs(bar.pch, foo.pch)
+        self.assertEqual(len(self.pch_edges()), 2)
+
+        # Once nothing uses the original PCH, it's removed from the build.
+        baz.add_extra_options(opts.option_list('-fPIC'))
+        self.assertIs(baz.pch, foo.pch)
+        self.assertEqual(self.pch_edges(), [foo.pch.creator])
+
+    def test_explicit(self):
+        pch = self.builtin_dict['precompiled_header'](file='main.hpp')
+        foo = self.object_file('foo', pch=pch)
+        bar = self.object_file('bar', pch=pch)
+        self.assertIs(foo.pch, pch)
+        self.assertIs(bar.pch, pch)
+
+        foo.add_extra_options(opts.option_list('-fPIC'))
+        self.assertIs(foo.pch, pch)
+        self.assertIn('-fPIC', list(pch.creator.options))
+
+
 class TestObjectFiles(BuiltinTest):
     def make_object_files(self, make_src=False):
         files = [file_types.ObjectFile(Path(i, Root.srcdir), None)
@@ -160,3 +272,231 @@ class TestObjectFiles(BuiltinTest):
         self.assertRaises(IndexError, lambda: obj_files[Path(
             'src3', Root.srcdir
         )])
+
+
+class TestUnityObjectFiles(CompileTest):
+    def object_files(self, files, **kwargs):
+        with mock.patch('bfg9000.builtins.compile._write_if_changed') as m:
+            result = self.builtin_dict['object_files'](files, **kwargs)
+        return result, {k[0][0]: k[0][1] for k in m.call_args_list}
+
+    def unity_path(self, name):
+        return Path(name, Root.builddir).string(self.env.base_dirs)
+
+    def unity_name(self, members, ext='.cpp', name='foo'):
+        batch_id = hashlib.sha1(''.join(
+            i + '\n' for i in members
+        ).encode('utf-8')).hexdigest()[:8]
+        return '{}.unity/unity_{}{}'.format(name, batch_id, ext)
+
+    def test_batch_size(self):
+        objs, written = self.object_files(
+            ['a.cpp', 'b.cpp', 'c.cpp', 'd.c'], unity=2, unity_name='foo'
+        )
+        unity_ab = self.unity_name(['a.cpp', 'b.cpp'])
+        self.assertEqual([i.creator.file.path for i in objs], [
+            Path(unity_ab, Root.builddir),
+            Path('c.cpp', Root.srcdir),
+            Path('d.c', Root.srcdir),
+        ])
+        self.assertEqual(list(written.keys()), [self.unity_path(unity_ab)])
+        self.assertEqual(
+            written[self.unity_path(unity_ab)],
+            '#include "../../srcdir/a.cpp"\n#include "../../srcdir/b.cpp"\n'
+        )
+
+        self.assertEqual(objs['a.cpp'], objs[0])
+        self.assertEqual(objs['b.cpp'], objs[0])
+        self.assertEqual(objs['c.cpp'], objs[1])
+        self.assertEqual(objs[0].creator.extra_deps, [
+            file_types.SourceFile(Path('a.cpp', Root.srcdir), 'c++'),
+            file_types.SourceFile(Path('b.cpp', Root.srcdir), 'c++'),
+        ])
+
+    def test_group_by_lang(self):
+        objs, written = self.object_files(
+            ['a.cpp', 'b.c', 'c.cpp', 'd.c'], unity=10, unity_name='foo'
+        )
+        self.assertEqual([i.creator.file.path for i in objs], [
+            Path(self.unity_name(['a.cpp', 'c.cpp']), Root.builddir),
+            Path(self.unity_name(['b.c', 'd.c'], '.c'), Root.builddir),
+        ])
+        self.assertEqual(objs['c.cpp'], objs[0])
+        self.assertEqual(objs['d.c'], objs[1])
+
+    def test_stable_names(self):
+        objs, written = self.object_files(
+            ['a.cpp', 'b.cpp', 'c.cpp', 'd.cpp', 'e.c', 'f.c'], unity=2,
+            unity_name='foo'
+        )
+        names = [i.creator.file.path for i in objs]
+
+        # Changing one batch shouldn't rename any of the others, whether
+        # they're in the same language or not.
+        objs, written = self.object_files(
+            ['a.cpp', 'b.cpp', 'c.cpp', 'x.cpp', 'e.c', 'f.c'], unity=2,
+            unity_name='foo'
+        )
+        self.assertEqual([i.creator.file.path for i in objs], [
+            names[0],
+            Path(self.unity_name(['c.cpp', 'x.cpp']), Root.builddir),
+            names[2],
+        ])
+        self.assertEqual(list(written.keys()), [
+            self.unity_path(names[0].suffix),
+            self.unity_path(self.unity_name(['c.cpp', 'x.cpp'])),
+            self.unity_path(names[2].suffix),
+        ])
+
+    def test_exclude(self):
+        objs, written = self.object_files(
+            ['a.cpp', 'b.cpp', 'c.cpp'], unity=10, unity_exclude=['b.cpp'],
+            unity_name='foo'
+        )
+        self.assertEqual([i.creator.file.path for i in objs], [
+            Path(self.unity_name(['a.cpp', 'c.cpp']), Root.builddir),
+            Path('b.cpp', Root.srcdir),
+        ])
+
+    def test_byte_budget(self):
+        sizes = {'a.cpp': 600, 'b.cpp': 600, 'c.cpp': 300}
+
+        def getsize(path):
+            return sizes[path.split('/')[-1]]
+
+        with mock.patch('os.path.getsize', getsize):
+            objs, written = self.object_files(
+                ['a.cpp', 'b.cpp', 'c.cpp'], unity='1k', unity_name='foo'
+            )
+        self.assertEqual([i.creator.file.path for i in objs], [
+            Path('a.cpp', Root.srcdir),
+            Path(self.unity_name(['b.cpp', 'c.cpp']), Root.builddir),
+        ])
+
+    def test_default_name(self):
+        # The default name doesn't depend on the files, so adding or removing
+        # one doesn't rename the other batches.
+        objs, written = self.object_files(['a.cpp', 'b.cpp'], unity=2)
+        self.assertEqual(objs[0].creator.file.path, Path(self.unity_name(
+            ['a.cpp', 'b.cpp'], name='object_files-1'
+        ), Root.builddir))
+
+        objs, written = self.object_files(['a.cpp', 'b.cpp', 'c.cpp'],
+                                          unity=2)
+        self.assertEqual(objs[0].creator.file.path, Path(self.unity_name(
+            ['a.cpp', 'b.cpp'], name='object_files-2'
+        ), Root.builddir))
+
+    def test_invalid(self):
+        self.assertRaises(TypeError, self.object_files, ['a.cpp'],
+                          unity=True)
+        self.assertRaises(ValueError, self.object_files, ['a.cpp'], unity=0)
+        self.assertRaises(ValueError, self.object_files, ['a.cpp'],
+                          unity='lots')
+
+
+class TestAutoPch(CompileTest):
+    def setUp(self):
+        CompileTest.setUp(self)
+        self.base_dirs = self.env.base_dirs
+
+    def src(self, name):
+        return Path(name, Root.srcdir).string(self.base_dirs)
+
+    def object_files(self, files, deps, prefix=None, **kwargs):
+        def read_prefix(filename):
+            return prefix or []
+
+        with mock.patch('bfg9000.builtins.compile.load_deps',
+                        return_value=deps), \
+             mock.patch('bfg9000.builtins.compile._read_pch_prefix',
+                        read_prefix), \
+             mock.patch('os.path.getsize', return_value=100), \
+             mock.patch('bfg9000.builtins.compile._write_if_changed') as m:  # noqa
+            result = self.builtin_dict['object_files'](files, pch='auto',
+                                                       **kwargs)
+        return result, {k[0][0]: k[0][1] for k in m.call_args_list}
+
+    def test_no_deps(self):
+        objs, written = self.object_files(['a.cpp', 'b.cpp'], {})
+        self.assertEqual([i.creator.pch for i in objs], [None, None])
+        self.assertEqual(written, {})
+
+    def test_select(self):
+        deps = {
+            'a.o': [self.src('a.cpp'), self.src('common.hpp'),
+                    self.src('a.hpp')],
+            'b.o': [self.src('b.cpp'), self.src('common.hpp')],
+            'c.o': [self.src('c.c'), self.src('common.h')],
+        }
+        objs, written = self.object_files(['a.cpp', 'b.cpp', 'c.c'], deps,
+                                          pch_name='foo')
+
+        prefix = Path('foo.autopch/c++.hpp', Root.builddir)
+        self.assertEqual(written, {
+            prefix.string(self.base_dirs): (
+                '#include "../../srcdir/common.hpp"\n' +
+                '#include "../../srcdir/a.hpp"\n'
+            ),
+        })
+        self.assertEqual(objs[0].creator.pch.creator.file.path, prefix)
+        self.assertEqual(objs[1].creator.pch, objs[0].creator.pch)
+        self.assertEqual(objs[2].creator.pch, None)
+
+    def test_keep_previous(self):
+        prefix = Path('foo.autopch/c++.hpp', Root.builddir)
+        prefix_name = prefix.string(self.base_dirs)
+        deps = {
+            'a.o': [self.src('a.cpp')],
+            'b.o': [self.src('b.cpp')],
+            'foo.autopch/c++.hpp.gch': [prefix_name, self.src('common.hpp')],
+        }
+        objs, written = self.object_files(
+            ['a.cpp', 'b.cpp'], deps, prefix=[self.src('common.hpp')],
+            pch_name='foo'
+        )
+        self.assertEqual(written, {
+            prefix_name: '#include "../../srcdir/common.hpp"\n',
+        })
+        self.assertEqual(objs[0].creator.pch.creator.file.path, prefix)
+
+    def test_default_name(self):
+        deps = {
+            'a.o': [self.src('a.cpp'), self.src('common.hpp')],
+            'b.o': [self.src('b.cpp'), self.src('common.hpp')],
+        }
+        objs, written = self.object_files(['a.cpp', 'b.cpp'], deps)
+        self.assertEqual(objs[0].creator.pch.creator.file.path,
+                         Path('object_files-1.autopch/c++.hpp',
+                              Root.builddir))
+
+        objs, written = self.object_files(['a.cpp', 'b.cpp', 'c.cpp'], deps)
+        self.assertEqual(objs[0].creator.pch.creator.file.path,
+                         Path('object_files-2.autopch/c++.hpp',
+                              Root.builddir))
+
+
+class TestSelectPchHeaders(unittest.TestCase):
+    def select(self, tus, previous=(), budget=1000):
+        with mock.patch('os.path.getsize', return_value=100):
+            return compile._select_pch_headers(tus, previous, budget)
+
+    def test_select(self):
+        self.assertEqual(self.select([['a.h', 'b.h'], ['b.h', 'c.h'],
+                                      ['b.h'], ['c.h', 'a.h']]),
+                         ['a.h', 'b.h', 'c.h'])
+        self.assertEqual(self.select([['a.h'], ['b.h'], ['b.h'], ['c.h']]),
+                         ['b.h'])
+
+    def test_too_few(self):
+        self.assertEqual(self.select([]), [])
+        self.assertEqual(self.select([['a.h']]), [])
+
+    def test_previous(self):
+        tus = [['a.h'], ['b.h'], ['b.h'], ['c.h']]
+        self.assertEqual(self.select(tus, ['a.h']), ['a.h', 'b.h'])
+        self.assertEqual(self.select(tus, ['d.h']), ['b.h'])
+
+    def test_budget(self):
+        tus = [['a.h', 'b.h', 'c.h'], ['a.h', 'b.h', 'c.h']]
+        self.assertEqual(self.select(tus, budget=250), ['a.h', 'b.h'])
@@ -1,6 +1,10 @@
+import mock
+import os
+import shutil
+import tempfile
 import unittest
 
-from bfg9000.builtins.find import _filter_from_glob, FindResult
+from bfg9000.builtins.find import _filter_from_glob, _find_files, FindResult
 
 
 class TestFilterFromGlob(unittest.TestCase):
@@ -45,3 +49,33 @@ class TestFilterFromGlob(unittest.TestCase):
         self.assertEqual(f('foo.hpp', 'foo.hpp', 'f'), FindResult.exclude)
         self.assertEqual(f('foo.cpp', 'foo.cpp', 'f'), FindResult.include)
         self.assertEqual(f('foo.ipp', 'foo.ipp', 'f'), FindResult.not_now)
+
+
+class TestFindFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmpdir, 'dir'))
+        open(os.path.join(self.tmpdir, 'dir', 'foo.cpp'), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def find(self, walk_cache=None):
+        f = _filter_from_glob('f', '*.cpp', None, None)
+        return _find_files([self.tmpdir], f, False, False, walk_cache)[0]
+
+    def test_find(self):
+        self.assertEqual(self.find(), [
+            os.path.join(self.tmpdir, 'dir', 'foo.cpp')
+        ])
+
+    def test_walk_cache(self):
+        cache = {}
+        self.assertEqual(self.find(cache), [
+            os.path.join(self.tmpdir, 'dir', 'foo.cpp')
+        ])
+        with mock.patch('os.listdir') as listdir:
+            self.assertEqual(self.find(cache), [
+                os.path.join(self.tmpdir, 'dir', 'foo.cpp')
+            ])
+        listdir.assert_not_called()
@@ -1,13 +1,21 @@
 import mock
+from six import assertRegex
+from six.moves import cStringIO as StringIO
 
 from .common import BuiltinTest
-from bfg9000.builtins import compile, default, link
-from bfg9000 import file_types
+from bfg9000.backends.make.syntax import Makefile
+from bfg9000.backends.ninja.syntax import NinjaFile
+from bfg9000.builtins import compile, default, link, pool  # noqa
+from bfg9000 import file_types, options as opts
 from bfg9000.environment import LibraryMode
 from bfg9000.iterutils import listify, unlistify
 from bfg9000.path import Path, Root
 
 
+def mock_which(*args, **kwargs):
+    return ['command']
+
+
 class LinkTest(BuiltinTest):
     def output_file(self, linker, name, context):
         output = linker.output_file(name, context)
@@ -42,6 +50,45 @@ class TestExecutable(LinkTest):
         self.assertRaises(ValueError, self.builtin_dict['executable'],
                           'executable', [])
 
+    def test_make_unity(self):
+        with mock.patch('bfg9000.builtins.compile._write_if_changed'):
+            result = self.builtin_dict['executable'](
+                'executable', ['main.cpp', 'util.cpp'], unity=2
+            )
+        self.assertEqual(len(result.creator.files), 1)
+        assertRegex(self, result.creator.files[0].creator.file.path.suffix,
+                    r'^executable\.unity/unity_[0-9a-f]{8}\.cpp$')
+
+    def test_make_pool(self):
+        p = self.builtin_dict['pool']('link', 2)
+        result = self.builtin_dict['executable']('executable', ['main.cpp'],
+                                                 pool='link')
+        self.assertEqual(result.creator.pool, p)
+
+        result = self.builtin_dict['executable']('executable2', ['main.cpp'],
+                                                 pool=p)
+        self.assertEqual(result.creator.pool, p)
+
+        result = self.builtin_dict['executable']('executable3', ['main.cpp'])
+        self.assertEqual(result.creator.pool, None)
+
+        self.assertRaises(ValueError, self.builtin_dict['executable'],
+                          'executable4', ['main.cpp'], pool='nonexist')
+
+    def test_make_lto(self):
+        result = self.builtin_dict['executable'](
+            'executable', ['main.cpp'], link_options=[opts.lto()]
+        )
+        self.assertIn(opts.lto(), result.creator.options)
+        self.assertIn(opts.lto(), result.creator.files[0].creator.options)
+
+        result = self.builtin_dict['executable'](
+            'executable2', ['main2.cpp'], compile_options=[opts.lto('thin')]
+        )
+        self.assertIn(opts.lto('thin'), result.creator.options)
+        self.assertIn(opts.lto('thin'),
+                      result.creator.files[0].creator.options)
+
 
 class TestSharedLibrary(LinkTest):
     def test_identity(self):
@@ -144,10 +191,49 @@ class TestStaticLibrary(LinkTest):
         result = self.builtin_dict['static_library']('static', [src])
         self.assertEqual(result, self.output_file(linker, 'static', Context()))
 
+    def test_make_lto(self):
+        linker = self.env.builder('c++').linker('static_library')
+        with mock.patch('warnings.warn'):
+            result = self.builtin_dict['static_library'](
+                'static', ['main.cpp'], link_options=[opts.lto()]
+            )
+            lto_linker = linker.lto_linker()
+        self.assertEqual(result.creator.linker, lto_linker)
+        self.assertEqual(result.creator.linker.rule_name, 'ar_lto')
+        self.assertIn(opts.lto(), result.creator.files[0].creator.options)
+        self.assertEqual(result.forward_opts['link_options'],
+                         opts.option_list(opts.lto()))
+
     def test_make_no_files(self):
         self.assertRaises(ValueError, self.builtin_dict['static_library'],
                           'static', [])
 
+    def write(self, buildfile, rule_handler, rule):
+        with mock.patch('bfg9000.shell.which', mock_which):
+            rule_handler(rule, self.build, buildfile, self.env)
+        out = StringIO()
+        buildfile.write(out)
+        return out.getvalue()
+
+    def test_make_rule_pool(self):
+        self.builtin_dict['pool']('heavy', 1)
+        result = self.builtin_dict['static_library']('static', ['main.cpp'],
+                                                     pool='heavy')
+        output = self.write(Makefile('build.bfg'), link.make_link,
+                            result.creator)
+
+        # The old archive is removed on its own line so that the pool applies
+        # to the whole archiving step.
+        self.assertIn("\t$(RM) '$@'\n\t$(BFG9000_POOL) heavy 1 -- " +
+                      '$(call RULE_AR,./main.o)\n', output)
+
+    def test_ninja_rule(self):
+        result = self.builtin_dict['static_library']('static', ['main.cpp'])
+        output = self.write(NinjaFile('build.bfg'), link.ninja_link,
+                            result.creator)
+        self.assertIn('  command = ${rm} ${out} && ${ar} ${arflags} ' +
+                      '--thin ${out} ${in}\n', output)
+
 
 class TestLibrary(LinkTest):
     def test_identity(self):
@@ -249,7 +335,7 @@ class TestLibrary(LinkTest):
         src = file_types.SourceFile(Path('main.cpp', Root.srcdir))
         shared_linker = self.env.builder('c++').linker('shared_library')
         static_linker = self.env.builder('c++').linker('static_library')
-        with mock.patch('warnings.warn', lambda s: None):
+        with mock.patch('warnings.warn', lambda *args: None):
             result = self.builtin_dict['library']('library', [src],
                                                   kind='dual')
 
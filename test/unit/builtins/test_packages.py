@@ -54,6 +54,8 @@ def mock_execute(args, **kwargs):
                 '19.12.25831 for x86')
     elif args[-1] == '--modversion':
         return '1.2.3\n'
+    elif args[-1] == 'pkg-config':
+        return '/usr/lib/pkgconfig\n'
 
 
 class TestFramework(unittest.TestCase):
@@ -0,0 +1,99 @@
+import mock
+from six.moves import cStringIO as StringIO
+
+from .common import BuiltinTest
+from bfg9000.backends.make.syntax import Makefile
+from bfg9000.backends.ninja.syntax import NinjaFile
+from bfg9000.builtins import compile, pgo, tests  # noqa
+from bfg9000.environment import PgoSettings
+from bfg9000.path import Path, Root
+from bfg9000.versioning import Version
+
+
+def mock_which(*args, **kwargs):
+    return ['command']
+
+
+class TestPgo(BuiltinTest):
+    def setUp(self):
+        BuiltinTest.setUp(self)
+        self.profile_dir = self.env.builddir.append('pgo-profile')
+
+    def set_mode(self, mode, train=None):
+        self.env.pgo = PgoSettings(mode, self.profile_dir, train)
+
+    def train_commands(self):
+        with mock.patch('bfg9000.shell.which', mock_which):
+            return pgo._train_commands(self.build, self.env, ['make'])
+
+    def test_stamp_dep(self):
+        self.set_mode('use')
+        obj = self.builtin_dict['object_file'](file='main.cpp')
+        self.assertEqual(obj.creator.extra_deps, [pgo.pgo_stamp()])
+
+    def test_no_stamp_dep(self):
+        obj = self.builtin_dict['object_file'](file='main.cpp')
+        self.assertEqual(obj.creator.extra_deps, [])
+
+        self.set_mode('generate')
+        obj = self.builtin_dict['object_file'](file='main2.cpp')
+        self.assertEqual(obj.creator.extra_deps, [])
+
+    def test_train(self):
+        self.set_mode('use', ['./prog'])
+        with mock.patch('bfg9000.shell.which', mock_which):
+            tool = self.env.tool('pgo')
+        self.assertEqual(self.train_commands(), [['make'], tool(
+            Path('pgo-profile', Root.builddir), ['./prog'],
+            directory=Path('pgo-generate', Root.builddir),
+            stamp=Path('pgo-profile.stamp', Root.builddir)
+        )])
+
+    def test_train_tests(self):
+        self.set_mode('use')
+        self.builtin_dict['test'](['./prog'])
+        with mock.patch('bfg9000.shell.which', mock_which):
+            tool = self.env.tool('pgo')
+        self.assertEqual(self.train_commands(), [['make'], tool(
+            Path('pgo-profile', Root.builddir), ['make', 'test'],
+            stamp=Path('pgo-profile.stamp', Root.builddir)
+        )])
+
+    def test_no_train(self):
+        self.set_mode('use')
+        self.assertRaises(ValueError, self.train_commands)
+
+
+class TestPgoRules(BuiltinTest):
+    def setUp(self):
+        BuiltinTest.setUp(self)
+        self.env.pgo = PgoSettings('use', self.env.builddir.append(
+            'pgo-profile'
+        ), ['./prog'])
+        self.builtin_dict['object_file'](file='main.cpp')
+
+    def write(self, buildfile, rule):
+        with mock.patch('bfg9000.shell.which', mock_which):
+            rule(self.build, buildfile, self.env)
+        out = StringIO()
+        buildfile.write(out)
+        return out.getvalue()
+
+    def test_make(self):
+        result = self.write(Makefile('build.bfg'), pgo.make_pgo_rule)
+        self.assertIn('pgo-trained.stamp: $(srcdir)/build.bfg ' +
+                      '$(srcdir)/main.cpp\n', result)
+        self.assertIn('pgo-profile.stamp: pgo-trained.stamp\n', result)
+
+    def test_ninja(self):
+        self.env.backend_version = Version('1.10')
+        result = self.write(NinjaFile('build.bfg'), pgo.ninja_pgo_rule)
+        self.assertIn('build pgo-profile.stamp: pgo_train | ' +
+                      '${srcdir}/build.bfg ${srcdir}/main.cpp\n', result)
+        self.assertIn('  restat = 1\n', result)
+        self.assertIn('  pool = console\n', result)
+
+    def test_ninja_old(self):
+        self.env.backend_version = Version('1.4')
+        result = self.write(NinjaFile('build.bfg'), pgo.ninja_pgo_rule)
+        self.assertNotIn('pool = console', result)
@@ -0,0 +1,59 @@
+import mock
+
+from .common import BuiltinTest
+from bfg9000.builtins import pool  # noqa
+from bfg9000.builtins.pool import Pool
+
+
+class TestPool(BuiltinTest):
+    def test_pool(self):
+        result = self.builtin_dict['pool']('link', 2)
+        self.assertEqual(result, Pool('link', 2))
+        self.assertEqual(list(self.build['pools']), [result])
+
+    def test_get(self):
+        p = self.builtin_dict['pool']('link', 2)
+        self.assertEqual(self.build['pools'].get(None), None)
+        self.assertEqual(self.build['pools'].get(p), p)
+        self.assertEqual(self.build['pools'].get('link'), p)
+        self.assertRaises(ValueError, self.build['pools'].get, 'nonexist')
+        self.assertRaises(TypeError, self.build['pools'].get, 1)
+
+    def test_invalid(self):
+        self.assertRaises(TypeError, self.builtin_dict['pool'], 1, 2)
+        self.assertRaises(TypeError, self.builtin_dict['pool'], 'link', '2')
+        self.assertRaises(TypeError, self.builtin_dict['pool'], 'link', True)
+        self.assertRaises(ValueError, self.builtin_dict['pool'], 'link', 0)
+        self.assertRaises(ValueError, self.builtin_dict['pool'], 'a b', 1)
+        self.assertRaises(ValueError, self.builtin_dict['pool'], 'console',
+                          1)
+
+    def test_duplicate(self):
+        self.builtin_dict['pool']('link', 2)
+        self.assertRaises(ValueError, self.builtin_dict['pool'], 'link', 2)
+
+    def test_link_pool(self):
+        with mock.patch('bfg9000.builtins.pool._physical_memory',
+                        return_value=16 * 1024 ** 3), \
+             mock.patch('bfg9000.builtins.pool._cpu_count', return_value=32):
+            self.assertEqual(self.build['pools'].link_pool(), Pool('link', 8))
+
+    def test_link_pool_few_cpus(self):
+        with mock.patch('bfg9000.builtins.pool._physical_memory',
+                        return_value=16 * 1024 ** 3), \
+             mock.patch('bfg9000.builtins.pool._cpu_count', return_value=4):
+            self.assertEqual(self.build['pools'].link_pool(), Pool('link', 4))
+
+    def test_link_pool_low_memory(self):
+        with mock.patch('bfg9000.builtins.pool._physical_memory',
+                        return_value=1024 ** 3):
+            self.assertEqual(self.build['pools'].link_pool(), Pool('link', 1))
+
+    def test_link_pool_unknown_memory(self):
+        with mock.patch('bfg9000.builtins.pool._physical_memory',
+                        return_value=None):
+            self.assertEqual(self.build['pools'].link_pool(), None)
+
+    def test_link_pool_explicit(self):
+        p = self.builtin_dict['pool']('link', 3)
+        self.assertEqual(self.build['pools'].link_pool(), p)
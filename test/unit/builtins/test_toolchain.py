@@ -79,6 +79,23 @@ class TestToolchain(unittest.TestCase):
                 self.assertRaises(IOError, toolchain.compiler, ['foo', 'bar'],
                                   'c++', strict=True)
 
+    def test_compiler_launcher(self):
+        environ = {}
+        with mock.patch('os.environ', environ):
+            with mock.patch('bfg9000.shell.which', mock_which):
+                toolchain.compiler_launcher('ccache', 'c++')
+                self.assertEqual(environ, {'CXX_LAUNCHER': 'command'})
+
+            with mock.patch('bfg9000.shell.which', mock_bad_which):
+                toolchain.compiler_launcher('ccache', 'c')
+                self.assertEqual(environ, {'CXX_LAUNCHER': 'command',
+                                           'CC_LAUNCHER': 'ccache'})
+                self.assertRaises(IOError, toolchain.compiler_launcher,
+                                  'ccache', 'c', strict=True)
+
+        self.assertRaises(ValueError, toolchain.compiler_launcher, 'ccache',
+                          'java')
+
     def test_compile_options(self):
         environ = {}
         with mock.patch('os.environ', environ):
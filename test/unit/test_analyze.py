@@ -0,0 +1,225 @@
+import json
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+from six.moves import cStringIO as StringIO
+
+from .. import make_env
+
+from bfg9000.analyze import *
+from bfg9000.build_inputs import BuildInputs, Edge, Location
+from bfg9000.file_types import File
+from bfg9000.path import Path, Root
+
+
+def make_edge(build, output, location):
+    edge = Edge(build, File(Path(output)))
+    edge.location = location
+    return edge
+
+
+class TestBuildGraph(unittest.TestCase):
+    def setUp(self):
+        self.env = make_env()
+        self.env.backend = 'ninja'
+        self.srcdir = self.env.srcdir.string()
+        self.build = BuildInputs(self.env, Path('build.bfg', Root.srcdir))
+
+    def loc(self, line, function='executable'):
+        return Location(os.path.join(self.srcdir, 'build.bfg'), line,
+                        function)
+
+    def test_edge_location(self):
+        edge = Edge(self.build, File(Path('foo')))
+        self.assertEqual(edge.location.filename, __file__.replace('.pyc',
+                                                                  '.py'))
+        self.assertEqual(edge.location.function, '__init__')
+
+    def test_add(self):
+        graph = BuildGraph.from_env(self.env)
+        graph.add([(['all'], [Path('foo')])])
+        graph.add([([File(Path('foo.o'))], [Path('foo.c', Root.srcdir)])],
+                  make_edge(self.build, 'foo.o', self.loc(1)))
+        graph.add([([File(Path('foo'))], [File(Path('foo.o'))])],
+                  make_edge(self.build, 'foo', self.loc(1)))
+
+        self.assertEqual(graph.steps, [
+            [['all'], ['foo'], None],
+            [['foo.o'], [os.path.join(self.srcdir, 'foo.c')], 0],
+            [['foo'], ['foo.o'], 0],
+        ])
+        self.assertEqual(graph.locations, [
+            ['build.bfg', 1, 'executable', 'foo'],
+        ])
+
+    def test_add_empty(self):
+        graph = BuildGraph.from_env(self.env)
+        graph.add([([object()], [])],
+                  make_edge(self.build, 'foo', self.loc(1)))
+        self.assertEqual(graph.steps, [])
+        self.assertEqual(graph.locations, [])
+
+    def test_add_no_location(self):
+        graph = BuildGraph.from_env(self.env)
+        graph.add([(['foo'], [])], make_edge(self.build, 'foo', None))
+        self.assertEqual(graph.steps, [[['foo'], [], None]])
+
+    def test_save_load(self):
+        graph = BuildGraph.from_env(self.env)
+        graph.add([([File(Path('foo'))], [])],
+                  make_edge(self.build, 'foo', self.loc(2)))
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            graph.save(tmpdir)
+            loaded = BuildGraph.load(tmpdir)
+        finally:
+            shutil.rmtree(tmpdir)
+
+        self.assertEqual(loaded.backend, 'ninja')
+        self.assertEqual(loaded.steps, graph.steps)
+        self.assertEqual(loaded.locations, graph.locations)
+
+    def test_load_missing(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            self.assertEqual(BuildGraph.load(tmpdir), None)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestReadLogs(unittest.TestCase):
+    def test_ninja_log(self):
+        log = StringIO('# ninja log v5\n'
+                       '0\t100\t1234\tfoo.o\tabcd\n'
+                       '100\t150\t1234\tfoo\tabcd\n'
+                       '0\t120\t1234\tfoo.o\tabcd\n')
+        self.assertEqual(read_ninja_log(log), {
+            'foo.o': (0, 120), 'foo': (100, 150),
+        })
+
+    def test_timing_log(self):
+        log = StringIO('1000\t1100\t1\tfoo.o\n'
+                       '1200\t1250\t1\tfoo.o\n'
+                       '1300\t1310\t1\tfoo bar\n'
+                       '2000\t2030\t2\tfoo.o\n')
+        self.assertEqual(read_timing_log(log), {
+            'foo.o': (2000, 2030), 'foo bar': (1300, 1310),
+        })
+
+    def test_load_timings(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            self.assertEqual(load_timings(tmpdir, 'make'), {})
+            with open(os.path.join(tmpdir, '.bfg_timing'), 'w') as f:
+                f.write('0\t10\t1\tfoo\n')
+            self.assertEqual(load_timings(tmpdir, 'make'), {'foo': (0, 10)})
+        finally:
+            shutil.rmtree(tmpdir)
+
+        self.assertRaises(ValueError, load_timings, '.', 'msbuild')
+
+
+class TestAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.graph = BuildGraph('ninja', steps=[
+            [['a.o'], ['a.c'], 0],
+            [['b.o'], ['b.c'], 0],
+            [['liba.so'], ['a.o', 'b.o'], 0],
+            [['c.o'], ['c.c'], 1],
+            [['prog'], ['c.o', 'liba.so'], 1],
+            [['all'], ['prog'], None],
+        ], locations=[
+            ['build.bfg', 1, 'library', 'liba.so'],
+            ['build.bfg', 2, 'executable', 'prog'],
+        ])
+        self.timings = {
+            'a.o': (0, 1000), 'b.o': (0, 3000), 'liba.so': (3000, 3500),
+            'c.o': (0, 2000), 'prog': (3500, 4000),
+        }
+        self.analysis = Analysis(self.graph, self.timings)
+
+    def test_critical_path(self):
+        self.assertEqual(self.analysis.critical_path, [1, 2, 4])
+        self.assertEqual(self.analysis.critical_duration, 4)
+
+    def test_critical_path_empty(self):
+        self.assertEqual(Analysis(BuildGraph('ninja'), {}).critical_path, [])
+        self.assertEqual(Analysis(self.graph, {}).critical_path, [])
+
+    def test_cycle(self):
+        graph = BuildGraph('make', steps=[
+            [['a'], ['b'], None],
+            [['b'], ['a'], None],
+        ])
+        analysis = Analysis(graph, {'a': (0, 1000), 'b': (0, 2000)})
+        self.assertEqual(analysis.critical_duration, 3)
+
+    def test_targets(self):
+        self.assertEqual(self.analysis.targets(), [
+            {'target': 'liba.so', 'function': 'library',
+             'location': 'build.bfg:1', 'total': 4.5, 'critical': 3.5,
+             'steps': 3},
+            {'target': 'prog', 'function': 'executable',
+             'location': 'build.bfg:2', 'total': 2.5, 'critical': 0.5,
+             'steps': 2},
+        ])
+
+    def test_to_json(self):
+        result = json.loads(json.dumps(self.analysis.to_json()))
+        self.assertEqual(result['critical_path']['duration'], 4)
+        self.assertEqual(result['critical_path']['steps'][0], {
+            'outputs': ['b.o'], 'duration': 3, 'target': 'liba.so',
+            'function': 'library', 'location': 'build.bfg:1',
+        })
+        self.assertEqual(len(result['targets']), 2)
+
+    def test_format(self):
+        self.assertEqual(self.analysis.format(), '\n'.join([
+            'critical path: 4.00s over 3 step(s)',
+            '   TIME  OUTPUT   CREATED BY',
+            '  3.00s  b.o      liba.so (library) at build.bfg:1',
+            '  0.50s  liba.so  liba.so (library) at build.bfg:1',
+            '  0.50s  prog     prog (executable) at build.bfg:2',
+            '',
+            'TOTAL  CRITICAL  STEPS  TARGET             LOCATION',
+            '4.50s     3.50s      3  liba.so (library)  build.bfg:1',
+            '2.50s     0.50s      2  prog (executable)  build.bfg:2',
+        ]))
+
+    def test_format_internal(self):
+        graph = BuildGraph('ninja', steps=[[['foo/.dir'], [], None]])
+        analysis = Analysis(graph, {'foo/.dir': (0, 10)})
+        self.assertIn('(internal)', analysis.format())
+
+
+class TestDriver(unittest.TestCase):
+    def test_analyze(self):
+        from bfg9000 import driver
+
+        graph = BuildGraph('ninja', steps=[[['foo'], [], None]])
+        args = mock.Mock(json=True)
+        args.builddir.string.return_value = 'build'
+        with mock.patch('bfg9000.analyze.BuildGraph.load',
+                        return_value=graph), \
+             mock.patch('bfg9000.driver.load_timings',
+                        return_value={'foo': (0, 10)}), \
+             mock.patch('sys.stdout', StringIO()) as out:  # noqa
+            self.assertEqual(driver.analyze(None, None, args, []), None)
+        self.assertEqual(json.loads(out.getvalue())['critical_path']
+                         ['duration'], 0.01)
+
+    def test_analyze_no_log(self):
+        from bfg9000 import driver
+
+        graph = BuildGraph('ninja')
+        args = mock.Mock(json=False)
+        args.builddir.string.return_value = 'build'
+        with mock.patch('bfg9000.analyze.BuildGraph.load',
+                        return_value=graph), \
+             mock.patch('bfg9000.driver.load_timings', return_value={}), \
+             mock.patch('bfg9000.driver.logger') as logger:  # noqa
+            self.assertEqual(driver.analyze(None, None, args, []), 1)
+        logger.error.assert_called_once()
@@ -0,0 +1,122 @@
+import bz2
+import gzip
+import mock
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from io import BytesIO
+
+from bfg9000.archive import *
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+
+class TestParallelWriter(unittest.TestCase):
+    def _compress(self, compressor, data, jobs, chunk=1000):
+        out = BytesIO()
+        writer = ParallelWriter(out, compressor, jobs)
+        for i in range(0, len(data), chunk):
+            writer.write(data[i:i + chunk])
+        writer.close()
+        return out.getvalue()
+
+    def test_gzip(self):
+        data = os.urandom(1000) * 1000
+        for jobs in (1, 4):
+            result = self._compress(GzipCompressor(), data, jobs)
+            self.assertEqual(gzip.GzipFile(fileobj=BytesIO(result)).read(),
+                             data)
+
+    def test_gzip_empty(self):
+        result = self._compress(GzipCompressor(), b'', 1)
+        self.assertEqual(gzip.GzipFile(fileobj=BytesIO(result)).read(), b'')
+
+    def test_gzip_deterministic(self):
+        data = os.urandom(1000) * 500
+        self.assertEqual(self._compress(GzipCompressor(), data, 1),
+                         self._compress(GzipCompressor(), data, 4, 777))
+
+    def test_bzip2(self):
+        data = b'hello world\n' * 100000
+        with mock.patch.object(StreamCompressor, 'block_size', 100000):
+            result = self._compress(compressor('bzip2'), data, 4)
+        self.assertEqual(bz2.BZ2File(BytesIO(result)).read(), data)
+
+    @unittest.skipIf(lzma is None, 'xz not supported')
+    def test_xz(self):
+        data = b'hello world\n' * 100000
+        with mock.patch.object(StreamCompressor, 'block_size', 100000):
+            result = self._compress(compressor('xz'), data, 4)
+        self.assertEqual(lzma.decompress(result), data)
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, compressor, 'unknown')
+
+
+class TestWriteArchive(unittest.TestCase):
+    def setUp(self):
+        self.olddir = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+        os.mkdir('src')
+        os.mkdir('src/dir')
+        with open('src/foo', 'w') as f:
+            f.write('foo')
+        with open('src/dir/bar', 'w') as f:
+            f.write('bar')
+        os.chmod('src/dir/bar', 0o775)
+        self.sources = ['foo', 'dir', os.path.join('dir', 'bar')]
+
+    def tearDown(self):
+        os.chdir(self.olddir)
+        shutil.rmtree(self.tmpdir)
+
+    def _read(self, filename):
+        with open(filename, 'rb') as f:
+            return f.read()
+
+    def test_tar(self):
+        for fmt in ('gzip', 'bzip2'):
+            write_archive('out.tar', fmt, self.sources, 'src', 'proj', jobs=2)
+            with tarfile.open('out.tar') as t:
+                self.assertEqual(t.getnames(),
+                                 ['proj/dir', 'proj/dir/bar', 'proj/foo'])
+                self.assertEqual(t.extractfile('proj/foo').read(), b'foo')
+
+                member = t.getmember('proj/dir/bar')
+                self.assertEqual(member.mode, 0o755)
+                self.assertEqual(member.mtime, source_mtime())
+                self.assertEqual((member.uid, member.uname), (0, ''))
+                self.assertEqual(t.getmember('proj/foo').mode, 0o644)
+
+    def test_zip(self):
+        write_archive('out.zip', 'zip', self.sources, 'src', 'proj')
+        with zipfile.ZipFile('out.zip') as z:
+            self.assertEqual(z.namelist(),
+                             ['proj/dir/', 'proj/dir/bar', 'proj/foo'])
+            self.assertEqual(z.read('proj/foo'), b'foo')
+            self.assertEqual(z.getinfo('proj/foo').date_time,
+                             (1980, 1, 1, 0, 0, 0))
+
+    def test_reproducible(self):
+        for fmt in ('gzip', 'zip'):
+            write_archive('out1', fmt, self.sources, 'src')
+            os.utime('src/foo', (1234567890, 1234567890))
+            write_archive('out2', fmt, list(reversed(self.sources)), 'src',
+                          jobs=4)
+            self.assertEqual(self._read('out1'), self._read('out2'))
+
+    def test_source_date_epoch(self):
+        os.environ['SOURCE_DATE_EPOCH'] = '1234567890'
+        try:
+            write_archive('out.tar.gz', 'gzip', self.sources, 'src')
+        finally:
+            del os.environ['SOURCE_DATE_EPOCH']
+        with tarfile.open('out.tar.gz') as t:
+            self.assertEqual(t.getmember('foo').mtime, 1234567890)
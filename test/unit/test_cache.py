@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from bfg9000.cache import *
+
+
+class TestParseSize(unittest.TestCase):
+    def test_bytes(self):
+        self.assertEqual(parse_size('100'), 100)
+        self.assertEqual(parse_size('100b'), 100)
+
+    def test_units(self):
+        self.assertEqual(parse_size('2k'), 2048)
+        self.assertEqual(parse_size('2M'), 2 * 1024 ** 2)
+        self.assertEqual(parse_size('2GB'), 2 * 1024 ** 3)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, parse_size, 'foo')
+        self.assertRaises(ValueError, parse_size, '1t')
+
+
+class TestFormatSize(unittest.TestCase):
+    def test_format(self):
+        self.assertEqual(format_size(100), '100B')
+        self.assertEqual(format_size(2048), '2.0kB')
+        self.assertEqual(format_size(3 * 1024 ** 2), '3.0MB')
+        self.assertEqual(format_size(4 * 1024 ** 3), '4.0GB')
+
+
+class TestStore(unittest.TestCase):
+    def setUp(self):
+        self.olddir = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+        self.store = Store(os.path.join(self.tmpdir, 'cache'))
+
+    def tearDown(self):
+        os.chdir(self.olddir)
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, filename, data):
+        with open(filename, 'w') as f:
+            f.write(data)
+
+    def read(self, filename):
+        with open(filename) as f:
+            return f.read()
+
+    def test_command_inputs(self):
+        self.write('foo.c', '')
+        self.write('foo.rsp', 'foo.c nonexist.c')
+        os.mkdir('lib')
+        self.write(os.path.join('lib', 'libbar.a'), '')
+
+        self.assertEqual(self.store.command_inputs(
+            ['cc', '-c', 'foo.c', '-o', 'foo.o'], ['foo.o']
+        ), ['foo.c'])
+        self.assertEqual(self.store.command_inputs(
+            ['cc', '@foo.rsp'], []
+        ), ['foo.rsp', 'foo.c'])
+        self.assertEqual(self.store.command_inputs(
+            ['cc', '-Llib', '-lbar', '-lnonexist'], []
+        ), [os.path.join('lib', 'libbar.a')])
+        self.assertEqual(self.store.command_inputs(
+            ['cc', 'foo.c'], ['foo.c']
+        ), [])
+
+    def test_command_key(self):
+        self.write('foo.c', 'foo')
+        key = self.store.command_key(['cc', 'foo.c'], ['foo.o'], [])
+        self.assertEqual(
+            self.store.command_key(['cc', 'foo.c'], ['foo.o'], []), key
+        )
+        self.assertNotEqual(
+            self.store.command_key(['cc', 'foo.c'], ['foo.o'], [], 'salt'), key
+        )
+        self.assertNotEqual(
+            self.store.command_key(['cc', 'foo.c'], ['bar.o'], []), key
+        )
+
+        self.write('foo.c', 'bar')
+        store = Store(self.store.path)
+        self.assertNotEqual(
+            store.command_key(['cc', 'foo.c'], ['foo.o'], []), key
+        )
+
+    def test_store_lookup(self):
+        self.write('foo.h', 'header')
+        self.write('foo.o', 'object')
+        self.assertTrue(self.store.store('key', ['foo.o'], ['foo.h'],
+                                         b'out', b'err'))
+
+        os.remove('foo.o')
+        result = Store(self.store.path).lookup('key')
+        self.assertEqual(result['stdout'], 'out')
+        self.assertEqual(result['stderr'], 'err')
+        self.store.restore(result)
+        self.assertEqual(self.read('foo.o'), 'object')
+
+        self.assertEqual(self.store.stats()['stores'], 1)
+        self.assertEqual(self.store.stats()['size'], 6)
+
+    def test_lookup_changed_deps(self):
+        self.write('foo.h', 'header')
+        self.write('foo.o', 'object')
+        self.store.store('key', ['foo.o'], ['foo.h'])
+
+        self.write('foo.h', 'changed')
+        self.assertEqual(Store(self.store.path).lookup('key'), None)
+
+    def test_lookup_missing(self):
+        self.assertEqual(self.store.lookup('key'), None)
+
+    def test_store_missing_output(self):
+        self.assertFalse(self.store.store('key', ['nonexist.o']))
+        self.assertEqual(self.store.lookup('key'), None)
+
+    def test_trim(self):
+        self.write('foo.o', 'x' * 100)
+        self.store.store('foo', ['foo.o'])
+        self.write('bar.o', 'y' * 100)
+        self.store.store('bar', ['bar.o'])
+
+        self.assertEqual(self.store.trim(0), 6)
+        self.assertEqual(self.store.stats()['size'], 0)
+        self.assertEqual(self.store.stats()['evictions'], 6)
+        self.assertEqual(self.store.lookup('foo'), None)
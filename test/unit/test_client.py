@@ -0,0 +1,174 @@
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from bfg9000.app_version import version
+from bfg9000.client import *
+from bfg9000.client import _parse_refresh, _strip_color
+
+
+class TestSocketDir(unittest.TestCase):
+    def test_runtime_dir(self):
+        with mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': '/run/user/1'}):
+            self.assertEqual(socket_dir(), os.path.join('/run/user/1',
+                                                        'bfg9000'))
+            self.assertEqual(socket_path(), os.path.join(
+                '/run/user/1', 'bfg9000', 'server.sock'
+            ))
+
+    def test_tempdir(self):
+        with mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': ''}), \
+             mock.patch('tempfile.gettempdir', return_value='/tmp'):  # noqa
+            self.assertEqual(socket_dir(), os.path.join(
+                '/tmp', 'bfg9000-{}'.format(os.getuid())
+            ))
+
+
+class TestIsPrivate(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_private(self):
+        os.chmod(self.tmpdir, 0o700)
+        self.assertTrue(is_private(self.tmpdir))
+
+    def test_shared(self):
+        os.chmod(self.tmpdir, 0o755)
+        self.assertFalse(is_private(self.tmpdir))
+
+    def test_file(self):
+        filename = os.path.join(self.tmpdir, 'file')
+        open(filename, 'w').close()
+        os.chmod(filename, 0o600)
+        self.assertFalse(is_private(filename))
+
+    def test_nonexistent(self):
+        self.assertFalse(is_private(os.path.join(self.tmpdir, 'nonexist')))
+
+
+class TestParseRefresh(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_refresh(self):
+        self.assertEqual(_parse_refresh(['refresh', self.tmpdir]), {
+            'command': 'refresh', 'builddir': self.tmpdir, 'force': False,
+        })
+        self.assertEqual(_parse_refresh(['refresh', '-f', self.tmpdir]), {
+            'command': 'refresh', 'builddir': self.tmpdir, 'force': True,
+        })
+        self.assertEqual(_parse_refresh(['refresh', self.tmpdir, '--force']), {
+            'command': 'refresh', 'builddir': self.tmpdir, 'force': True,
+        })
+
+    def test_default_builddir(self):
+        with mock.patch('os.getcwd', return_value=self.tmpdir):
+            self.assertEqual(_parse_refresh(['refresh']), {
+                'command': 'refresh', 'builddir': self.tmpdir, 'force': False,
+            })
+
+    def test_other_commands(self):
+        self.assertEqual(_parse_refresh([]), None)
+        self.assertEqual(_parse_refresh(['configure', self.tmpdir]), None)
+        self.assertEqual(_parse_refresh(['--debug', 'refresh']), None)
+
+    def test_unknown_args(self):
+        self.assertEqual(_parse_refresh(['refresh', '--help']), None)
+        self.assertEqual(_parse_refresh(['refresh', 'foo', 'bar']), None)
+
+    def test_bad_builddir(self):
+        self.assertEqual(_parse_refresh(
+            ['refresh', os.path.join(self.tmpdir, 'nonexist')]
+        ), None)
+
+        open(os.path.join(self.tmpdir, 'build.bfg'), 'w').close()
+        self.assertEqual(_parse_refresh(['refresh', self.tmpdir]), None)
+
+    def test_configurations(self):
+        open(os.path.join(self.tmpdir, '.bfg_configs'), 'w').close()
+        self.assertEqual(_parse_refresh(['refresh', self.tmpdir]), None)
+
+
+class TestRequest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        os.chmod(self.tmpdir, 0o700)
+        self.path = os.path.join(self.tmpdir, 'server.sock')
+        open(self.path, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_request(self):
+        response = {'returncode': 0, 'output': ''}
+        with mock.patch('bfg9000.client.send',
+                        return_value=response) as send:
+            self.assertEqual(request({'command': 'refresh'}, self.path),
+                             response)
+        send.assert_called_once_with(self.path, {
+            'command': 'refresh', 'version': version
+        })
+
+    def test_no_server(self):
+        os.remove(self.path)
+        with mock.patch('bfg9000.client.send') as send:
+            self.assertEqual(request({'command': 'refresh'}, self.path), None)
+        send.assert_not_called()
+
+    def test_shared_dir(self):
+        os.chmod(self.tmpdir, 0o755)
+        with mock.patch('bfg9000.client.send') as send:
+            self.assertEqual(request({'command': 'refresh'}, self.path), None)
+        send.assert_not_called()
+
+    def test_dead_server(self):
+        # Not a real socket, so connecting should fail.
+        self.assertEqual(request({'command': 'refresh'}, self.path), None)
+
+    def test_refused(self):
+        with mock.patch('bfg9000.client.send',
+                        return_value={'refused': True}):
+            self.assertEqual(request({'command': 'refresh'}, self.path), None)
+
+
+class TestDelegate(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_delegate(self):
+        response = {'returncode': 1, 'output': '\033[1;31merror\033[0m: bad\n'}
+        with mock.patch('bfg9000.client.request',
+                        return_value=response) as req, \
+             mock.patch('sys.stderr') as stderr:  # noqa
+            stderr.isatty.return_value = False
+            self.assertEqual(delegate(['refresh', self.tmpdir]), 1)
+        req.assert_called_once_with({
+            'command': 'refresh', 'builddir': self.tmpdir, 'force': False
+        }, None)
+        stderr.write.assert_called_once_with('error: bad\n')
+
+    def test_no_server(self):
+        with mock.patch('bfg9000.client.request', return_value=None):
+            self.assertEqual(delegate(['refresh', self.tmpdir]), None)
+
+    def test_not_refresh(self):
+        with mock.patch('bfg9000.client.request') as req:
+            self.assertEqual(delegate(['configure', self.tmpdir]), None)
+        req.assert_not_called()
+
+
+class TestStripColor(unittest.TestCase):
+    def test_strip(self):
+        self.assertEqual(_strip_color('\033[1;34minfo\033[0m: foo'),
+                         'info: foo')
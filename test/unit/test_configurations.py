@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import make_env
+
+from bfg9000 import builtins
+from bfg9000.build_inputs import BuildInputs
+from bfg9000.configurations import *
+from bfg9000.file_types import File
+from bfg9000.path import Path, Root
+
+
+class TestConfiguration(unittest.TestCase):
+    def test_parse_name(self):
+        self.assertEqual(Configuration.parse('debug'), Configuration('debug'))
+        self.assertEqual(Configuration.parse('release+lto:'),
+                         Configuration('release+lto'))
+
+    def test_parse_variables(self):
+        self.assertEqual(
+            Configuration.parse("asan: CXXFLAGS='-g -fsanitize=address' " +
+                                'LDFLAGS=-fsanitize=address'),
+            Configuration('asan', {'CXXFLAGS': '-g -fsanitize=address',
+                                   'LDFLAGS': '-fsanitize=address'})
+        )
+
+    def test_parse_args(self):
+        self.assertEqual(
+            Configuration.parse('rel: CFLAGS=-O2 --prefix=/opt FOO=bar'),
+            Configuration('rel', {'CFLAGS': '-O2'},
+                          ['--prefix=/opt', 'FOO=bar'])
+        )
+
+    def test_invalid_name(self):
+        self.assertRaises(ValueError, Configuration, '')
+        self.assertRaises(ValueError, Configuration, '.hidden')
+        self.assertRaises(ValueError, Configuration, 'foo/bar')
+        self.assertRaises(ValueError, Configuration, 'all')
+        self.assertRaises(ValueError, Configuration.parse, ':CFLAGS=-g')
+
+    def test_equality(self):
+        self.assertTrue(Configuration('foo') == Configuration('foo'))
+        self.assertFalse(Configuration('foo') != Configuration('foo'))
+        self.assertFalse(Configuration('foo') == Configuration('bar'))
+        self.assertFalse(Configuration('foo', {'CFLAGS': '-g'}) ==
+                         Configuration('foo'))
+        self.assertFalse(Configuration('foo', args=['--x-foo']) ==
+                         Configuration('foo'))
+
+
+class TestCheckUnique(unittest.TestCase):
+    def test_unique(self):
+        check_unique([Configuration('foo'), Configuration('bar')])
+
+    def test_duplicate(self):
+        self.assertRaises(ValueError, check_unique, [
+            Configuration('foo'), Configuration('foo', {'CFLAGS': '-g'})
+        ])
+
+
+class TestTargets(unittest.TestCase):
+    def setUp(self):
+        builtins.init()
+        self.build_inputs = BuildInputs(make_env(),
+                                        Path('build.bfg', Root.srcdir))
+
+    def test_default(self):
+        self.assertEqual(targets(self.build_inputs), ['all'])
+
+    def test_test(self):
+        self.build_inputs['tests'].tests.append('test')
+        self.assertEqual(targets(self.build_inputs), ['all', 'test'])
+
+    def test_install(self):
+        self.build_inputs['install'].add(File(Path('foo', Root.srcdir)))
+        self.assertEqual(targets(self.build_inputs),
+                         ['all', 'install', 'uninstall'])
+
+    def test_target_name(self):
+        self.assertEqual(target_name('debug', 'all'), 'debug')
+        self.assertEqual(target_name('debug', 'test'), 'debug/test')
+
+
+class TestConfigurationSet(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_targets(self):
+        configs = ConfigurationSet()
+        configs.add('debug', ['all', 'test'])
+        configs.add('release', ['all', 'install', 'uninstall'])
+        self.assertEqual(list(configs.targets().items()), [
+            ('all', ['debug', 'release']),
+            ('test', ['debug']),
+            ('install', ['release']),
+            ('uninstall', ['release']),
+        ])
+
+    def test_save_load(self):
+        configs = ConfigurationSet()
+        configs.add('release', ['all'])
+        configs.add('debug', ['all', 'test'])
+        configs.save(self.tmpdir)
+
+        self.assertTrue(ConfigurationSet.exists(self.tmpdir))
+        loaded = ConfigurationSet.load(self.tmpdir)
+        self.assertEqual(list(loaded.configurations.items()), [
+            ('release', ['all']), ('debug', ['all', 'test']),
+        ])
+
+    def test_load_missing(self):
+        self.assertFalse(ConfigurationSet.exists(self.tmpdir))
+        self.assertEqual(ConfigurationSet.load(self.tmpdir), None)
+
+    def test_load_other_version(self):
+        with open(os.path.join(self.tmpdir, configs_file), 'w') as f:
+            f.write('{"version": 0, "data": {}}')
+        self.assertEqual(ConfigurationSet.load(self.tmpdir), None)
+
+    def test_clear(self):
+        ConfigurationSet().save(self.tmpdir)
+        ConfigurationSet.clear(self.tmpdir)
+        self.assertFalse(ConfigurationSet.exists(self.tmpdir))
+        ConfigurationSet.clear(self.tmpdir)
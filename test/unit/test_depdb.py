@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+from six.moves import cStringIO as StringIO
+
+from bfg9000.depdb import *
+
+
+class TestShard(unittest.TestCase):
+    def test_read(self):
+        blocks = read_shard(StringIO(
+            '# depdb: foo.o\n'
+            'foo.o: foo.c\n'
+            'foo.c:\n'
+            '# depdb: bar.o\n'
+            'bar.o: bar.c\n'
+        ))
+        self.assertEqual(blocks, {
+            'foo.o': ['foo.o: foo.c\n', 'foo.c:\n'],
+            'bar.o': ['bar.o: bar.c\n'],
+        })
+
+    def test_read_empty(self):
+        self.assertEqual(read_shard(StringIO('')), {})
+
+    def test_write(self):
+        out = StringIO()
+        write_shard(out, {
+            'foo.o': ['foo.o: foo.c\n'],
+            'bar.o': ['bar.o: bar.c\n'],
+        })
+        self.assertEqual(out.getvalue(),
+                         '# depdb: bar.o\n'
+                         'bar.o: bar.c\n'
+                         '# depdb: foo.o\n'
+                         'foo.o: foo.c\n')
+
+
+class TestUpdate(unittest.TestCase):
+    def setUp(self):
+        self.olddir = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+        self.shard = os.path.join('deps', '0.mk')
+
+    def tearDown(self):
+        os.chdir(self.olddir)
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, data):
+        with open(name, 'w') as f:
+            f.write(data)
+
+    def _read(self):
+        with open(self.shard) as f:
+            return f.read()
+
+    def test_fix_deps(self):
+        self._write('foo.o.d', 'foo.o: foo.c foo.h')
+        self.assertEqual(fix_deps('foo.o.d'),
+                         'foo.o: foo.c foo.h\nfoo.c:\nfoo.h:\n')
+
+    def test_update(self):
+        update(self.shard, 'foo.o', 'foo.o: foo.h\nfoo.h:\n')
+        update(self.shard, 'bar.o', 'bar.o: bar.h\nbar.h:\n')
+        self.assertEqual(self._read(),
+                         '# depdb: bar.o\nbar.o: bar.h\nbar.h:\n'
+                         '# depdb: foo.o\nfoo.o: foo.h\nfoo.h:\n')
+
+        update(self.shard, 'foo.o', 'foo.o: foo2.h\nfoo2.h:\n')
+        self.assertEqual(self._read(),
+                         '# depdb: bar.o\nbar.o: bar.h\nbar.h:\n'
+                         '# depdb: foo.o\nfoo.o: foo2.h\nfoo2.h:\n')
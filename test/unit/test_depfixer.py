@@ -69,3 +69,42 @@ class TestEmitDeps(unittest.TestCase):
         instream = StringIO('foo: bar')
         outstream = StringIO()
         self.assertRaises(ParseError, emit_deps, instream, outstream)
+
+
+class TestParseDeps(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(parse_deps(StringIO('')), [])
+
+    def test_single_rule(self):
+        self.assertEqual(parse_deps(StringIO('foo: bar \\\n  baz\n')),
+                         [(['foo'], ['bar', 'baz'])])
+
+    def test_multiple_rules(self):
+        self.assertEqual(parse_deps(StringIO('foo bar: baz\nbaz:\n')), [
+            (['foo', 'bar'], ['baz']),
+            (['baz'], []),
+        ])
+
+    def test_escaped_spaces(self):
+        self.assertEqual(parse_deps(StringIO('foo: bar\\ baz\n')),
+                         [(['foo'], ['bar baz'])])
+
+    def test_windows_paths(self):
+        self.assertEqual(parse_deps(StringIO('c:\\foo: c:\\bar\n')),
+                         [(['c:\\foo'], ['c:\\bar'])])
+
+    def test_no_trailing_newline(self):
+        self.assertEqual(parse_deps(StringIO('foo: bar')),
+                         [(['foo'], ['bar'])])
+
+    def test_unexpected_newline(self):
+        self.assertRaises(UnexpectedTokenError, parse_deps, StringIO('foo\n'))
+
+    def test_unexpected_colon(self):
+        self.assertRaises(UnexpectedTokenError, parse_deps,
+                          StringIO('foo: bar :\n'))
+        self.assertRaises(UnexpectedTokenError, parse_deps,
+                          StringIO(': bar\n'))
+
+    def test_unexpected_eof(self):
+        self.assertRaises(ParseError, parse_deps, StringIO('foo'))
@@ -0,0 +1,151 @@
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+from six.moves import cStringIO as StringIO
+
+from bfg9000 import shell
+from bfg9000.depreport import *
+
+
+class TestReadNinjaDeps(unittest.TestCase):
+    def test_read(self):
+        output = StringIO(
+            'foo.o: #deps 3, deps mtime 123 (VALID)\n'
+            '    ../src/foo.c\n'
+            '    ../src/foo.h\n'
+            '    /usr/include/stdio.h\n'
+            '\n'
+            'bar.o: #deps 1, deps mtime 456 (STALE)\n'
+            '    ../src/bar.c\n'
+            '\n'
+        )
+        self.assertEqual(read_ninja_deps(output), {
+            'foo.o': ['../src/foo.c', '../src/foo.h', '/usr/include/stdio.h'],
+            'bar.o': ['../src/bar.c'],
+        })
+
+    def test_empty(self):
+        self.assertEqual(read_ninja_deps(StringIO('')), {})
+
+
+class TestMakeDeps(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(data)
+
+    def test_depfiles(self):
+        self.write('foo.o.d', 'foo.o: ../src/foo.c ../src/foo.h\n'
+                              '../src/foo.c:\n../src/foo.h:\n')
+        self.write('sub/bar.o.d', 'sub/bar.o: ../src/bar.c \\\n'
+                                  '  ../src/foo.h\n')
+        self.write('bad.d', 'bad\n')
+        self.write('other.mk', 'baz.o: ../src/baz.c\n')
+        self.assertEqual(make_deps(self.tmpdir), {
+            'foo.o': ['../src/foo.c', '../src/foo.h'],
+            'sub/bar.o': ['../src/bar.c', '../src/foo.h'],
+        })
+
+    def test_depdb(self):
+        self.write('.bfg_deps/0.mk', '# depdb: foo.o\n'
+                                     'foo.o: ../src/foo.c ../src/foo.h\n'
+                                     '../src/foo.h:\n')
+        self.assertEqual(make_deps(self.tmpdir), {
+            'foo.o': ['../src/foo.c', '../src/foo.h'],
+        })
+
+
+class TestLoadDeps(unittest.TestCase):
+    def test_make(self):
+        with mock.patch('bfg9000.depreport.make_deps',
+                        return_value={}) as m:
+            self.assertEqual(load_deps('build', 'make', {}), {})
+        m.assert_called_once_with('build')
+
+    def test_ninja(self):
+        with mock.patch('bfg9000.shell.which', return_value=['ninja']), \
+             mock.patch('bfg9000.shell.execute',
+                        return_value='foo.o: #deps 1\n    foo.c\n') as m:  # noqa
+            self.assertEqual(load_deps('build', 'ninja', {}),
+                             {'foo.o': ['foo.c']})
+        m.assert_called_once_with(
+            ['ninja', '-C', 'build', '-t', 'deps'],
+            stdout=shell.Mode.pipe, stderr=shell.Mode.devnull
+        )
+
+    def test_unsupported(self):
+        self.assertRaises(ValueError, load_deps, 'build', 'msbuild', {})
+
+
+class TestDepsReport(unittest.TestCase):
+    def setUp(self):
+        self.srcdir = os.path.abspath(os.path.join('project', 'src'))
+        self.builddir = os.path.abspath(os.path.join('project', 'build'))
+        self.deps = {
+            'foo.o': ['../src/foo.c', '../src/common.h', '../src/foo.h',
+                      '/usr/include/stdio.h'],
+            'bar.o': ['../src/bar.c', '../src/common.h'],
+            'baz.o': ['../src/baz.c', 'config.h'],
+            'quux.o': ['../src/quux.c'],
+        }
+        self.timings = {'foo.o': (0, 2000), 'bar.o': (0, 1000),
+                        'baz.o': (0, 500)}
+
+    def report(self, **kwargs):
+        return DepsReport(self.deps, self.timings, self.builddir,
+                          self.srcdir, **kwargs)
+
+    def test_headers(self):
+        report = self.report()
+        self.assertEqual(report.objects, 4)
+        self.assertEqual(report.headers, [
+            {'header': 'common.h', 'objects': 2, 'percent': 50.0,
+             'cost': 3.0, 'flagged': True},
+            {'header': 'foo.h', 'objects': 1, 'percent': 25.0,
+             'cost': 2.0, 'flagged': False},
+            {'header': 'config.h', 'objects': 1, 'percent': 25.0,
+             'cost': 0.5, 'flagged': False},
+        ])
+        self.assertEqual([i['header'] for i in report.flagged], ['common.h'])
+
+    def test_threshold(self):
+        report = self.report(threshold=20)
+        self.assertEqual([i['header'] for i in report.flagged],
+                         ['common.h', 'foo.h', 'config.h'])
+
+    def test_system(self):
+        report = self.report(system=True)
+        self.assertEqual([i['header'] for i in report.headers],
+                         ['common.h', '/usr/include/stdio.h', 'foo.h',
+                          'config.h'])
+
+    def test_to_json(self):
+        result = self.report().to_json()
+        self.assertEqual(result['objects'], 4)
+        self.assertEqual(result['threshold'], 25)
+        self.assertEqual(len(result['headers']), 3)
+
+    def test_format(self):
+        self.assertEqual(self.report().format(), '\n'.join([
+            '4 object(s), 3 header(s)',
+            'OBJECTS  PERCENT   COST    HEADER',
+            '      2    50.0%  3.00s  * common.h',
+            '      1    25.0%  2.00s    foo.h',
+            '      1    25.0%  0.50s    config.h',
+            '',
+            '* 1 header(s) rebuild more than 25% of the objects when changed',
+        ]))
+
+    def test_format_empty(self):
+        self.assertEqual(DepsReport({}, {}, self.builddir, self.srcdir)
+                         .format(), '0 object(s), 0 header(s)')
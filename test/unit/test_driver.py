@@ -1,6 +1,7 @@
 import argparse
 import logging
 import mock
+import os
 import re
 import unittest
 from six import assertRegex
@@ -8,6 +9,7 @@ from six.moves import cStringIO as StringIO
 
 from bfg9000 import driver, log, path
 from bfg9000.build import Toolchain
+from bfg9000.configurations import ConfigurationSet
 from bfg9000.environment import EnvVersionError
 
 
@@ -120,3 +122,40 @@ class TestReloadException(unittest.TestCase):
                     'Unable to reload environment\n' +
                     '  Please re-run bfg9000 manually\n'
         )
+
+
+class TestRegenerate(unittest.TestCase):
+    def setUp(self):
+        self.env = mock.Mock()
+        self.env.builddir.string.return_value = 'builddir'
+        self.backend = mock.Mock()
+
+    def load_configurations(self, configurations):
+        return mock.patch('bfg9000.configurations.ConfigurationSet.load',
+                          return_value=configurations)
+
+    def test_single(self):
+        with self.load_configurations(None), \
+             mock.patch.object(driver, 'generate') as generate, \
+             mock.patch.object(driver, 'update_parent_configuration') as u:
+            driver.regenerate(self.env, self.backend)
+        generate.assert_called_once_with(self.env, self.backend)
+        u.assert_called_once_with(self.env, self.backend,
+                                  generate.return_value)
+
+    def test_configurations(self):
+        configurations = ConfigurationSet([('debug', []), ('release', [])])
+        with self.load_configurations(configurations), \
+             mock.patch('bfg9000.environment.Environment.load',
+                        side_effect=lambda path: path), \
+             mock.patch.object(driver, 'generate') as generate, \
+             mock.patch.object(driver, 'generate_configurations') as gen:
+            driver.regenerate(self.env, self.backend)
+            args, kwargs = gen.call_args
+            self.assertEqual(args[:2], (self.env, self.backend))
+            self.assertEqual(list(args[2]), [
+                ('debug', os.path.join('builddir', 'debug')),
+                ('release', os.path.join('builddir', 'release')),
+            ])
+            self.assertEqual(kwargs, {'force': False})
+        generate.assert_not_called()
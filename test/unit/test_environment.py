@@ -1,9 +1,15 @@
+import mock
 import os
+import shutil
+import tempfile
 import unittest
 import sys
 from six import iteritems
 
-from bfg9000.environment import Environment, LibraryMode
+from .. import make_env
+
+from bfg9000 import shell
+from bfg9000.environment import Environment, LibraryMode, PgoSettings
 from bfg9000.path import Path, Root, InstallRoot
 from bfg9000.platforms import platform_name
 
@@ -37,6 +43,7 @@ class TestEnvironment(unittest.TestCase):
         })
 
         self.assertEqual(env.library_mode, LibraryMode(True, False))
+        self.assertEqual(env.pgo, None)
         self.assertEqual(env.extra_args, [])
 
         variables = {u'HOME': u'/home/user'}
@@ -46,3 +53,98 @@ class TestEnvironment(unittest.TestCase):
 
         self.assertEqual(env.host_platform.name, 'linux')
         self.assertEqual(env.target_platform.name, 'linux')
+
+    def test_save_load_pgo(self):
+        env = make_env()
+        env.backend_version = None
+        env.pgo = PgoSettings('use', Path('/root/profile', Root.absolute),
+                              ['./prog'])
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            env.save(tmpdir)
+            loaded = Environment.load(tmpdir)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(loaded.pgo, env.pgo)
+
+
+class TestProbes(unittest.TestCase):
+    def test_add_probe(self):
+        env = make_env()
+        env.add_probe('/usr/lib')
+        env.add_probe('/usr/lib')
+        self.assertEqual(env.probes, ['/usr/lib'])
+
+    def test_execute(self):
+        env = make_env()
+        with mock.patch('bfg9000.shell.execute') as m:
+            env.execute(['cc', '--version'])
+            env.execute([Path('tool', Root.builddir)])
+            env.execute('echo hi', shell=True)
+        self.assertEqual(m.call_count, 3)
+        self.assertEqual(env.probes, [
+            'cc', Path('tool', Root.builddir).string(env.base_dirs)
+        ])
+
+
+class TestProbeCache(unittest.TestCase):
+    def setUp(self):
+        self.env = make_env()
+        self.env.variables = {'PATH': '/usr/bin', 'CFLAGS': '-O2'}
+
+    def execute(self, env, *args, **kwargs):
+        kwargs.setdefault('stdout', shell.Mode.pipe)
+        return env.execute(['cc', '--version'], *args, **kwargs)
+
+    def test_no_cache(self):
+        with mock.patch('bfg9000.shell.execute', return_value='out') as m:
+            self.assertEqual(self.execute(self.env), 'out')
+            self.assertEqual(self.execute(self.env), 'out')
+        self.assertEqual(self.env.probe_cache, None)
+        self.assertEqual(m.call_count, 2)
+
+    def test_shared(self):
+        other = make_env()
+        other.variables = {'PATH': '/usr/bin', 'CFLAGS': '-g'}
+        other.share_probes(self.env)
+        self.assertIs(other.probe_cache, self.env.probe_cache)
+
+        with mock.patch('bfg9000.shell.execute', return_value='out') as m:
+            self.assertEqual(self.execute(self.env), 'out')
+            self.assertEqual(self.execute(other), 'out')
+        self.assertEqual(m.call_count, 1)
+        self.assertEqual(other.probes, ['cc'])
+
+    def test_different_args(self):
+        self.env.share_probes(self.env)
+        with mock.patch('bfg9000.shell.execute', return_value='out') as m:
+            self.execute(self.env)
+            self.env.execute(['cc', '-v'], stdout=shell.Mode.pipe)
+            self.execute(self.env, stderr=shell.Mode.pipe)
+        self.assertEqual(m.call_count, 3)
+
+    def test_different_env(self):
+        other = make_env()
+        other.variables = {'PATH': '/opt/bin', 'CFLAGS': '-O2'}
+        other.share_probes(self.env)
+
+        with mock.patch('bfg9000.shell.execute', return_value='out') as m:
+            self.execute(self.env)
+            self.execute(other)
+        self.assertEqual(m.call_count, 2)
+
+    def test_not_piped(self):
+        self.env.share_probes(self.env)
+        with mock.patch('bfg9000.shell.execute') as m:
+            self.execute(self.env, stdout=shell.Mode.normal)
+            self.execute(self.env, stdout=shell.Mode.normal)
+        self.assertEqual(m.call_count, 2)
+
+    def test_error(self):
+        self.env.share_probes(self.env)
+        with mock.patch('bfg9000.shell.execute',
+                        side_effect=OSError('not found')) as m:
+            self.assertRaises(OSError, self.execute, self.env)
+            self.assertRaises(OSError, self.execute, self.env)
+        self.assertEqual(m.call_count, 1)
@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+from six.moves import cStringIO as StringIO
+
+from bfg9000.fortscan import *
+
+
+class TestScan(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(scan(StringIO('')), Scan())
+
+    def test_module(self):
+        self.assertEqual(scan(StringIO(
+            'module Foo\n'
+            '  use bar\n'
+            '  use, intrinsic :: iso_c_binding\n'
+            '  use, non_intrinsic :: baz, only: x\n'
+            '  use :: quux\n'
+            'contains\n'
+            '  module procedure impl\n'
+            'end module Foo\n'
+        )), Scan(['foo'], ['bar', 'baz', 'quux']))
+
+    def test_program(self):
+        self.assertEqual(scan(StringIO(
+            'program main\n'
+            '  use foo\n'
+            '  use foo\n'
+            '  ! use commented\n'
+            '  useful = 1\n'
+            'end program main\n'
+        )), Scan([], ['foo']))
+
+    def test_fixed_form(self):
+        self.assertEqual(scan(StringIO(
+            'c     use commented\n'
+            '      program main\n'
+            '      use foo\n'
+            '      end\n'
+        )), Scan([], ['foo']))
+
+    def test_own_module(self):
+        self.assertEqual(scan(StringIO(
+            'module foo\n'
+            'end module foo\n'
+            'program main\n'
+            '  use foo\n'
+            'end program main\n'
+        )), Scan(['foo'], []))
+
+    def test_submodule(self):
+        self.assertEqual(scan(StringIO('submodule (foo) bar\n')),
+                         Scan(['foo@bar'], ['foo']))
+        self.assertEqual(scan(StringIO('submodule (foo:bar) baz\n')),
+                         Scan(['foo@baz'], ['foo', 'foo@bar']))
+
+    def test_include(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(tmpdir, 'uses.inc'), 'w') as f:
+                f.write('use bar\n')
+            with open(os.path.join(tmpdir, 'foo.f90'), 'w') as f:
+                f.write("module foo\n  include 'uses.inc'\nend module foo\n")
+            self.assertEqual(scan_file(os.path.join(tmpdir, 'foo.f90')),
+                             Scan(['foo'], ['bar']))
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestModuleFile(unittest.TestCase):
+    def test_module(self):
+        self.assertEqual(module_file('foo'), 'foo.mod')
+        self.assertEqual(module_file('foo', 'mods'),
+                         os.path.join('mods', 'foo.mod'))
+
+    def test_submodule(self):
+        self.assertEqual(module_file('foo@bar'), 'foo@bar.smod')
+
+
+class TestResolve(unittest.TestCase):
+    def setUp(self):
+        self.scans = OrderedDict([
+            ('main.o', Scan([], ['foo', 'iso_c_binding'])),
+            ('foo.o', Scan(['foo'], ['bar'])),
+            ('bar.o', Scan(['bar'], [])),
+        ])
+
+    def test_resolve(self):
+        self.assertEqual(resolve(self.scans), OrderedDict([
+            ('main.o', ([], [('foo', 'foo.o')])),
+            ('foo.o', (['foo'], [('bar', 'bar.o')])),
+            ('bar.o', (['bar'], [])),
+        ]))
+
+    def test_duplicate(self):
+        self.scans['bar2.o'] = Scan(['bar'], [])
+        self.assertEqual(resolve(self.scans)['bar2.o'], ([], []))
+
+    def test_emit_ninja(self):
+        out = StringIO()
+        emit_ninja(out, resolve(self.scans))
+        self.assertEqual(out.getvalue(),
+                         'ninja_dyndep_version = 1\n'
+                         'build main.o: dyndep | foo.mod\n'
+                         'build foo.o | foo.mod: dyndep | bar.mod\n'
+                         'build bar.o | bar.mod: dyndep\n')
+
+    def test_emit_ninja_escaped(self):
+        out = StringIO()
+        emit_ninja(out, OrderedDict([('dir name/foo.o', (['foo'], []))]),
+                   'mod:dir')
+        self.assertEqual(out.getvalue(),
+                         'ninja_dyndep_version = 1\n'
+                         'build dir$ name/foo.o | ' +
+                         os.path.join('mod$:dir', 'foo.mod') + ': dyndep\n')
+
+    def test_emit_make(self):
+        out = StringIO()
+        emit_make(out, resolve(self.scans))
+        self.assertEqual(out.getvalue(),
+                         'main.o: foo.o\n'
+                         'foo.o: bar.o\n')
+
+    def test_emit_make_escaped(self):
+        out = StringIO()
+        emit_make(out, OrderedDict([
+            ('dir name/main.o', ([], [('foo', '$foo.o')]))
+        ]))
+        self.assertEqual(out.getvalue(), 'dir\\ name/main.o: $$foo.o\n')
+
+
+class TestWriteIfChanged(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'deps')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_write(self):
+        self.assertTrue(write_if_changed(self.filename, 'data'))
+        with open(self.filename) as f:
+            self.assertEqual(f.read(), 'data')
+
+    def test_unchanged(self):
+        write_if_changed(self.filename, 'data')
+        os.utime(self.filename, (0, 0))
+        self.assertFalse(write_if_changed(self.filename, 'data'))
+        self.assertEqual(os.stat(self.filename).st_mtime, 0)
+
+    def test_touch(self):
+        write_if_changed(self.filename, 'data')
+        os.utime(self.filename, (0, 0))
+        self.assertFalse(write_if_changed(self.filename, 'data', touch=True))
+        self.assertNotEqual(os.stat(self.filename).st_mtime, 0)
@@ -0,0 +1,173 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from bfg9000.install import *
+
+copy_cmd = [sys.executable, '-c', (
+    'import shutil, sys, os\n' +
+    'for i in sys.argv[1:-1]:\n' +
+    '    shutil.copyfile(i, os.path.join(sys.argv[-1], ' +
+    'os.path.basename(i)))\n'
+)]
+
+
+class TestUpToDate(unittest.TestCase):
+    def setUp(self):
+        self.olddir = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.olddir)
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, path, data, mtime=None):
+        with open(path, 'w') as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_missing(self):
+        self._write('src', 'foo')
+        self.assertFalse(up_to_date('src', 'dst'))
+        self.assertFalse(up_to_date('nonexist', 'src'))
+
+    def test_different_size(self):
+        self._write('src', 'foo', 1000)
+        self._write('dst', 'foobar', 1000)
+        self.assertFalse(up_to_date('src', 'dst'))
+
+    def test_same_mtime(self):
+        self._write('src', 'foo', 1000)
+        self._write('dst', 'foo', 1000)
+        self.assertTrue(up_to_date('src', 'dst'))
+
+    def test_same_contents(self):
+        self._write('src', 'foo', 1000)
+        self._write('dst', 'foo', 2000)
+        self.assertTrue(up_to_date('src', 'dst'))
+        self.assertEqual(os.stat('dst').st_mtime, 1000)
+
+    def test_different_contents(self):
+        self._write('src', 'foo', 1000)
+        self._write('dst', 'bar', 2000)
+        self.assertFalse(up_to_date('src', 'dst'))
+
+    @unittest.skipIf(not hasattr(os, 'symlink'), 'symlinks not supported')
+    def test_symlink(self):
+        self._write('target', 'foo')
+        os.symlink('target', 'src')
+        os.symlink('target', 'dst')
+        self.assertTrue(up_to_date('src', 'dst'))
+
+        os.remove('dst')
+        self._write('dst', 'foo')
+        self.assertFalse(up_to_date('src', 'dst'))
+
+
+class TestInstall(unittest.TestCase):
+    def setUp(self):
+        self.olddir = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+        os.mkdir('dest')
+        for i in ('foo', 'bar'):
+            with open(i, 'w') as f:
+                f.write(i)
+
+    def tearDown(self):
+        os.chdir(self.olddir)
+        shutil.rmtree(self.tmpdir)
+
+    def test_install(self):
+        self.assertEqual(install(copy_cmd, ['foo', 'bar'], 'dest'), 0)
+        self.assertEqual(sorted(os.listdir('dest')), ['bar', 'foo'])
+        self.assertEqual(os.stat('dest/foo').st_mtime,
+                         os.stat('foo').st_mtime)
+
+    def test_skip_unchanged(self):
+        install(copy_cmd, ['foo', 'bar'], 'dest')
+        # If we tried to install anything, the command would fail.
+        self.assertEqual(install(copy_cmd, ['foo'], 'dest'), 0)
+        self.assertEqual(install(['false'], ['foo'], 'dest'), 0)
+
+    def test_force(self):
+        install(copy_cmd, ['foo'], 'dest')
+        self.assertNotEqual(install(['false'], ['foo'], 'dest', force=True),
+                            0)
+
+    def test_skip_stamped(self):
+        install(copy_cmd, ['foo'], 'dest', state_dir='state')
+        # Simulate a post-install step modifying the installed file.
+        with open('dest/foo', 'w') as f:
+            f.write('patched foo')
+        self.assertNotEqual(install(['false'], ['foo'], 'dest',
+                                    state_dir='state'), 0)
+
+        stamp('foo', 'dest/foo', 'state')
+        self.assertEqual(install(['false'], ['foo'], 'dest',
+                                 state_dir='state'), 0)
+        self.assertNotEqual(install(['false'], ['foo'], 'dest', force=True,
+                                    state_dir='state'), 0)
+
+
+class TestStamp(unittest.TestCase):
+    def setUp(self):
+        self.olddir = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.olddir)
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, path, data, mtime=None):
+        with open(path, 'w') as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_unstamped(self):
+        self._write('src', 'foo')
+        self._write('dst', 'foo')
+        self.assertFalse(stamped('src', 'dst', 'state'))
+
+    def test_stamped(self):
+        self._write('src', 'foo', 1000)
+        self._write('dst', 'patched', 2000)
+        stamp('src', 'dst', 'state')
+        self.assertTrue(stamped('src', 'dst', 'state'))
+        self.assertFalse(stamped('src', 'other', 'state'))
+
+    def test_source_touched(self):
+        self._write('src', 'foo', 1000)
+        self._write('dst', 'patched', 2000)
+        stamp('src', 'dst', 'state')
+        os.utime('src', (3000, 3000))
+        self.assertTrue(stamped('src', 'dst', 'state'))
+
+    def test_source_changed(self):
+        self._write('src', 'foo', 1000)
+        self._write('dst', 'patched', 2000)
+        stamp('src', 'dst', 'state')
+        self._write('src', 'bar', 3000)
+        self.assertFalse(stamped('src', 'dst', 'state'))
+
+        self._write('src', 'foobar', 1000)
+        self.assertFalse(stamped('src', 'dst', 'state'))
+
+    def test_installed_changed(self):
+        self._write('src', 'foo', 1000)
+        self._write('dst', 'patched', 2000)
+        stamp('src', 'dst', 'state')
+        self._write('dst', 'modified', 2000)
+        self.assertFalse(stamped('src', 'dst', 'state'))
+
+        self._write('dst', 'patched', 3000)
+        self.assertFalse(stamped('src', 'dst', 'state'))
+
+        os.remove('dst')
+        self.assertFalse(stamped('src', 'dst', 'state'))
@@ -0,0 +1,81 @@
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+from argparse import Namespace
+
+from bfg9000 import jvmd
+
+
+class TestCompilerId(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.javac = os.path.join(self.tmpdir, 'javac')
+        with open(self.javac, 'w') as f:
+            f.write('javac')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_same(self):
+        self.assertEqual(jvmd._compiler_id(self.javac),
+                         jvmd._compiler_id(self.javac))
+
+    def test_different_path(self):
+        other = os.path.join(self.tmpdir, 'other-javac')
+        shutil.copy2(self.javac, other)
+        self.assertNotEqual(jvmd._compiler_id(self.javac),
+                            jvmd._compiler_id(other))
+
+    def test_changed(self):
+        old = jvmd._compiler_id(self.javac)
+        with open(self.javac, 'w') as f:
+            f.write('new javac')
+        self.assertNotEqual(jvmd._compiler_id(self.javac), old)
+
+    def test_nonexistent(self):
+        self.assertEqual(jvmd._compiler_id('nonexist'),
+                         jvmd._compiler_id('nonexist'))
+
+
+class TestDaemonCompile(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.args = Namespace(state_dir=self.tmpdir, idle_timeout=600,
+                              command=['javac', 'foo.java'])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_state(self, compiler):
+        with open(os.path.join(self.tmpdir, 'port'), 'w') as f:
+            f.write('1234\ntoken\n{}\n'.format(compiler))
+
+    def compile(self, compiler):
+        new_state = jvmd._State(5678, 'token2', compiler)
+        with mock.patch('bfg9000.jvmd._compiler_id',
+                        return_value=compiler), \
+             mock.patch('bfg9000.jvmd._request',
+                        return_value=('0', '')) as request, \
+             mock.patch('bfg9000.jvmd._start_daemon',
+                        return_value=new_state) as start:  # noqa
+            self.assertEqual(jvmd._daemon_compile(self.args), ('0', ''))
+        return request, start
+
+    def test_reuse(self):
+        self.write_state('abc')
+        request, start = self.compile('abc')
+        start.assert_not_called()
+        self.assertEqual(request.call_args[0][0],
+                         jvmd._State(1234, 'token', 'abc'))
+
+    def test_compiler_changed(self):
+        self.write_state('abc')
+        request, start = self.compile('def')
+        start.assert_called_once_with(self.tmpdir, 'javac', 'def', 600)
+        self.assertEqual([i[0][:2] for i in request.call_args_list], [
+            (jvmd._State(1234, 'token', 'abc'), ['stop']),
+            (jvmd._State(5678, 'token2', 'def'),
+             ['compile', os.getcwd(), '1', 'foo.java']),
+        ])
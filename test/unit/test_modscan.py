@@ -0,0 +1,231 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+from six.moves import cStringIO as StringIO
+
+from bfg9000.modscan import *
+
+
+class TestParsePreprocessed(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(parse_preprocessed('', 'foo.o'), Unit('foo.o'))
+
+    def test_interface(self):
+        self.assertEqual(parse_preprocessed(
+            '# 1 "foo.cppm"\n'
+            'module;\n'
+            'int x;\n'
+            'export module foo;\n'
+            'import bar;\n'
+            'export import :part;\n'
+            'import <header>;\n'
+            'export int f();\n',
+            'foo.o'
+        ), Unit('foo.o', [('foo', True)], ['bar', 'foo:part']))
+
+    def test_partition(self):
+        self.assertEqual(
+            parse_preprocessed('export module foo:part;\n', 'part.o'),
+            Unit('part.o', [('foo:part', True)])
+        )
+        self.assertEqual(
+            parse_preprocessed('module foo:impl;\n', 'impl.o'),
+            Unit('impl.o', [('foo:impl', False)])
+        )
+
+    def test_implementation(self):
+        self.assertEqual(
+            parse_preprocessed('module foo;\nimport bar;\n', 'foo_impl.o'),
+            Unit('foo_impl.o', [], ['foo', 'bar'])
+        )
+
+    def test_importer(self):
+        self.assertEqual(parse_preprocessed(
+            'import foo;\n'
+            'import foo;\n'
+            'import :part;\n'
+            'int main() {}\n',
+            'main.o'
+        ), Unit('main.o', [], ['foo']))
+
+
+class TestP1689(unittest.TestCase):
+    def test_round_trip(self):
+        unit = Unit('foo.o', [('foo', True)], ['bar'])
+        self.assertEqual(from_p1689(to_p1689(unit)), [unit])
+
+    def test_to_p1689(self):
+        self.assertEqual(to_p1689(Unit('main.o', [], ['foo'])), {
+            'version': 1,
+            'revision': 0,
+            'rules': [{
+                'primary-output': 'main.o',
+                'requires': [{'logical-name': 'foo'}],
+            }],
+        })
+
+    def test_from_p1689(self):
+        self.assertEqual(from_p1689({
+            'version': 1,
+            'revision': 0,
+            'rules': [{
+                'primary-output': 'foo.o',
+                'provides': [{'logical-name': 'foo',
+                              'is-interface': True}],
+                'requires': [{'logical-name': 'bar',
+                              'lookup-method': 'by-name'}],
+            }],
+        }), [Unit('foo.o', [('foo', True)], ['bar'])])
+
+
+class TestResolve(unittest.TestCase):
+    def setUp(self):
+        self.units = [
+            Unit('main.o', [], ['foo', 'std']),
+            Unit('foo.o', [('foo', True)], ['foo:part']),
+            Unit('part.o', [('foo:part', True)], []),
+        ]
+
+    def bmi(self, name):
+        return os.path.join('bmi', name)
+
+    def test_resolve(self):
+        resolved = resolve(self.units, 'bmi', 'gcc')
+        self.assertEqual(list(resolved.keys()), ['main.o', 'foo.o', 'part.o'])
+
+        main = resolved['main.o']
+        self.assertEqual(main.provides, [])
+        self.assertEqual(main.requires,
+                         [Module('foo', self.bmi('foo.gcm'))])
+        self.assertEqual(main.all_requires,
+                         [Module('foo', self.bmi('foo.gcm')),
+                          Module('foo:part', self.bmi('foo-part.gcm'))])
+        self.assertEqual(main.providers, ['foo.o'])
+
+        foo = resolved['foo.o']
+        self.assertEqual(foo.provides,
+                         [Module('foo', self.bmi('foo.gcm'))])
+        self.assertEqual(foo.requires,
+                         [Module('foo:part', self.bmi('foo-part.gcm'))])
+        self.assertEqual(foo.providers, ['part.o'])
+
+    def test_clang(self):
+        resolved = resolve(self.units, 'bmi', 'clang')
+        self.assertEqual(resolved['foo.o'].provides,
+                         [Module('foo', self.bmi('foo.pcm'))])
+
+    def test_duplicate(self):
+        self.units.append(Unit('foo2.o', [('foo', True)], []))
+        resolved = resolve(self.units, 'bmi', 'gcc')
+        self.assertEqual(resolved['foo2.o'].provides,
+                         [Module('foo', 'foo2.o.foo.gcm')])
+        self.assertEqual(resolved['main.o'].requires,
+                         [Module('foo', self.bmi('foo.gcm'))])
+
+    def test_emit_ninja(self):
+        out = StringIO()
+        emit_ninja(out, resolve(self.units, 'bmi', 'gcc'))
+        self.assertEqual(out.getvalue(), (
+            'ninja_dyndep_version = 1\n'
+            'build main.o: dyndep | {foo}\n'
+            'build foo.o | {foo}: dyndep | {part}\n'
+            'build part.o | {part}: dyndep\n'
+        ).format(foo=self.bmi('foo.gcm'), part=self.bmi('foo-part.gcm')))
+
+    def test_emit_make(self):
+        out = StringIO()
+        emit_make(out, resolve(self.units, 'bmi', 'gcc'))
+        self.assertEqual(out.getvalue(),
+                         'main.o: foo.o\n'
+                         'foo.o: part.o\n')
+
+    def test_modmap_gcc(self):
+        resolved = resolve(self.units, 'bmi', 'gcc')
+        self.assertEqual(modmap(resolved['main.o'], 'gcc'), (
+            'foo {}\n'
+            'foo:part {}\n'
+        ).format(self.bmi('foo.gcm'), self.bmi('foo-part.gcm')))
+        self.assertEqual(modmap(resolved['part.o'], 'gcc'),
+                         'foo:part {}\n'.format(self.bmi('foo-part.gcm')))
+
+    def test_modmap_clang(self):
+        resolved = resolve(self.units, 'bmi', 'clang')
+        self.assertEqual(modmap(resolved['main.o'], 'clang'), (
+            '-fmodule-file=foo={}\n'
+            '-fmodule-file=foo:part={}\n'
+        ).format(self.bmi('foo.pcm'), self.bmi('foo-part.pcm')))
+        self.assertEqual(modmap(resolved['foo.o'], 'clang'), (
+            '-x\n'
+            'c++-module\n'
+            '-fmodule-output={}\n'
+            '-fmodule-file=foo:part={}\n'
+        ).format(self.bmi('foo.pcm'), self.bmi('foo-part.pcm')))
+
+    def test_modmap_clang_quoted(self):
+        resolved = resolve([Unit('foo.o', [('foo', False)])], 'my bmi',
+                           'clang')
+        bmi = os.path.join('my bmi', 'foo.pcm')
+        self.assertEqual(modmap(resolved['foo.o'], 'clang'),
+                         '"-fmodule-output={}"\n'.format(bmi))
+
+
+class TestFixDeps(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.depfile = os.path.join(self.tmpdir, 'foo.o.d')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_fix_deps(self):
+        with open(self.depfile, 'w') as f:
+            f.write('foo.o bmi/foo.gcm: src/foo.cppm \\\n'
+                    ' src/foo.hpp\n'
+                    'foo.o bmi/foo.gcm: foo:part.c++m bar.c++m\n'
+                    'foo.c++m: bmi/foo.gcm\n'
+                    '.PHONY: foo.c++m\n'
+                    'bmi/foo.gcm:| foo.o\n'
+                    'CXX_IMPORTS += foo:part.c++m bar.c++m\n')
+        fix_deps(self.depfile, 'foo.o')
+        with open(self.depfile) as f:
+            self.assertEqual(f.read(), 'foo.o: src/foo.cppm src/foo.hpp\n')
+
+    def test_plain(self):
+        with open(self.depfile, 'w') as f:
+            f.write('foo.o: src/foo.cpp src/foo.hpp\n')
+        fix_deps(self.depfile, 'foo.o')
+        with open(self.depfile) as f:
+            self.assertEqual(f.read(), 'foo.o: src/foo.cpp src/foo.hpp\n')
+
+
+class TestCollate(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def test_collate(self):
+        with open('main.o.ddi', 'w') as f:
+            json.dump(to_p1689(Unit('main.o', [], ['foo'])), f)
+        with open('foo.o.ddi', 'w') as f:
+            json.dump(to_p1689(Unit('foo.o', [('foo', True)])), f)
+
+        collate('out.dd', 'ninja', 'gcc', 'bmi', ['main.o.ddi', 'foo.o.ddi'])
+        self.assertTrue(os.path.isdir('bmi'))
+        with open('out.dd') as f:
+            self.assertEqual(f.read(), (
+                'ninja_dyndep_version = 1\n'
+                'build main.o: dyndep | {bmi}\n'
+                'build foo.o | {bmi}: dyndep\n'
+            ).format(bmi=os.path.join('bmi', 'foo.gcm')))
+        with open('main.o.modmap') as f:
+            self.assertEqual(f.read(), 'foo {}\n'.format(
+                os.path.join('bmi', 'foo.gcm')
+            ))
@@ -172,3 +172,20 @@ class TestDefine(unittest.TestCase):
     def test_invalid_type(self):
         self.assertRaises(TypeError, define, 1)
         self.assertRaises(TypeError, define, 'NAME', 1)
+
+
+class TestLto(unittest.TestCase):
+    def test_default(self):
+        opt = lto()
+        self.assertEqual(type(opt), lto)
+        self.assertEqual(opt.mode, 'full')
+        self.assertEqual(opt.jobs, None)
+
+    def test_mode_and_jobs(self):
+        opt = lto('thin', 4)
+        self.assertEqual(opt.mode, 'thin')
+        self.assertEqual(opt.jobs, 4)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, lto, 'fat')
+        self.assertRaises(TypeError, lto, 'full', '4')
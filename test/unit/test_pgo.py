@@ -0,0 +1,76 @@
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from bfg9000.pgo import train
+
+
+class TestTrain(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.profile = os.path.join(self.tmpdir, 'profile')
+        self.stamp = os.path.join(self.tmpdir, 'profile.stamp')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_profile(self, name, data):
+        def call(args, cwd=None):
+            with open(os.path.join(self.profile, name), 'w') as f:
+                f.write(data)
+            return 0
+        return call
+
+    def read_stamp(self):
+        with open(self.stamp) as f:
+            return f.read()
+
+    def test_train(self):
+        with mock.patch('subprocess.call',
+                        side_effect=self.write_profile('a.gcda', 'a')) as m:
+            self.assertEqual(train(self.profile, ['make', 'test'],
+                                   stamp=self.stamp), 0)
+        m.assert_called_once_with(['make', 'test'], cwd=None)
+        self.assertEqual(os.listdir(self.profile), ['a.gcda'])
+        stamp = self.read_stamp()
+
+        # Old profiles are removed before training again.
+        with mock.patch('subprocess.call',
+                        side_effect=self.write_profile('b.gcda', 'b')):
+            self.assertEqual(train(self.profile, ['./prog'], 'dir',
+                                   stamp=self.stamp), 0)
+        self.assertEqual(os.listdir(self.profile), ['b.gcda'])
+        self.assertNotEqual(self.read_stamp(), stamp)
+
+    def test_unchanged(self):
+        with mock.patch('subprocess.call',
+                        side_effect=self.write_profile('a.gcda', 'a')):
+            train(self.profile, ['make', 'test'], stamp=self.stamp)
+        mtime = os.path.getmtime(self.stamp)
+        os.utime(self.stamp, (mtime - 10, mtime - 10))
+
+        with mock.patch('subprocess.call',
+                        side_effect=self.write_profile('a.gcda', 'a')):
+            train(self.profile, ['make', 'test'], stamp=self.stamp)
+        self.assertEqual(os.path.getmtime(self.stamp), mtime - 10)
+
+    def test_merge(self):
+        with mock.patch('subprocess.call', return_value=0) as m:
+            self.assertEqual(train(self.profile, ['./prog'], 'dir',
+                                   merge=['llvm-profdata']), 0)
+        self.assertEqual(m.mock_calls, [
+            mock.call(['./prog'], cwd='dir'),
+            mock.call(['llvm-profdata', 'merge', '-output=' +
+                       os.path.join(self.profile, 'default.profdata'),
+                       os.path.join(self.profile, 'raw')]),
+        ])
+
+    def test_failure(self):
+        with mock.patch('subprocess.call', return_value=1) as m:
+            self.assertEqual(train(self.profile, ['./prog'],
+                                   merge=['llvm-profdata'],
+                                   stamp=self.stamp), 1)
+        m.assert_called_once_with(['./prog'], cwd=None)
+        self.assertFalse(os.path.exists(self.stamp))
@@ -0,0 +1,185 @@
+import mock
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from six.moves import cStringIO as StringIO
+
+from bfg9000.app_version import version
+from bfg9000.client import request
+from bfg9000.environment import Environment
+from bfg9000.path import abspath, Path, Root
+from bfg9000.server import *
+from bfg9000.snapshot import Snapshot
+
+
+class TestRequestStream(unittest.TestCase):
+    def test_write(self):
+        out = StringIO()
+        stream = RequestStream(out)
+        stream.write('foo')
+        stream.flush()
+        self.assertEqual(out.getvalue(), 'foo')
+
+        other = StringIO()
+        stream.target = other
+        stream.write('bar')
+        self.assertEqual(out.getvalue(), 'foo')
+        self.assertEqual(other.getvalue(), 'bar')
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.srcdir = os.path.join(self.tmpdir, 'src')
+        self.builddir = os.path.join(self.tmpdir, 'build')
+        os.mkdir(self.srcdir)
+        os.mkdir(self.builddir)
+
+        self.env = Environment(
+            Path('bfgdir', Root.srcdir), 'make', None, abspath(self.srcdir),
+            abspath(self.builddir), {}, (False, False), None
+        )
+        self.env.save(self.builddir)
+
+        self.backend = mock.Mock()
+        self.regenerate = mock.Mock()
+        self.stream = RequestStream()
+        self.server = Server(self.regenerate, self.stream)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def refresh(self, *args, **kwargs):
+        with mock.patch('bfg9000.server.list_backends',
+                        return_value={'make': self.backend}):
+            return self.server.refresh(self.builddir, *args, **kwargs)
+
+    def snapshot(self, current, changes=set()):
+        snapshot = Snapshot('make', [], [])
+        snapshot.current = mock.Mock(return_value=current)
+        snapshot.changes = mock.Mock(return_value=changes)
+        snapshot.touch = mock.Mock()
+        return mock.patch('bfg9000.snapshot.Snapshot.load',
+                          return_value=snapshot)
+
+    def test_refresh_current(self):
+        with self.snapshot(True) as load:
+            self.assertEqual(self.refresh(), 0)
+        load.return_value.touch.assert_called_once_with()
+        self.regenerate.assert_not_called()
+
+    def test_refresh_force(self):
+        with self.snapshot(True) as load:
+            self.assertEqual(self.refresh(force=True), 0)
+        load.return_value.touch.assert_not_called()
+        self.regenerate.assert_called_once()
+
+    def test_refresh_stale(self):
+        with self.snapshot(False):
+            self.assertEqual(self.refresh(), 0)
+        env, backend = self.regenerate.call_args[0]
+        self.assertEqual(env.builddir, self.env.builddir)
+        self.assertIs(backend, self.backend)
+
+    def test_reuse_env(self):
+        with self.snapshot(False):
+            self.refresh()
+            self.refresh()
+        first, second = (i[0][0] for i in self.regenerate.call_args_list)
+        self.assertIs(first, second)
+
+    def test_env_changed(self):
+        with self.snapshot(False):
+            self.refresh()
+            self.env.variables = {'CC': 'cc'}
+            self.env.save(self.builddir)
+            self.refresh()
+        first, second = (i[0][0] for i in self.regenerate.call_args_list)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.variables, {'CC': 'cc'})
+
+    def test_tools_changed(self):
+        with self.snapshot(False):
+            self.refresh()
+        with self.snapshot(False, {'which'}):
+            self.refresh()
+        first, second = (i[0][0] for i in self.regenerate.call_args_list)
+        self.assertIsNot(first, second)
+
+    def test_no_snapshot(self):
+        with mock.patch('bfg9000.snapshot.Snapshot.load', return_value=None):
+            self.refresh()
+            self.refresh()
+        first, second = (i[0][0] for i in self.regenerate.call_args_list)
+        self.assertIsNot(first, second)
+
+    def test_refresh_error(self):
+        self.regenerate.side_effect = [ValueError('bad'), None]
+        with self.snapshot(False), \
+             mock.patch('bfg9000.server.logger') as logger:  # noqa
+            self.assertEqual(self.refresh(), 1)
+            logger.exception.assert_called_once()
+            self.assertEqual(self.refresh(), 0)
+        first, second = (i[0][0] for i in self.regenerate.call_args_list)
+        self.assertIsNot(first, second)
+
+    def test_handle(self):
+        def regenerate(env, backend):
+            print('stdout')
+            self.stream.write('log\n')
+
+        self.regenerate.side_effect = regenerate
+        with self.snapshot(False), \
+             mock.patch('bfg9000.server.list_backends',
+                        return_value={'make': self.backend}):  # noqa
+            self.assertEqual(self.server.handle({
+                'version': version, 'command': 'refresh',
+                'builddir': self.builddir
+            }), {'returncode': 0, 'output': 'stdout\nlog\n'})
+        self.assertIs(self.stream.target, sys.stderr)
+
+    def test_handle_refused(self):
+        self.assertEqual(self.server.handle({
+            'version': '0.0', 'command': 'refresh', 'builddir': self.builddir
+        }), {'refused': True})
+        self.assertEqual(self.server.handle({
+            'version': version, 'command': 'unknown'
+        }), {'refused': True})
+        self.regenerate.assert_not_called()
+
+    def test_serve(self):
+        sockdir = os.path.join(self.tmpdir, 'run')
+        path = os.path.join(sockdir, 'server.sock')
+        self.server.refresh = mock.Mock(return_value=0)
+
+        thread = threading.Thread(target=self.server.serve,
+                                  kwargs={'path': path, 'idle_timeout': 10})
+        thread.start()
+        try:
+            for i in range(100):
+                if os.path.exists(path):
+                    break
+                thread.join(0.05)
+            self.assertEqual(os.stat(sockdir).st_mode & 0o777, 0o700)
+
+            self.assertEqual(request({
+                'command': 'refresh', 'builddir': self.builddir,
+                'force': True,
+            }, path), {'returncode': 0, 'output': ''})
+            self.server.refresh.assert_called_once_with(self.builddir, True)
+        finally:
+            self.assertEqual(request({'command': 'stop'}, path),
+                             {'returncode': 0})
+            thread.join(10)
+
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(os.path.exists(path))
+
+    def test_idle_timeout(self):
+        path = os.path.join(self.tmpdir, 'run', 'server.sock')
+        with mock.patch('bfg9000.server.logger'):
+            self.server.serve(path, idle_timeout=0.01)
+        self.assertFalse(os.path.exists(path))
@@ -0,0 +1,134 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from bfg9000.build_inputs import BuildInputs
+from bfg9000.environment import Environment
+from bfg9000.path import abspath, Path, Root
+from bfg9000.snapshot import *
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.srcdir = os.path.join(self.tmpdir, 'src')
+        self.builddir = os.path.join(self.tmpdir, 'build')
+        os.mkdir(self.srcdir)
+        os.mkdir(self.builddir)
+        os.mkdir(self.src('dir'))
+
+        self.env = Environment(
+            Path('bfgdir', Root.srcdir), 'make', None, abspath(self.srcdir),
+            abspath(self.builddir), {}, (False, False), None
+        )
+        self.env.save(self.builddir)
+        self.write(self.src('build.bfg'), 'project("foo")\n')
+        self.write(self.build('Makefile'), 'all:\n')
+
+        self.build_inputs = BuildInputs(self.env,
+                                        Path('build.bfg', Root.srcdir))
+        self.build_inputs['find_dirs'].update([Path('dir', Root.srcdir),
+                                               Path('.', Root.srcdir)])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def src(self, *args):
+        return os.path.join(self.srcdir, *args)
+
+    def build(self, *args):
+        return os.path.join(self.builddir, *args)
+
+    def write(self, filename, data):
+        with open(filename, 'w') as f:
+            f.write(data)
+
+    def take(self):
+        return Snapshot.take(self.env, self.build_inputs,
+                             [Path('Makefile', Root.builddir)],
+                             Path('options.bfg', Root.srcdir))
+
+    def test_current(self):
+        self.assertTrue(self.take().current(self.env))
+
+    def test_changed_script(self):
+        snapshot = self.take()
+        self.write(self.src('build.bfg'), 'project("bar")\n')
+        self.assertFalse(snapshot.current(self.env))
+
+    def test_touched_script(self):
+        snapshot = self.take()
+        os.utime(self.src('build.bfg'), (0, 0))
+        self.assertTrue(snapshot.current(self.env))
+
+    def test_added_options(self):
+        snapshot = self.take()
+        self.write(self.src('options.bfg'), '')
+        self.assertFalse(snapshot.current(self.env))
+
+    def test_changed_dir(self):
+        snapshot = self.take()
+        self.write(self.src('dir', 'file.txt'), '')
+        self.assertFalse(snapshot.current(self.env))
+
+    def test_changed_probe(self):
+        self.write(self.src('tool'), '')
+        self.env.add_probe(self.src('tool'))
+        snapshot = self.take()
+        self.assertTrue(snapshot.current(self.env))
+
+        self.write(self.src('tool'), 'new version')
+        self.assertFalse(snapshot.current(self.env))
+
+    def test_changes(self):
+        self.write(self.src('tool'), '')
+        self.env.add_probe(self.src('tool'))
+        snapshot = self.take()
+        self.assertEqual(snapshot.changes(self.env), set())
+
+        self.write(self.src('dir', 'file.txt'), '')
+        self.assertEqual(snapshot.changes(self.env), {'dir'})
+        self.write(self.src('tool'), 'new version')
+        self.assertEqual(snapshot.changes(self.env), {'dir', 'which'})
+
+    def test_changed_backend(self):
+        snapshot = self.take()
+        self.env.backend = 'ninja'
+        self.assertFalse(snapshot.current(self.env))
+
+    def test_missing_output(self):
+        snapshot = self.take()
+        os.remove(self.build('Makefile'))
+        self.assertFalse(snapshot.current(self.env))
+
+    def test_touch(self):
+        snapshot = self.take()
+        os.utime(self.build('Makefile'), (0, 0))
+        snapshot.touch()
+        self.assertNotEqual(os.stat(self.build('Makefile')).st_mtime, 0)
+
+    def test_save_load(self):
+        self.take().save(self.builddir)
+        snapshot = Snapshot.load(self.builddir)
+        self.assertEqual(snapshot.outputs, [self.build('Makefile')])
+        self.assertTrue(snapshot.current(self.env))
+
+    def test_load_missing(self):
+        self.assertEqual(Snapshot.load(self.builddir), None)
+
+    def test_load_other_version(self):
+        self.take().save(self.builddir)
+        with open(self.build(snapshot_file)) as f:
+            state = json.load(f)
+        state['bfg_version'] = '0.0.0'
+        with open(self.build(snapshot_file), 'w') as f:
+            json.dump(state, f)
+        self.assertEqual(Snapshot.load(self.builddir), None)
+
+    def test_clear(self):
+        self.take().save(self.builddir)
+        Snapshot.clear(self.builddir)
+        self.assertFalse(os.path.exists(self.build(snapshot_file)))
+        Snapshot.clear(self.builddir)
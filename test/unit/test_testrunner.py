@@ -0,0 +1,106 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from six import assertRegex
+from six.moves import cStringIO as StringIO
+from xml.etree import ElementTree
+
+from bfg9000.shell import quote
+from bfg9000.testrunner import *
+
+
+def python_cmd(code):
+    return ' '.join(quote(i) for i in [sys.executable, '-c', code])
+
+
+class TestSchedule(unittest.TestCase):
+    def test_no_history(self):
+        tests = [{'name': 'foo'}, {'name': 'bar'}]
+        self.assertEqual(schedule(tests, {}), tests)
+
+    def test_history(self):
+        tests = [{'name': 'foo'}, {'name': 'bar'}, {'name': 'baz'},
+                 {'name': 'quux'}]
+        self.assertEqual(schedule(tests, {'foo': 1, 'bar': 3, 'baz': 2}), [
+            {'name': 'quux'}, {'name': 'bar'}, {'name': 'baz'},
+            {'name': 'foo'},
+        ])
+
+
+class TestRunTests(unittest.TestCase):
+    def test_run(self):
+        tests = [
+            {'name': 'pass', 'cmd': python_cmd('print("hello")')},
+            {'name': 'fail', 'cmd': python_cmd('import sys; sys.exit(2)')},
+            {'name': 'env', 'cmd': python_cmd(
+                'import os; print(os.environ["FOO"])'
+            ), 'env': {'FOO': 'foo'}},
+        ]
+        reported = []
+        results = run_tests(tests, 2, lambda r, i, n: reported.append(i))
+        self.assertEqual(sorted(reported), [1, 2, 3])
+
+        results = {i.name: i for i in results}
+        self.assertTrue(results['pass'].passed)
+        self.assertEqual(results['pass'].output.strip(), 'hello')
+        self.assertFalse(results['fail'].passed)
+        self.assertEqual(results['fail'].returncode, 2)
+        self.assertEqual(results['env'].output.strip(), 'foo')
+
+    def test_empty(self):
+        self.assertEqual(run_tests([], 4), [])
+
+
+class TestWriteJunit(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_write(self):
+        filename = os.path.join(self.tmpdir, 'results.xml')
+        write_junit(filename, [
+            TestResult({'name': 'pass'}, 0, 'output', 1.5),
+            TestResult({'name': 'fail'}, 1, 'error', 0.5),
+        ], 2)
+
+        suite = ElementTree.parse(filename).getroot().find('testsuite')
+        self.assertEqual(suite.get('tests'), '2')
+        self.assertEqual(suite.get('failures'), '1')
+
+        cases = suite.findall('testcase')
+        self.assertEqual([i.get('name') for i in cases], ['pass', 'fail'])
+        self.assertEqual(cases[0].get('time'), '1.500')
+        self.assertEqual(cases[0].find('system-out').text, 'output')
+        self.assertEqual(cases[1].find('failure').text, 'error')
+
+
+class TestRunOne(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.stamp = os.path.join(self.tmpdir, 'stamps', 'test.pass')
+        self.log = os.path.join(self.tmpdir, 'stamps', 'test.log')
+        self.out = StringIO()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_pass(self):
+        test = {'name': 'pass', 'cmd': python_cmd('print("hello")')}
+        self.assertEqual(run_one(test, self.stamp, self.log, self.out), 0)
+        self.assertTrue(os.path.exists(self.stamp))
+        with open(self.log) as f:
+            self.assertEqual(f.read().strip(), 'hello')
+        assertRegex(self, self.out.getvalue(), r'^PASS pass \(')
+
+    def test_fail(self):
+        os.makedirs(os.path.dirname(self.stamp))
+        open(self.stamp, 'w').close()
+
+        test = {'name': 'fail', 'cmd': python_cmd('import sys; sys.exit(2)')}
+        self.assertEqual(run_one(test, self.stamp, self.log, self.out), 2)
+        self.assertFalse(os.path.exists(self.stamp))
+        assertRegex(self, self.out.getvalue(), r'^FAIL fail \(')
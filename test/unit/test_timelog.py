@@ -0,0 +1,30 @@
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from bfg9000.analyze import read_timing_log
+from bfg9000.timelog import record
+
+
+class TestRecord(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, '.bfg_timing')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_record(self):
+        with mock.patch('os.getppid', return_value=123):
+            record(self.filename, 1000, 1100, 'foo.o')
+            record(self.filename, 1200, 1250, 'foo.o')
+
+        with open(self.filename) as f:
+            data = f.read()
+        self.assertEqual(data, '1000\t1100\t123\tfoo.o\n'
+                               '1200\t1250\t123\tfoo.o\n')
+
+        with open(self.filename) as f:
+            self.assertEqual(read_timing_log(f), {'foo.o': (1000, 1150)})
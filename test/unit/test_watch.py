@@ -0,0 +1,208 @@
+import mock
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from .. import make_env
+
+from bfg9000.configurations import ConfigurationSet
+from bfg9000.snapshot import Snapshot
+from bfg9000.versioning import Version
+from bfg9000.watch import *
+
+
+class WatcherTest(object):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for i in ('src', '.git', 'build'):
+            os.mkdir(self.path(i))
+        self.write(self.path('src', 'foo.cpp'))
+        # Make sure any modifications get a different mtime.
+        os.utime(self.path('src', 'foo.cpp'), (0, 0))
+
+        self.watcher = self.make_watcher(self.tmpdir, [self.path('build')])
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, *args):
+        return os.path.join(self.tmpdir, *args)
+
+    def write(self, filename, data=''):
+        with open(filename, 'w') as f:
+            f.write(data)
+
+    def test_timeout(self):
+        self.assertEqual(self.watcher.wait(0.05), set())
+
+    def test_modify(self):
+        self.write(self.path('src', 'foo.cpp'), 'int main() {}')
+        self.assertIn(self.path('src', 'foo.cpp'), self.watcher.wait(1))
+
+    def test_create(self):
+        self.write(self.path('src', 'bar.cpp'))
+        self.assertIn(self.path('src', 'bar.cpp'), self.watcher.wait(1))
+
+    def test_remove(self):
+        os.remove(self.path('src', 'foo.cpp'))
+        self.assertIn(self.path('src', 'foo.cpp'), self.watcher.wait(1))
+
+    def test_new_dir(self):
+        os.mkdir(self.path('src', 'sub'))
+        self.assertIn(self.path('src', 'sub'), self.watcher.wait(1))
+        self.watcher.wait(0.05)
+
+        self.write(self.path('src', 'sub', 'baz.cpp'))
+        self.assertIn(self.path('src', 'sub', 'baz.cpp'),
+                      self.watcher.wait(1))
+
+    def test_ignored(self):
+        self.write(self.path('build', 'foo.o'))
+        self.write(self.path('.git', 'index'))
+        self.assertEqual(self.watcher.wait(0.1), set())
+
+
+class TestPollingWatcher(WatcherTest, unittest.TestCase):
+    def make_watcher(self, root, ignore):
+        return PollingWatcher(root, ignore, interval=0.01)
+
+
+@unittest.skipIf(not sys.platform.startswith('linux'), 'requires inotify')
+class TestInotifyWatcher(WatcherTest, unittest.TestCase):
+    make_watcher = InotifyWatcher
+
+
+class TestMakeWatcher(unittest.TestCase):
+    def test_poll(self):
+        watcher = make_watcher('.', poll=True)
+        self.assertIsInstance(watcher, PollingWatcher)
+
+    def test_no_inotify(self):
+        with mock.patch('bfg9000.watch._load_libc', return_value=None):
+            watcher = make_watcher('.')
+        self.assertIsInstance(watcher, PollingWatcher)
+
+
+class TestCollect(unittest.TestCase):
+    def test_collect(self):
+        watcher = mock.Mock()
+        watcher.wait.side_effect = [{'foo'}, {'bar'}, set()]
+        self.assertEqual(collect(watcher, 0.5), {'foo', 'bar'})
+        self.assertEqual(watcher.wait.mock_calls, [
+            mock.call(), mock.call(0.5), mock.call(0.5)
+        ])
+
+
+class TestWatch(unittest.TestCase):
+    def setUp(self):
+        self.env = make_env()
+        self.env.backend = 'make'
+        self.backend = mock.Mock()
+        self.backend.command.return_value = ['make']
+        self.regenerate = mock.Mock()
+        self.watch = Watch(self.env, self.backend, ['foo'], self.regenerate)
+
+        self.srcdir = self.env.srcdir.string()
+        self.snapshot = Snapshot('make', [], [
+            ['file', os.path.join(self.srcdir, 'build.bfg'), 'hash'],
+            ['dir', os.path.join(self.srcdir, 'src'), 'hash'],
+        ])
+
+    def load(self, current=False):
+        self.snapshot.current = mock.Mock(return_value=current)
+        self.snapshot.touch = mock.Mock()
+        return mock.patch('bfg9000.snapshot.Snapshot.load',
+                          return_value=self.snapshot)
+
+    def test_needs_refresh(self):
+        src = self.srcdir
+        with self.load():
+            self.assertTrue(self.watch.needs_refresh({
+                os.path.join(src, 'build.bfg')
+            }))
+            self.assertTrue(self.watch.needs_refresh({
+                os.path.join(src, 'options.bfg')
+            }))
+            self.assertTrue(self.watch.needs_refresh({
+                os.path.join(src, 'src', 'new.cpp')
+            }))
+            self.assertFalse(self.watch.needs_refresh({
+                os.path.join(src, 'other', 'new.cpp')
+            }))
+
+    def test_needs_refresh_configurations(self):
+        src = self.srcdir
+        debug = os.path.join(self.env.builddir.string(), 'debug')
+        configurations = ConfigurationSet([('debug', [])])
+
+        # Multi-configuration builds track the directories in each
+        # configuration's snapshot.
+        def load(path):
+            return self.snapshot if path == debug else None
+
+        with mock.patch('bfg9000.configurations.ConfigurationSet.load',
+                        return_value=configurations), \
+             mock.patch('bfg9000.snapshot.Snapshot.load', load):  # noqa
+            self.assertTrue(self.watch.needs_refresh({
+                os.path.join(src, 'src', 'new.cpp')
+            }))
+            self.assertFalse(self.watch.needs_refresh({
+                os.path.join(src, 'other', 'new.cpp')
+            }))
+
+    def test_refresh_current(self):
+        with self.load(current=True):
+            self.assertTrue(self.watch.refresh())
+        self.snapshot.touch.assert_called_once_with()
+        self.regenerate.assert_not_called()
+
+    def test_refresh_stale(self):
+        with self.load(current=False):
+            self.assertTrue(self.watch.refresh())
+        self.regenerate.assert_called_once_with(self.env, self.backend)
+
+    def test_refresh_error(self):
+        self.regenerate.side_effect = ValueError('bad')
+        with self.load(current=False), \
+             mock.patch('bfg9000.watch.logger') as logger:  # noqa
+            self.assertFalse(self.watch.refresh())
+        logger.exception.assert_called_once()
+
+    def test_refresh_ninja(self):
+        self.env.backend = 'ninja'
+        self.env.backend_version = Version('1.10')
+        with self.load(current=True), \
+             mock.patch('subprocess.call') as call:  # noqa
+            self.watch.refresh()
+        call.assert_called_once_with(['make', '-t', 'restat'],
+                                     cwd=self.env.builddir.string())
+
+    def test_step(self):
+        src = self.srcdir
+        with self.load(current=False), \
+             mock.patch('subprocess.call', return_value=0) as call:  # noqa
+            self.assertEqual(self.watch.step({
+                os.path.join(src, 'foo.cpp')
+            }), 0)
+            self.regenerate.assert_not_called()
+
+            self.assertEqual(self.watch.step({
+                os.path.join(src, 'build.bfg')
+            }), 0)
+            self.regenerate.assert_called_once_with(self.env, self.backend)
+        self.assertEqual(call.mock_calls, [
+            mock.call(['make', 'foo'], cwd=self.env.builddir.string()),
+        ] * 2)
+
+    def test_step_error(self):
+        self.regenerate.side_effect = ValueError('bad')
+        with self.load(current=False), \
+             mock.patch('bfg9000.watch.logger'), \
+             mock.patch('subprocess.call') as call:  # noqa
+            self.assertEqual(self.watch.step({
+                os.path.join(self.srcdir, 'build.bfg')
+            }), None)
+        call.assert_not_called()
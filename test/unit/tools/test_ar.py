@@ -3,8 +3,10 @@ import unittest
 
 from ... import make_env
 
-from bfg9000 import options as opts
-from bfg9000.tools.ar import ArLinker
+from bfg9000 import options as opts, shell
+from bfg9000.file_types import ObjectFile, StaticLibrary, file_install_path
+from bfg9000.path import Path
+from bfg9000.tools.ar import ArLinker, _lto_archivers
 from bfg9000.versioning import Version
 
 
@@ -29,6 +31,14 @@ class TestArLinker(unittest.TestCase):
             self.assertEqual(self.ar.brand, 'gnu')
             self.assertEqual(self.ar.version, Version('2.26.1'))
 
+    def test_llvm_ar(self):
+        def mock_execute(*args, **kwargs):
+            return 'LLVM (http://llvm.org/):\n  LLVM version 15.0.7\n'
+
+        with mock.patch('bfg9000.shell.execute', mock_execute):
+            self.assertEqual(self.ar.brand, 'llvm')
+            self.assertEqual(self.ar.version, Version('15.0.7'))
+
     def test_unknown_brand(self):
         def mock_execute(*args, **kwargs):
             return 'unknown'
@@ -45,6 +55,61 @@ class TestArLinker(unittest.TestCase):
             self.assertEqual(self.ar.brand, 'unknown')
             self.assertEqual(self.ar.version, None)
 
+    def test_thin(self):
+        for version, thin in [('GNU ar (binutils) 2.26.1', False),
+                              ('GNU ar (binutils) 2.38', True),
+                              ('LLVM version 13.0.1', False),
+                              ('LLVM version 14.0.6', True),
+                              ('unknown', False)]:
+            with mock.patch('bfg9000.shell.which', mock_which):
+                ar = ArLinker(None, self.env)
+            with mock.patch('bfg9000.shell.execute', return_value=version):
+                self.assertEqual(ar.thin, thin, version)
+
+    def test_call(self):
+        with mock.patch('bfg9000.shell.execute',
+                        return_value='GNU ar (binutils) 2.40'):
+            self.assertEqual(self.ar(['a.o', 'b.o'], 'libfoo.a', ['cr']),
+                             [self.ar, 'cr', '--thin', 'libfoo.a', 'a.o',
+                              'b.o'])
+            self.assertEqual(self.ar(['a.o'], 'libfoo.a', ['cr'],
+                                     thin=False),
+                             [self.ar, 'cr', 'libfoo.a', 'a.o'])
+
+        with mock.patch('bfg9000.shell.which', mock_which):
+            ar = ArLinker(None, self.env)
+        with mock.patch('bfg9000.shell.execute', return_value='unknown'):
+            self.assertEqual(ar(['a.o'], 'libfoo.a', ['cr']),
+                             [ar, 'cr', 'libfoo.a', 'a.o'])
+
+    def test_post_install(self):
+        class MockContext(object):
+            files = [ObjectFile(Path('foo.o'), 'elf', 'c')]
+
+        output = StaticLibrary(Path('libfoo.a'), 'elf')
+        installed = file_install_path(output)
+        with mock.patch('bfg9000.shell.which', mock_which):
+            rm = self.env.tool('rm')
+
+        with mock.patch('bfg9000.shell.execute',
+                        return_value='GNU ar (binutils) 2.40'):
+            self.assertEqual(
+                self.ar.post_install(opts.option_list(), output,
+                                     MockContext()),
+                shell.join_lines([
+                    rm(installed),
+                    self.ar(MockContext.files, installed, ['cr'],
+                            thin=False),
+                ])
+            )
+
+        with mock.patch('bfg9000.shell.which', mock_which):
+            ar = ArLinker(None, self.env)
+        with mock.patch('bfg9000.shell.execute', return_value='unknown'):
+            self.assertEqual(ar.post_install(
+                opts.option_list(), output, MockContext()
+            ), None)
+
     def test_flags_empty(self):
         self.assertEqual(self.ar.flags(opts.option_list()), [])
 
@@ -54,3 +119,47 @@ class TestArLinker(unittest.TestCase):
     def test_flags_invalid(self):
         with self.assertRaises(TypeError):
             self.ar.flags(opts.option_list(123))
+
+
+class TestLtoArchivers(unittest.TestCase):
+    class MockBuilder(object):
+        class MockCompiler(object):
+            def __init__(self, command):
+                self.command = command
+
+        def __init__(self, brand, command):
+            self.brand = brand
+            self.compiler = self.MockCompiler(command)
+
+    def test_gcc(self):
+        self.assertEqual(_lto_archivers(self.MockBuilder('gcc', ['g++'])),
+                         ['gcc-ar'])
+        self.assertEqual(_lto_archivers(self.MockBuilder(
+            'gcc', ['/usr/bin/x86_64-linux-gnu-gcc-12']
+        )), ['x86_64-linux-gnu-gcc-ar-12', 'gcc-ar'])
+
+    def test_clang(self):
+        self.assertEqual(_lto_archivers(self.MockBuilder('clang', ['clang'])),
+                         ['llvm-ar'])
+        self.assertEqual(_lto_archivers(self.MockBuilder(
+            'clang', ['clang++-15']
+        )), ['llvm-ar-15', 'llvm-ar'])
+
+    def test_unknown(self):
+        self.assertEqual(_lto_archivers(self.MockBuilder('unknown', ['xlc'])),
+                         ['gcc-ar'])
+
+    def test_lto_linker(self):
+        def which(names, *args, **kwargs):
+            return [names[0]]
+
+        self.env = make_env()
+        with mock.patch('bfg9000.shell.which', which):
+            ar = ArLinker(self.MockBuilder('gcc', ['gcc']), self.env, True)
+        self.assertEqual(ar.command, ['gcc-ar'])
+        self.assertEqual(ar.lto_linker(), ar)
+
+        self.env.variables['LTO_AR'] = 'my-ar'
+        with mock.patch('bfg9000.shell.which', which):
+            ar = ArLinker(self.MockBuilder('gcc', ['gcc']), self.env, True)
+        self.assertEqual(ar.command, ['my-ar'])
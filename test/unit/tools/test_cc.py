@@ -1,19 +1,23 @@
 import mock
+import os
 import unittest
 
 from ... import make_env
 
 from bfg9000 import file_types, options as opts
+from bfg9000.environment import PgoSettings
+from bfg9000.iterutils import first
 from bfg9000.languages import Languages
 from bfg9000.packages import Framework
 from bfg9000.path import Path
 from bfg9000.safe_str import jbos
+from bfg9000.shell import CalledProcessError
 from bfg9000.tools.cc import CcBuilder
 from bfg9000.versioning import Version
 
 known_langs = Languages()
 with known_langs.make('c++') as x:
-    x.vars(compiler='CXX', cflags='CXXFLAGS')
+    x.vars(compiler='CXX', launcher='CXX_LAUNCHER', cflags='CXXFLAGS')
 with known_langs.make('java') as x:
     x.vars(compiler='JAVAC', cflags='JAVAFLAGS')
 
@@ -138,6 +142,51 @@ class TestCcCompiler(unittest.TestCase):
             self.compiler = CcBuilder(self.env, known_langs['c++'], ['c++'],
                                       'version').compiler
 
+    def test_call(self):
+        self.assertEqual(self.compiler('in', 'out'), [
+            self.compiler, '-x', 'c++', '-c', 'in', '-o', 'out'
+        ])
+        self.assertEqual(self.compiler('in', 'out', deps='out.d'), [
+            self.compiler, '-x', 'c++', '-c', 'in', '-MMD', '-MF', 'out.d',
+            '-o', 'out'
+        ])
+
+    def test_call_launcher(self):
+        def which(names, *args, **kwargs):
+            return [first(names)]
+
+        calls = []
+
+        def execute(args, **kwargs):
+            calls.append(args)
+            return mock_execute(args, **kwargs)
+
+        self.env.variables['CXX_LAUNCHER'] = 'ccache'
+        with mock.patch('bfg9000.shell.which', which), \
+             mock.patch('bfg9000.shell.execute', execute):  # noqa
+            builder = CcBuilder(self.env, known_langs['c++'], ['c++'],
+                                'version')
+            builder.compiler.search_dirs()
+            builder.linker('executable').search_dirs()
+        compiler = builder.compiler
+
+        self.assertEqual(builder.launcher.command, ['ccache'])
+        self.assertEqual(builder.launcher.command_var, 'cxx_launcher')
+        self.assertEqual(compiler('in', 'out'), [
+            builder.launcher, compiler, '-x', 'c++', '-c', 'in', '-o', 'out'
+        ])
+        self.assertEqual(builder.pch_compiler('in', 'out')[0:2],
+                         [builder.launcher, builder.pch_compiler])
+
+        # The launcher shouldn't be used when probing the compiler.
+        self.assertTrue(calls)
+        for i in calls:
+            self.assertNotIn('ccache', i)
+
+        # Linking doesn't use the launcher.
+        self.assertEqual(builder.linker('executable')(['in'], 'out')[0],
+                         builder.linker('executable'))
+
     def test_flags_empty(self):
         self.assertEqual(self.compiler.flags(opts.option_list()), [])
 
@@ -194,6 +243,133 @@ class TestCcCompiler(unittest.TestCase):
             self.compiler.flags(opts.option_list(123))
 
 
+class TestCcCompilerModules(unittest.TestCase):
+    gcc_version = 'g++ (GCC) {}\nCopyright (C) Free Software Foundation, Inc.'
+    clang_version = 'clang version {}'
+
+    def setUp(self):
+        self.env = make_env()
+
+    def _compiler(self, version, lang='c++'):
+        with mock.patch('bfg9000.shell.which', mock_which), \
+             mock.patch('bfg9000.shell.execute', mock_execute):  # noqa
+            return CcBuilder(self.env, known_langs[lang], ['c++'],
+                             version).compiler
+
+    def _scan(self, compiler):
+        with mock.patch('bfg9000.shell.which', mock_which):
+            return compiler.scan('in', 'out.ddi', 'out', 'out.ddi.d',
+                                 flags=['-std=c++20'])
+
+    def test_module_flavor(self):
+        self.assertEqual(self._compiler(self.gcc_version.format('12.2.0'))
+                         .module_flavor, 'gcc')
+        self.assertEqual(self._compiler(self.gcc_version.format('10.2.0'))
+                         .module_flavor, None)
+        self.assertEqual(self._compiler(self.clang_version.format('17.0.6'))
+                         .module_flavor, 'clang')
+        self.assertEqual(self._compiler(self.clang_version.format('15.0.0'))
+                         .module_flavor, None)
+        self.assertEqual(self._compiler('unknown').module_flavor, None)
+        self.assertEqual(self._compiler(self.gcc_version.format('12.2.0'),
+                                        'java').module_flavor, None)
+
+    def test_call_gcc(self):
+        compiler = self._compiler(self.gcc_version.format('12.2.0'))
+        self.assertEqual(compiler('in', 'out', modmap='out.modmap'), [
+            compiler, '-x', 'c++', '-fmodules-ts',
+            '-fmodule-mapper=out.modmap', '-c', 'in', '-o', 'out'
+        ])
+
+    def test_call_clang(self):
+        compiler = self._compiler(self.clang_version.format('17.0.6'))
+        self.assertEqual(compiler('in', 'out', modmap='out.modmap'), [
+            compiler, '-x', 'c++', '@out.modmap', '-c', 'in', '-o', 'out'
+        ])
+
+    def test_scan_gcc(self):
+        compiler = self._compiler(self.gcc_version.format('12.2.0'))
+        self.assertEqual(self._scan(compiler), [
+            self.env.tool('modscan'), 'scan', '--preprocessed', '-o',
+            'out.ddi', '-t', 'out', '--', compiler, '-x', 'c++', '-std=c++20',
+            '-E', 'in', '-MD', '-MF', 'out.ddi.d', '-MT', 'out.ddi'
+        ])
+
+    def test_scan_gcc_p1689(self):
+        compiler = self._compiler(self.gcc_version.format('14.1.0'))
+        self.assertEqual(self._scan(compiler), [
+            compiler, '-x', 'c++', '-std=c++20', '-E', 'in', '-fmodules-ts',
+            '-fdeps-format=p1689r5', '-fdeps-file=out.ddi',
+            '-fdeps-target=out', '-o', 'out.ddi.i', '-MD', '-MF', 'out.ddi.d',
+            '-MT', 'out.ddi'
+        ])
+
+    def test_scan_clang(self):
+        compiler = self._compiler(self.clang_version.format('17.0.6'))
+        with mock.patch('bfg9000.shell.which', mock_which):
+            scan_deps = self.env.tool('clang_scan_deps')
+        self.assertEqual(self._scan(compiler), [
+            self.env.tool('modscan'), 'scan', '--stdout', '-o', 'out.ddi',
+            '-t', 'out', '--', scan_deps, '-format=p1689', '--', compiler,
+            '-x', 'c++', '-std=c++20', '-c', 'in', '-o', 'out', '-MD', '-MF',
+            'out.ddi.d', '-MT', 'out.ddi'
+        ])
+
+
+class TestCcBuilderPgo(unittest.TestCase):
+    gcc_version = 'g++ (GCC) {}\nCopyright (C) Free Software Foundation, Inc.'
+    clang_version = 'clang version {}'
+
+    def setUp(self):
+        self.env = make_env()
+        self.builddir = self.env.builddir.string()
+        self.profile_dir = os.path.join(self.builddir, 'pgo-profile')
+
+    def _builder(self, version, mode):
+        self.env.pgo = PgoSettings(mode, Path(self.profile_dir), None)
+        with mock.patch('bfg9000.shell.which', mock_which), \
+             mock.patch('bfg9000.shell.execute', mock_execute):  # noqa
+            return CcBuilder(self.env, known_langs['c++'], ['c++'], version)
+
+    def test_gcc_generate(self):
+        cc = self._builder(self.gcc_version.format('12.2.0'), 'generate')
+        self.assertEqual(cc.compiler.global_flags, [
+            '-fprofile-generate=' + self.profile_dir,
+            '-fprofile-prefix-path=' + self.builddir,
+        ])
+        self.assertEqual(cc.pch_compiler.global_flags,
+                         cc.compiler.global_flags)
+        self.assertEqual(cc.linker('executable').global_flags,
+                         ['-fprofile-generate=' + self.profile_dir])
+
+    def test_gcc_use(self):
+        cc = self._builder(self.gcc_version.format('12.2.0'), 'use')
+        self.assertEqual(cc.compiler.global_flags, [
+            '-fprofile-use=' + self.profile_dir,
+            '-fprofile-prefix-path=' + self.builddir,
+        ])
+        self.assertEqual(cc.linker('executable').global_flags, [])
+
+    def test_clang_generate(self):
+        cc = self._builder(self.clang_version.format('17.0.6'), 'generate')
+        flag = '-fprofile-generate=' + os.path.join(self.profile_dir, 'raw')
+        self.assertEqual(cc.compiler.global_flags, [flag])
+        self.assertEqual(cc.linker('executable').global_flags, [flag])
+
+    def test_clang_use(self):
+        cc = self._builder(self.clang_version.format('17.0.6'), 'use')
+        self.assertEqual(cc.compiler.global_flags, [
+            '-fprofile-use=' + os.path.join(self.profile_dir,
+                                            'default.profdata'),
+        ])
+        self.assertEqual(cc.linker('executable').global_flags, [])
+
+    def test_unsupported(self):
+        self.assertRaises(ValueError, self._builder,
+                          self.gcc_version.format('10.2.0'), 'generate')
+        self.assertRaises(ValueError, self._builder, 'unknown', 'use')
+
+
 class TestCcLinker(unittest.TestCase):
     def _get_linker(self, lang):
         with mock.patch('bfg9000.shell.which', mock_which), \
@@ -408,3 +584,185 @@ class TestCcLinker(unittest.TestCase):
 
     def test_lib_flags_ignored(self):
         self.assertEqual(self.linker.lib_flags(opts.option_list('-Lfoo')), [])
+
+
+class TestCcBuilderLinkSpeed(unittest.TestCase):
+    def setUp(self):
+        self.env = make_env(platform='linux')
+
+    def _builder(self, linkers=None, split_dwarf=None):
+        if linkers is not None:
+            self.env.variables['LINKER'] = linkers
+        if split_dwarf is not None:
+            self.env.variables['SPLIT_DWARF'] = split_dwarf
+
+        def execute(args, **kwargs):
+            if args[-1] == '-Wl,--version':
+                fuse_ld = [i for i in args if i.startswith('-fuse-ld=')]
+                if fuse_ld == ['-fuse-ld=gold']:
+                    return ('GNU gold (GNU Binutils 2.40) 1.16',
+                            '/usr/bin/ld.gold --version\n')
+                elif fuse_ld:
+                    raise CalledProcessError(1, args)
+                return ('GNU ld (GNU Binutils) 2.40',
+                        '/usr/bin/ld --version\n')
+            return mock_execute(args, **kwargs)
+
+        with mock.patch('bfg9000.shell.which', mock_which), \
+             mock.patch('bfg9000.shell.execute', execute):  # noqa
+            return CcBuilder(self.env, known_langs['c++'], ['c++'],
+                             'version')
+
+    def test_default(self):
+        cc = self._builder()
+        self.assertEqual(cc.linker('executable').global_flags, [])
+        self.assertEqual(cc.linker('raw').brand, 'bfd')
+        self.assertEqual(cc.split_dwarf, False)
+
+    def test_linker(self):
+        cc = self._builder('mold lld gold')
+        self.assertEqual(cc.linker('executable').global_flags,
+                         ['-fuse-ld=gold'])
+        self.assertEqual(cc.linker('shared_library').global_flags,
+                         ['-fuse-ld=gold'])
+        self.assertEqual(cc.linker('raw').brand, 'gold')
+        self.assertEqual(cc.linker('raw').command, ['/usr/bin/ld.gold'])
+
+    def test_linker_unavailable(self):
+        with mock.patch('warnings.warn') as m:
+            cc = self._builder('mold lld')
+        m.assert_any_call("unable to use any linker from 'mold lld'; using " +
+                          'the default linker')
+        self.assertEqual(cc.linker('executable').global_flags, [])
+        self.assertEqual(cc.linker('raw').brand, 'bfd')
+
+    def test_split_dwarf(self):
+        cc = self._builder(split_dwarf='1')
+        self.assertEqual(cc.split_dwarf, True)
+        self.assertEqual(cc.compiler.num_outputs, 2)
+        self.assertEqual(cc.pch_compiler.num_outputs, 1)
+        self.assertEqual(cc.compiler('in', ['out.o', 'out.dwo']), [
+            cc.compiler, '-x', 'c++', '-g', '-gsplit-dwarf', '-c', 'in',
+            '-o', 'out.o'
+        ])
+
+        output = cc.compiler.output_file('file', None)
+        self.assertEqual(output, [
+            file_types.ObjectFile(Path('file.o'), 'elf', 'c++'),
+            file_types.DebugInfoFile(Path('file.dwo')),
+        ])
+        self.assertEqual(output[0].debug_info, output[1])
+        self.assertTrue(output[1].private)
+
+        # BFD doesn't support `--gdb-index`.
+        self.assertEqual(cc.linker('executable').global_flags, [])
+
+    def test_split_dwarf_gdb_index(self):
+        cc = self._builder('gold', '1')
+        self.assertEqual(cc.linker('executable').global_flags,
+                         ['-fuse-ld=gold', '-Wl,--gdb-index'])
+
+    def test_split_dwarf_non_elf(self):
+        self.env = make_env(platform='darwin')
+        with mock.patch('warnings.warn') as m:
+            cc = self._builder(split_dwarf='1')
+        m.assert_any_call('split DWARF is only supported for ELF objects')
+        self.assertEqual(cc.split_dwarf, False)
+        self.assertEqual(cc.compiler.num_outputs, 1)
+
+
+class TestCcLto(unittest.TestCase):
+    gcc_version = 'g++ (GCC) {}\nCopyright (C) Free Software Foundation, Inc.'
+    clang_version = 'clang version {}'
+
+    def setUp(self):
+        self.env = make_env(platform='linux')
+
+    def _builder(self, version, ld_version=''):
+        def execute(args, **kwargs):
+            if args[-1] == '-Wl,--version':
+                return ld_version, '/usr/bin/ld --version\n'
+            return mock_execute(args, **kwargs)
+
+        with mock.patch('bfg9000.shell.which', mock_which), \
+             mock.patch('bfg9000.shell.execute', execute):  # noqa
+            return CcBuilder(self.env, known_langs['c++'], ['c++'], version)
+
+    def _flags(self, builder, *args, **kwargs):
+        options = opts.option_list(opts.lto(*args, **kwargs))
+        return (builder.compiler.flags(options),
+                builder.linker('executable').flags(options))
+
+    def test_gcc(self):
+        cc = self._builder(self.gcc_version.format('12.2.0'))
+        self.assertEqual(self._flags(cc), (['-flto'], ['-flto=auto']))
+        self.assertEqual(self._flags(cc, 'thin'), (['-flto'], ['-flto=auto']))
+        self.assertEqual(self._flags(cc, jobs=4), (['-flto'], ['-flto=4']))
+
+        cc = self._builder(self.gcc_version.format('9.3.0'))
+        self.assertEqual(self._flags(cc), (['-flto'], ['-flto']))
+
+    def test_gcc_make(self):
+        self.env.backend = 'make'
+        cc = self._builder(self.gcc_version.format('12.2.0'))
+        linker = cc.linker('executable')
+        self.assertEqual(self._flags(cc), (['-flto'], ['-flto=jobserver']))
+        self.assertTrue(linker.needs_jobserver(opts.option_list(opts.lto())))
+
+        self.assertEqual(self._flags(cc, jobs=4), (['-flto'], ['-flto=4']))
+        self.assertFalse(linker.needs_jobserver(opts.option_list(
+            opts.lto(jobs=4)
+        )))
+        self.assertFalse(linker.needs_jobserver(opts.option_list()))
+
+    def test_clang_full(self):
+        cc = self._builder(self.clang_version.format('17.0.6'))
+        self.assertEqual(self._flags(cc), (['-flto'], ['-flto']))
+        self.assertEqual(self._flags(cc, jobs=4), (['-flto'], ['-flto']))
+
+        self.env.backend = 'make'
+        self.assertFalse(cc.linker('executable').needs_jobserver(
+            opts.option_list(opts.lto())
+        ))
+
+    def test_clang_thin(self):
+        cache = Path('.thinlto_cache')
+        cc = self._builder(self.clang_version.format('17.0.6'))
+        self.assertEqual(self._flags(cc, 'thin'), (['-flto=thin'], [
+            '-flto=thin', '-Wl,-plugin-opt,cache-dir=' + cache
+        ]))
+        self.assertEqual(self._flags(cc, 'thin', 4), (['-flto=thin'], [
+            '-flto=thin', '-Wl,-plugin-opt,cache-dir=' + cache,
+            '-Wl,-plugin-opt,jobs=4'
+        ]))
+
+    def test_clang_thin_lld(self):
+        cache = Path('.thinlto_cache')
+        cc = self._builder(self.clang_version.format('17.0.6'),
+                           'LLD 17.0.6 (compatible with GNU linkers)')
+        self.assertEqual(self._flags(cc, 'thin', 4), (['-flto=thin'], [
+            '-flto=thin', '-Wl,--thinlto-cache-dir=' + cache,
+            '-Wl,--thinlto-jobs=4'
+        ]))
+
+    def test_clang_thin_darwin(self):
+        self.env = make_env(platform='darwin')
+        cache = Path('.thinlto_cache')
+        cc = self._builder(self.clang_version.format('17.0.6'))
+        self.assertEqual(self._flags(cc, 'thin', 4), (['-flto=thin'], [
+            '-flto=thin', '-Wl,-cache_path_lto,' + cache,
+            '-Wl,-mllvm,-threads=4'
+        ]))
+
+    def test_static_linker(self):
+        def which(names, *args, **kwargs):
+            return [first(names)]
+
+        cc = self._builder(self.gcc_version.format('12.2.0'))
+        with mock.patch('bfg9000.shell.which', which):
+            ar = cc.linker('static_library').lto_linker()
+        self.assertEqual(ar.command, ['gcc-ar'])
+        self.assertEqual(ar.rule_name, 'ar_lto')
+        self.assertEqual(ar.command_var, 'lto_ar')
+        self.assertIs(ar.lto_linker(), ar)
+        self.assertIs(cc.linker('static_library').lto_linker(), ar)
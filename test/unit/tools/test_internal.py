@@ -0,0 +1,197 @@
+import mock
+import unittest
+from six import assertRegex
+
+from ... import make_env
+
+from bfg9000.path import Path
+from bfg9000.safe_str import shell_literal
+from bfg9000.shell import shell_list
+from bfg9000.tools.internal import (cached_command, Archive, Cache, Depdb,
+                                   Fortscan, Installer, Modscan, Pgo,
+                                   Timelog)
+
+
+def mock_which(*args, **kwargs):
+    return ['command']
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        with mock.patch('bfg9000.shell.which', mock_which):
+            self.archive = Archive(make_env())
+
+    def test_call(self):
+        self.assertEqual(self.archive('gzip', ['foo', 'bar'], 'out.tar.gz',
+                                      cmd='cmd'),
+                         ['cmd', '-f', 'gzip', 'out.tar.gz', 'foo', 'bar'])
+
+    def test_call_prefix(self):
+        self.assertEqual(self.archive(
+            'xz', ['foo'], 'out.tar.xz', directory='src', dest_prefix='proj',
+            cmd='cmd'
+        ), ['cmd', '-f', 'xz', '-C', 'src', '-P', 'proj', 'out.tar.xz', 'foo'])
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.env = make_env()
+        self.env.variables['BFG9000_CACHE_DIR'] = '/cache'
+        with mock.patch('bfg9000.shell.which', mock_which):
+            self.cache = Cache(self.env)
+
+    def test_call(self):
+        self.assertEqual(self.cache(['cc', 'foo.c'], ['foo.o'], cmd='cmd'), [
+            'cmd', '-d', '/cache', 'run', '-o', 'foo.o', '--', 'cc', 'foo.c'
+        ])
+        self.assertEqual(self.cache(['cc'], 'foo.o', 'foo.d', cmd='cmd'), [
+            'cmd', '-d', '/cache', 'run', '-o', 'foo.o', '--depfile', 'foo.d',
+            '--', 'cc'
+        ])
+
+    def test_call_max_size(self):
+        self.env.variables['BFG9000_CACHE_SIZE'] = '1G'
+        with mock.patch('bfg9000.shell.which', mock_which):
+            cache = Cache(self.env)
+        self.assertEqual(cache(['cc'], ['foo.o'], cmd='cmd'), [
+            'cmd', '-d', '/cache', '--max-size', '1G', 'run', '-o', 'foo.o',
+            '--', 'cc'
+        ])
+
+    def test_wrap_shell(self):
+        self.assertEqual(self.cache.wrap_shell(
+            shell_list(['touch', 'foo']), ['foo'], ['bar'], 'salt', 'cmd'
+        ), [
+            'cmd', '-d', '/cache', 'lookup', '-o', 'foo', '-i', 'bar',
+            '--salt', 'salt', shell_literal('||'), shell_literal('('),
+            shell_literal('('), 'touch', 'foo', shell_literal(')'),
+            shell_literal('&&'), 'cmd', '-d', '/cache', 'store', '-o', 'foo',
+            '-i', 'bar', '--salt', 'salt', shell_literal(')')
+        ])
+
+    def test_cached_command(self):
+        with mock.patch('bfg9000.shell.which', mock_which):
+            result = cached_command(self.env, ['cc'], ['foo.o'])
+        self.assertEqual(result, [
+            self.env.tool('cache'), '-d', '/cache', 'run', '-o', 'foo.o',
+            '--', 'cc'
+        ])
+
+    def test_cached_command_disabled(self):
+        del self.env.variables['BFG9000_CACHE_DIR']
+        self.assertEqual(cached_command(self.env, ['cc'], ['foo.o']), ['cc'])
+
+
+class TestInstaller(unittest.TestCase):
+    def setUp(self):
+        with mock.patch('bfg9000.shell.which', mock_which):
+            self.installer = Installer(make_env())
+
+    def test_call(self):
+        self.assertEqual(self.installer(
+            ['foo', 'bar'], 'dest', ['doppel', '-ip'], cmd='cmd'
+        ), ['cmd', 'dest', 'foo', 'bar', '--', 'doppel', '-ip'])
+
+    def test_call_directory(self):
+        self.assertEqual(self.installer(
+            ['foo/bar'], 'dest', ['doppel', '-ipN'], directory='src',
+            full_name=True, cmd='cmd'
+        ), ['cmd', '-C', 'src', '-N', 'dest', 'foo/bar', '--', 'doppel',
+            '-ipN'])
+
+    def test_wrap_post_install(self):
+        self.assertEqual(self.installer.wrap_post_install(
+            shell_list(['patchelf', 'dest/foo']), 'foo', 'dest/foo', 'cmd'
+        ), [
+            'cmd', '--check', 'foo', 'dest/foo', shell_literal('||'),
+            shell_literal('('), shell_literal('('), 'patchelf', 'dest/foo',
+            shell_literal(')'), shell_literal('&&'), 'cmd', '--stamp', 'foo',
+            'dest/foo', shell_literal(')')
+        ])
+
+
+class TestTimelog(unittest.TestCase):
+    def setUp(self):
+        with mock.patch('bfg9000.shell.which', mock_which):
+            self.timelog = Timelog(make_env())
+
+    def test_call(self):
+        self.assertEqual(self.timelog('foo.o', 'cc -c foo.c', cmd='cmd'),
+                         ['cmd', 'foo.o', '-c', 'cc -c foo.c'])
+
+
+class TestPgo(unittest.TestCase):
+    def setUp(self):
+        with mock.patch('bfg9000.shell.which', mock_which):
+            self.pgo = Pgo(make_env())
+
+    def test_call(self):
+        self.assertEqual(self.pgo('profile', ['make', 'test'], cmd='cmd'),
+                         ['cmd', 'profile', '--', 'make', 'test'])
+
+    def test_call_options(self):
+        self.assertEqual(self.pgo('profile', ['./prog'], directory='dir',
+                                  merge='llvm-profdata', stamp='stamp',
+                                  cmd='cmd'),
+                         ['cmd', '-C', 'dir', '--merge', 'llvm-profdata',
+                          '--stamp', 'stamp', 'profile', '--', './prog'])
+
+
+class TestDepdb(unittest.TestCase):
+    def _depdb(self, shards=None):
+        env = make_env()
+        if shards is not None:
+            env.variables['MAKE_DEPDB_SHARDS'] = shards
+        with mock.patch('bfg9000.shell.which', mock_which):
+            return Depdb(env)
+
+    def test_disabled(self):
+        self.assertEqual(self._depdb().shards, 0)
+        self.assertEqual(self._depdb('0').shards, 0)
+
+    def test_shard(self):
+        depdb = self._depdb('4')
+        self.assertEqual(depdb.shards, 4)
+        shard = depdb.shard(Path('foo.o'))
+        self.assertEqual(shard, depdb.shard(Path('foo.o')))
+        assertRegex(self, shard.suffix, r'^\.bfg_deps/[0-3]\.mk$')
+
+    def test_call(self):
+        self.assertEqual(self._depdb('4')('shard', 'foo.o', 'foo.o.d',
+                                          cmd='cmd'),
+                         ['cmd', 'shard', 'foo.o', 'foo.o.d'])
+
+
+class TestFortscan(unittest.TestCase):
+    def test_call(self):
+        with mock.patch('bfg9000.shell.which', mock_which):
+            fortscan = Fortscan(make_env())
+        self.assertEqual(fortscan('ninja', 'out.dd', ['foo.o', 'foo.f90'],
+                                  cmd='cmd'),
+                         ['cmd', '-f', 'ninja', '-o', 'out.dd', 'foo.o',
+                          'foo.f90'])
+
+
+class TestModscan(unittest.TestCase):
+    def setUp(self):
+        with mock.patch('bfg9000.shell.which', mock_which):
+            self.modscan = Modscan(make_env())
+
+    def test_call(self):
+        self.assertEqual(self.modscan('stdout', 'foo.o.ddi', 'foo.o',
+                                      ['scan-deps'], cmd='cmd'),
+                         ['cmd', 'scan', '--stdout', '-o', 'foo.o.ddi', '-t',
+                          'foo.o', '--', 'scan-deps'])
+
+    def test_collate(self):
+        self.assertEqual(self.modscan.collate(
+            'ninja', 'gcc', 'out.dd', 'bmi', ['foo.o.ddi', 'bar.o.ddi'],
+            cmd='cmd'
+        ), ['cmd', 'collate', '-f', 'ninja', '--flavor', 'gcc', '-b', 'bmi',
+            '-o', 'out.dd', 'foo.o.ddi', 'bar.o.ddi'])
+
+    def test_wrap_compile(self):
+        self.assertEqual(self.modscan.wrap_compile(
+            ['c++', '-c', 'foo.cpp'], 'foo.o', 'foo.o.d', cmd='cmd'
+        ), ['cmd', 'compile', '-t', 'foo.o', '--depfile', 'foo.o.d', '--',
+            'c++', '-c', 'foo.cpp'])
@@ -9,6 +9,7 @@ from bfg9000.environment import Environment
 from bfg9000.languages import Languages
 from bfg9000.path import Path
 from bfg9000.safe_str import jbos
+from bfg9000.tools.internal import Jvmd, JvmOutput
 from bfg9000.tools.jvm import JvmBuilder
 from bfg9000.versioning import Version
 
@@ -164,6 +165,21 @@ class TestJvmCompiler(unittest.TestCase):
             self.compiler = JvmBuilder(self.env, known_langs['java'],
                                        ['javac'], 'version').compiler
 
+    def test_call(self):
+        with mock.patch('bfg9000.shell.which', mock_which):
+            cmd = self.compiler('in', 'out')
+        self.assertIsInstance(cmd[0], JvmOutput)
+        self.assertEqual(cmd[1:], ['-o', 'out', self.compiler, '-verbose',
+                                   '-d', '.', 'in'])
+
+    def test_call_daemon(self):
+        self.env.variables['JVM_DAEMON'] = '1'
+        with mock.patch('bfg9000.shell.which', mock_which):
+            cmd = self.compiler('in', 'out')
+        self.assertIsInstance(cmd[0], Jvmd)
+        self.assertEqual(cmd[1:], ['-o', 'out', self.compiler, '-verbose',
+                                   '-d', '.', 'in'])
+
     def test_flags_empty(self):
         self.assertEqual(self.compiler.flags(opts.option_list()), [])
 
@@ -41,6 +41,20 @@ class TestLdLinker(unittest.TestCase):
         self.assertEqual(ld.brand, 'gold')
         self.assertEqual(ld.version, Version('1.11'))
 
+    def test_lld(self):
+        version = 'LLD 15.0.7 (compatible with GNU linkers)'
+        ld = LdLinker(None, self.env, ['ld.lld'], version)
+
+        self.assertEqual(ld.brand, 'lld')
+        self.assertEqual(ld.version, Version('15.0.7'))
+
+    def test_mold(self):
+        version = 'mold 2.4.0 (compatible with GNU ld)'
+        ld = LdLinker(None, self.env, ['ld.mold'], version)
+
+        self.assertEqual(ld.brand, 'mold')
+        self.assertEqual(ld.version, Version('2.4.0'))
+
     def test_unknown_brand(self):
         version = 'unknown'
         ld = LdLinker(None, self.env, ['ld'], version)
@@ -12,7 +12,7 @@ from bfg9000.versioning import Version
 
 known_langs = Languages()
 with known_langs.make('c++') as x:
-    x.vars(compiler='CXX', cflags='CXXFLAGS')
+    x.vars(compiler='CXX', launcher='CXX_LAUNCHER', cflags='CXXFLAGS')
 
 
 def mock_which(*args, **kwargs):
@@ -101,6 +101,23 @@ class TestMsvcCompiler(unittest.TestCase):
             self.compiler = MsvcBuilder(self.env, known_langs['c++'], ['cl'],
                                         'version').compiler
 
+    def test_call(self):
+        self.assertEqual(self.compiler('in', 'out'), [
+            self.compiler, '/nologo', '/EHsc', '/c', 'in', '/Foout'
+        ])
+
+    def test_call_launcher(self):
+        self.env.variables['CXX_LAUNCHER'] = 'sccache'
+        with mock.patch('bfg9000.shell.which', mock_which):
+            builder = MsvcBuilder(self.env, known_langs['c++'], ['cl'],
+                                  'version')
+        compiler = builder.compiler
+        self.assertEqual(builder.launcher.command, ['command'])
+        self.assertEqual(compiler('in', 'out'), [
+            builder.launcher, compiler, '/nologo', '/EHsc', '/c', 'in',
+            '/Foout'
+        ])
+
     def test_flags_empty(self):
         self.assertEqual(self.compiler.flags(opts.option_list()), [])
 
@@ -140,6 +157,10 @@ class TestMsvcCompiler(unittest.TestCase):
                                                       'native'))
         )), ['/Yuheader'])
 
+    def test_flags_lto(self):
+        self.assertEqual(self.compiler.flags(opts.option_list(opts.lto())),
+                         ['/GL'])
+
     def test_flags_string(self):
         self.assertEqual(self.compiler.flags(opts.option_list('-v')), ['-v'])
 
@@ -189,6 +210,13 @@ class TestMsvcLinker(unittest.TestCase):
             opts.lib(file_types.SharedLibrary(lib, 'native'))
         )), ['/LIBPATH:' + libdir])
 
+    def test_flags_lto(self):
+        self.assertEqual(self.linker.flags(opts.option_list(opts.lto())),
+                         ['/LTCG'])
+        self.assertEqual(self.linker.flags(opts.option_list(
+            opts.lto('thin')
+        )), ['/LTCG:INCREMENTAL'])
+
     def test_flags_string(self):
         self.assertEqual(self.linker.flags(opts.option_list('-v')), ['-v'])
 